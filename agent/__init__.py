@@ -1,4 +1,6 @@
 # agent package
 from .personal_agent import PersonalAgent
+from .reminder_scheduler import ReminderScheduler
+from .event_predictor import RecurrencePredictor
 
-__all__ = ['PersonalAgent']
+__all__ = ['PersonalAgent', 'ReminderScheduler', 'RecurrencePredictor']
@@ -0,0 +1,213 @@
+# agent/event_predictor.py
+"""
+Learn recurring events (rent, bills, weekly meetings) from the events extracted
+into the EventStore and propose the next occurrence as a reminder.
+
+Events are grouped by topic. Each topic keeps only its most recent
+`Config.PATTERN_WINDOW` occurrence times, so a new event costs a constant amount
+of work: insert its time, then fit the window's intervals against the candidate
+periods in one vectorized NumPy pass. The fitted pattern (period, next due time,
+confidence) is stored with the topic, so listing predictions is an indexed query.
+"""
+import bisect
+import math
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import Config
+
+# (name, period in days, tolerance in days per period)
+PERIODS = [
+    ('daily', 1.0, 0.25),
+    ('weekly', 7.0, 1.0),
+    ('biweekly', 14.0, 1.5),
+    ('monthly', 30.44, 3.5),
+    ('quarterly', 91.31, 7.0),
+    ('yearly', 365.25, 10.0),
+]
+# Intervals this regular (coefficient of variation) form a custom "every N days" pattern
+CUSTOM_PERIOD_MAX_CV = 0.1
+MIN_PERIOD_SCORE = 0.5
+
+_STOPWORDS = set("""
+    a an the my our your his her their its i we you he she they it is are was were be been
+    to of in on at for by with from and or but this that these those next last every each
+    due pay paid paying payment remind reminder reminders have has had do does did need needs
+    get got make made go going will shall should must please about around before after
+    today tonight tomorrow yesterday morning afternoon evening night noon midnight
+    week weekly weekend month monthly year yearly daily day days am pm
+    monday tuesday wednesday thursday friday saturday sunday
+    january february march april may june july august september october november december
+    jan feb mar apr jun jul aug sep sept oct nov dec
+""".split())
+
+
+def topic_key(text: str, max_words: int = 4) -> str:
+    """
+    Normalize an event title or intent topic into a grouping key, e.g.
+    "Paid the rent on 1 October" and "Rent payment due 1 November" -> "rent".
+    """
+    words = []
+    for word in re.findall(r'[a-z]+', (text or '').lower()):
+        if word in _STOPWORDS or len(word) < 3:
+            continue
+        # Light stemming so "meetings"/"meeting" and "renewed"/"renewal" group together
+        for suffix in ('ings', 'ing', 'als', 'al', 'ed', 'es', 's'):
+            if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+                word = word[:-len(suffix)]
+                break
+        if word not in _STOPWORDS and word not in words:
+            words.append(word)
+        if len(words) == max_words:
+            break
+    return ' '.join(sorted(words))
+
+
+def _add_months(date: datetime, months: int, day: int) -> datetime:
+    month_index = date.month - 1 + months
+    year, month = date.year + month_index // 12, month_index % 12 + 1
+    next_month = datetime(year + (month == 12), month % 12 + 1, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return date.replace(year=year, month=month, day=min(day, last_day))
+
+
+def analyze(timestamps: List[float], now: datetime = None) -> Optional[Dict]:
+    """
+    Fit occurrence times (epoch seconds, sorted) to the candidate periods.
+    Returns {'period', 'interval_days', 'next_due', 'confidence'} or None when
+    there are too few occurrences or no regular period.
+    """
+    import numpy as np
+
+    now = now or datetime.now()
+    times = np.asarray(timestamps, dtype=np.float64)
+    intervals = np.diff(times) / 86400.0
+    intervals = intervals[intervals > 0.01]
+    if times.size < Config.PATTERN_MIN_OCCURRENCES or intervals.size < Config.PATTERN_MIN_OCCURRENCES - 1:
+        return None
+
+    periods = np.array([period for _, period, _ in PERIODS])
+    tolerances = np.array([tolerance for _, _, tolerance in PERIODS])
+
+    # intervals x periods: how many periods each interval spans, and how far off it is
+    multiples = np.maximum(np.rint(intervals[:, None] / periods[None, :]), 1.0)
+    errors = np.abs(intervals[:, None] - multiples * periods[None, :])
+    hits = errors <= tolerances[None, :] * np.sqrt(multiples)
+    # An interval spanning k periods (skipped occurrences) counts 1/k, so "daily"
+    # does not win on weekly data just because every week is a whole number of days
+    scores = (hits / multiples).mean(axis=0)
+
+    best = int(np.argmax(scores))
+    score = float(scores[best])
+    name, interval = PERIODS[best][0], float(periods[best])
+    if score < MIN_PERIOD_SCORE:
+        mean = float(intervals.mean())
+        cv = float(intervals.std() / mean) if mean else 1.0
+        if cv > CUSTOM_PERIOD_MAX_CV:
+            return None
+        interval = float(np.median(intervals))
+        name, score = f"every {interval:.0f} days", 1.0 - cv
+
+    last = datetime.fromtimestamp(times[-1])
+    if name in ('monthly', 'quarterly', 'yearly'):
+        # Calendar periods keep the usual day of the month rather than drifting by 30.44 days
+        step = {'monthly': 1, 'quarterly': 3, 'yearly': 12}[name]
+        day = int(np.median([datetime.fromtimestamp(t).day for t in times]))
+        next_due = _add_months(last, step, day)
+        while next_due <= now:
+            next_due = _add_months(next_due, step, day)
+    else:
+        next_due = last + timedelta(days=interval)
+        if next_due <= now:
+            skipped = math.ceil((now - next_due).total_seconds() / (interval * 86400.0))
+            next_due += timedelta(days=interval * max(skipped, 1))
+            if next_due <= now:
+                next_due += timedelta(days=interval)
+
+    observed = intervals.size
+    return {
+        'period': name,
+        'interval_days': round(interval, 2),
+        'next_due': next_due.replace(microsecond=0),
+        # Regularity of the fit, discounted while only a few intervals have been seen
+        'confidence': round(score * observed / (observed + 2), 3)
+    }
+
+
+class RecurrencePredictor:
+    """Incrementally maintained per-topic recurrence patterns, persisted in an EventStore"""
+
+    def __init__(self, event_store, window: int = None):
+        self.event_store = event_store
+        self.window = window or Config.PATTERN_WINDOW
+        self._lock = threading.Lock()
+
+    def observe(self, topic: str, due_at, title: str = None, now: datetime = None) -> Optional[Dict]:
+        """Record one occurrence of `topic`; returns the updated prediction (or None)"""
+        if not topic:
+            return None
+        if isinstance(due_at, str):
+            due_at = datetime.fromisoformat(due_at)
+
+        with self._lock:
+            pattern = self.event_store.get_pattern(topic) or {
+                'topic': topic, 'occurrences': 0, 'timestamps': []
+            }
+            timestamps = pattern['timestamps']
+            bisect.insort(timestamps, due_at.timestamp())
+            pattern['timestamps'] = timestamps[-self.window:]
+            pattern['occurrences'] += 1
+            if title:
+                pattern['title'] = title
+
+            fit = analyze(pattern['timestamps'], now=now)
+            pattern.update({
+                'period': fit['period'] if fit else None,
+                'interval_days': fit['interval_days'] if fit else None,
+                'next_due': fit['next_due'].isoformat() if fit else None,
+                'confidence': fit['confidence'] if fit else 0.0
+            })
+            self.event_store.save_pattern(pattern)
+        return self._prediction(pattern) if fit else None
+
+    def predictions(self, limit: int = 20, min_confidence: float = None) -> List[Dict]:
+        """Upcoming predicted occurrences, soonest first"""
+        min_confidence = Config.PATTERN_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        now = datetime.now().isoformat(timespec='seconds')
+        patterns = self.event_store.upcoming_patterns(now, min_confidence=min_confidence, limit=limit)
+        return [self._prediction(pattern) for pattern in patterns]
+
+    def prediction(self, topic: str) -> Optional[Dict]:
+        """The current prediction for one topic, or None if it has no upcoming recurrence"""
+        pattern = self.event_store.get_pattern(topic)
+        if not pattern or not pattern['next_due'] or pattern['next_due'] <= datetime.now().isoformat():
+            return None
+        return self._prediction(pattern)
+
+    @staticmethod
+    def _prediction(pattern: Dict) -> Dict:
+        return {
+            'topic': pattern['topic'],
+            'title': f"{pattern['topic'].capitalize()} ({pattern['period']})",
+            'example': pattern.get('title'),
+            'period': pattern['period'],
+            'interval_days': pattern['interval_days'],
+            'next_due': pattern['next_due'],
+            'confidence': pattern['confidence'],
+            'occurrences': pattern['occurrences']
+        }
+
+    def reminder_for(self, prediction: Dict) -> Dict:
+        """Event dict (for EventStore.add_events) that turns a prediction into a reminder"""
+        due_at = datetime.fromisoformat(prediction['next_due'])
+        return {
+            'title': prediction['title'],
+            'description': (f"Predicted from {prediction['occurrences']} past occurrences such as "
+                            f"\"{prediction['example']}\" (confidence {prediction['confidence']:.2f})"),
+            'due_at': due_at,
+            'remind_at': due_at - timedelta(minutes=Config.REMINDER_LEAD_MINUTES),
+            'method': 'predicted',
+            'topic': prediction['topic']
+        }
@@ -0,0 +1,219 @@
+# agent/job_runner.py
+"""
+Run background jobs from a JobStore on a pool of worker threads.
+
+Jobs are ingestion ('add_text', 'add_file', 'transcribe' for recordings),
+snapshot export ('export') and re-embedding with another model ('migrate').
+Each handler reports progress through a callback that writes to the job row
+(at most every Config.JOB_PROGRESS_INTERVAL seconds) and raises JobCancelled
+once cancellation was requested, so a job stops at its next batch boundary.
+Chunks stored before a cancelled ingest stop stay in the knowledge base; a
+cancelled export leaves nothing behind.
+
+Workers wake up immediately for jobs submitted through this runner and poll
+the table every Config.JOB_POLL_SECONDS for jobs submitted by other processes.
+A heartbeat thread touches this process's running jobs every
+Config.JOB_HEARTBEAT_SECONDS, including through phases that report no progress,
+so other processes starting up do not take them for orphaned.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, List
+
+from config import Config
+from database.job_store import JobCancelled
+
+
+def is_upload_path(path) -> bool:
+    """Whether path lies inside Config.JOB_UPLOAD_DIR (symlinks and '..' resolved)"""
+    upload_dir = os.path.realpath(Config.JOB_UPLOAD_DIR)
+    try:
+        return os.path.commonpath([upload_dir, os.path.realpath(path)]) == upload_dir
+    except ValueError:
+        # Paths on different drives (Windows)
+        return False
+
+
+class JobRunner:
+    """Worker threads executing queued jobs with the given agent"""
+
+    def __init__(self, agent, job_store, workers: int = None, poll_seconds: float = None,
+                 stale_seconds: float = None, on_finish: Callable[[Dict], None] = None):
+        self.agent = agent
+        self.job_store = job_store
+        self.workers = workers or Config.JOB_WORKERS
+        self.poll_seconds = poll_seconds or Config.JOB_POLL_SECONDS
+        self.stale_seconds = stale_seconds or Config.JOB_STALE_SECONDS
+        self.heartbeat_seconds = Config.JOB_HEARTBEAT_SECONDS
+        self.callbacks: List[Callable[[Dict], None]] = [on_finish] if on_finish else []
+        self.handlers: Dict[str, Callable] = {
+            'add_text': self._add_text,
+            'add_file': self._add_file,
+            'transcribe': self._transcribe,
+            'export': self._export,
+            'migrate': self._migrate,
+        }
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._threads = []
+        self._running = set()  # IDs of the jobs executing in this process
+        self._running_lock = threading.Lock()
+        self._heartbeat_stopped = threading.Event()
+        self._heartbeat_thread = None
+        self.completed = 0
+
+    def register(self, kind: str, handler: Callable[[Dict, Callable], Dict]):
+        """Add a job kind: `handler(job, report)` returns the job's JSON result"""
+        self.handlers[kind] = handler
+
+    def start(self):
+        """Queue again jobs orphaned by a dead process and start the workers"""
+        requeued = self.job_store.requeue_stale(self.stale_seconds)
+        if requeued:
+            print(f"Re-queued {requeued} interrupted jobs")
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, daemon=True, name='job-heartbeat')
+        self._heartbeat_thread.start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, daemon=True, name=f'job-worker-{i}')
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Stop taking jobs; running jobs finish their current batch unless cancelled"""
+        self._stopped.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        # Jobs still finishing their batch keep their heartbeat until then
+        self._heartbeat_stopped.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join(timeout=timeout)
+            self._heartbeat_thread = None
+
+    def submit(self, kind: str, params: Dict = None) -> int:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}' (expected one of {', '.join(self.handlers)})")
+        job_id = self.job_store.submit(kind, params)
+        self._wake.set()
+        return job_id
+
+    def _heartbeat(self):
+        while not self._heartbeat_stopped.wait(self.heartbeat_seconds):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                self.job_store.heartbeat(running)
+            except Exception as e:
+                print(f"Error recording job heartbeat: {e}")
+
+    def _run(self):
+        worker = f"pid-{os.getpid()}-{threading.current_thread().name}"
+        while not self._stopped.is_set():
+            try:
+                job = self.job_store.claim(worker, kinds=list(self.handlers))
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+            self.execute(job)
+
+    def execute(self, job: Dict) -> Dict:
+        """Run a claimed job in the calling thread and record its outcome"""
+        print(f"Running job #{job['id']} ({job['kind']})")
+        last_write = [0.0]
+
+        def report(done: int, total: int = None, message: str = None):
+            now = time.time()
+            final = total is not None and done >= total
+            if not final and now - last_write[0] < Config.JOB_PROGRESS_INTERVAL:
+                return
+            last_write[0] = now
+            if self.job_store.update_progress(job['id'], done, total, message):
+                raise JobCancelled(f"Job #{job['id']} cancelled")
+
+        with self._running_lock:
+            self._running.add(job['id'])
+        try:
+            result = self.handlers[job['kind']](job, report)
+            self.job_store.finish(job['id'], 'done', result=result)
+        except JobCancelled:
+            print(f"Job #{job['id']} cancelled")
+            self.job_store.finish(job['id'], 'cancelled')
+        except Exception as e:
+            print(f"Job #{job['id']} failed: {e}")
+            self.job_store.finish(job['id'], 'failed', error=str(e))
+        finally:
+            with self._running_lock:
+                self._running.discard(job['id'])
+        self.completed += 1
+        finished = self.job_store.get(job['id'])
+        for callback in self.callbacks:
+            try:
+                callback(finished)
+            except Exception as e:
+                print(f"Error in job callback: {e}")
+        return finished
+
+    def _add_text(self, job: Dict, report) -> Dict:
+        params = job['params']
+        doc_ids = self.agent.add_to_knowledge_base(params['text'], source=params.get('source', 'manual'),
+                                                   metadata=params.get('metadata'), topic=params.get('topic'),
+                                                   progress=report)
+        return {'chunks': len(doc_ids)}
+
+    def _add_file(self, job: Dict, report) -> Dict:
+        params = job['params']
+        try:
+            doc_ids = self.agent.add_file_to_knowledge_base(params['path'], source=params.get('source', 'manual'),
+                                                            metadata=params.get('metadata'), progress=report)
+        finally:
+            # Uploads are copied to a private file for the job; it goes once the job ends.
+            # Only files in the upload directory are ever removed, whoever queued the job.
+            if params.get('delete_after') and is_upload_path(params['path']):
+                try:
+                    os.remove(params['path'])
+                except OSError:
+                    pass
+        return {'chunks': len(doc_ids)}
+
+    def _transcribe(self, job: Dict, report) -> Dict:
+        params = job['params']
+        return self.agent.add_audio_to_knowledge_base(params['path'], source=params.get('source', 'voice'),
+                                                      metadata=params.get('metadata'), progress=report)
+
+    def _export(self, job: Dict, report) -> Dict:
+        from database.snapshot import export_snapshot
+
+        params = job['params']
+        manifest = export_snapshot(self.agent.vector_store, self.agent.session_manager, params['path'],
+                                   dtype=params.get('dtype'), progress=report)
+        return {'path': params['path'],
+                'records': {name: info['records'] for name, info in manifest['collections'].items()}}
+
+    def _migrate(self, job: Dict, report) -> Dict:
+        store = self.agent.vector_store
+        migration = store.start_migration(job['params'].get('model'))
+        if migration is None:
+            return {'state': 'current', 'model': store.embedding_model}
+        try:
+            while not migration.wait(timeout=self.poll_seconds):
+                status = migration.status()
+                counts = status['collections'].values()
+                report(sum(c['done'] for c in counts), sum(c['total'] for c in counts) or None,
+                       f"{status['from']} -> {status['to']}")
+        except JobCancelled:
+            migration.cancel()
+            migration.wait()
+            raise
+        status = migration.status()
+        if status['state'] == 'cancelled':
+            raise JobCancelled(f"Job #{job['id']} cancelled")
+        if status['state'] == 'failed':
+            raise RuntimeError(status.get('error') or 'migration failed')
+        return {'state': status['state'], 'model': status['to']}
@@ -1,56 +1,394 @@
 # agent/personal_agent.py
 from typing import List, Dict, Optional
+import os
+import threading
 import uuid
 from datetime import datetime
-from ollama_runner import OllamaClient
+from ollama_runner import ModelNotFoundError, OllamaClient
+from helper.tracing import traced, tracer
 
 class PersonalAgent:
-    def __init__(self, vector_store, session_manager, llm_model: str = 'mistral'):
+    """
+    Knowledge base agent. One instance can serve many users at once: pass each
+    user's session handle (`session_id`) to `query`/`chat`/`get_stats`.
+    `current_session_id` is only a default for single-user entry points (CLI, Tk).
+    """
+    
+    def __init__(self, vector_store, session_manager, llm_model: str = 'mistral', event_store=None,
+                 job_store=None):
         self.vector_store = vector_store
         self.session_manager = session_manager
-        self.ollama_client = OllamaClient(base_url="http://localhost:11434")
+        # Optional EventStore: dated events found in added text become reminders
+        self.event_store = event_store
+        self.reminder_scheduler = None
+        self.recurrence_predictor = None
+        # Optional JobStore: ingestion, export and re-embedding queued for background workers
+        self.job_store = job_store
+        self.job_runner = None
+        from config import Config
+        # Results of recent queries, invalidated by any knowledge base write
+        self.query_cache = None
+        if Config.QUERY_CACHE_ENABLED:
+            from agent.query_cache import QueryCache
+            self.query_cache = QueryCache()
+        # Decides per chat message whether to reframe and search at all
+        self.retrieval_router = None
+        if Config.ROUTER_ENABLED:
+            from agent.retrieval_router import RetrievalRouter
+            self.retrieval_router = RetrievalRouter(embed=lambda texts: self.vector_store.get_embeddings(texts),
+                                                    version=lambda: getattr(self.vector_store, 'embedding_model', None))
+        # Cuts retrieved chunks down to their query-relevant sentences before prompting
+        self.context_compressor = None
+        if Config.COMPRESSION_ENABLED:
+            from processing.context_compressor import ContextCompressor
+            self.context_compressor = ContextCompressor(
+                embed=lambda texts: self.vector_store.get_embeddings(texts),
+                version=lambda: getattr(self.vector_store, 'embedding_model', None))
+        self.ollama_client = OllamaClient(base_url=Config.OLLAMA_BASE_URL)
         self.llm_model = llm_model
+        # Task models (Config.MODEL_PROFILES) found missing on the server; their tasks use llm_model
+        self._missing_models = set()
         self.current_session_id = None
+        
+        # Background rolling-summary refreshes, at most one per session at a time
+        self._summary_lock = threading.Lock()
+        self._summaries_in_progress = set()
+        
+        # Background conversation-memory indexing, at most one run at a time
+        self._memory_lock = threading.Lock()
+        self._memory_indexing = False
+    
+    def create_session(self, metadata: Dict = None) -> str:
+        """Create a new conversation session and return its handle without activating it"""
+        session_id = str(uuid.uuid4())
+        self.session_manager.create_session(session_id, metadata)
+        print(f"Started new session: {session_id}")
+        return session_id
     
     def start_session(self, metadata: Dict = None) -> str:
-        """Start a new conversation session"""
-        self.current_session_id = str(uuid.uuid4())
-        self.session_manager.create_session(self.current_session_id, metadata)
-        print(f"Started new session: {self.current_session_id}")
+        """Start a new conversation session and make it the default for this agent"""
+        self.current_session_id = self.create_session(metadata)
         return self.current_session_id
     
+    def _resolve_session(self, session_id: Optional[str]) -> Optional[str]:
+        """Use the explicit session handle, falling back to the agent's default session"""
+        return session_id if session_id is not None else self.current_session_id
+    
+    @traced('agent.add_to_knowledge_base')
     def add_to_knowledge_base(self, text: str, source: str = 'manual', 
-                              metadata: Dict = None):
-        """Add text to knowledge base"""
+                              metadata: Dict = None, topic: str = None, progress=None):
+        """
+        Add text to knowledge base (`topic` groups its events for recurrence detection).
+        `progress(done, total)` is called with chunk counts after every stored batch.
+        """
+        processor = self._text_processor()
+        stats = processor.measure(text)
+        
+        print(f"Split text into {stats['chunks']} chunks")
+        
+        inserted = []
+        doc_ids = self._ingest_chunks(processor.iter_chunks(text), stats, source, metadata, progress, inserted)
+        # Events point at a chunk of this text, never at an older duplicate it was linked to
+        self.extract_events(text, source=source, doc_id=inserted[0] if inserted else None, topic=topic)
+        return doc_ids
+    
+    @traced('agent.add_file_to_knowledge_base')
+    def add_file_to_knowledge_base(self, file, source: str = 'manual', metadata: Dict = None, progress=None):
+        """
+        Stream a text file (a path or a seekable text file object) into the knowledge base.
+        The file is read twice in fixed-size blocks, once to count chunks and once to
+        ingest them, so it is never held in memory as a whole. `progress` is called
+        as in `add_to_knowledge_base`.
+        """
+        if isinstance(file, (str, os.PathLike)):
+            with open(file, 'r', encoding='utf-8') as f:
+                return self.add_file_to_knowledge_base(f, source=source, metadata=metadata, progress=progress)
+        
+        processor = self._text_processor()
+        start = file.tell()
+        stats = processor.measure(file)
+        file.seek(start)
+        
+        print(f"Read {stats['characters']} characters, split into {stats['chunks']} chunks")
+        
+        inserted = []
+        doc_ids = self._ingest_chunks(processor.iter_chunks(file), stats, source, metadata, progress, inserted)
+        file.seek(start)
+        self.extract_events(file, source=source, doc_id=inserted[0] if inserted else None)
+        return doc_ids
+    
+    @traced('agent.add_audio_to_knowledge_base')
+    def add_audio_to_knowledge_base(self, path: str, source: str = 'voice', metadata: Dict = None,
+                                    progress=None, recognizer=None) -> Dict:
+        """
+        Transcribe a WAV recording, or every recording in the folder `path`, and add
+        each transcript to the knowledge base. Within a recording, speech segments are
+        recognized while the following audio is still being read. `progress(done, total)`
+        counts recordings. Returns counts of recordings, transcribed recordings and chunks.
+        """
+        from helper.voice_pipeline import VoicePipeline, duration_seconds, iter_audio_files
+        
+        files = iter_audio_files(path)
+        pipeline = VoicePipeline(recognizer)
+        counts = {'files': len(files), 'transcribed': 0, 'chunks': 0}
+        for done, file in enumerate(files, 1):
+            name = os.path.relpath(file, path) if os.path.isdir(path) else os.path.basename(file)
+            try:
+                text = pipeline.transcribe(file)
+            except Exception as e:
+                print(f"Error transcribing {name}: {e}")
+                text = ''
+            if text:
+                print(f"Transcribed {name}: {len(text.split())} words")
+                meta = dict(metadata or {}, input_type='voice', file=name,
+                            duration_seconds=round(duration_seconds(file), 1))
+                counts['chunks'] += len(self.add_to_knowledge_base(text, source=source, metadata=meta) or [])
+                counts['transcribed'] += 1
+            else:
+                print(f"No speech recognized in {name}")
+            if progress is not None:
+                progress(done, len(files))
+        return counts
+    
+    @traced('agent.extract_events')
+    def extract_events(self, text, source: str = 'manual', doc_id: str = None,
+                       topic: str = None) -> List[Dict]:
+        """
+        Find dated events in text (a string or a text file object) and store them as
+        reminders. Rules run first; the LLM is asked only about event-like sentences
+        the rules could not date. Past events are kept too: every stored event feeds
+        the recurrence patterns of its topic (`topic`, or else keywords of its title).
+        Returns the newly stored events.
+        """
+        from config import Config
+        from processing.event_extractor import EventExtractor
+        from agent.event_predictor import topic_key
+        
+        if self.event_store is None or not Config.REMINDERS_ENABLED:
+            return []
+        
+        llm = None
+        if Config.EVENT_LLM_FALLBACK:
+            llm = lambda prompt: self._generate(prompt, task='events')
+        
+        try:
+            now = datetime.now()
+            events = EventExtractor(llm=llm).extract(text, now=now, include_past=True)
+            for event in events:
+                event['topic'] = topic_key(topic) if topic else topic_key(event['title'])
+                if event['due_at'] < now:
+                    event['status'] = 'past'
+            stored = self.event_store.add_events(events, source=source, doc_id=doc_id)
+        except Exception as e:
+            print(f"Error extracting events: {e}")
+            return []
+        
+        pending = [event for event in stored if event['status'] == 'pending']
+        if pending:
+            print(f"Scheduled {len(pending)} reminders")
+        self._schedule(pending)
+        self._observe_recurrences(stored)
+        return stored
+    
+    def _schedule(self, events: List[Dict]):
+        if self.reminder_scheduler is not None:
+            for event in events:
+                self.reminder_scheduler.schedule(event['id'], event['remind_at'])
+    
+    def _predictor(self):
+        from agent.event_predictor import RecurrencePredictor
+        
+        if self.recurrence_predictor is None:
+            self.recurrence_predictor = RecurrencePredictor(self.event_store)
+        return self.recurrence_predictor
+    
+    def _observe_recurrences(self, events: List[Dict]):
+        """Update the recurrence pattern of each new event's topic (constant work per event)"""
+        from config import Config
+        
+        predictor = self._predictor()
+        for event in events:
+            try:
+                prediction = predictor.observe(event.get('topic'), event['due_at'], title=event['title'])
+            except Exception as e:
+                print(f"Error updating recurrence pattern: {e}")
+                continue
+            if prediction:
+                print(f"Recurring pattern '{prediction['topic']}': {prediction['period']}, "
+                      f"next {prediction['next_due']} (confidence {prediction['confidence']:.2f})")
+                auto_accept = Config.PATTERN_AUTO_ACCEPT_CONFIDENCE
+                if auto_accept is not None and prediction['confidence'] >= auto_accept:
+                    self.accept_prediction(prediction['topic'])
+    
+    def predict_reminders(self, limit: int = 20, min_confidence: float = None) -> List[Dict]:
+        """Predicted next occurrences of recurring events, soonest first"""
+        if self.event_store is None:
+            return []
+        return self._predictor().predictions(limit=limit, min_confidence=min_confidence)
+    
+    def accept_prediction(self, topic: str) -> Optional[Dict]:
+        """
+        Turn the prediction for `topic` into a pending reminder. Returns the stored
+        event, or None if there is no prediction or it was already accepted.
+        """
+        if self.event_store is None:
+            return None
+        predictor = self._predictor()
+        prediction = predictor.prediction(topic)
+        if prediction is None:
+            return None
+        stored = self.event_store.add_events([predictor.reminder_for(prediction)], source='prediction')
+        self._schedule(stored)
+        return stored[0] if stored else None
+    
+    def start_reminders(self, on_fire=None):
+        """Start firing reminders in this process (for long-running entry points)"""
+        from agent.reminder_scheduler import ReminderScheduler
+        
+        if self.event_store is None:
+            raise ValueError("Reminders need an event store")
+        if self.reminder_scheduler is None:
+            self.reminder_scheduler = ReminderScheduler(self.event_store, on_fire=on_fire).start()
+        return self.reminder_scheduler
+    
+    def stop_reminders(self):
+        if self.reminder_scheduler is not None:
+            self.reminder_scheduler.stop()
+            self.reminder_scheduler = None
+    
+    def start_jobs(self, workers: int = None, on_finish=None):
+        """Run queued background jobs on worker threads in this process"""
+        from agent.job_runner import JobRunner
+        
+        if self.job_store is None:
+            raise ValueError("Background jobs need a job store")
+        if self.job_runner is None:
+            self.job_runner = JobRunner(self, self.job_store, workers=workers, on_finish=on_finish).start()
+        return self.job_runner
+    
+    def stop_jobs(self):
+        if self.job_runner is not None:
+            self.job_runner.stop()
+            self.job_runner = None
+    
+    def submit_job(self, kind: str, params: Dict = None) -> int:
+        """
+        Queue a background job ('add_text', 'add_file', 'transcribe', 'export' or 'migrate') and
+        return its ID at once. Without workers in this process the job waits for
+        another process (daemon, API server, UI) to run it.
+        """
+        if self.job_store is None:
+            raise ValueError("Background jobs need a job store")
+        if self.job_runner is not None:
+            return self.job_runner.submit(kind, params)
+        return self.job_store.submit(kind, params)
+    
+    def submit_file_job(self, file, source: str = 'manual', metadata: Dict = None) -> int:
+        """
+        Queue ingestion of a file. A path is read by the job; a file object (e.g. an
+        upload) is first copied to Config.JOB_UPLOAD_DIR, so the job outlives the request.
+        """
+        import shutil
+        from config import Config
+        
+        if isinstance(file, (str, os.PathLike)):
+            return self.submit_job('add_file', {'path': os.path.abspath(file), 'source': source,
+                                                'metadata': metadata})
+        os.makedirs(Config.JOB_UPLOAD_DIR, exist_ok=True)
+        path = os.path.join(Config.JOB_UPLOAD_DIR, f"{uuid.uuid4().hex}.txt")
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(getattr(file, 'buffer', file), f)
+        return self.submit_job('add_file', {'path': path, 'source': source, 'metadata': metadata,
+                                            'delete_after': True})
+    
+    def job_status(self, job_id: int) -> Optional[Dict]:
+        return self.job_store.get(job_id) if self.job_store is not None else None
+    
+    def list_jobs(self, status: str = None, limit: int = 20) -> List[Dict]:
+        """Jobs with the given status (None for all, 'active' for queued and running), newest first"""
+        return self.job_store.list_jobs(status, limit=limit) if self.job_store is not None else []
+    
+    def cancel_job(self, job_id: int) -> bool:
+        return self.job_store.cancel(job_id) if self.job_store is not None else False
+    
+    def list_reminders(self, status: str = 'pending', limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Reminders with the given status (None for all), soonest first"""
+        if self.event_store is None:
+            return []
+        return self.event_store.list_events(status, limit=limit, offset=offset)
+    
+    def snooze_reminder(self, event_id: int, minutes: float = None) -> Optional[str]:
+        """Fire the reminder again `minutes` from now; returns the new time, or None if unknown, cancelled or past"""
+        from datetime import timedelta
+        from config import Config
+        
+        if self.event_store is None:
+            return None
+        if self.reminder_scheduler is not None:
+            return self.reminder_scheduler.snooze(event_id, minutes)
+        
+        minutes = Config.REMINDER_SNOOZE_MINUTES if minutes is None else minutes
+        remind_at = (datetime.now() + timedelta(minutes=minutes)).isoformat(timespec='seconds')
+        return remind_at if self.event_store.snooze(event_id, remind_at) else None
+    
+    def cancel_reminder(self, event_id: int) -> bool:
+        if self.event_store is None:
+            return False
+        if self.reminder_scheduler is not None:
+            return self.reminder_scheduler.cancel(event_id)
+        return self.event_store.cancel(event_id)
+    
+    @staticmethod
+    def _text_processor():
         from processing.text_processor import TextProcessor
         from config import Config
         
-        processor = TextProcessor(
+        return TextProcessor(
             chunk_size=Config.CHUNK_SIZE,
             chunk_overlap=Config.CHUNK_OVERLAP
         )
-        chunks = processor.chunk_text(text)
+    
+    def _ingest_chunks(self, chunks, stats: Dict, source: str, metadata: Dict = None,
+                       progress=None, inserted: List[str] = None) -> List[str]:
+        """Embed and store chunks in batches of Config.INGEST_BATCH_SIZE (new chunk IDs go to `inserted`)"""
+        from config import Config
         
-        print(f"Split text into {len(chunks)} chunks")
+        doc_ids = []
+        batch = []
+        processed = 0  # chunks handled so far (duplicates may store fewer)
         
-        # Prepare metadata
-        chunk_metadata = []
-        for i, chunk in enumerate(chunks):
-            meta = metadata.copy() if metadata else {}
-            meta.update({
-                'source': source,
-                'chunk_index': i,
-                'total_chunks': len(chunks),
-                'original_text_length': len(text)
-            })
-            chunk_metadata.append(meta)
+        def flush():
+            nonlocal processed
+            # Prepare metadata
+            chunk_metadata = []
+            for i in range(len(batch)):
+                meta = metadata.copy() if metadata else {}
+                meta.update({
+                    'source': source,
+                    'chunk_index': len(doc_ids) + i,
+                    'total_chunks': stats['chunks'],
+                    'original_text_length': stats['characters']
+                })
+                chunk_metadata.append(meta)
+            
+            # Add to vector store
+            doc_ids.extend(self.vector_store.add_documents(batch, chunk_metadata, inserted=inserted) or [])
+            processed += len(batch)
+            batch.clear()
+            if progress is not None:
+                progress(processed, stats['chunks'])
         
-        # Add to vector store
-        doc_ids = self.vector_store.add_documents(chunks, chunk_metadata)
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= Config.INGEST_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
         
         return doc_ids
     
-    def reframe_query(self, user_query: str, temperature: float = 0.3) -> str:
+    @traced('agent.reframe_query')
+    def reframe_query(self, user_query: str, temperature: float = None) -> str:
         """
         Reframe the user query using LLM to add temporal context and improve RAG search.
         Adds relevant dates and formats the query for better semantic search.
@@ -81,32 +419,110 @@ Provide ONLY the reframed query without any explanation or additional text."""
         
         try:
             print(f"Reframing query: {user_query}")
-            reframed = self._call_ollama_llm(reframe_prompt, temperature=temperature)
+            reframed = self._generate(reframe_prompt, task='reframe', temperature=temperature).strip()
             print(f"Reframed query: {reframed}")
             return reframed
         except Exception as e:
             print(f"Error reframing query: {e}. Using original query.")
             return user_query
     
-    def query(self, question: str, n_results: int = None) -> Dict:
-        """Query the knowledge base with query reframing for better RAG search"""
+    def unknown_shards(self, shards: List[str]) -> List[str]:
+        """Values of `shards` (for `query`) the knowledge base has no shard for"""
+        return self.vector_store.unknown_shards(shards)
+    
+    @traced('agent.query')
+    def query(self, question: str, n_results: int = None, include_memory: bool = False,
+              session_id: str = None, reframe: bool = True, query_embedding: List[float] = None,
+              mmr: bool = None, mmr_lambda: float = None, fetch_multiplier: int = None,
+              shards: List[str] = None) -> Dict:
+        """
+        Query the knowledge base with query reframing for better RAG search.
+        With include_memory, past conversations from other sessions are retrieved
+        using the same query embedding. Repeated and near-identical questions are
+        answered from the query cache until the knowledge base changes; memory,
+        which grows with every chat turn, is searched again on a hit.
+        `query_embedding` (of `question` itself) saves an embedding call.
+        `mmr` (default Config.MMR_ENABLED) trades some relevance for chunks that do
+        not repeat each other; see VectorStore.search. `shards` limits a sharded
+        knowledge base to those values of Config.SHARD_BY.
+        """
         from config import Config
+        session_id = self._resolve_session(session_id)
         if n_results is None:
             n_results = Config.MAX_CONTEXT_CHUNKS
+        diversity = None
+        if Config.MMR_ENABLED if mmr is None else mmr:
+            diversity = (Config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda,
+                         fetch_multiplier or Config.MMR_FETCH_MULTIPLIER)
         
-        # Reframe the query using LLM to add temporal context and improve search
-        reframed_question = self.reframe_query(question)
-        
-        # Search vector store with reframed query
-        results = self.vector_store.search(reframed_question, n_results=n_results)
+        result, question_embedding = None, None
+        if self.query_cache is not None:
+            # Only the knowledge base part is cached: every chat turn writes to memory
+            scope = (n_results, reframe, diversity, tuple(shards) if shards is not None else None)
+            generation = self.vector_store.generation
+            embed = self.vector_store.embed_query
+            if query_embedding is not None:
+                embed = lambda _: query_embedding
+            with tracer.span('agent.query_cache'):
+                result, question_embedding = self.query_cache.get(question, scope, generation, embed=embed)
+        if result is None:
+            result = self._search(question, n_results, include_memory, session_id, reframe,
+                                  query_embedding if query_embedding is not None else question_embedding,
+                                  diversity, shards)
+            if self.query_cache is not None:
+                self.query_cache.put(question, scope, generation, dict(result, memory=[]),
+                                     embedding=question_embedding)
+        elif include_memory:
+            # The probe embedding only fits when the cached reframing kept this question's text
+            reframed = result['reframed_question']
+            result['memory'] = self._search_memory(reframed, session_id,
+                                                   question_embedding if reframed == question else None)
+        result['question'] = question
         
         # Save user question to session (save original question)
-        if self.current_session_id:
+        if session_id:
             self.session_manager.add_message(
-                self.current_session_id, 
+                session_id, 
                 'user', 
                 question
             )
+        return result
+    
+    def _search(self, question: str, n_results: int, include_memory: bool, session_id: Optional[str],
+                reframe: bool = True, question_embedding: List[float] = None, diversity: tuple = None,
+                shards: List[str] = None) -> Dict:
+        """
+        Reframe the question and search the knowledge base (and conversation memory).
+        `diversity` is (mmr_lambda, fetch_multiplier) to diversify the chunks, or None.
+        """
+        from config import Config
+        
+        mmr_options = {}
+        if diversity is not None:
+            mmr_options = {'mmr': True, 'mmr_lambda': diversity[0], 'fetch_multiplier': diversity[1]}
+        # Reframe the query using LLM to add temporal context and improve search
+        if reframe:
+            reframed_question = self.reframe_query(question)
+            if reframed_question != question:
+                question_embedding = None  # the reframed text needs its own embedding
+        else:
+            reframed_question = question
+        
+        # Search vector store with reframed query
+        memory_results = None
+        if include_memory:
+            results, memory_results = self.vector_store.search_with_memory(
+                reframed_question,
+                n_results=n_results,
+                n_memory=Config.MEMORY_RESULTS,
+                memory_filter=self._memory_filter(session_id),
+                query_embedding=question_embedding,
+                shards=shards,
+                **mmr_options
+            )
+        else:
+            results = self.vector_store.search(reframed_question, n_results=n_results,
+                                               query_embedding=question_embedding, shards=shards, **mmr_options)
         
         # Extract relevant context
         context_chunks = results['documents'][0] if results['documents'] else []
@@ -118,42 +534,287 @@ Provide ONLY the reframed query without any explanation or additional text."""
             'reframed_question': reframed_question,
             'context': context_chunks,
             'metadata': metadatas,
-            'distances': distances
+            'distances': distances,
+            'memory': self._memory_entries(memory_results)
         }
     
-    def chat(self, message: str, use_context: bool = True, temperature: float = 0.7) -> str:
-        """Chat with the agent using knowledge base context"""
+    def _search_memory(self, question: str, session_id: Optional[str],
+                       question_embedding: List[float] = None) -> List[Dict]:
+        """Past conversation messages related to the (reframed) question"""
+        from config import Config
+        memory_results = self.vector_store.search_memory(question, n_memory=Config.MEMORY_RESULTS,
+                                                         memory_filter=self._memory_filter(session_id),
+                                                         query_embedding=question_embedding)
+        return self._memory_entries(memory_results)
+    
+    @staticmethod
+    def _memory_filter(session_id: Optional[str]) -> Optional[Dict]:
+        # The current session already reaches the prompt through its history
+        return {'session_id': {'$ne': session_id}} if session_id else None
+    
+    @staticmethod
+    def _memory_entries(memory_results: Optional[Dict]) -> List[Dict]:
+        """Extract relevant past conversation messages"""
+        memory = []
+        if memory_results and memory_results.get('documents'):
+            memory_docs = memory_results['documents'][0]
+            memory_metas = memory_results['metadatas'][0] if memory_results.get('metadatas') else []
+            memory_dists = memory_results['distances'][0] if memory_results.get('distances') else []
+            for doc, meta, dist in zip(memory_docs, memory_metas, memory_dists):
+                memory.append({
+                    'content': doc,
+                    'role': meta.get('role', 'user'),
+                    'session_id': meta.get('session_id'),
+                    'timestamp': meta.get('timestamp', ''),
+                    'distance': dist
+                })
+        return memory
+    
+    @traced('agent.chat')
+    def chat(self, message: str, use_context: bool = True, temperature: float = 0.7,
+             session_id: str = None, on_token=None, cancel=None) -> str:
+        """
+        Chat with the agent using knowledge base context. With `on_token`, the answer
+        is streamed to it piece by piece; setting the `cancel` event (a
+        threading.Event) stops generation and keeps the partial answer.
+        """
         from config import Config
+        session_id = self._resolve_session(session_id)
+        
+        # Chit-chat and follow-ups answered by the history skip reframing and search
+        route = None
+        if use_context and self.retrieval_router is not None:
+            with tracer.span('agent.route'):
+                has_history = bool(session_id) and self.session_manager.count_messages_since(session_id)['messages'] > 0
+                route = self.retrieval_router.route(message, has_history=has_history)
+        
         # Get relevant context from knowledge base
-        query_result = self.query(message, n_results=Config.MAX_CONTEXT_CHUNKS) if use_context else {'context': []}
+        if use_context and (route is None or route['retrieve']):
+            query_result = self.query(
+                message,
+                n_results=Config.MAX_CONTEXT_CHUNKS,
+                include_memory=Config.MEMORY_ENABLED,
+                session_id=session_id,
+                reframe=route is None or route['reframe'],
+                query_embedding=route['embedding'] if route else None
+            )
+        else:
+            query_result = {'context': [], 'memory': []}
+            if session_id:
+                self.session_manager.add_message(session_id, 'user', message)
         
-        # Get session history for context
+        # Get session history for context: rolling summary plus every turn it does not cover yet
         history = []
-        if self.current_session_id:
-            history = self.session_manager.get_session_history(
-                self.current_session_id, 
-                limit=10  # Last 5 exchanges
-            )
+        summary = ''
+        if session_id:
+            with tracer.span('agent.load_history'):
+                state = self.session_manager.get_session_summary(session_id)
+                summary = state['summary']
+                history = self._recent_history(
+                    self.session_manager.get_messages_since(session_id, state['summary_message_id'])
+                )
+        
+        # Keep only the sentences of the retrieved chunks that bear on the question
+        context = self._compress_context(query_result.get('reframed_question') or message,
+                                         query_result['context'])
         
         # Build the complete prompt
-        prompt = self._build_prompt(message, query_result['context'], history)
+        with tracer.span('agent.build_prompt'):
+            prompt = self._build_prompt(
+                message, context, history, summary, query_result['memory']
+            )
         
         # Call Ollama LLM using generate
         print("Generating response...")
-        response = self._call_ollama_llm(prompt, temperature)
+        with tracer.span('agent.generate'):
+            if on_token is not None:
+                response = self._stream_ollama_llm(prompt, temperature, on_token, cancel)
+            else:
+                response = self._call_ollama_llm(prompt, temperature)
         
         # Save assistant response to session
-        if self.current_session_id:
+        if session_id:
             self.session_manager.add_message(
-                self.current_session_id,
+                session_id,
                 'assistant',
                 response
             )
+            self._maybe_summarize_session(session_id)
+            if Config.MEMORY_ENABLED:
+                self._schedule_memory_indexing()
         
         return response
     
+    @traced('agent.index_conversation_memory')
+    def index_conversation_memory(self) -> int:
+        """
+        Embed conversation messages that are not yet in the memory collection.
+        Only new messages are embedded, so each call costs O(new messages).
+        Returns the number of messages embedded.
+        """
+        from config import Config
+        
+        indexed = 0
+        while True:
+            messages = self.session_manager.get_unindexed_messages(
+                limit=Config.MEMORY_INDEX_BATCH_SIZE
+            )
+            if not messages:
+                break
+            
+            # Very short messages carry no recallable content; mark them as seen anyway
+            to_embed = [m for m in messages if len(m['content'].strip()) >= Config.MEMORY_MIN_CHARS]
+            self.vector_store.add_memories(
+                [f"msg-{m['id']}" for m in to_embed],
+                [m['content'] for m in to_embed],
+                [{
+                    'session_id': m['session_id'],
+                    'role': m['role'],
+                    'message_id': m['id'],
+                    'timestamp': m['timestamp']
+                } for m in to_embed]
+            )
+            self.session_manager.mark_messages_indexed([m['id'] for m in messages])
+            indexed += len(to_embed)
+        
+        return indexed
+    
+    def _schedule_memory_indexing(self):
+        """Index new conversation messages in the background"""
+        with self._memory_lock:
+            if self._memory_indexing:
+                return
+            self._memory_indexing = True
+        
+        worker = threading.Thread(target=self._index_memory_worker, daemon=True)
+        worker.start()
+    
+    def _index_memory_worker(self):
+        try:
+            self.index_conversation_memory()
+        except Exception as e:
+            print(f"Error indexing conversation memory: {e}")
+        finally:
+            with self._memory_lock:
+                self._memory_indexing = False
+    
+    @traced('agent.summarize_conversation')
+    def summarize_conversation(self, messages: List[Dict], previous_summary: str = "",
+                               temperature: float = 0.2) -> str:
+        """
+        Use LLM to fold older conversation turns into a rolling session summary.
+        Raises on LLM errors so a failed call never overwrites a good summary.
+        """
+        from config import Config
+        
+        transcript = "\n".join(
+            f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
+            for msg in messages
+        )
+        summary_prompt = f"""You are a conversation summarization assistant. Update the running summary of a conversation with the new turns below.
+
+Current Summary:
+"{previous_summary or 'No summary yet.'}"
+
+New Conversation Turns:
+{transcript}
+
+Instructions:
+1. Keep facts, decisions, names, dates and open questions the user may refer back to
+2. Drop greetings, filler and repeated information
+3. Write in third person ("The user ...", "The assistant ...")
+4. Use at most {Config.SUMMARY_MAX_WORDS} words
+
+Provide ONLY the updated summary without any explanation or additional text."""
+        
+        response = self._generate(summary_prompt, task='summary', temperature=temperature)
+        return response.strip()
+    
+    @staticmethod
+    def _recent_history(messages: List[Dict]) -> List[Dict]:
+        """The newest messages within Config.HISTORY_TOKEN_BUDGET (at least the last one), oldest first"""
+        from config import Config
+        from processing.text_processor import TextProcessor
+        
+        kept, tokens = [], 0
+        for message in reversed(messages):
+            tokens += TextProcessor.estimate_tokens(message['content'])
+            if kept and tokens > Config.HISTORY_TOKEN_BUDGET:
+                break
+            kept.append(message)
+        return list(reversed(kept))
+    
+    def _maybe_summarize_session(self, session_id: str):
+        """Refresh the session summary in the background once enough history piles up"""
+        from config import Config
+        from processing.text_processor import TextProcessor
+        
+        state = self.session_manager.get_session_summary(session_id)
+        pending = self.session_manager.get_messages_since(
+            session_id, state['summary_message_id']
+        )
+        
+        # Only messages that fell out of the verbatim window need summarizing
+        older_messages = len(pending) - Config.SUMMARY_KEEP_RECENT
+        if older_messages <= 0:
+            return
+        tokens = sum(TextProcessor.estimate_tokens(message['content']) for message in pending)
+        if (older_messages < Config.SUMMARY_TRIGGER_MESSAGES and
+                tokens < Config.SUMMARY_TRIGGER_TOKENS):
+            return
+        
+        with self._summary_lock:
+            if session_id in self._summaries_in_progress:
+                return
+            self._summaries_in_progress.add(session_id)
+        
+        worker = threading.Thread(
+            target=self._summarize_session,
+            args=(session_id,),
+            daemon=True
+        )
+        worker.start()
+    
+    def _summarize_session(self, session_id: str):
+        """Fold messages older than the verbatim window into the rolling summary"""
+        from config import Config
+        
+        try:
+            state = self.session_manager.get_session_summary(session_id)
+            messages = self.session_manager.get_messages_since(
+                session_id, state['summary_message_id']
+            )
+            to_summarize = messages[:max(len(messages) - Config.SUMMARY_KEEP_RECENT, 0)]
+            if not to_summarize:
+                return
+            
+            summary = self.summarize_conversation(to_summarize, state['summary'])
+            if summary:
+                self.session_manager.update_session_summary(
+                    session_id, summary, to_summarize[-1]['id']
+                )
+                print(f"Updated summary for session {session_id} "
+                      f"({len(to_summarize)} messages folded in)")
+        except Exception as e:
+            print(f"Error summarizing session {session_id}: {e}")
+        finally:
+            with self._summary_lock:
+                self._summaries_in_progress.discard(session_id)
+    
+    @traced('agent.compress_context')
+    def _compress_context(self, question: str, chunks: List[str]) -> List[str]:
+        """Retrieved chunks cut to their most relevant sentences (unchanged if compression is off or fails)"""
+        if self.context_compressor is None or not chunks:
+            return chunks
+        try:
+            return self.context_compressor.compress(question, chunks)
+        except Exception as e:
+            print(f"Error compressing context: {e}. Using whole chunks.")
+            return chunks
+    
     def _build_prompt(self, user_message: str, context_chunks: List[str], 
-                      history: List[Dict]) -> str:
+                      history: List[Dict], summary: str = "",
+                      memory: List[Dict] = None) -> str:
         """Build a comprehensive prompt with context and history"""
         prompt_parts = []
         
@@ -179,17 +840,33 @@ Provide ONLY the reframed query without any explanation or additional text."""
             "- Use the current date and time to understand time-sensitive queries and provide accurate temporal context.\n"
         )
         
+        from config import Config
+        
+        # Add rolling summary of older conversation turns
+        if summary:
+            prompt_parts.append("\n--- Summary of Earlier Conversation ---")
+            prompt_parts.append(summary)
+            prompt_parts.append("--- End of Summary ---\n")
+        
+        # Add relevant messages from past sessions
+        if memory:
+            prompt_parts.append("\n--- Relevant Past Conversations ---")
+            for msg in memory:
+                role = "User" if msg['role'] == 'user' else "Assistant"
+                date = msg['timestamp'][:10] if msg.get('timestamp') else 'unknown date'
+                prompt_parts.append(f"[{date}] {role}: {msg['content']}")
+            prompt_parts.append("--- End of Past Conversations ---\n")
+        
         # Add conversation history if available
         if history:
             prompt_parts.append("\n--- Conversation History ---")
-            for msg in history[-6:]:  # Last 3 exchanges
+            for msg in history:  # Turns not covered by the summary, verbatim
                 role = "User" if msg['role'] == 'user' else "Assistant"
                 prompt_parts.append(f"{role}: {msg['content']}")
             prompt_parts.append("--- End of History ---\n")
         
         # Add context from knowledge base
         if context_chunks:
-            from config import Config
             prompt_parts.append("\n--- Relevant Information from Knowledge Base ---")
             # Use all context chunks (already limited by MAX_CONTEXT_CHUNKS in query)
             for i, chunk in enumerate(context_chunks[:Config.MAX_CONTEXT_CHUNKS], 1):
@@ -202,14 +879,92 @@ Provide ONLY the reframed query without any explanation or additional text."""
         
         return "\n".join(prompt_parts)
     
-    def _call_ollama_llm(self, prompt: str, temperature: float = 0.7) -> str:
-        """Call Ollama LLM using generate method"""
+    def model_profile(self, task: str) -> Dict:
+        """Generation settings for a task: its Config.MODEL_PROFILES entry over the 'chat' defaults"""
+        from config import Config
+        
+        profile = dict(Config.MODEL_PROFILES.get('chat', {}))
+        profile.update({k: v for k, v in Config.MODEL_PROFILES.get(task, {}).items() if v is not None})
+        if not profile.get('model') or profile['model'] in self._missing_models:
+            profile['model'] = self.llm_model
+        return profile
+    
+    def _generate(self, prompt: str, task: str = 'chat', temperature: float = None) -> str:
+        """
+        Generate with the model, token budget and timeout of `task`. An explicit
+        temperature overrides the profile's. Raises on errors; a task model that is
+        not installed is replaced by the agent's model for the rest of the process.
+        """
+        from config import Config
+        
+        profile = self.model_profile(task)
+        if temperature is None:
+            temperature = profile['temperature'] if profile.get('temperature') is not None else Config.TEMPERATURE
+        options = {'num_predict': profile.get('num_predict'), 'num_ctx': profile.get('num_ctx')}
+        timeout = profile.get('timeout') or 120
         try:
-            response = self.ollama_client.generate(
-                model=self.llm_model,
-                prompt=prompt,
-                temperature=temperature
-            )
+            return self.ollama_client.generate(model=profile['model'], prompt=prompt, temperature=temperature,
+                                               options=options, timeout=timeout)
+        except ModelNotFoundError as e:
+            if profile['model'] == self.llm_model:
+                raise
+            print(f"Model {profile['model']} for {task} is not available ({e}); using {self.llm_model}")
+            self._missing_models.add(profile['model'])
+            return self.ollama_client.generate(model=self.llm_model, prompt=prompt, temperature=temperature,
+                                               options=options, timeout=timeout)
+    
+    def _generate_stream(self, prompt: str, task: str = 'chat', temperature: float = None):
+        """`_generate`, yielding the response in pieces as they are produced"""
+        from config import Config
+        
+        profile = self.model_profile(task)
+        if temperature is None:
+            temperature = profile['temperature'] if profile.get('temperature') is not None else Config.TEMPERATURE
+        options = {'num_predict': profile.get('num_predict'), 'num_ctx': profile.get('num_ctx')}
+        timeout = profile.get('timeout') or 120
+        model = profile['model']
+        started = False
+        try:
+            for piece in self.ollama_client.generate_stream(model=model, prompt=prompt, temperature=temperature,
+                                                            options=options, timeout=timeout):
+                started = True
+                yield piece
+        except ModelNotFoundError as e:
+            # A missing task model fails before any output; fall back as `_generate` does
+            if started or model == self.llm_model:
+                raise
+            print(f"Model {model} for {task} is not available ({e}); using {self.llm_model}")
+            self._missing_models.add(model)
+            yield from self.ollama_client.generate_stream(model=self.llm_model, prompt=prompt,
+                                                          temperature=temperature, options=options, timeout=timeout)
+    
+    def _stream_ollama_llm(self, prompt: str, temperature: float, on_token, cancel=None) -> str:
+        """
+        Generate for chat, passing each piece to `on_token` as it arrives. Stops early
+        once the `cancel` event is set; returns the text generated until then
+        (errors become the response text, as in `_call_ollama_llm`).
+        """
+        pieces = []
+        stream = self._generate_stream(prompt, task='chat', temperature=temperature)
+        try:
+            for piece in stream:
+                if cancel is not None and cancel.is_set():
+                    break
+                pieces.append(piece)
+                on_token(piece)
+        except Exception as e:
+            print(f"Error calling Ollama: {e}")
+            message = f"I encountered an error generating a response: {str(e)}"
+            on_token(("\n" if pieces else "") + message)
+            pieces.append(("\n" if pieces else "") + message)
+        finally:
+            stream.close()
+        return ''.join(pieces).strip()
+    
+    def _call_ollama_llm(self, prompt: str, temperature: float = None, task: str = 'chat') -> str:
+        """Call Ollama LLM using generate method (errors become the response text)"""
+        try:
+            response = self._generate(prompt, task=task, temperature=temperature)
             return response.strip()
         except Exception as e:
             print(f"Error calling Ollama: {e}")
@@ -218,28 +973,40 @@ Provide ONLY the reframed query without any explanation or additional text."""
     def simple_completion(self, prompt: str, temperature: float = 0.7) -> str:
         """Simple completion without context or history"""
         try:
-            response = self.ollama_client.generate(
-                model=self.llm_model,
-                prompt=prompt,
-                temperature=temperature
-            )
+            response = self._generate(prompt, task='chat', temperature=temperature)
             return response.strip()
         except Exception as e:
             print(f"Error: {e}")
             return f"Error: {str(e)}"
     
-    def get_stats(self):
+    def get_stats(self, session_id: str = None):
         """Get knowledge base statistics"""
+        session_id = self._resolve_session(session_id)
         stats = self.vector_store.get_collection_stats()
         
         # Add session info if available
-        if self.current_session_id:
-            history = self.session_manager.get_session_history(self.current_session_id)
+        if session_id:
+            counts = self.session_manager.count_messages_since(session_id)
             stats['current_session'] = {
-                'session_id': self.current_session_id,
-                'message_count': len(history)
+                'session_id': session_id,
+                'message_count': counts['messages']
             }
         
+        if self.event_store is not None:
+            stats['reminders'] = self.event_store.count_events()
+        
+        if self.query_cache is not None:
+            stats['query_cache'] = self.query_cache.stats()
+        if self.retrieval_router is not None:
+            stats['router'] = self.retrieval_router.stats()
+        if self.context_compressor is not None:
+            stats['context_compression'] = self.context_compressor.stats()
+        
+        # Per-stage latency and Ollama server metrics collected so far
+        latency = tracer.snapshot()
+        if latency['spans']:
+            stats['latency'] = latency
+        
         return stats
     
     def reset_all(self):
@@ -249,8 +1016,10 @@ Provide ONLY the reframed query without any explanation or additional text."""
         # Reset vector store
         vector_docs_deleted = self.vector_store.reset_collection()
         
-        # Reset session database
+        # Reset conversation memory and session database
+        memory_deleted = self.vector_store.reset_memory()
         session_data = self.session_manager.reset_database()
+        events_deleted = self.event_store.reset_database() if self.event_store is not None else 0
         
         # Reset current session
         self.current_session_id = None
@@ -259,10 +1028,13 @@ Provide ONLY the reframed query without any explanation or additional text."""
             'vector_documents_deleted': vector_docs_deleted,
             'sessions_deleted': session_data['sessions'],
             'messages_deleted': session_data['messages'],
+            'memory_messages_deleted': memory_deleted,
+            'events_deleted': events_deleted,
             'status': 'success'
         }
     
-    def detect_update_intent(self, user_input: str, temperature: float = 0.2) -> Dict:
+    @traced('agent.detect_update_intent')
+    def detect_update_intent(self, user_input: str, temperature: float = None) -> Dict:
         """
         Use LLM to detect if user input is meant to update existing knowledge.
         Returns: {'is_update': bool, 'topic': str, 'reason': str}
@@ -286,7 +1058,7 @@ Respond in JSON format:
 If it seems like new information, set is_update to false."""
 
         try:
-            response = self._call_ollama_llm(intent_prompt, temperature=temperature)
+            response = self._call_ollama_llm(intent_prompt, temperature=temperature, task='intent')
             import json
             # Extract JSON from response
             json_start = response.find('{')
@@ -309,7 +1081,8 @@ If it seems like new information, set is_update to false."""
         results = self.vector_store.search(query, n_results=n_results)
         return results
     
-    def merge_knowledge(self, original_text: str, update_text: str, topic: str = "", temperature: float = 0.3) -> str:
+    @traced('agent.merge_knowledge')
+    def merge_knowledge(self, original_text: str, update_text: str, topic: str = "", temperature: float = None) -> str:
         """
         Use LLM to intelligently merge old knowledge with new update.
         Returns the merged/updated knowledge.
@@ -334,12 +1107,13 @@ Task:
 Provide ONLY the merged knowledge without any explanation or metadata."""
 
         try:
-            merged = self._call_ollama_llm(merge_prompt, temperature=temperature)
+            merged = self._generate(merge_prompt, task='merge', temperature=temperature).strip()
             return merged
         except Exception as e:
             print(f"Error merging knowledge: {e}")
             return original_text
     
+    @traced('agent.add_or_update_knowledge_base')
     def add_or_update_knowledge_base(self, text: str, source: str = 'manual', 
                                      metadata: Dict = None) -> Dict:
         """
@@ -368,7 +1142,8 @@ Provide ONLY the merged knowledge without any explanation or metadata."""
         # Step 2: If not detected as update, just add it
         if not intent.get('is_update', False):
             print("Adding as new knowledge...")
-            doc_ids = self.add_to_knowledge_base(text, source=source, metadata=metadata)
+            doc_ids = self.add_to_knowledge_base(text, source=source, metadata=metadata,
+                                                 topic=intent.get('topic'))
             return {
                 'action': 'added',
                 'doc_ids': doc_ids,
@@ -436,6 +1211,8 @@ Provide ONLY the merged knowledge without any explanation or metadata."""
                     new_chunks[:len(ids_to_update)],
                     new_chunk_metadata[:len(ids_to_update)]
                 )
+                self.extract_events(text, source=source, doc_id=doc_ids[0] if doc_ids else None,
+                                    topic=intent.get('topic'))
                 
                 return {
                     'action': 'updated',
@@ -445,7 +1222,8 @@ Provide ONLY the merged knowledge without any explanation or metadata."""
         
         # Step 5: If no related documents found but intent was update, add as new
         print("No related documents found, adding as new...")
-        doc_ids = self.add_to_knowledge_base(text, source=source, metadata=metadata)
+        doc_ids = self.add_to_knowledge_base(text, source=source, metadata=metadata,
+                                             topic=intent.get('topic'))
         return {
             'action': 'added',
             'doc_ids': doc_ids,
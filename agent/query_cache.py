@@ -0,0 +1,167 @@
+# agent/query_cache.py
+"""
+Result cache in front of PersonalAgent.query.
+
+Two tiers share one LRU of at most `max_entries` results:
+- exact: the normalized question text (case, spacing and trailing punctuation ignored)
+- near-duplicate: cosine similarity of the question embedding to cached questions,
+  computed against one preallocated NumPy matrix of unit vectors
+
+Every entry records the vector store's write generations when it was computed;
+an entry whose generation no longer matches (documents were added, updated,
+deleted or reset since) is dropped instead of served. Entries also expire after
+`ttl_seconds`, which bounds staleness from writes made by other processes, and
+on a new day, since the reframed query carries the current date.
+"""
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import Config
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r'\s+', ' ', question).strip().rstrip('?!.').strip().lower()
+
+
+class QueryCache:
+    """Thread-safe exact + near-duplicate cache of query results"""
+
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None, similarity: float = None):
+        self.max_entries = max_entries or Config.QUERY_CACHE_MAX_ENTRIES
+        self.ttl_seconds = Config.QUERY_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.similarity = Config.QUERY_CACHE_SIMILARITY if similarity is None else similarity
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Dict]" = OrderedDict()  # (scope, text) -> entry, LRU order
+        self._vectors = None  # max_entries x dim unit vectors, allocated on first embedding
+        self._slot_keys: List[Optional[Tuple]] = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self.counters = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+    def _scope(self, scope: Hashable, generation: Hashable) -> Tuple:
+        return (scope, date.today().isoformat()), generation
+
+    def get(self, question: str, scope: Hashable, generation: Hashable,
+            embed: Callable[[str], List[float]] = None) -> Tuple[Optional[Dict], Optional[List[float]]]:
+        """
+        Cached result for the question, or None. `scope` holds everything else the
+        result depends on (n_results, memory options); `generation` the store's
+        current write generation. With `embed`, a miss on the exact tier falls back
+        to the near-duplicate tier. Returns (result, question_embedding) so the
+        embedding can be reused by `put`.
+        """
+        scope, generation = self._scope(scope, generation)
+        key = (scope, normalize_question(question))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._valid(key, entry, generation, now):
+                self._entries.move_to_end(key)
+                self.counters['exact_hits'] += 1
+                return copy.deepcopy(entry['result']), None
+
+        embedding = None
+        if embed is not None and self.similarity < 1.0:
+            try:
+                embedding = embed(question)
+            except Exception as e:
+                print(f"Error embedding question for the query cache: {e}")
+        if embedding is not None:
+            with self._lock:
+                key = self._nearest(scope, embedding)
+                entry = self._entries.get(key) if key else None
+                if entry is not None and self._valid(key, entry, generation, now):
+                    self._entries.move_to_end(key)
+                    self.counters['similar_hits'] += 1
+                    return copy.deepcopy(entry['result']), embedding
+
+        with self._lock:
+            self.counters['misses'] += 1
+        return None, embedding
+
+    def put(self, question: str, scope: Hashable, generation: Hashable, result: Dict,
+            embedding: List[float] = None):
+        import numpy as np
+
+        scope, generation = self._scope(scope, generation)
+        key = (scope, normalize_question(question))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters['evictions'] += 1
+
+            slot = None
+            if embedding is not None:
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = float(np.linalg.norm(vector))
+                if self._vectors is None or vector.size != self._vectors.shape[1]:
+                    # First embedding, or the embedding model changed: older vectors are not comparable
+                    for other in self._entries.values():
+                        other['slot'] = None
+                    self._slot_keys = [None] * self.max_entries
+                    self._free_slots = list(range(self.max_entries - 1, -1, -1))
+                    self._vectors = np.zeros((self.max_entries, vector.size), dtype=np.float32)
+                if norm > 0 and vector.size == self._vectors.shape[1]:
+                    slot = self._free_slots.pop()
+                    self._vectors[slot] = vector / norm
+                    self._slot_keys[slot] = key
+
+            self._entries[key] = {
+                'result': copy.deepcopy(result),
+                'generation': generation,
+                'created': time.time(),
+                'slot': slot
+            }
+
+    def _nearest(self, scope: Tuple, embedding: List[float]) -> Optional[Tuple]:
+        """Key of the most similar cached question in the same scope, if similar enough"""
+        import numpy as np
+
+        if self._vectors is None or len(self._free_slots) == self.max_entries:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0 or vector.size != self._vectors.shape[1]:
+            return None
+        scores = self._vectors @ (vector / norm)
+        # Free slots are zero vectors, so they score 0 and never pass the threshold
+        for slot in np.argsort(scores)[::-1]:
+            if scores[slot] < self.similarity:
+                return None
+            key = self._slot_keys[slot]
+            if key is not None and key[0] == scope:
+                return key
+        return None
+
+    def _valid(self, key: Tuple, entry: Dict, generation: Hashable, now: float) -> bool:
+        if entry['generation'] == generation and now - entry['created'] <= self.ttl_seconds:
+            return True
+        self._remove(key)
+        self.counters['stale'] += 1
+        return False
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key)
+        if entry['slot'] is not None:
+            self._vectors[entry['slot']] = 0.0
+            self._slot_keys[entry['slot']] = None
+            self._free_slots.append(entry['slot'])
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.counters['exact_hits'] + self.counters['similar_hits']
+            lookups = hits + self.counters['misses']
+            return dict(self.counters, entries=len(self._entries),
+                        hit_rate=round(hits / lookups, 3) if lookups else 0.0)
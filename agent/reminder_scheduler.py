@@ -0,0 +1,187 @@
+# agent/reminder_scheduler.py
+"""
+Fire reminders at their due time.
+
+Pending reminders due within `horizon_seconds` sit in a min-heap keyed by due
+time; the scheduler thread sleeps on a condition variable until the earliest one
+(or the next refresh) and is woken early when a sooner reminder is scheduled.
+Scheduling is O(log n); cancellations and snoozes are lazy (stale heap entries
+are skipped when popped). Reminders further out stay only in sqlite and are
+loaded as the horizon moves, so memory does not grow with the total backlog.
+Missed reminders (e.g. while the process was down) fire on start.
+"""
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+
+def print_reminder(event: Dict):
+    print(f"\n⏰ Reminder #{event['id']}: {event['title']} (due {event['due_at'].replace('T', ' ')})")
+
+
+def _timestamp(iso: str) -> float:
+    return datetime.fromisoformat(iso).timestamp()
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+
+class ReminderScheduler:
+    """Background thread that fires reminders from an EventStore"""
+
+    def __init__(self, event_store, on_fire: Callable[[Dict], None] = None,
+                 horizon_seconds: float = None, refresh_seconds: float = None):
+        self.event_store = event_store
+        self.callbacks: List[Callable[[Dict], None]] = [on_fire or print_reminder]
+        self.horizon_seconds = horizon_seconds or Config.REMINDER_HORIZON_SECONDS
+        self.refresh_seconds = refresh_seconds or Config.REMINDER_REFRESH_SECONDS
+
+        self._heap = []  # (remind_ts, event_id)
+        self._scheduled: Dict[int, float] = {}  # event_id -> the heap entry that is still valid
+        self._condition = threading.Condition()
+        self._horizon_end: Optional[float] = None
+        self._last_refresh = 0.0
+        self._next_refresh = 0.0
+        self._stopped = False
+        self._thread = None
+        self.fired = 0
+
+    def add_callback(self, callback: Callable[[Dict], None]):
+        self.callbacks.append(callback)
+
+    def start(self):
+        """Load the first window (including missed reminders) and start the timer thread"""
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='reminder-scheduler')
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    @property
+    def pending_in_memory(self) -> int:
+        return len(self._scheduled)
+
+    def schedule(self, event_id: int, remind_at: str):
+        """(Re)schedule a pending reminder; a no-op beyond the horizon, where refresh picks it up"""
+        timestamp = _timestamp(remind_at)
+        with self._condition:
+            if self._horizon_end is not None and timestamp > self._horizon_end:
+                self._scheduled.pop(event_id, None)
+                return
+            self._scheduled[event_id] = timestamp
+            heapq.heappush(self._heap, (timestamp, event_id))
+            if self._heap[0] == (timestamp, event_id):
+                self._condition.notify()
+
+    def unschedule(self, event_id: int):
+        with self._condition:
+            self._scheduled.pop(event_id, None)
+
+    def refresh(self):
+        """
+        Extend the horizon and apply changes made through the store since the last
+        refresh (possibly by other processes). Only indexed, incremental queries run.
+        """
+        started = time.time()
+        horizon_end = started + self.horizon_seconds
+        until = _iso(horizon_end)
+        after = None if self._horizon_end is None else _iso(self._horizon_end)
+
+        entering = self.event_store.pending_between(after, until)
+        changed = self.event_store.updated_since(self._last_refresh - 1.0) if self._last_refresh else []
+
+        with self._condition:
+            for event in entering:
+                self._push(event['id'], _timestamp(event['remind_at']))
+            for event in changed:
+                timestamp = _timestamp(event['remind_at'])
+                if event['status'] != 'pending' or timestamp > horizon_end:
+                    self._scheduled.pop(event['id'], None)
+                elif self._scheduled.get(event['id']) != timestamp:
+                    self._push(event['id'], timestamp)
+            self._horizon_end = horizon_end
+            self._last_refresh = started
+            self._next_refresh = started + self.refresh_seconds
+            self._condition.notify()
+
+    def _push(self, event_id: int, timestamp: float):
+        self._scheduled[event_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, event_id))
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            timestamp, event_id = heapq.heappop(self._heap)
+            if self._scheduled.get(event_id) == timestamp:
+                del self._scheduled[event_id]
+                due.append(event_id)
+        return due
+
+    def _run(self):
+        while True:
+            refresh_due = False
+            with self._condition:
+                while not self._stopped:
+                    now = time.time()
+                    due = self._pop_due(now)
+                    if due:
+                        break
+                    if now >= self._next_refresh:
+                        refresh_due = True
+                        break
+                    wake_at = min(self._heap[0][0], self._next_refresh) if self._heap else self._next_refresh
+                    self._condition.wait(wake_at - now)
+                if self._stopped:
+                    return
+
+            if refresh_due:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing reminders: {e}")
+                    with self._condition:
+                        self._next_refresh = time.time() + self.refresh_seconds
+                continue
+
+            for event_id in due:
+                self._fire(event_id)
+
+    def _fire(self, event_id: int):
+        try:
+            event = self.event_store.claim(event_id)
+        except Exception as e:
+            print(f"Error firing reminder {event_id}: {e}")
+            return
+        if event is None:
+            return  # cancelled, snoozed or fired elsewhere in the meantime
+        self.fired += 1
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error in reminder callback: {e}")
+
+    def snooze(self, event_id: int, minutes: float = None) -> Optional[str]:
+        """Push a reminder `minutes` from now; returns the new reminder time or None if not found"""
+        minutes = Config.REMINDER_SNOOZE_MINUTES if minutes is None else minutes
+        remind_at = (datetime.now() + timedelta(minutes=minutes)).isoformat(timespec='seconds')
+        if not self.event_store.snooze(event_id, remind_at):
+            return None
+        self.schedule(event_id, remind_at)
+        return remind_at
+
+    def cancel(self, event_id: int) -> bool:
+        cancelled = self.event_store.cancel(event_id)
+        self.unschedule(event_id)
+        return cancelled
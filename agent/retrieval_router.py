@@ -0,0 +1,172 @@
+# agent/retrieval_router.py
+"""
+Decide per chat message whether it needs knowledge base retrieval and query reframing.
+
+Cheap rules run first: greetings, thanks and acknowledgements are chit-chat, and
+short follow-ups that lean on the previous turn ("why?", "tell me more") are
+answered from history. Messages the rules cannot place are embedded once and
+compared with per-route centroids computed from the seed examples below; the
+message embedding is handed back so the search can reuse it. Reframing (an LLM
+call) is only requested for messages with relative dates or abbreviations.
+
+Every decision is counted and, with `Config.ROUTER_LOG_PATH` set, appended as a
+JSON line for audit. Anything uncertain (or any error) falls back to retrieval.
+"""
+import json
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import Config
+
+CHITCHAT = 'chitchat'
+FOLLOWUP = 'followup'
+KNOWLEDGE = 'knowledge'
+
+# Seed examples for the centroid classifier
+EXAMPLES = {
+    CHITCHAT: [
+        "hi there", "hello, how are you?", "thanks a lot", "thank you, that helps", "ok great",
+        "good morning", "have a nice day", "you are awesome", "see you later", "haha that's funny",
+    ],
+    FOLLOWUP: [
+        "can you explain that in more detail?", "why is that?", "tell me more", "make it shorter",
+        "what do you mean by that?", "can you rephrase your answer?", "give me an example of that",
+        "summarize what you just said", "and what about the second point?", "put that in a list",
+    ],
+    KNOWLEDGE: [
+        "when is my rent due?", "what did I note about the project deadline?",
+        "what is my doctor's phone number?", "when did I last pay the electricity bill?",
+        "what are my plans for next week?", "where did I save the wifi password?",
+        "what did we decide in the team meeting?", "how much did I spend on groceries last month?",
+        "what is the name of my landlord?", "which books did I want to read?",
+    ],
+}
+
+CHITCHAT_PATTERN = re.compile(
+    r"^(hi|hello|hey|hiya|yo|thanks|thank you|thx|ty|cheers|ok|okay|k|cool|great|nice|awesome|perfect"
+    r"|got it|sounds good|good (morning|afternoon|evening|night)|bye|goodbye|see you|lol|haha|yes|no|sure"
+    r"|you'?re welcome|no problem|how are you)( (so much|a lot|very much|there|again|bot|agent))?$")
+FOLLOWUP_PATTERN = re.compile(
+    r"^(why|how so|really|tell me more|more|go on|continue|elaborate|explain|rephrase"
+    r"|shorter|longer|simplify|summari[sz]e|translate|example|in other words|what do you mean|can you (explain|"
+    r"rephrase|elaborate|expand|shorten|summari[sz]e|clarify)|put (that|it) )\b")
+ANAPHORA_PATTERN = re.compile(r"\b(that|this|it|those|these|above|you said|your answer|previous)\b")
+# Words that tie a message to the user's own notes: never routed away from retrieval by rules
+PERSONAL_PATTERN = re.compile(r"\b(my|mine|i|i'm|i've|we|our|me|remind|note|notes|saved|wrote)\b")
+# Reframing adds dates for relative time and expands abbreviations; other queries search as typed
+TEMPORAL_PATTERN = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|now|recent(ly)?|current(ly)?|last|next|this (week|month|year)"
+    r"|ago|upcoming|weekend|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b", re.I)
+ABBREVIATION_PATTERN = re.compile(r"\b[A-Z]{2,}\b")
+
+
+def normalize(message: str) -> str:
+    return re.sub(r"\s+", " ", message.lower()).strip(" \t\n.!?,;:)(")
+
+
+class RetrievalRouter:
+    """Rules plus an embedding-centroid classifier deciding how each message is answered"""
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]],
+                 margin: float = None, log_path: str = None, version: Callable[[], str] = None):
+        self.embed = embed
+        # Names the embedding model behind `embed`; centroids are recomputed when it changes
+        self.version = version
+        self.margin = Config.ROUTER_MARGIN if margin is None else margin
+        self.log_path = Config.ROUTER_LOG_PATH if log_path is None else log_path
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.counts = {CHITCHAT: 0, FOLLOWUP: 0, KNOWLEDGE: 0, 'reframed': 0, 'classified': 0}
+
+    def route(self, message: str, has_history: bool = False) -> Dict:
+        """
+        {'route', 'retrieve', 'reframe', 'reason', 'embedding'}; `embedding` is the
+        message embedding when the classifier ran, otherwise None.
+        """
+        decision = self._decide(message, has_history)
+        decision['reframe'] = decision['retrieve'] and bool(
+            TEMPORAL_PATTERN.search(message) or ABBREVIATION_PATTERN.search(message))
+        self._record(message, decision)
+        return decision
+
+    def _decide(self, message: str, has_history: bool) -> Dict:
+        text = normalize(message)
+        words = text.split()
+
+        if not words or CHITCHAT_PATTERN.match(text):
+            return self._decision(CHITCHAT, 'rule: chit-chat phrase')
+        if has_history and len(words) <= Config.ROUTER_FOLLOWUP_MAX_WORDS and not PERSONAL_PATTERN.search(text):
+            refers_back = bool(ANAPHORA_PATTERN.search(text))
+            # "explain that" is a follow-up, "explain the lease terms" may need the notes
+            if FOLLOWUP_PATTERN.match(text) and (refers_back or len(words) <= 3):
+                return self._decision(FOLLOWUP, 'rule: follow-up phrase')
+            if refers_back and len(words) <= 6:
+                return self._decision(FOLLOWUP, 'rule: refers to the previous turn')
+        if PERSONAL_PATTERN.search(text) or len(words) > Config.ROUTER_CLASSIFY_MAX_WORDS:
+            return self._decision(KNOWLEDGE, 'rule: personal or detailed question')
+
+        try:
+            import numpy as np
+
+            vector = np.asarray(self.embed([message])[0], dtype=np.float32)
+            names, centroids = self._load_centroids()
+            scores = centroids @ (vector / (np.linalg.norm(vector) or 1.0))
+        except Exception as e:
+            print(f"Error classifying message for retrieval: {e}")
+            return self._decision(KNOWLEDGE, 'fallback: classifier unavailable')
+
+        order = np.argsort(scores)[::-1]
+        best, runner_up = names[order[0]], float(scores[order[1]])
+        score = float(scores[order[0]])
+        reason = f"classifier: {best} {score:.2f} vs {runner_up:.2f}"
+        if best == KNOWLEDGE or score - runner_up < self.margin or (best == FOLLOWUP and not has_history):
+            return self._decision(KNOWLEDGE, reason, embedding=vector.tolist())
+        return self._decision(best, reason, embedding=vector.tolist())
+
+    @staticmethod
+    def _decision(route: str, reason: str, embedding: Optional[List[float]] = None) -> Dict:
+        return {'route': route, 'retrieve': route == KNOWLEDGE, 'reason': reason, 'embedding': embedding}
+
+    def _load_centroids(self):
+        """Unit centroid per route, embedded from the seed examples once per embedding model"""
+        import numpy as np
+
+        version = self.version() if self.version else None
+        with self._lock:
+            if self._centroids is None or self._centroids[2] != version:
+                names = list(EXAMPLES)
+                centroids = []
+                for name in names:
+                    vectors = np.asarray(self.embed(EXAMPLES[name]), dtype=np.float32)
+                    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                    centroid = vectors.mean(axis=0)
+                    centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+                self._centroids = (names, np.stack(centroids), version)
+            return self._centroids[:2]
+
+    def _record(self, message: str, decision: Dict):
+        with self._lock:
+            self.counts[decision['route']] += 1
+            self.counts['reframed'] += decision['reframe']
+            self.counts['classified'] += decision['embedding'] is not None
+            if not self.log_path:
+                return
+            entry = {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'message': message[:200],
+                'route': decision['route'],
+                'retrieve': decision['retrieve'],
+                'reframe': decision['reframe'],
+                'reason': decision['reason']
+            }
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                print(f"Error writing router log: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,183 @@
+# agent_daemon.py
+"""
+Keep a warm PersonalAgent behind a Unix domain socket so `main.py` invocations
+skip importing chromadb, opening the vector store and creating HTTP clients.
+
+Protocol: one JSON object per line in each direction.
+  request:  {"mode": "add" | "query" | "stats" | "migrate" | "ping" | "shutdown", "model": ..., ...}
+            ("add" carries either "text" or the absolute path of a "file" to stream)
+  response: {"ok": true, "result": ...} or {"ok": false, "error": ..., "fallback": bool}
+"""
+import json
+import os
+import socket
+import socketserver
+import threading
+from typing import Dict, Optional
+
+from config import Config
+
+# Modes the daemon can run on behalf of main.py
+FORWARDED_MODES = ('add', 'query', 'stats', 'migrate')
+
+
+def daemon_supported() -> bool:
+    return hasattr(socket, 'AF_UNIX')
+
+
+def send_command(command: Dict, socket_path: str = None, timeout: float = 600.0) -> Optional[Dict]:
+    """
+    Send a command to a running daemon and return its response, or None when no
+    daemon is listening (the caller then runs in-process). Once the command was sent,
+    a failure (timeout, dropped connection, broken reply) is returned as an error
+    response without fallback, since the daemon may already have run the command.
+    """
+    if not daemon_supported():
+        return None
+    socket_path = str(socket_path or Config.DAEMON_SOCKET_PATH)
+    if not os.path.exists(socket_path):
+        return None
+
+    sent = False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(command).encode('utf-8') + b'\n')
+            sent = True
+            with sock.makefile('rb') as stream:
+                line = stream.readline()
+        if not line.endswith(b'\n'):
+            raise ValueError('connection closed before the reply was complete')
+        response = json.loads(line)
+        if not isinstance(response, dict) or 'ok' not in response:
+            raise ValueError('reply is not a daemon response')
+    except (OSError, ValueError) as e:
+        if not sent:
+            # Stale socket file left behind by a daemon that is no longer running
+            return None
+        return {'ok': False, 'error': f"No valid reply from the daemon: {e}", 'fallback': False}
+    return response
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            command = json.loads(line)
+            response = self.server.execute(command)
+        except Exception as e:
+            response = {'ok': False, 'error': str(e), 'fallback': False}
+        self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+
+
+class AgentDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server running main.py commands against one warm agent"""
+
+    daemon_threads = True
+
+    def __init__(self, agent, model: str, socket_path: str):
+        self.agent = agent
+        self.model = model
+        self.socket_path = socket_path
+        super().__init__(socket_path, _DaemonHandler)
+
+    def server_bind(self):
+        # Create the socket owner-only: a chmod after bind leaves a window where anyone can connect
+        previous = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous)
+
+    def execute(self, command: Dict) -> Dict:
+        mode = command.get('mode')
+
+        if mode == 'ping':
+            return {'ok': True, 'result': {'model': self.model, 'pid': os.getpid()}}
+        if mode == 'shutdown':
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {'ok': True, 'result': 'shutting down'}
+        if mode not in FORWARDED_MODES:
+            return {'ok': False, 'error': f"Unsupported mode: {mode}", 'fallback': True}
+
+        # A different model means a different agent; let the client run in-process
+        if command.get('model') and command['model'] != self.model:
+            return {'ok': False, 'error': f"Daemon serves model {self.model}", 'fallback': True}
+
+        if mode == 'stats':
+            result = self.agent.get_stats()
+        elif mode == 'migrate':
+            # Runs in the daemon's background, which keeps serving queries meanwhile
+            self.agent.vector_store.start_migration()
+            result = self.agent.vector_store.migration_status()
+        elif mode == 'add' and command.get('file'):
+            result = self.agent.add_file_to_knowledge_base(
+                command['file'],
+                source=command.get('source', 'manual'),
+                metadata=command.get('metadata')
+            )
+        elif mode == 'add':
+            result = self.agent.add_to_knowledge_base(
+                command['text'],
+                source=command.get('source', 'manual'),
+                metadata=command.get('metadata')
+            )
+        else:
+            result = self.agent.query(command['text'], n_results=command.get('n_results'),
+                                      mmr=command.get('mmr'), mmr_lambda=command.get('mmr_lambda'),
+                                      shards=command.get('shards'))
+        return {'ok': True, 'result': result}
+
+
+def run_daemon(model: str, socket_path: str = None):
+    """Start the daemon in the foreground until interrupted or sent 'shutdown'"""
+    if not daemon_supported():
+        print("❌ Daemon mode needs Unix domain sockets, which this platform lacks.")
+        return
+
+    socket_path = str(socket_path or Config.DAEMON_SOCKET_PATH)
+    if os.path.exists(socket_path):
+        if send_command({'mode': 'ping'}, socket_path, timeout=5) is not None:
+            print(f"Daemon already running on {socket_path}")
+            return
+        os.unlink(socket_path)
+
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from database.event_store import EventStore
+    from database.job_store import JobStore
+    from agent.personal_agent import PersonalAgent
+
+    print("Initializing Personal AI Agent...")
+    vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
+    session_manager = SessionManager(str(Config.METADATA_DB_PATH))
+    event_store = EventStore(str(Config.METADATA_DB_PATH))
+    job_store = JobStore(str(Config.METADATA_DB_PATH))
+    agent = PersonalAgent(vector_store, session_manager, llm_model=model, event_store=event_store,
+                          job_store=job_store)
+
+    server = AgentDaemon(agent, model, socket_path)
+    print(f"Daemon listening on {socket_path} (model: {model})")
+    if Config.MIGRATION_AUTO_START and vector_store.needs_migration:
+        vector_store.start_migration()
+    # Background jobs queued by the CLI, UIs or API clients run here
+    agent.start_jobs()
+
+    exporter = None
+    if Config.METRICS_EXPORT_PATH:
+        from helper.tracing import PrometheusFileExporter
+        exporter = PrometheusFileExporter(Config.METRICS_EXPORT_PATH, Config.METRICS_EXPORT_INTERVAL).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter:
+            exporter.stop()
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("Daemon stopped.")
@@ -0,0 +1,495 @@
+# api_server.py
+"""
+Local HTTP API for the Personal AI agent.
+
+Endpoints (JSON in, JSON out):
+  POST /add       {"text", "source"?, "metadata"?}
+  POST /query     {"question", "n_results"?, "session_id"?, "mmr"?, "mmr_lambda"?, "shards"?}
+  POST /chat      {"message", "session_id"?}   (creates a session when none is given)
+  POST /sessions  {"metadata"?}
+  POST /jobs      {"kind", "params"?}   (kinds in API_JOB_KINDS; files must be in JOB_UPLOAD_DIR)
+  GET  /jobs      ?job_id=... or ?status=...&limit=...
+  POST /jobs/cancel {"job_id"}
+  GET  /stats     ?session_id=...
+  GET  /health
+
+One agent and one set of storage handles serve every client. Requests beyond
+API_MAX_PENDING, or waiting longer than API_QUEUE_TIMEOUT for their endpoint's
+concurrency slot, are rejected with 503 so overload never turns into unbounded
+queueing. Embedding requests from all in-flight requests are micro-batched into
+single Ollama calls.
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from config import Config
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable'
+}
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from concurrent callers over a short window
+    and sends them to Ollama as one batch.
+
+    `embed` is a blocking, thread-safe entry point meant to be installed with
+    `VectorStore.set_embedder`; it must not be called from the event loop thread.
+    """
+
+    def __init__(self, ollama_client, model: str, loop: asyncio.AbstractEventLoop,
+                 window_ms: float = None, max_batch_size: int = None):
+        self.ollama_client = ollama_client
+        self.model = model
+        self.loop = loop
+        window_ms = Config.EMBED_BATCH_WINDOW_MS if window_ms is None else window_ms
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size or Config.EMBED_BATCH_MAX_SIZE
+
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_texts = 0
+        self._flush_handle = None
+
+        self.batches_sent = 0
+        self.texts_embedded = 0
+        self.requests_batched = 0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts from a worker thread, sharing Ollama calls with other requests"""
+        if not texts:
+            return []
+        future = asyncio.run_coroutine_threadsafe(self.submit(texts), self.loop)
+        return future.result()
+
+    async def submit(self, texts: List[str]) -> List[List[float]]:
+        """Queue texts for the next batch and wait for their embeddings"""
+        future = self.loop.create_future()
+        self._pending.append((list(texts), future))
+        self._pending_texts += len(texts)
+
+        if self._pending_texts >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        self._pending_texts = 0
+        if batch:
+            self.loop.create_task(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for item_texts, _ in batch for text in item_texts]
+
+        try:
+            embeddings = []
+            # Large single requests (bulk ingest) are still split to the batch size
+            for start in range(0, len(texts), self.max_batch_size):
+                part = texts[start:start + self.max_batch_size]
+                part_embeddings = await self.loop.run_in_executor(
+                    None, self.ollama_client.embed_batch, self.model, part
+                )
+                if len(part_embeddings) != len(part):
+                    raise Exception(
+                        f"Ollama returned {len(part_embeddings)} embeddings for {len(part)} inputs"
+                    )
+                embeddings.extend(part_embeddings)
+                self.batches_sent += 1
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.texts_embedded += len(texts)
+        self.requests_batched += len(batch)
+
+        offset = 0
+        for item_texts, future in batch:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(item_texts)])
+            offset += len(item_texts)
+
+    def get_stats(self) -> Dict:
+        return {
+            'batches_sent': self.batches_sent,
+            'texts_embedded': self.texts_embedded,
+            'requests_batched': self.requests_batched,
+            'avg_batch_size': round(self.texts_embedded / self.batches_sent, 2) if self.batches_sent else 0
+        }
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _int_param(body: Dict, name: str, default: int = None) -> int:
+    """body[name] as an int (query string values arrive as text), or 400"""
+    value = body.get(name)
+    if value is None:
+        return default
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise HTTPError(400, f"'{name}' must be an integer")
+
+
+def _fraction_param(body: Dict, name: str) -> float:
+    """body[name] as a number from 0 to 1, or 400"""
+    value = body.get(name)
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and 0.0 <= value <= 1.0:
+        return float(value)
+    raise HTTPError(400, f"'{name}' must be a number from 0 to 1")
+
+
+class APIServer:
+    """asyncio HTTP/1.1 server with admission control and per-endpoint concurrency limits"""
+
+    def __init__(self, agent, batcher: EmbeddingBatcher = None, max_pending: int = None,
+                 endpoint_limits: Dict[str, int] = None, queue_timeout: float = None):
+        self.agent = agent
+        self.batcher = batcher
+        self.max_pending = max_pending or Config.API_MAX_PENDING
+        self.endpoint_limits = endpoint_limits or dict(Config.API_ENDPOINT_CONCURRENCY)
+        self.queue_timeout = Config.API_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+
+        self.routes = {
+            ('POST', '/add'): ('add', self._add),
+            ('POST', '/query'): ('query', self._query),
+            ('POST', '/chat'): ('chat', self._chat),
+            ('POST', '/sessions'): ('sessions', self._create_session),
+            ('GET', '/stats'): ('stats', self._stats),
+            ('POST', '/jobs'): ('jobs', self._submit_job),
+            ('GET', '/jobs'): ('jobs', self._jobs),
+            ('POST', '/jobs/cancel'): ('jobs', self._cancel_job),
+        }
+        self.semaphores = {
+            endpoint: asyncio.Semaphore(limit) for endpoint, limit in self.endpoint_limits.items()
+        }
+        # Agent calls block on sqlite/Chroma/Ollama, so they run on worker threads
+        self.executor = ThreadPoolExecutor(
+            max_workers=sum(self.endpoint_limits.values()),
+            thread_name_prefix='api-worker'
+        )
+
+        self.in_flight = 0
+        self.counters = {endpoint: {'requests': 0, 'rejected': 0, 'errors': 0}
+                         for endpoint in self.endpoint_limits}
+
+    # ---------- Endpoint handlers (run on worker threads) ----------
+
+    def _add(self, body: Dict) -> Dict:
+        text = body.get('text')
+        if not text:
+            raise HTTPError(400, "'text' is required")
+        doc_ids = self.agent.add_to_knowledge_base(
+            text,
+            source=body.get('source', 'api'),
+            metadata=body.get('metadata')
+        )
+        return {'doc_ids': doc_ids, 'chunks': len(doc_ids or [])}
+
+    def _query(self, body: Dict) -> Dict:
+        question = body.get('question')
+        if not question:
+            raise HTTPError(400, "'question' is required")
+        # Bad values would otherwise surface as a 500, or as a huge fetch from Chroma
+        n_results = _int_param(body, 'n_results')
+        if n_results is not None and not 1 <= n_results <= Config.API_MAX_RESULTS:
+            raise HTTPError(400, f"'n_results' must be from 1 to {Config.API_MAX_RESULTS}")
+        mmr = body.get('mmr')
+        if mmr is not None and not isinstance(mmr, bool):
+            raise HTTPError(400, "'mmr' must be true or false")
+        shards = body.get('shards')
+        if shards is not None:
+            if not isinstance(shards, list) or not all(isinstance(shard, str) for shard in shards):
+                raise HTTPError(400, "'shards' must be a list of strings")
+            unknown = self.agent.unknown_shards(shards)
+            if unknown:
+                raise HTTPError(400, f"Unknown shards: {', '.join(unknown)}")
+        return self.agent.query(
+            question,
+            n_results=n_results,
+            session_id=body.get('session_id'),
+            mmr=mmr,
+            mmr_lambda=_fraction_param(body, 'mmr_lambda'),
+            shards=shards
+        )
+
+    def _chat(self, body: Dict) -> Dict:
+        message = body.get('message')
+        if not message:
+            raise HTTPError(400, "'message' is required")
+        session_id = body.get('session_id') or self.agent.create_session({'mode': 'api'})
+        response = self.agent.chat(message, session_id=session_id)
+        return {'session_id': session_id, 'response': response}
+
+    def _create_session(self, body: Dict) -> Dict:
+        metadata = body.get('metadata') or {}
+        metadata.setdefault('mode', 'api')
+        return {'session_id': self.agent.create_session(metadata)}
+
+    def _submit_job(self, body: Dict) -> Dict:
+        from agent.job_runner import is_upload_path
+
+        kind = body.get('kind')
+        if not kind:
+            raise HTTPError(400, "'kind' is required")
+        if kind not in Config.API_JOB_KINDS:
+            raise HTTPError(400, f"Job kind '{kind}' cannot be submitted over the API "
+                                 f"(expected one of {', '.join(Config.API_JOB_KINDS)})")
+        params = body.get('params') or {}
+        if not isinstance(params, dict):
+            raise HTTPError(400, "'params' must be a JSON object")
+        # Only the agent's own upload copies are deleted after ingest, never a client-named file
+        params = {key: value for key, value in params.items() if key != 'delete_after'}
+        if 'path' in params and not (isinstance(params['path'], str) and is_upload_path(params['path'])):
+            raise HTTPError(400, f"'path' must be a file in {Config.JOB_UPLOAD_DIR}")
+        try:
+            return {'job_id': self.agent.submit_job(kind, params)}
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+    def _jobs(self, body: Dict) -> Dict:
+        """One job by 'job_id', or the most recent ones (optionally by 'status')"""
+        job_id = _int_param(body, 'job_id')
+        if job_id is not None:
+            job = self.agent.job_status(job_id)
+            if job is None:
+                raise HTTPError(404, f"No job {job_id}")
+            return job
+        return {'jobs': self.agent.list_jobs(body.get('status'), limit=_int_param(body, 'limit', 20))}
+
+    def _cancel_job(self, body: Dict) -> Dict:
+        job_id = _int_param(body, 'job_id')
+        if job_id is None:
+            raise HTTPError(400, "'job_id' is required")
+        return {'cancelled': self.agent.cancel_job(job_id)}
+
+    def _stats(self, body: Dict) -> Dict:
+        stats = self.agent.get_stats(session_id=body.get('session_id'))
+        stats['server'] = {
+            'in_flight': self.in_flight,
+            'max_pending': self.max_pending,
+            'endpoints': self.counters
+        }
+        if self.batcher:
+            stats['server']['embedding_batcher'] = self.batcher.get_stats()
+        return stats
+
+    # ---------- Request dispatch ----------
+
+    async def dispatch(self, method: str, path: str, body: Dict) -> Tuple[int, Dict, Dict]:
+        """Route a request through admission control; returns (status, payload, headers)"""
+        if path == '/health':
+            return 200, {'status': 'ok'}, {}
+
+        route = self.routes.get((method, path))
+        if route is None:
+            if any(route_path == path for _, route_path in self.routes):
+                return 405, {'error': f"{method} not allowed on {path}"}, {}
+            return 404, {'error': f"Unknown endpoint {path}"}, {}
+        endpoint, handler = route
+        counters = self.counters[endpoint]
+        counters['requests'] += 1
+
+        # Global admission control: shed load instead of queueing without bound
+        if self.in_flight >= self.max_pending:
+            counters['rejected'] += 1
+            return 503, {'error': 'Server busy, retry later'}, {'Retry-After': '1'}
+
+        self.in_flight += 1
+        try:
+            semaphore = self.semaphores[endpoint]
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                counters['rejected'] += 1
+                return 503, {'error': f"Too many concurrent '{endpoint}' requests"}, {'Retry-After': '1'}
+
+            try:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self.executor, handler, body)
+                return 200, result, {}
+            except HTTPError as e:
+                return e.status, {'error': e.message}, {}
+            except Exception as e:
+                counters['errors'] += 1
+                print(f"Error handling {method} {path}: {e}")
+                return 500, {'error': str(e)}, {}
+            finally:
+                semaphore.release()
+        finally:
+            self.in_flight -= 1
+
+    # ---------- HTTP plumbing ----------
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._write_response(writer, e.status, {'error': e.message}, {}, False)
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                status, payload, extra_headers = await self.dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._write_response(writer, status, payload, extra_headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_line(reader: asyncio.StreamReader) -> bytes:
+        try:
+            return await reader.readline()
+        except (asyncio.LimitOverrunError, ValueError):
+            # readline raises ValueError once a line exceeds the stream's buffer limit
+            raise HTTPError(400, 'Request line or header too long')
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        request_line = await self._read_line(reader)
+        if not request_line:
+            return None
+
+        parts = request_line.decode('latin-1').split()
+        if len(parts) != 3:
+            raise HTTPError(400, 'Malformed request line')
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = await self._read_line(reader)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length < 0:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > Config.API_MAX_BODY_BYTES:
+            raise HTTPError(413, 'Request body too large')
+        raw_body = await reader.readexactly(length) if length else b''
+
+        url = urlsplit(target)
+        if raw_body:
+            try:
+                body = json.loads(raw_body)
+            except ValueError:
+                raise HTTPError(400, 'Request body must be JSON')
+            if not isinstance(body, dict):
+                raise HTTPError(400, 'Request body must be a JSON object')
+        else:
+            body = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        return method.upper(), url.path, headers, body
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                              extra_headers: Dict, keep_alive: bool):
+        data = json.dumps(payload, default=str).encode('utf-8')
+        lines = [
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'Unknown')}",
+            'Content-Type: application/json',
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"
+        ]
+        lines.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + data)
+        await writer.drain()
+
+
+async def serve(host: str, port: int, model: str):
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from database.event_store import EventStore
+    from database.job_store import JobStore
+    from agent.personal_agent import PersonalAgent
+
+    Config.create_dirs()
+    print("Initializing Personal AI Agent...")
+    vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
+    session_manager = SessionManager(str(Config.METADATA_DB_PATH))
+    event_store = EventStore(str(Config.METADATA_DB_PATH))
+    job_store = JobStore(str(Config.METADATA_DB_PATH))
+    agent = PersonalAgent(vector_store, session_manager, llm_model=model, event_store=event_store,
+                          job_store=job_store)
+
+    loop = asyncio.get_running_loop()
+    batcher = EmbeddingBatcher(vector_store.ollama_client, vector_store.embedding_model, loop)
+    vector_store.set_embedder(batcher.embed)
+    # After an embedding model migration the batcher embeds with the new model
+    vector_store.on_switch.append(lambda model: setattr(batcher, 'model', model))
+    if Config.MIGRATION_AUTO_START and vector_store.needs_migration:
+        vector_store.start_migration()
+    # Background jobs queued by the CLI, UIs or API clients run here
+    agent.start_jobs()
+
+    api = APIServer(agent, batcher=batcher)
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"API server listening on http://{host}:{port}")
+
+    exporter = None
+    if Config.METRICS_EXPORT_PATH:
+        from helper.tracing import PrometheusFileExporter
+        exporter = PrometheusFileExporter(Config.METRICS_EXPORT_PATH, Config.METRICS_EXPORT_INTERVAL).start()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if exporter:
+            exporter.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Personal AI Knowledge Base HTTP API')
+    parser.add_argument('--host', type=str, default=Config.API_HOST, help='Interface to bind')
+    parser.add_argument('--port', type=int, default=Config.API_PORT, help='Port to listen on')
+    parser.add_argument('--model', type=str, default=Config.LLM_MODEL,
+                       help='Ollama model to use')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.model))
+    except KeyboardInterrupt:
+        print("\nAPI server stopped.")
+
+
+if __name__ == '__main__':
+    main()
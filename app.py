@@ -1,10 +1,17 @@
 # app.py
+from collections import deque
 import streamlit as st
 from config import Config
 from database.vector_store import VectorStore
 from database.session_manager import SessionManager
+from database.event_store import EventStore
+from database.job_store import JobStore
 from agent.personal_agent import PersonalAgent
-from helper.speechtotext import voice_search
+
+def voice_search():
+    # speech_recognition (and PyAudio) load only when voice input is actually used
+    from helper.speechtotext import voice_search as _voice_search
+    return _voice_search()
 
 # ---------- Init ----------
 st.set_page_config(page_title="Personal AI Agent", layout="wide")
@@ -13,19 +20,33 @@ st.set_page_config(page_title="Personal AI Agent", layout="wide")
 if 'cache_cleared' not in st.session_state:
     st.session_state.cache_cleared = False
 
+# One agent (and its storage handles) is shared by every browser session;
+# each user's conversation is identified by the session handle kept in st.session_state.
 @st.cache_resource
 def init_agent(model):
     Config.create_dirs()
     vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
     session_manager = SessionManager(str(Config.METADATA_DB_PATH))
-    return PersonalAgent(vector_store, session_manager, llm_model=model)
+    event_store = EventStore(str(Config.METADATA_DB_PATH))
+    job_store = JobStore(str(Config.METADATA_DB_PATH))
+    agent = PersonalAgent(vector_store, session_manager, llm_model=model, event_store=event_store,
+                          job_store=job_store)
+    # Reminders fire on a background thread; pages show them on their next run
+    agent.start_reminders(on_fire=fired_reminders().append)
+    # Ingestion, export and re-embedding run on worker threads; pages poll their progress
+    agent.start_jobs()
+    return agent
+
+@st.cache_resource
+def fired_reminders():
+    return deque(maxlen=100)
 
 # ---------- Sidebar ----------
 st.sidebar.title("⚙️ Settings")
 
 mode = st.sidebar.selectbox(
     "Mode",
-    ["add", "query", "chat", "stats"]
+    ["add", "query", "chat", "reminders", "stats"]
 )
 
 input_type = st.sidebar.selectbox(
@@ -56,6 +77,9 @@ with col1:
                 # Create a temporary agent to perform reset
                 reset_agent = init_agent(model)
                 result = reset_agent.reset_all()
+                # Sessions are gone from the database, so drop this user's handle too
+                st.session_state.pop("session_id", None)
+                st.session_state.pop("messages", None)
                 st.sidebar.success("✅ Database reset successfully!")
                 st.sidebar.info(
                     f"Deleted:\n"
@@ -80,12 +104,61 @@ agent = init_agent(model)
 
 st.title("🧠 Personal AI Knowledge Base")
 
+seen_reminders = st.session_state.setdefault("seen_reminders", set())
+for event in list(fired_reminders()):
+    if event["id"] not in seen_reminders:
+        seen_reminders.add(event["id"])
+        st.toast(f"⏰ {event['title']} (due {event['due_at'].replace('T', ' ')})")
+
+def render_jobs():
+    """Recent background jobs with their progress; active ones can be cancelled"""
+    jobs = agent.list_jobs(limit=10)
+    if not jobs:
+        st.caption("No background jobs yet.")
+    for job in jobs:
+        col_job, col_cancel = st.columns([6, 1])
+        label = f"#{job['id']} {job['kind']} · {job['status']}"
+        with col_job:
+            if job["status"] in ("queued", "running"):
+                st.progress((job["percent"] or 0) / 100,
+                            text=f"{label} · {job['done']}/{job['total'] or '?'}")
+            elif job["status"] == "done":
+                st.markdown(f"✅ {label} · {job['result']}")
+            elif job["status"] == "failed":
+                st.markdown(f"❌ {label} · {job['error']}")
+            else:
+                st.markdown(f"⏹️ {label} · {job['done']}/{job['total'] or '?'}")
+        if job["status"] in ("queued", "running") and not job["cancel_requested"]:
+            with col_cancel:
+                if st.button("Cancel", key=f"cancel_job_{job['id']}"):
+                    agent.cancel_job(job["id"])
+                    st.rerun()
+
+# Re-render only the job list every few seconds (fragments need Streamlit 1.37+)
+if hasattr(st, "fragment"):
+    render_jobs = st.fragment(run_every=2 * Config.JOB_POLL_SECONDS)(render_jobs)
+
 # ---------- Stats ----------
 if mode == "stats":
     st.subheader("📊 Knowledge Base Stats")
-    stats = agent.get_stats()
+    stats = agent.get_stats(session_id=st.session_state.get("session_id"))
     st.json(stats)
 
+    st.subheader("🧰 Maintenance")
+    snapshot_path = st.text_input("Snapshot directory", value=str(Config.DATA_DIR / "snapshot"))
+    if st.button("Export snapshot"):
+        job_id = agent.submit_job("export", {"path": snapshot_path})
+        st.info(f"Queued export as job #{job_id}")
+    if agent.vector_store.needs_migration and st.button(
+            f"Re-embed with {agent.vector_store.target_embedding_model}"):
+        job_id = agent.submit_job("migrate")
+        st.info(f"Queued re-embedding as job #{job_id}")
+
+    st.subheader("⏳ Background Jobs")
+    if not hasattr(st, "fragment"):
+        st.button("Refresh")
+    render_jobs()
+
 # ---------- Add ----------
 elif mode == "add":
     st.subheader("➕ Add to Knowledge Base")
@@ -98,26 +171,85 @@ elif mode == "add":
         text = None
 
         if uploaded_file:
-            text = uploaded_file.read().decode("utf-8")
-        elif input_type == "voice":
-            with st.spinner("🎤 Listening..."):
-                text = voice_search()
-        else:
-            text = text_input
-
-        if not text:
-            st.error("No input provided")
+            # The upload is copied to disk and ingested by a background job, so the page stays responsive
+            job_id = agent.submit_file_job(
+                uploaded_file,
+                source=source,
+                metadata={"input_type": input_type, "file": uploaded_file.name}
+            )
+            st.info(f"Queued {uploaded_file.name} as job #{job_id}")
         else:
-            with st.spinner("Adding to knowledge base..."):
-                doc_ids = agent.add_to_knowledge_base(
-                    text,
-                    source=source,
-                    metadata={
+            if input_type == "voice":
+                with st.spinner("🎤 Listening..."):
+                    text = voice_search()
+            else:
+                text = text_input
+
+            if not text:
+                st.error("No input provided")
+            else:
+                job_id = agent.submit_job("add_text", {
+                    "text": text,
+                    "source": source,
+                    "metadata": {
                         "input_type": input_type,
-                        "file": uploaded_file.name if uploaded_file else None
+                        "file": None
                     }
-                )
-            st.success(f"Added {len(doc_ids)} chunks")
+                })
+                st.info(f"Queued as job #{job_id}")
+
+    st.subheader("⏳ Background Jobs")
+    if not hasattr(st, "fragment"):
+        st.button("Refresh")
+    render_jobs()
+
+# ---------- Reminders ----------
+elif mode == "reminders":
+    st.subheader("⏰ Reminders")
+
+    status = st.selectbox("Show", ["pending", "fired", "cancelled", "past", "all"])
+    snooze_minutes = st.number_input("Snooze minutes", min_value=1,
+                                     value=Config.REMINDER_SNOOZE_MINUTES)
+    events = agent.list_reminders(None if status == "all" else status, limit=100)
+
+    if not events:
+        st.info("No reminders.")
+    for event in events:
+        col_title, col_snooze, col_cancel = st.columns([6, 1, 1])
+        with col_title:
+            st.markdown(
+                f"**{event['title']}**  \n"
+                f"Due {event['due_at'].replace('T', ' ')} · remind {event['remind_at'].replace('T', ' ')}"
+                f" · {event['status']}"
+            )
+        if event["status"] in ("pending", "fired"):
+            with col_snooze:
+                if st.button("Snooze", key=f"snooze_{event['id']}"):
+                    agent.snooze_reminder(event["id"], snooze_minutes)
+                    st.rerun()
+            with col_cancel:
+                if st.button("Cancel", key=f"cancel_{event['id']}"):
+                    agent.cancel_reminder(event["id"])
+                    st.rerun()
+
+    st.subheader("🔁 Predicted")
+    predictions = agent.predict_reminders()
+    if not predictions:
+        st.info("No recurring events detected yet.")
+    for prediction in predictions:
+        col_title, col_accept = st.columns([6, 2])
+        with col_title:
+            st.markdown(
+                f"**{prediction['title']}**  \n"
+                f"Next {prediction['next_due'].replace('T', ' ')} · seen {prediction['occurrences']}x"
+                f" · confidence {prediction['confidence']:.2f}"
+            )
+        with col_accept:
+            if st.button("Add reminder", key=f"accept_{prediction['topic']}"):
+                if agent.accept_prediction(prediction["topic"]):
+                    st.success("Reminder added")
+                else:
+                    st.info("Reminder already added")
 
 # ---------- Query ----------
 elif mode == "query":
@@ -148,7 +280,7 @@ elif mode == "chat":
     st.subheader("💬 Chat")
 
     if "session_id" not in st.session_state:
-        st.session_state.session_id = agent.start_session(
+        st.session_state.session_id = agent.create_session(
             {"mode": "chat", "input_type": input_type}
         )
 
@@ -175,7 +307,10 @@ elif mode == "chat":
                 st.markdown(user_input)
 
             with st.spinner("Thinking..."):
-                response = agent.chat(user_input)
+                response = agent.chat(
+                    user_input,
+                    session_id=st.session_state.session_id
+                )
 
             st.session_state.messages.append(
                 {"role": "assistant", "content": response}
@@ -0,0 +1,2 @@
+# benchmarks package
+# Offline benchmark and load-testing tools; see benchmarks/run_benchmarks.py.
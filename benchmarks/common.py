@@ -0,0 +1,58 @@
+# benchmarks/common.py
+"""Helpers shared by the benchmark and load-test tools"""
+import os
+import random
+from contextlib import contextmanager, redirect_stdout
+from typing import Dict, Iterator, List
+
+# Small fixed vocabulary so synthetic text is cheap to generate and repeats words
+VOCABULARY = (
+    "rent payment bill electricity water meeting project deadline doctor appointment "
+    "birthday party flight hotel booking invoice salary bank account insurance policy "
+    "car service gym membership subscription renewal exam schedule lecture notes "
+    "python model training dataset server backup password router network office "
+    "monday tuesday wednesday thursday friday weekend morning evening january march "
+    "july october december week month year today tomorrow reminder call email report"
+).split()
+
+
+def synthetic_text(words: int, rng: random.Random) -> str:
+    return ' '.join(rng.choices(VOCABULARY, k=words))
+
+
+def synthetic_documents(total_chunks: int, chunks_per_doc: int, chunk_size: int,
+                        chunk_overlap: int, rng: random.Random) -> Iterator[str]:
+    """Yield documents that TextProcessor splits into exactly `total_chunks` chunks overall"""
+    step = chunk_size - chunk_overlap
+    remaining = total_chunks
+    while remaining > 0:
+        chunks = min(chunks_per_doc, remaining)
+        # `step * chunks` words produce exactly `chunks` overlapping chunks
+        yield synthetic_text(step * chunks, rng)
+        remaining -= chunks
+
+
+def latency_summary(samples: List[float]) -> Dict:
+    """Milliseconds summary of a list of durations in seconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(pick(0.50), 3),
+        'p90_ms': round(pick(0.90), 3),
+        'p99_ms': round(pick(0.99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+@contextmanager
+def quiet():
+    """Swallow the progress prints of the agent and stores while timing them"""
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
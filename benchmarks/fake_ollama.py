@@ -0,0 +1,217 @@
+# benchmarks/fake_ollama.py
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks and tests without models.
+
+Embeddings are deterministic hashed bag-of-words vectors, so texts sharing words
+are close in cosine space; generations are canned. Latency can be injected per
+endpoint to model a real server. Generations requested with "stream": true are
+sent word by word as NDJSON, the generation latency spread over the words.
+
+Run standalone:  python -m benchmarks.fake_ollama --port 11435
+then point the app at it:  OLLAMA_BASE_URL=http://127.0.0.1:11435 python main.py ...
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+DEFAULT_DIMENSIONS = 384
+
+# Canned replies keyed by a phrase found in the prompt; first match wins
+CANNED_RESPONSES = [
+    ('intent detection assistant',
+     '{"is_update": false, "topic": "", "reason": "fake server treats input as new"}'),
+    ('query enhancement assistant', None),  # echo the original query back
+    ('summarization assistant', 'The user and the assistant discussed several topics.'),
+    ('knowledge merge assistant', None),
+    ('date extraction assistant', '[]'),
+]
+DEFAULT_RESPONSE = 'This is a canned response from the fake Ollama server.'
+
+
+def fake_embedding(text: str, dimensions: int = DEFAULT_DIMENSIONS) -> List[float]:
+    """Deterministic unit vector from hashed word counts (similar words -> similar vectors)"""
+    vector = [0.0] * dimensions
+    for word in re.findall(r'\w+', text.lower()):
+        digest = hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], 'little') % dimensions
+        sign = 1.0 if digest[4] & 1 else -1.0
+        vector[bucket] += sign
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return [value / norm for value in vector]
+
+
+def fake_generation(prompt: str, default: str = DEFAULT_RESPONSE) -> str:
+    lowered = prompt.lower()
+    for phrase, response in CANNED_RESPONSES:
+        if phrase in lowered:
+            if response is None:
+                # Echo the quoted user text so rewrite steps stay meaningful
+                match = re.search(r'"([^"]+)"', prompt)
+                return match.group(1) if match else default
+            return response
+    return default
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionResetError:
+            pass  # a client dropped a kept-alive connection (e.g. after a cancelled stream)
+
+    def _send_json(self, payload: Dict, status: int = 200):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_generation(self, response: str, final: Dict):
+        """Send the response word by word as chunked NDJSON, ending with the metrics line"""
+        words = re.findall(r'\S+\s*', response)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        lines = [{'model': final['model'], 'response': word, 'done': False} for word in words]
+        lines.append(dict(final, response=''))
+        try:
+            for line in lines:
+                time.sleep(self.server.generate_latency / max(len(words), 1))
+                data = (json.dumps(line) + "\n").encode('utf-8')
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (cancelled generation)
+            self.close_connection = True
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._send_json({'models': [{'name': 'fake'}]})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server.count(self.path)
+
+        model = body.get('model')
+        if model in server.missing_models:
+            self._send_json({'error': f"model '{model}' not found"}, 404)
+            return
+        if self.path == '/api/embeddings':
+            time.sleep(server.embed_latency)
+            self._send_json({
+                'embedding': fake_embedding(body.get('prompt', ''), server.dimensions),
+                'total_duration': int(server.embed_latency * 1e9)
+            })
+        elif self.path == '/api/embed':
+            inputs = body.get('input', [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            time.sleep(server.embed_latency + server.embed_latency_per_item * len(inputs))
+            self._send_json({
+                'embeddings': [fake_embedding(text, server.dimensions) for text in inputs],
+                'total_duration': int(server.embed_latency * 1e9),
+                'prompt_eval_count': sum(len(text.split()) for text in inputs)
+            })
+        elif self.path == '/api/generate':
+            prompt = body.get('prompt', '')
+            response = fake_generation(prompt, server.default_response)
+            final = {
+                'model': body.get('model', 'fake'),
+                'response': response,
+                'done': True,
+                'total_duration': int(server.generate_latency * 1e9),
+                'load_duration': 0,
+                'prompt_eval_count': len(prompt.split()),
+                'prompt_eval_duration': int(server.generate_latency * 0.2e9),
+                'eval_count': len(response.split()),
+                'eval_duration': int(server.generate_latency * 0.8e9)
+            }
+            if body.get('stream'):
+                self._stream_generation(response, final)
+                return
+            time.sleep(server.generate_latency)
+            self._send_json(final)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Threaded fake Ollama server; `start()` serves in the background and returns the base URL"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, dimensions: int = DEFAULT_DIMENSIONS,
+                 embed_latency_ms: float = 0.0, embed_latency_per_item_ms: float = 0.0,
+                 generate_latency_ms: float = 0.0):
+        super().__init__((host, port), _Handler)
+        self.dimensions = dimensions
+        self.embed_latency = embed_latency_ms / 1000.0
+        self.embed_latency_per_item = embed_latency_per_item_ms / 1000.0
+        self.generate_latency = generate_latency_ms / 1000.0
+        self.default_response = DEFAULT_RESPONSE  # reply to prompts no canned phrase matches
+        self.missing_models = set()  # models answered with Ollama's 404 "model not found"
+        self.request_counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path: str):
+        with self._counts_lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Ollama server for offline benchmarks')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0)
+    parser.add_argument('--generate-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.dimensions,
+                              embed_latency_ms=args.embed_latency_ms,
+                              generate_latency_ms=args.generate_latency_ms)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+# benchmarks/load_test.py
+"""
+Concurrent end-to-end load generator for chat and query.
+
+Virtual users run session scripts (create a session, then a sequence of query/chat
+steps with think times) either in-process against a shared PersonalAgent or over
+HTTP against api_server.py. Two arrival models:
+  closed loop:  --users N            N users run scripts back to back
+  open loop:    --arrival-rate R     new sessions arrive as a Poisson process (R per second)
+
+Reports throughput, latency percentiles and error rate per operation, and (in-process)
+the per-stage breakdown from the tracer: sqlite, Chroma and Ollama contention show up
+as growing session.*, vector_store.* and ollama.* spans.
+
+Usage:
+  python -m benchmarks.load_test --users 16 --duration 60
+  python -m benchmarks.load_test --arrival-rate 5 --duration 60 --generate-latency-ms 300
+  python -m benchmarks.load_test --users 8 --target http://127.0.0.1:8765
+"""
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from config import Config
+from benchmarks.common import latency_summary, quiet, synthetic_documents, synthetic_text
+from benchmarks.fake_ollama import FakeOllamaServer
+
+# A session script: (operation, words in the message, think time in seconds)
+DEFAULT_SCRIPT = [
+    ('query', 8, 0.5),
+    ('chat', 12, 1.0),
+    ('chat', 6, 1.0),
+    ('chat', 10, 0.5),
+    ('query', 8, 0.0),
+]
+
+
+class Recorder:
+    """Thread-safe collection of per-operation latencies and errors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.queue_delays: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.error_samples: List[str] = []
+
+    def record(self, operation: str, seconds: float, error: Exception = None):
+        with self._lock:
+            if error is None:
+                self.latencies.setdefault(operation, []).append(seconds)
+            else:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+                if len(self.error_samples) < 10:
+                    self.error_samples.append(f"{operation}: {error}")
+
+    def record_queue_delay(self, seconds: float):
+        with self._lock:
+            self.queue_delays.append(seconds)
+
+
+class InProcessClient:
+    """Drives a shared PersonalAgent directly from worker threads"""
+
+    def __init__(self, agent):
+        self.agent = agent
+
+    def new_session(self) -> str:
+        return self.agent.create_session({'mode': 'load_test'})
+
+    def query(self, session_id: str, text: str):
+        self.agent.query(text, session_id=session_id)
+
+    def chat(self, session_id: str, text: str):
+        response = self.agent.chat(text, session_id=session_id)
+        if response.startswith('I encountered an error'):
+            raise Exception(response)
+
+
+class HTTPClient:
+    """Drives a running api_server.py"""
+
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _post(self, path: str, body: Dict) -> Dict:
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise Exception(f"HTTP {e.code}: {e.read().decode('utf-8', 'replace')}")
+
+    def new_session(self) -> str:
+        return self._post('/sessions', {'metadata': {'mode': 'load_test'}})['session_id']
+
+    def query(self, session_id: str, text: str):
+        self._post('/query', {'question': text, 'session_id': session_id})
+
+    def chat(self, session_id: str, text: str):
+        self._post('/chat', {'message': text, 'session_id': session_id})
+
+
+def run_session(client, script, rng: random.Random, recorder: Recorder, deadline: float,
+                think_scale: float):
+    """Run one scripted session, stopping early at the deadline"""
+    start = time.perf_counter()
+    try:
+        session_id = client.new_session()
+        recorder.record('session', time.perf_counter() - start)
+    except Exception as e:
+        recorder.record('session', time.perf_counter() - start, e)
+        return
+
+    for operation, words, think_time in script:
+        if time.perf_counter() >= deadline:
+            return
+        text = synthetic_text(words, rng)
+        start = time.perf_counter()
+        try:
+            getattr(client, operation)(session_id, text)
+            recorder.record(operation, time.perf_counter() - start)
+        except Exception as e:
+            recorder.record(operation, time.perf_counter() - start, e)
+        if think_time and think_scale:
+            time.sleep(rng.expovariate(1.0 / (think_time * think_scale)))
+
+
+def run_closed_loop(client, script, users: int, duration: float, seed: int,
+                    recorder: Recorder, think_scale: float):
+    deadline = time.perf_counter() + duration
+
+    def user(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            run_session(client, script, rng, recorder, deadline, think_scale)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def run_open_loop(client, script, rate: float, duration: float, seed: int, recorder: Recorder,
+                  max_concurrency: int, think_scale: float):
+    arrivals = random.Random(seed)
+    deadline = time.perf_counter() + duration
+
+    def session(arrived_at: float, session_seed: int):
+        # Time spent waiting for a free worker is part of what users experience
+        recorder.record_queue_delay(time.perf_counter() - arrived_at)
+        run_session(client, script, random.Random(session_seed), recorder, deadline, think_scale)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        next_arrival = time.perf_counter()
+        count = 0
+        while True:
+            next_arrival += arrivals.expovariate(rate)
+            if next_arrival >= deadline:
+                break
+            time.sleep(max(next_arrival - time.perf_counter(), 0))
+            count += 1
+            pool.submit(session, time.perf_counter(), seed + count)
+
+
+def build_report(recorder: Recorder, elapsed: float, stage_snapshot: Dict = None) -> Dict:
+    operations = {}
+    total_ok = total_errors = 0
+    for operation in sorted(set(recorder.latencies) | set(recorder.errors)):
+        ok = len(recorder.latencies.get(operation, []))
+        errors = recorder.errors.get(operation, 0)
+        total_ok += ok
+        total_errors += errors
+        operations[operation] = dict(
+            latency_summary(recorder.latencies.get(operation, [])),
+            errors=errors,
+            error_rate=round(errors / (ok + errors), 4) if ok + errors else 0.0,
+            throughput_per_second=round(ok / elapsed, 3) if elapsed else 0.0
+        )
+
+    report = {
+        'elapsed_seconds': round(elapsed, 3),
+        'completed': total_ok,
+        'errors': total_errors,
+        'error_rate': round(total_errors / (total_ok + total_errors), 4) if total_ok + total_errors else 0.0,
+        'throughput_per_second': round(total_ok / elapsed, 3) if elapsed else 0.0,
+        'operations': operations,
+        'error_samples': recorder.error_samples
+    }
+    if recorder.queue_delays:
+        report['queue_delay'] = latency_summary(recorder.queue_delays)
+    if stage_snapshot:
+        report['stages'] = stage_snapshot['spans']
+        report['ollama'] = stage_snapshot['ollama']
+    return report
+
+
+def print_report(report: Dict):
+    out = sys.stderr
+    print("\n=== Load Test Report ===", file=out)
+    print(f"elapsed: {report['elapsed_seconds']}s  completed: {report['completed']}  "
+          f"errors: {report['errors']} ({report['error_rate'] * 100:.2f}%)  "
+          f"throughput: {report['throughput_per_second']}/s", file=out)
+    print(f"\n{'operation':<12}{'count':>8}{'ops/s':>9}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}{'errors':>8}",
+          file=out)
+    for name, op in report['operations'].items():
+        if not op.get('count'):
+            print(f"{name:<12}{0:>8}{0:>9}{'-':>10}{'-':>10}{'-':>10}{'-':>10}{op['errors']:>8}", file=out)
+            continue
+        print(f"{name:<12}{op['count']:>8}{op['throughput_per_second']:>9}{op['p50_ms']:>10.1f}"
+              f"{op['p90_ms']:>10.1f}{op['p99_ms']:>10.1f}{op['max_ms']:>10.1f}{op['errors']:>8}", file=out)
+    if 'queue_delay' in report:
+        print(f"\nqueue delay: p50 {report['queue_delay']['p50_ms']} ms, "
+              f"p99 {report['queue_delay']['p99_ms']} ms", file=out)
+    if report.get('stages'):
+        print(f"\n{'stage':<40}{'count':>8}{'mean':>10}{'p95':>10}{'total s':>10}", file=out)
+        for name, span in report['stages'].items():
+            print(f"{name:<40}{span['count']:>8}{span['mean_ms']:>10.1f}{span['p95_ms']:>10.1f}"
+                  f"{span['total_ms'] / 1000:>10.1f}", file=out)
+    for sample in report['error_samples']:
+        print(f"  error: {sample}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent load generator for chat and query')
+    parser.add_argument('--users', type=int, default=8, help='Closed-loop concurrent users')
+    parser.add_argument('--arrival-rate', type=float, default=None,
+                       help='Open-loop session arrivals per second (overrides --users)')
+    parser.add_argument('--max-concurrency', type=int, default=64,
+                       help='Worker threads for open-loop sessions')
+    parser.add_argument('--duration', type=float, default=30.0, help='Test length in seconds')
+    parser.add_argument('--think-scale', type=float, default=1.0,
+                       help='Multiplier for think times in the script (0 disables them)')
+    parser.add_argument('--script', type=str, default=None,
+                       help='JSON list of [operation, words, think_seconds] steps')
+    parser.add_argument('--target', type=str, default=None,
+                       help='Base URL of a running api_server.py (default: in-process agent)')
+    parser.add_argument('--ollama-url', type=str, default=None,
+                       help='Real Ollama server for in-process runs (default: fake server)')
+    parser.add_argument('--embed-latency-ms', type=float, default=5.0)
+    parser.add_argument('--generate-latency-ms', type=float, default=200.0)
+    parser.add_argument('--seed-chunks', type=int, default=1000,
+                       help='Chunks ingested before the test (in-process only)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', type=str, default=None,
+                       help='Directory for databases (default: temporary)')
+    parser.add_argument('--output', type=str, default=None, help='Write the report as JSON')
+    args = parser.parse_args()
+
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script = [tuple(step) for step in json.load(f)]
+
+    fake_server = None
+    workdir = None
+    tracer = None
+    try:
+        if args.target:
+            client = HTTPClient(args.target)
+        else:
+            if args.ollama_url:
+                Config.OLLAMA_BASE_URL = args.ollama_url
+            else:
+                fake_server = FakeOllamaServer(embed_latency_ms=args.embed_latency_ms,
+                                               generate_latency_ms=args.generate_latency_ms)
+                Config.OLLAMA_BASE_URL = fake_server.start()
+
+            from database.vector_store import VectorStore
+            from database.session_manager import SessionManager
+            from agent.personal_agent import PersonalAgent
+            from helper.tracing import tracer
+
+            workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='pa-load-'))
+            workdir.mkdir(parents=True, exist_ok=True)
+            # Synthetic turns must not end up in the user's router decision log
+            Config.ROUTER_LOG_PATH = None
+            with quiet():
+                store = VectorStore(str(workdir / 'vector_store'))
+                agent = PersonalAgent(store, SessionManager(str(workdir / 'metadata.db')),
+                                      llm_model=Config.LLM_MODEL if args.ollama_url else 'fake')
+                if store.collection.count() == 0 and args.seed_chunks:
+                    print(f"Seeding {args.seed_chunks} chunks...", file=sys.stderr)
+                    for document in synthetic_documents(args.seed_chunks, 100, Config.CHUNK_SIZE,
+                                                        Config.CHUNK_OVERLAP, random.Random(args.seed)):
+                        agent.add_to_knowledge_base(document, source='load_test')
+            client = InProcessClient(agent)
+            tracer.reset()
+
+        recorder = Recorder()
+        mode = (f"open loop, {args.arrival_rate} sessions/s" if args.arrival_rate
+                else f"closed loop, {args.users} users")
+        print(f"Running load test ({mode}) for {args.duration}s...", file=sys.stderr)
+
+        start = time.perf_counter()
+        # The agent prints progress for every call; keep the terminal for the report
+        with quiet():
+            if args.arrival_rate:
+                run_open_loop(client, script, args.arrival_rate, args.duration, args.seed,
+                              recorder, args.max_concurrency, args.think_scale)
+            else:
+                run_closed_loop(client, script, args.users, args.duration, args.seed,
+                                recorder, args.think_scale)
+        elapsed = time.perf_counter() - start
+
+        report = build_report(recorder, elapsed, tracer.snapshot() if tracer else None)
+        report['config'] = {
+            'mode': mode,
+            'duration': args.duration,
+            'target': args.target or 'in-process',
+            'ollama': args.ollama_url or ('fake' if fake_server else 'api server'),
+            'embed_latency_ms': args.embed_latency_ms if fake_server else None,
+            'generate_latency_ms': args.generate_latency_ms if fake_server else None
+        }
+        print_report(report)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"\nReport written to {args.output}", file=sys.stderr)
+    finally:
+        if fake_server:
+            fake_server.stop()
+        if workdir and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
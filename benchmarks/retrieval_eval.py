@@ -0,0 +1,319 @@
+# benchmarks/retrieval_eval.py
+"""
+Retrieval quality vs latency, and the HNSW settings that trade one for the other.
+
+For every chunking (chunk size, overlap) of a labeled corpus, and every HNSW index
+(M, construction_ef) built over it, each search_ef is measured by:
+  - recall@k and MRR of the labeled relevant documents among the top k chunks
+  - ANN recall@k: overlap of the index's top k chunks with an exact brute-force search
+  - query latency of the Chroma collection (p50/p99) and the index build time
+An exact row per chunking gives the quality ceiling of the embeddings themselves. The
+report recommends the fastest settings whose ANN recall reaches --min-ann-recall and
+whose recall@k is within --tolerance of the best; set them in Config.
+
+Dataset (JSON): {"documents": [{"id": "...", "text": "..."}],
+                 "queries": [{"query": "...", "relevant": ["document id", ...]}]}
+A document may give "path" (relative to the dataset file) instead of "text".
+
+Usage:
+  python -m benchmarks.retrieval_eval --synthetic 2000 --output retrieval_eval.json
+  python -m benchmarks.retrieval_eval --dataset labeled.json --ollama-url http://localhost:11434 \\
+      --m 8,16,32 --construction-ef 64,100,200 --search-ef 10,20,50,100 --chunking 200:20,500:50
+"""
+import argparse
+import itertools
+import json
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from config import Config
+from benchmarks.common import VOCABULARY, latency_summary, quiet, synthetic_text
+
+
+def load_dataset(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        dataset = json.load(f)
+    base = Path(path).parent
+    for document in dataset['documents']:
+        if 'text' not in document:
+            document['text'] = (base / document['path']).read_text(encoding='utf-8')
+    return dataset
+
+
+def synthetic_dataset(documents: int, queries: int, rng: random.Random, words: int = 600) -> Dict:
+    """
+    Documents of random vocabulary words, one in twenty of them the document's own, and
+    queries made of words from one passage of a document (which is the relevant one),
+    favouring the document's own words as a person would recall the distinctive ones.
+    """
+    docs = []
+    for i in range(documents):
+        text = synthetic_text(words, rng).split()
+        for position in rng.sample(range(len(text)), len(text) // 20):
+            text[position] = f"{rng.choice(VOCABULARY)}{i}"
+        docs.append({'id': f"doc-{i}", 'text': ' '.join(text)})
+    labeled = []
+    for _ in range(queries):
+        document = rng.choice(docs)
+        text = document['text'].split()
+        start = rng.randrange(len(text) - 60)
+        passage = text[start:start + 60]
+        own = [word for word in passage if word[-1].isdigit()][:3]
+        common = rng.sample([word for word in passage if not word[-1].isdigit()], 8 - len(own))
+        labeled.append({'query': ' '.join(own + common), 'relevant': [document['id']]})
+    return {'documents': docs, 'queries': labeled}
+
+
+def chunk_dataset(dataset: Dict, chunk_size: int, chunk_overlap: int) -> Tuple[List[str], List[str]]:
+    """Chunk texts and the ID of the document each came from, chunked as ingestion does"""
+    from processing.text_processor import TextProcessor
+
+    processor = TextProcessor(chunk_size, chunk_overlap)
+    texts, doc_ids = [], []
+    for document in dataset['documents']:
+        for chunk in processor.chunk_text(document['text']):
+            texts.append(chunk)
+            doc_ids.append(document['id'])
+    return texts, doc_ids
+
+
+def embed_all(embed: Callable[[List[str]], List[List[float]]], texts: List[str], batch_size: int = 64):
+    import numpy as np
+
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embed(texts[start:start + batch_size]))
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def exact_top_k(chunk_matrix, query_matrix, k: int) -> List[List[int]]:
+    """Brute-force cosine top k chunk indexes per query (rows are unit vectors)"""
+    import numpy as np
+
+    scores = query_matrix @ chunk_matrix.T
+    k = min(k, chunk_matrix.shape[0])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1).tolist()
+
+
+def quality(ranked_chunks: List[List[int]], doc_ids: List[str], queries: List[Dict]) -> Dict:
+    """Recall@k and MRR of the relevant documents, counting each document at its best chunk"""
+    recalls, reciprocal_ranks = [], []
+    for chunks, query in zip(ranked_chunks, queries):
+        ranked_docs = list(dict.fromkeys(doc_ids[i] for i in chunks))
+        relevant = set(query['relevant'])
+        recalls.append(len(relevant.intersection(ranked_docs)) / len(relevant))
+        rank = next((position for position, doc in enumerate(ranked_docs, 1) if doc in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {'recall_at_k': round(sum(recalls) / len(recalls), 4),
+            'mrr': round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4)}
+
+
+def ann_recall(ranked_chunks: List[List[int]], exact: List[List[int]]) -> float:
+    overlaps = [len(set(found) & set(truth)) / len(truth) for found, truth in zip(ranked_chunks, exact) if truth]
+    return round(sum(overlaps) / len(overlaps), 4)
+
+
+def build_index(client, name: str, chunk_matrix, m: int, construction_ef: int):
+    from database.vector_store import hnsw_metadata
+
+    collection = client.create_collection(name=name, metadata=hnsw_metadata(m, construction_ef))
+    batch = client.get_max_batch_size() if hasattr(client, 'get_max_batch_size') else 5000
+    start = time.perf_counter()
+    for offset in range(0, chunk_matrix.shape[0], batch):
+        rows = chunk_matrix[offset:offset + batch]
+        collection.add(ids=[str(i) for i in range(offset, offset + len(rows))], embeddings=rows.tolist())
+    return collection, time.perf_counter() - start
+
+
+def open_client(workdir: str):
+    """A fresh client: Chroma applies search_ef when it loads an index, so each setting needs a reload"""
+    import chromadb
+    from chromadb.config import Settings
+
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except ImportError:
+        pass
+    return chromadb.PersistentClient(path=workdir, settings=Settings(anonymized_telemetry=False))
+
+
+def search_index(collection, query_matrix, k: int) -> Tuple[List[List[int]], List[float]]:
+    # The first query loads the index; it is not timed
+    collection.query(query_embeddings=[query_matrix[0].tolist()], n_results=k, include=[])
+    ranked, samples = [], []
+    for vector in query_matrix.tolist():
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[vector], n_results=k, include=[])
+        samples.append(time.perf_counter() - start)
+        ranked.append([int(i) for i in result['ids'][0]])
+    return ranked, samples
+
+
+def evaluate(dataset: Dict, embed: Callable[[List[str]], List[List[float]]], workdir: str,
+             chunkings: List[Tuple[int, int]] = None, m_values: List[int] = None,
+             construction_efs: List[int] = None, search_efs: List[int] = None, k: int = None) -> Dict:
+    """Measure every combination of the grid; a missing list sweeps only the configured value"""
+    from database.vector_store import set_search_ef
+
+    chunkings = chunkings or [(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)]
+    m_values = m_values or [Config.HNSW_M]
+    construction_efs = construction_efs or [Config.HNSW_CONSTRUCTION_EF]
+    search_efs = search_efs or [Config.HNSW_SEARCH_EF]
+    k = k or Config.MAX_CONTEXT_CHUNKS
+    queries = dataset['queries']
+    query_matrix = embed_all(embed, [query['query'] for query in queries])
+
+    client = open_client(workdir)
+    exact_rows, rows = [], []
+    for chunk_size, chunk_overlap in chunkings:
+        texts, doc_ids = chunk_dataset(dataset, chunk_size, chunk_overlap)
+        print(f"Chunking {chunk_size}/{chunk_overlap}: embedding {len(texts)} chunks...")
+        chunk_matrix = embed_all(embed, texts)
+        start = time.perf_counter()
+        exact = exact_top_k(chunk_matrix, query_matrix, k)
+        exact_seconds = (time.perf_counter() - start) / len(queries)
+        exact_rows.append({'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap, 'chunks': len(texts),
+                           'mean_query_ms': round(exact_seconds * 1000, 3),
+                           **quality(exact, doc_ids, queries)})
+
+        for m, construction_ef in itertools.product(m_values, construction_efs):
+            name = f"eval-{chunk_size}-{chunk_overlap}-{m}-{construction_ef}"
+            with quiet():
+                _, build_seconds = build_index(client, name, chunk_matrix, m, construction_ef)
+            for search_ef in search_efs:
+                client = open_client(workdir)
+                collection = client.get_collection(name)
+                set_search_ef(collection, search_ef)
+                ranked, samples = search_index(collection, query_matrix, k)
+                row = {'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap, 'm': m,
+                       'construction_ef': construction_ef, 'search_ef': search_ef,
+                       'build_seconds': round(build_seconds, 3), 'ann_recall': ann_recall(ranked, exact),
+                       **quality(ranked, doc_ids, queries), 'latency': latency_summary(samples)}
+                rows.append(row)
+                print(f"  M={m} construction_ef={construction_ef} search_ef={search_ef}: "
+                      f"recall@{k} {row['recall_at_k']}, ANN recall {row['ann_recall']}, "
+                      f"p50 {row['latency']['p50_ms']} ms")
+            client.delete_collection(name)
+    return {'k': k, 'queries': len(queries), 'documents': len(dataset['documents']),
+            'exact': exact_rows, 'results': rows}
+
+
+def recommend(report: Dict, min_ann_recall: float = 0.95, tolerance: float = 0.01) -> Dict:
+    """
+    The lowest-latency row whose ANN recall reaches `min_ann_recall` and whose recall@k is
+    within `tolerance` of the best such row (ties: cheaper index). None if no row qualifies.
+    """
+    eligible = [row for row in report['results'] if row['ann_recall'] >= min_ann_recall]
+    if not eligible:
+        return None
+    best = max(row['recall_at_k'] for row in eligible)
+    close = [row for row in eligible if row['recall_at_k'] >= best - tolerance]
+    choice = min(close, key=lambda row: (row['latency']['p50_ms'], row['m'], row['construction_ef'],
+                                         row['search_ef']))
+    ceiling = next(row for row in report['exact'] if (row['chunk_size'], row['chunk_overlap'])
+                   == (choice['chunk_size'], choice['chunk_overlap']))
+    return {
+        'settings': {'CHUNK_SIZE': choice['chunk_size'], 'CHUNK_OVERLAP': choice['chunk_overlap'],
+                     'HNSW_M': choice['m'], 'HNSW_CONSTRUCTION_EF': choice['construction_ef'],
+                     'HNSW_SEARCH_EF': choice['search_ef']},
+        'recall_at_k': choice['recall_at_k'],
+        'mrr': choice['mrr'],
+        'ann_recall': choice['ann_recall'],
+        'p50_ms': choice['latency']['p50_ms'],
+        # Recall lost to the approximate index rather than to the embeddings/chunking
+        'recall_lost_to_index': round(ceiling['recall_at_k'] - choice['recall_at_k'], 4)
+    }
+
+
+def print_report(report: Dict):
+    k = report['k']
+    print(f"\n=== Exact search (quality ceiling), k={k} ===")
+    for row in report['exact']:
+        print(f"  chunks {row['chunk_size']}/{row['chunk_overlap']:<4} recall@{k} {row['recall_at_k']:.3f}  "
+              f"MRR {row['mrr']:.3f}  {row['mean_query_ms']} ms/query ({row['chunks']} chunks)")
+    print("\n=== HNSW ===")
+    print(f"  {'chunks':>9} {'M':>4} {'c_ef':>5} {'s_ef':>5} {'recall':>7} {'MRR':>6} {'ANN':>6} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    for row in report['results']:
+        print(f"  {row['chunk_size']:>5}/{row['chunk_overlap']:<3} {row['m']:>4} {row['construction_ef']:>5} "
+              f"{row['search_ef']:>5} {row['recall_at_k']:>7.3f} {row['mrr']:>6.3f} {row['ann_recall']:>6.3f} "
+              f"{row['latency']['p50_ms']:>8} {row['latency']['p99_ms']:>8} {row['build_seconds']:>8}")
+    recommendation = report.get('recommendation')
+    if recommendation is None:
+        print("\nNo setting reached the required ANN recall; sweep larger search_ef / M values.")
+        return
+    print(f"\nRecommended (recall@{k} {recommendation['recall_at_k']}, ANN recall "
+          f"{recommendation['ann_recall']}, p50 {recommendation['p50_ms']} ms; "
+          f"{recommendation['recall_lost_to_index']} recall lost to the index). In config.py:")
+    for key, value in recommendation['settings'].items():
+        print(f"    {key} = {value}")
+
+
+def _ints(value: str) -> List[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Retrieval quality vs latency across HNSW settings')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dataset', type=str, help='Labeled dataset (JSON, see module docstring)')
+    source.add_argument('--synthetic', type=int, help='Generate a labeled corpus of this many documents')
+    parser.add_argument('--queries', type=int, default=200, help='Queries of a synthetic dataset')
+    parser.add_argument('--k', type=int, default=Config.MAX_CONTEXT_CHUNKS, help='Chunks retrieved per query')
+    parser.add_argument('--m', type=str, default='8,16,32', help='HNSW M values')
+    parser.add_argument('--construction-ef', type=str, default='64,100,200', help='HNSW construction_ef values')
+    parser.add_argument('--search-ef', type=str, default='10,20,50,100,200', help='HNSW search_ef values')
+    parser.add_argument('--chunking', type=str, default=f"{Config.CHUNK_SIZE}:{Config.CHUNK_OVERLAP}",
+                        help='Comma-separated size:overlap pairs in words (e.g. 200:20,500:50)')
+    parser.add_argument('--min-ann-recall', type=float, default=0.95,
+                        help='Required overlap with exact search for a recommendation')
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='Recall@k below the best that is traded for lower latency')
+    parser.add_argument('--ollama-url', type=str, default=None,
+                        help=f'Embed with {Config.EMBEDDING_MODEL} on this Ollama server (default: offline fake embeddings)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', type=str, default=None, help='Directory for the indexes (default: temporary)')
+    parser.add_argument('--output', type=str, default='retrieval_eval.json')
+    args = parser.parse_args()
+
+    if args.dataset:
+        dataset = load_dataset(args.dataset)
+    else:
+        dataset = synthetic_dataset(args.synthetic, args.queries, random.Random(args.seed))
+
+    if args.ollama_url:
+        from ollama_runner import OllamaClient
+        client = OllamaClient(args.ollama_url)
+        embed = lambda texts: client.embed_batch(Config.EMBEDDING_MODEL, texts)
+    else:
+        from benchmarks.fake_ollama import fake_embedding
+        embed = lambda texts: [fake_embedding(text) for text in texts]
+
+    chunkings = [tuple(int(value) for value in pair.split(':')) for pair in args.chunking.split(',') if pair.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix='pa-retrieval-eval-')
+    try:
+        report = evaluate(dataset, embed, workdir, chunkings=chunkings, m_values=_ints(args.m),
+                          construction_efs=_ints(args.construction_ef), search_efs=_ints(args.search_ef), k=args.k)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report['embedding_model'] = Config.EMBEDDING_MODEL if args.ollama_url else 'fake'
+    report['recommendation'] = recommend(report, args.min_ann_recall, args.tolerance)
+    print_report(report)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# benchmarks/run_benchmarks.py
+"""
+Reproducible offline benchmarks against a local fake Ollama server.
+
+Measures:
+  - ingest throughput of add_to_knowledge_base for each corpus size
+  - VectorStore.search latency (p50/p99) on each ingested corpus
+  - SessionManager write/read latency
+  - end-to-end chat overhead, i.e. chat latency minus time spent inside Ollama calls
+
+Usage:
+  python -m benchmarks.run_benchmarks --sizes 1000,10000,100000,1000000 --output bench.json
+  python -m benchmarks.run_benchmarks --sizes 1000 --compare bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict
+
+from config import Config
+from benchmarks.common import latency_summary, quiet, synthetic_documents, synthetic_text
+from benchmarks.fake_ollama import FakeOllamaServer
+
+# Metrics compared by --compare: (section path, key, higher_is_better)
+COMPARED_METRICS = [
+    (('sessions', 'write'), 'p50_ms', False),
+    (('sessions', 'read'), 'p50_ms', False),
+    (('chat', 'overhead'), 'p50_ms', False),
+]
+
+
+def bench_ingest(size: int, workdir: Path, session_manager, chunks_per_doc: int, rng: random.Random):
+    from database.vector_store import VectorStore
+    from agent.personal_agent import PersonalAgent
+
+    store = VectorStore(str(workdir / f'vector_store_{size}'))
+    agent = PersonalAgent(store, session_manager, llm_model='fake')
+
+    ingested = 0
+    start = time.perf_counter()
+    for document in synthetic_documents(size, chunks_per_doc, Config.CHUNK_SIZE,
+                                        Config.CHUNK_OVERLAP, rng):
+        with quiet():
+            doc_ids = agent.add_to_knowledge_base(document, source='benchmark')
+        ingested += len(doc_ids or [])
+    elapsed = time.perf_counter() - start
+
+    return store, {
+        'chunks': ingested,
+        'seconds': round(elapsed, 3),
+        'chunks_per_second': round(ingested / elapsed, 2) if elapsed else 0.0
+    }
+
+
+def bench_search(store, queries: int, rng: random.Random) -> Dict:
+    samples = []
+    for _ in range(queries):
+        query = synthetic_text(8, rng)
+        start = time.perf_counter()
+        with quiet():
+            store.search(query, n_results=Config.MAX_CONTEXT_CHUNKS)
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def bench_sessions(session_manager, operations: int, rng: random.Random) -> Dict:
+    session_id = 'benchmark-session'
+    with quiet():
+        session_manager.create_session(session_id, {'mode': 'benchmark'})
+
+    writes = []
+    for _ in range(operations):
+        content = synthetic_text(40, rng)
+        start = time.perf_counter()
+        session_manager.add_message(session_id, 'user', content)
+        writes.append(time.perf_counter() - start)
+
+    reads = []
+    for _ in range(operations):
+        start = time.perf_counter()
+        session_manager.get_session_history(session_id, limit=Config.SUMMARY_KEEP_RECENT)
+        reads.append(time.perf_counter() - start)
+
+    return {'write': latency_summary(writes), 'read': latency_summary(reads)}
+
+
+def _ollama_seconds(tracer) -> float:
+    spans = tracer.snapshot()['spans']
+    return sum(span['total_ms'] for name, span in spans.items() if name.startswith('ollama.')) / 1000.0
+
+
+def bench_chat(store, session_manager, turns: int, rng: random.Random) -> Dict:
+    from agent.personal_agent import PersonalAgent
+    from helper.tracing import tracer
+
+    agent = PersonalAgent(store, session_manager, llm_model='fake')
+    with quiet():
+        session_id = agent.create_session({'mode': 'benchmark'})
+
+    totals, overheads = [], []
+    for _ in range(turns):
+        message = synthetic_text(12, rng)
+        tracer.reset()
+        start = time.perf_counter()
+        with quiet():
+            agent.chat(message, session_id=session_id)
+        elapsed = time.perf_counter() - start
+        totals.append(elapsed)
+        overheads.append(max(elapsed - _ollama_seconds(tracer), 0.0))
+
+    return {'total': latency_summary(totals), 'overhead': latency_summary(overheads)}
+
+
+def compare(current: Dict, previous: Dict):
+    """Print relative change of headline metrics between two result files"""
+    print("\n=== Comparison with previous run ===")
+
+    def lookup(results, path, key):
+        node = results
+        for part in path:
+            node = node.get(part, {}) if isinstance(node, dict) else {}
+        return node.get(key) if isinstance(node, dict) else None
+
+    rows = [(path, key, higher) for path, key, higher in COMPARED_METRICS]
+    for size in current.get('ingest', {}):
+        rows.append((('ingest', size), 'chunks_per_second', True))
+        rows.append((('search', size), 'p50_ms', False))
+        rows.append((('search', size), 'p99_ms', False))
+
+    for path, key, higher_is_better in rows:
+        new, old = lookup(current, path, key), lookup(previous, path, key)
+        label = '.'.join(path + (key,))
+        if new is None or old in (None, 0):
+            print(f"  {label:<40} {new!s:>12} (no baseline)")
+            continue
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        verdict = 'better' if better else ('same' if abs(change) < 1 else 'worse')
+        print(f"  {label:<40} {old:>12} -> {new:<12} {change:+6.1f}% {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks with a fake Ollama server')
+    parser.add_argument('--sizes', type=str, default='1000,10000',
+                       help='Comma-separated corpus sizes in chunks (e.g. 1000,10000,100000,1000000)')
+    parser.add_argument('--chunks-per-doc', type=int, default=100,
+                       help='Chunks per ingested document')
+    parser.add_argument('--queries', type=int, default=200, help='Searches per corpus size')
+    parser.add_argument('--session-ops', type=int, default=1000, help='Session writes and reads')
+    parser.add_argument('--chat-turns', type=int, default=50, help='Chat turns to time')
+    parser.add_argument('--embed-latency-ms', type=float, default=0.0,
+                       help='Latency injected into each fake embedding call')
+    parser.add_argument('--generate-latency-ms', type=float, default=0.0,
+                       help='Latency injected into each fake generation')
+    parser.add_argument('--ollama-url', type=str, default=None,
+                       help='Benchmark against this Ollama server instead of the fake one')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', type=str, default=None,
+                       help='Directory for benchmark databases (default: temporary)')
+    parser.add_argument('--output', type=str, default='benchmark_results.json')
+    parser.add_argument('--compare', type=str, default=None,
+                       help='Previous results file to compare against')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    rng = random.Random(args.seed)
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix='pa-bench-'))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    fake_server = None
+    if args.ollama_url:
+        Config.OLLAMA_BASE_URL = args.ollama_url
+    else:
+        fake_server = FakeOllamaServer(embed_latency_ms=args.embed_latency_ms,
+                                       generate_latency_ms=args.generate_latency_ms)
+        Config.OLLAMA_BASE_URL = fake_server.start()
+
+    # Background summarization and memory indexing would overlap with timed turns
+    Config.MEMORY_ENABLED = False
+    Config.SUMMARY_TRIGGER_MESSAGES = sys.maxsize
+    Config.SUMMARY_TRIGGER_TOKENS = sys.maxsize
+    # Synthetic turns must not end up in the user's router decision log
+    Config.ROUTER_LOG_PATH = None
+
+    from database.session_manager import SessionManager
+    session_manager = SessionManager(str(workdir / 'metadata.db'))
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'ollama': args.ollama_url or 'fake',
+            'embed_latency_ms': args.embed_latency_ms,
+            'generate_latency_ms': args.generate_latency_ms,
+            'chunk_size': Config.CHUNK_SIZE,
+            'chunk_overlap': Config.CHUNK_OVERLAP,
+            'seed': args.seed
+        },
+        'ingest': {},
+        'search': {}
+    }
+
+    try:
+        store = None
+        for size in sizes:
+            print(f"Ingesting {size} chunks...")
+            store, ingest = bench_ingest(size, workdir, session_manager, args.chunks_per_doc, rng)
+            results['ingest'][str(size)] = ingest
+            print(f"  {ingest['chunks_per_second']} chunks/s")
+
+            print(f"Searching {size}-chunk corpus ({args.queries} queries)...")
+            results['search'][str(size)] = bench_search(store, args.queries, rng)
+            print(f"  p50 {results['search'][str(size)]['p50_ms']} ms, "
+                  f"p99 {results['search'][str(size)]['p99_ms']} ms")
+
+        print(f"Timing {args.session_ops} session writes and reads...")
+        results['sessions'] = bench_sessions(session_manager, args.session_ops, rng)
+
+        if store is not None:
+            print(f"Timing {args.chat_turns} chat turns...")
+            results['chat'] = bench_chat(store, session_manager, args.chat_turns, rng)
+            print(f"  overhead p50 {results['chat']['overhead']['p50_ms']} ms")
+    finally:
+        if fake_server:
+            results['meta']['fake_server_requests'] = dict(fake_server.request_counts)
+            fake_server.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,7 @@ class Config:
     METADATA_DB_PATH = DATA_DIR / 'metadata.db'
     
     # Ollama settings
-    OLLAMA_BASE_URL = "http://localhost:11434"
+    OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', "http://localhost:11434")
     EMBEDDING_MODEL = 'granite-embedding:30m'
     LLM_MODEL = 'nemotron-3-nano:30b-cloud'  # Cloud model
     
@@ -26,6 +26,171 @@ class Config:
     MAX_CONTEXT_CHUNKS = 10  # Number of related chunks to send to LLM
     TEMPERATURE = 0.7
     
+    # MMR diversification
+    MMR_ENABLED = False  # Diversify retrieved chunks with maximal marginal relevance (overlapping chunks)
+    MMR_LAMBDA = 0.7  # 1.0 = relevance only, 0.0 = diversity only
+    MMR_FETCH_MULTIPLIER = 4  # Candidates fetched per returned chunk
+    
+    # HNSW index of the Chroma collections (tune with `python -m benchmarks.retrieval_eval`).
+    # M and construction_ef are fixed when a collection is created; search_ef is applied on every open.
+    HNSW_M = 16  # Graph neighbours per node: higher = better recall, more memory and slower inserts
+    HNSW_CONSTRUCTION_EF = 100  # Candidate list size while building
+    HNSW_SEARCH_EF = 100  # Candidate list size per query: higher = better recall, slower queries
+    
+    # Sharding: split the knowledge base into one collection per value of this metadata field
+    # (e.g. 'source', 'tenant', or 'timestamp' for time buckets); None keeps one collection.
+    # Searches fan out over the shards in parallel, or only those picked with `shards=[...]`
+    # or a filter on the field. Records without the field stay in the unsharded collection.
+    SHARD_BY = None
+    SHARD_TIME_FORMAT = '%Y-%m'  # Bucket of SHARD_BY = 'timestamp' (strftime; '%Y' for yearly shards)
+    SHARD_SEARCH_WORKERS = 4  # Threads querying shards in parallel
+    
+    # Context compression (chat): only the query-relevant sentences of retrieved chunks reach the prompt
+    COMPRESSION_ENABLED = True
+    COMPRESSION_TOKEN_BUDGET = 800  # Approximate tokens of knowledge base context per prompt
+    COMPRESSION_MAX_SENTENCE_WORDS = 40  # Longer unpunctuated runs are scored in windows of this size
+    COMPRESSION_CACHE_CHUNKS = 1024  # Chunks whose sentence embeddings are kept in memory
+    
+    # Per-task generation settings. model None = the agent's model (--model);
+    # temperature None = the caller's; num_predict/num_ctx None = the model's default.
+    # If a task's model is not installed, the agent's model is used instead.
+    AUX_LLM_MODEL = os.environ.get('AUX_LLM_MODEL', 'llama3.2:3b')  # Small model for rewrite/classify tasks
+    MODEL_PROFILES = {
+        'chat': {'model': None, 'num_predict': None, 'num_ctx': None, 'temperature': None, 'timeout': 120},
+        'reframe': {'model': AUX_LLM_MODEL, 'num_predict': 96, 'num_ctx': 2048, 'temperature': 0.3, 'timeout': 20},
+        'intent': {'model': AUX_LLM_MODEL, 'num_predict': 128, 'num_ctx': 4096, 'temperature': 0.2, 'timeout': 20},
+        'merge': {'model': AUX_LLM_MODEL, 'num_predict': 768, 'num_ctx': 4096, 'temperature': 0.3, 'timeout': 60},
+        'summary': {'model': AUX_LLM_MODEL, 'num_predict': 400, 'num_ctx': 8192, 'temperature': 0.2, 'timeout': 60},
+        'events': {'model': AUX_LLM_MODEL, 'num_predict': 512, 'num_ctx': 4096, 'temperature': 0.0, 'timeout': 30},
+    }
+    
+    # Conversation summarization
+    SUMMARY_KEEP_RECENT = 6  # Messages kept verbatim in the prompt
+    SUMMARY_TRIGGER_MESSAGES = 8  # Unsummarized messages (beyond recent) before summarizing
+    SUMMARY_TRIGGER_TOKENS = 1500  # Approximate unsummarized tokens before summarizing
+    SUMMARY_MAX_WORDS = 200
+    HISTORY_TOKEN_BUDGET = 3000  # Unsummarized turns in the prompt (newest first); above SUMMARY_TRIGGER_TOKENS
+    
+    # Cross-session conversation memory
+    MEMORY_ENABLED = True
+    MEMORY_COLLECTION = 'conversation_memory'
+    MEMORY_RESULTS = 3  # Past conversation messages retrieved per chat turn
+    MEMORY_MIN_CHARS = 20  # Shorter messages ("thanks", "ok") are not embedded
+    MEMORY_INDEX_BATCH_SIZE = 64
+    
+    # Near-duplicate chunks at ingest (MinHash of word 3-shingles)
+    DEDUP_POLICY = 'link'  # 'skip' drops them, 'link' records them on the existing chunk, 'merge' keeps the newer text, 'off'
+    DEDUP_MIN_SIMILARITY = 0.8  # Estimated Jaccard similarity of shingles from which chunks count as duplicates
+    DEDUP_NUM_PERM = 64  # MinHash functions per signature
+    DEDUP_BANDS = 16  # LSH bands (of DEDUP_NUM_PERM / DEDUP_BANDS rows) probed per lookup
+    
+    # Query result cache
+    QUERY_CACHE_ENABLED = True
+    QUERY_CACHE_MAX_ENTRIES = 256
+    QUERY_CACHE_TTL_SECONDS = 600  # Also bounds staleness from writes made by other processes
+    QUERY_CACHE_SIMILARITY = 0.97  # Cosine similarity for a near-duplicate hit (1.0 = exact only)
+    
+    # Retrieval router (chat only: decides whether a message needs reframing and search)
+    ROUTER_ENABLED = True
+    ROUTER_MARGIN = 0.05  # Centroid similarity lead needed to skip retrieval
+    ROUTER_FOLLOWUP_MAX_WORDS = 12  # Longer messages are never treated as follow-ups by the rules
+    ROUTER_CLASSIFY_MAX_WORDS = 20  # Longer messages always retrieve
+    ROUTER_LOG_PATH = None  # Audit log of decisions (JSON lines), e.g. DATA_DIR / 'router_decisions.jsonl'
+    
+    # HTTP API server
+    API_HOST = '127.0.0.1'
+    API_PORT = 8765
+    API_MAX_PENDING = 64  # Requests admitted at once; beyond this clients get 503
+    API_QUEUE_TIMEOUT = 10.0  # Seconds a request may wait for its endpoint slot
+    API_MAX_BODY_BYTES = 10 * 1024 * 1024
+    API_MAX_RESULTS = 50  # Largest n_results a /query request may ask for
+    API_ENDPOINT_CONCURRENCY = {
+        'add': 2,
+        'query': 16,
+        'chat': 8,
+        'sessions': 8,
+        'stats': 4,
+        'jobs': 8
+    }
+    # Job kinds API clients may queue ('export' writes wherever its path points, so it is left out).
+    # File jobs submitted over the API must name a file inside JOB_UPLOAD_DIR.
+    API_JOB_KINDS = ('add_text', 'add_file', 'transcribe', 'migrate')
+    EMBED_BATCH_WINDOW_MS = 5  # How long the batcher collects embedding requests
+    EMBED_BATCH_MAX_SIZE = 64
+    
+    # CLI daemon (keeps the agent warm between main.py invocations)
+    DAEMON_SOCKET_PATH = DATA_DIR / 'agent.sock'
+    
+    # Tracing / metrics
+    TRACING_ENABLED = True
+    METRICS_EXPORT_PATH = None  # e.g. DATA_DIR / 'metrics.prom' for the Prometheus textfile collector
+    METRICS_EXPORT_INTERVAL = 15  # Seconds between metric file rewrites (servers/daemon)
+    
+    # Startup budget (enforced by test_startup.py)
+    STARTUP_IMPORT_BUDGET_SECONDS = 0.5  # Importing an entry point, before any command runs
+    HEAVY_MODULES = ['chromadb', 'speech_recognition', 'pyaudio', 'streamlit',
+                     'numpy', 'requests', 'torch', 'sentence_transformers']
+    
+    # Event extraction and reminders
+    REMINDERS_ENABLED = True  # Extract dated events from text added to the knowledge base
+    REMINDER_LEAD_MINUTES = 30  # Reminders fire this long before the event
+    REMINDER_DEFAULT_TIME = '09:00'  # Time used when text gives only a date
+    REMINDER_SNOOZE_MINUTES = 10
+    REMINDER_HORIZON_SECONDS = 24 * 3600  # Pending reminders due within this window are kept in memory
+    REMINDER_REFRESH_SECONDS = 60  # How often the scheduler picks up changes made by other processes
+    DATE_ORDER = 'DMY'  # How to read numeric dates such as 03/04/2026 ('DMY' or 'MDY')
+    # Also ask the LLM ('events' profile) about event-like sentences the rule parser could not date.
+    # Off by default: it adds a generate call to ingests with such sentences. Set True to enable.
+    EVENT_LLM_FALLBACK = False
+    EVENT_LLM_MAX_SENTENCES = 10  # Per ingest, sent in a single LLM call
+    EVENT_TITLE_MAX_CHARS = 120
+    
+    # Recurring-event prediction
+    PATTERN_WINDOW = 12  # Most recent occurrences per topic used to detect the period
+    PATTERN_MIN_OCCURRENCES = 3
+    PATTERN_MIN_CONFIDENCE = 0.5  # Predictions below this are not proposed
+    PATTERN_AUTO_ACCEPT_CONFIDENCE = None  # e.g. 0.9 turns confident predictions into reminders
+    
+    # Bounded memory for large operations (enforced by test_memory.py)
+    INGEST_BATCH_SIZE = 64  # Chunks embedded and written per vector store call
+    STORE_PAGE_SIZE = 500  # Documents fetched per page when scanning or deleting a collection
+    STREAM_READ_CHARS = 64 * 1024  # Characters read per block when streaming a file
+    MEMORY_BUDGET_BYTES = 32 * 1024 * 1024  # Peak Python allocation of ingest/export/reset
+    
+    # Embedding model migration (collections are versioned per EMBEDDING_MODEL)
+    MIGRATION_AUTO_START = True  # Daemon and API server re-embed in the background when the model changed
+    MIGRATION_BATCH_SIZE = 32  # Records re-embedded per batch
+    MIGRATION_PAUSE_SECONDS = 0.2  # Pause between batches, leaving Ollama to interactive requests
+    MIGRATION_CATCHUP_ROUNDS = 10  # Rounds syncing concurrent writes before the rest is synced with writes held
+    
+    # Background jobs (ingestion, export, re-embedding) queued in the metadata database
+    JOB_WORKERS = 2  # Worker threads per process that runs jobs (UIs, daemon, API server)
+    JOB_POLL_SECONDS = 1.0  # How often idle workers look for jobs queued by other processes
+    JOB_PROGRESS_INTERVAL = 0.5  # Minimum seconds between progress writes of one job
+    JOB_HEARTBEAT_SECONDS = 5.0  # How often a process marks its running jobs alive
+    JOB_STALE_SECONDS = 60  # A running job without heartbeat for this long, whose process is gone, is re-queued
+    JOB_UPLOAD_DIR = DATA_DIR / 'uploads'  # Uploaded files wait here for their ingest job
+    
+    # Voice input (files, streams and microphone; see helper/voice_pipeline.py)
+    VOICE_RECOGNIZER = 'google'  # Backend in voice_pipeline.RECOGNIZERS
+    VOICE_LANGUAGE = 'en-US'
+    VOICE_SAMPLE_RATE = 16000  # Microphone capture rate
+    VOICE_FRAME_MS = 30  # VAD frame length
+    VOICE_CALIBRATION_MS = 500  # Audio measured for the ambient noise level
+    VOICE_CALIBRATION_TTL_SECONDS = 600  # How long a microphone's noise level is reused
+    VOICE_ENERGY_RATIO = 3.0  # Frames this many times louder than the noise count as speech
+    VOICE_MIN_ENERGY = 100  # RMS (16-bit scale) below which a frame never counts as speech
+    VOICE_SILENCE_MS = 600  # Pause that ends a segment
+    VOICE_PADDING_MS = 150  # Audio kept before and after each segment
+    VOICE_MIN_SPEECH_MS = 200  # Shorter segments (clicks, coughs) are dropped
+    VOICE_MAX_SEGMENT_SECONDS = 30  # Longer speech is cut into segments of this length
+    VOICE_QUEUE_SEGMENTS = 8  # Segments captured ahead of transcription
+    VOICE_LISTEN_TIMEOUT = 10  # Seconds the microphone waits for speech to start
+    VOICE_FILE_EXTENSIONS = ('.wav',)  # Recordings picked up by --mode transcribe
+    
+    # Snapshots (--mode export / import)
+    SNAPSHOT_DTYPE = 'float16'  # Stored embedding precision: 'float16' halves the size, 'float32' is lossless
+    
     @classmethod
     def create_dirs(cls):
         for dir_path in [cls.DATA_DIR, cls.KB_DIR, cls.SESSIONS_DIR, cls.VECTOR_DB_PATH]:
@@ -0,0 +1,18 @@
+# conftest.py
+"""Helpers shared by the test files (imported as `from conftest import ...` so the __main__ runners work too)"""
+from contextlib import contextmanager
+
+from config import Config
+
+
+@contextmanager
+def config_override(**values):
+    """Set Config attributes for the enclosed block, restoring the previous values afterwards"""
+    previous = {name: getattr(Config, name) for name in values}
+    for name, value in values.items():
+        setattr(Config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(Config, name, value)
@@ -1,5 +1,18 @@
 # database package
-from .session_manager import SessionManager
-from .vector_store import VectorStore
+# Submodules are imported on first use so that session-only code never loads chromadb.
+import importlib
 
-__all__ = ['SessionManager', 'VectorStore']
+_LAZY_ATTRIBUTES = {
+    'SessionManager': '.session_manager',
+    'VectorStore': '.vector_store',
+    'EventStore': '.event_store',
+    'JobStore': '.job_store',
+}
+
+__all__ = ['SessionManager', 'VectorStore', 'EventStore', 'JobStore']
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,255 @@
+# database/embedding_migration.py
+"""
+Collections versioned by embedding model, and online migration between them.
+
+Vectors from different embedding models cannot be compared, so every model gets
+its own knowledge base and memory collections. `collections.json` in the store
+directory records which collections belong to which model and which model is
+active. The first model keeps the unversioned names, so existing stores need no
+change. Later models get `<name>__<model>` collections.
+
+A migration re-embeds the active collections into the target model's collections
+in throttled batches while queries keep using the active ones. Records whose
+document and metadata already match in the target are skipped, so an interrupted
+migration resumes where it stopped. The same goes for migrating back to a model
+whose collections still exist. Writes made meanwhile are tracked by ID and synced
+again, in rounds that embed outside the store's write lock. The switch happens
+under the lock once no write is left to sync, so no write is lost and readers see
+either the old collections or the complete new ones. If writes keep arriving as
+fast as they are synced (or after MIGRATION_CATCHUP_ROUNDS rounds), the remaining
+records are synced with writers held off, without pauses.
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+
+from config import Config
+
+COLLECTIONS = ('knowledge_base', 'memory')
+
+
+def versioned_name(name: str, model: str) -> str:
+    """Chroma-safe collection name for `name` embedded with `model`"""
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', model).strip('-').lower()
+    return f"{name}__{slug}"[:512]
+
+
+class CollectionRegistry:
+    """Which collections hold which embedding model's vectors, per base collection name"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save(self, data: Dict):
+        # Write then rename, so other processes never read a half-written file
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temporary, self.path)
+
+    def resolve(self, name: str, memory_name: str, model: str) -> Dict:
+        """Registry entry of `name`, created with `model` active (and unversioned names) if new"""
+        with self._lock:
+            data = self._load()
+            if name not in data:
+                data[name] = {
+                    'active': model,
+                    'versions': {model: self._version(name, memory_name)}
+                }
+                self._save(data)
+            return data[name]
+
+    def version(self, name: str, memory_name: str, model: str) -> Dict:
+        """Collection names for `model` (registered with versioned names if new)"""
+        with self._lock:
+            data = self._load()
+            entry = data.setdefault(name, {'active': model, 'versions': {}})
+            if model not in entry['versions']:
+                entry['versions'][model] = self._version(versioned_name(name, model),
+                                                         versioned_name(memory_name, model))
+                self._save(data)
+            return entry['versions'][model]
+
+    def activate(self, name: str, model: str):
+        with self._lock:
+            data = self._load()
+            data[name]['active'] = model
+            data[name]['versions'][model]['activated_at'] = datetime.now().isoformat()
+            self._save(data)
+
+    @staticmethod
+    def _version(collection: str, memory_collection: str) -> Dict:
+        return {'collection': collection, 'memory_collection': memory_collection,
+                'created_at': datetime.now().isoformat()}
+
+
+class MigrationCancelled(Exception):
+    pass
+
+
+class EmbeddingMigration:
+    """
+    Background job re-embedding a VectorStore's collections with `target_model`
+    and switching the store to them when complete. Use `start()` for a thread or
+    `run()` to migrate in the calling thread; `status()` reports progress.
+    """
+
+    def __init__(self, store, target_model: str, batch_size: int = None, pause_seconds: float = None):
+        self.store = store
+        self.source_model = store.embedding_model
+        self.target_model = target_model
+        self.batch_size = batch_size or Config.MIGRATION_BATCH_SIZE
+        self.pause_seconds = Config.MIGRATION_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        self.state = 'pending'
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {name: {'total': 0, 'done': 0, 'embedded': 0} for name in COLLECTIONS}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='embedding-migration', daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._stop.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for a started migration; returns whether it has finished"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.state in ('switched', 'failed', 'cancelled')
+
+    def run(self):
+        self.state, self.started_at = 'running', time.time()
+        print(f"Migrating embeddings from {self.source_model} to {self.target_model}...")
+        try:
+            targets = self.store.open_version(self.target_model)
+            sources = {'knowledge_base': self.store.collection, 'memory': self.store.memory_collection}
+            for name in COLLECTIONS:
+                self._copy(name, sources[name], targets[name])
+            # Catch up with writes made meanwhile. Each round embeds outside the write lock;
+            # the lock is only held to check that nothing is left and switch.
+            switched, previous = False, None
+            for _ in range(Config.MIGRATION_CATCHUP_ROUNDS):
+                with self.store._write_lock:
+                    pending = sum(self.store.pending_migration_ids().values())
+                    if not pending:
+                        self._switch(targets)
+                        switched = True
+                        break
+                if previous is not None and pending >= previous:
+                    break  # writes arrive as fast as they are synced
+                previous = pending
+                for name in COLLECTIONS:
+                    self._sync(name, sources[name], targets[name], self.store.take_migration_ids(name))
+            if not switched:
+                # Hold writers off for the few records still left, without pausing between batches
+                with self.store._write_lock:
+                    for name in COLLECTIONS:
+                        self._sync(name, sources[name], targets[name], self.store.take_migration_ids(name),
+                                   pause=False)
+                    self._switch(targets)
+            self.state = 'switched'
+            print(f"✓ Switched embeddings to {self.target_model}.")
+        except MigrationCancelled:
+            self.state = 'cancelled'
+            print("Embedding migration cancelled; it resumes where it stopped when started again.")
+        except Exception as e:
+            self.state, self.error = 'failed', str(e)
+            print(f"Error migrating embeddings: {e}")
+        finally:
+            self.finished_at = time.time()
+            self.store.migration_finished(self)
+
+    def _switch(self, targets: Dict):
+        self.store.switch_version(self.target_model, targets['knowledge_base'], targets['memory'])
+
+    def _copy(self, name: str, source, target):
+        """Bring `target` up to date with `source`, then drop records `source` no longer has"""
+        # Records added from here on are tracked by the store and synced afterwards
+        with self._lock:
+            self.progress[name]['total'] = source.count()
+        for page in self.store.iter_pages(source, page_size=self.batch_size, include=[]):
+            self._sync(name, source, target, page['ids'])
+            with self._lock:
+                self.progress[name]['done'] += len(page['ids'])
+        with self._lock:
+            # Records deleted meanwhile were never met, those added came on top: the copy is complete
+            counts = self.progress[name]
+            counts['total'] = counts['done'] = max(counts['total'], counts['done'])
+        for page in self.store.iter_pages(target, include=[]):
+            present = set(source.get(ids=page['ids'], include=[])['ids'])
+            self._sync(name, source, target, [doc_id for doc_id in page['ids'] if doc_id not in present])
+
+    def _sync(self, name: str, source, target, ids, pause: bool = True):
+        """Make `target` match `source` for `ids`: re-embed changed records, delete removed ones"""
+        ids = list(ids)
+        for start in range(0, len(ids), self.batch_size):
+            if self._stop.is_set():
+                raise MigrationCancelled()
+            batch = ids[start:start + self.batch_size]
+            current = source.get(ids=batch, include=['documents', 'metadatas'])
+            have = target.get(ids=batch, include=['documents', 'metadatas'])
+            copied = {doc_id: (doc, meta) for doc_id, doc, meta in
+                      zip(have['ids'], have['documents'], have['metadatas'])}
+            todo = [(doc_id, doc, meta) for doc_id, doc, meta in
+                    zip(current['ids'], current['documents'], current['metadatas'])
+                    if copied.get(doc_id) != (doc, meta)]
+            removed = set(batch) - set(current['ids'])
+
+            embeddings = {}
+            if todo:
+                vectors = self.store.get_embeddings([doc or '' for _, doc, _ in todo], model=self.target_model)
+                embeddings = {doc_id: (doc, vector) for (doc_id, doc, _), vector in zip(todo, vectors)}
+            with self.store._write_lock:
+                # Writes that landed while embedding win: only records still as embedded are copied
+                latest = source.get(ids=list(embeddings), include=['documents', 'metadatas']) if embeddings else None
+                if latest and latest['ids']:
+                    fresh = [(doc_id, doc, meta) for doc_id, doc, meta in
+                             zip(latest['ids'], latest['documents'], latest['metadatas'])
+                             if embeddings[doc_id][0] == doc]
+                    if fresh:
+                        target.upsert(ids=[r[0] for r in fresh], documents=[r[1] for r in fresh],
+                                      metadatas=[r[2] for r in fresh],
+                                      embeddings=[embeddings[r[0]][1] for r in fresh])
+                gone = [doc_id for doc_id in removed if doc_id in copied]
+                if gone:
+                    target.delete(ids=gone)
+            with self._lock:
+                self.progress[name]['embedded'] += len(embeddings)
+            if todo and pause and self.pause_seconds:
+                self._stop.wait(self.pause_seconds)
+
+    def status(self) -> Dict:
+        with self._lock:
+            progress = {name: dict(counts) for name, counts in self.progress.items()}
+        total = sum(counts['total'] for counts in progress.values())
+        done = sum(counts['done'] for counts in progress.values())
+        status = {
+            'state': self.state,
+            'from': self.source_model,
+            'to': self.target_model,
+            'percent': round(100.0 * done / total, 1) if total else (100.0 if self.state == 'switched' else 0.0),
+            'collections': progress,
+        }
+        if self.started_at:
+            status['elapsed_seconds'] = round((self.finished_at or time.time()) - self.started_at, 1)
+        if self.error:
+            status['error'] = self.error
+        return status
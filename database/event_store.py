@@ -0,0 +1,255 @@
+# database/event_store.py
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Optional
+from helper.tracing import traced
+
+EVENT_COLUMNS = ['id', 'title', 'description', 'due_at', 'remind_at', 'status', 'method',
+                 'source', 'doc_id', 'snooze_count', 'created_at', 'fired_at', 'updated_at', 'topic']
+PATTERN_COLUMNS = ['topic', 'title', 'occurrences', 'timestamps', 'period', 'interval_days', 'next_due',
+                   'confidence', 'updated_at']
+
+class EventStore:
+    """
+    SQLite-backed store of extracted events and their reminders.
+    Pending reminders are indexed by (status, remind_at) so the scheduler can load
+    the next window cheaply however many are pending; `updated_at` (epoch seconds)
+    lets schedulers in other processes pick up snoozes and cancellations.
+    Times are naive local ISO strings, like the rest of the metadata database.
+    Events stored with status 'past' (already over when extracted) never fire but
+    feed the recurrence patterns kept in `event_patterns`.
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    due_at TEXT NOT NULL,
+                    remind_at TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    method TEXT,
+                    source TEXT,
+                    doc_id TEXT,
+                    snooze_count INTEGER DEFAULT 0,
+                    created_at TEXT,
+                    fired_at TEXT,
+                    updated_at REAL,
+                    UNIQUE (title, due_at)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_events_pending
+                ON events (status, remind_at)
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_events_updated
+                ON events (updated_at)
+            ''')
+
+            # Topic column (added to existing databases on upgrade)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(events)')]
+            if 'topic' not in columns:
+                conn.execute('ALTER TABLE events ADD COLUMN topic TEXT')
+
+            # Per-topic recurrence state, updated incrementally as events arrive
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS event_patterns (
+                    topic TEXT PRIMARY KEY,
+                    title TEXT,
+                    occurrences INTEGER,
+                    timestamps TEXT,
+                    period TEXT,
+                    interval_days REAL,
+                    next_due TEXT,
+                    confidence REAL,
+                    updated_at TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_event_patterns_next_due
+                ON event_patterns (next_due)
+            ''')
+
+    @staticmethod
+    def _row_to_event(row) -> Dict:
+        return dict(zip(EVENT_COLUMNS, row))
+
+    @staticmethod
+    def _iso(value) -> str:
+        return value.isoformat(timespec='seconds') if isinstance(value, datetime) else value
+
+    @traced('events.add_events')
+    def add_events(self, events: List[Dict], source: str = None, doc_id: str = None) -> List[Dict]:
+        """
+        Insert extracted events (status 'pending' unless the event sets one); an event
+        with the same title and due time as an existing one is skipped, so re-adding the
+        same text does not duplicate reminders. Returns the inserted events with their IDs.
+        """
+        now = datetime.now()
+        inserted = []
+        with self._connect() as conn:
+            for event in events:
+                due_at, remind_at = self._iso(event['due_at']), self._iso(event['remind_at'])
+                status = event.get('status', 'pending')
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO events
+                    (title, description, due_at, remind_at, status, method, source, doc_id, topic,
+                     created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (event['title'], event.get('description'), due_at, remind_at, status,
+                      event.get('method'), source, doc_id, event.get('topic'), now.isoformat(), time.time()))
+                if cursor.rowcount:
+                    inserted.append(dict(event, id=cursor.lastrowid, status=status,
+                                         due_at=due_at, remind_at=remind_at))
+        return inserted
+
+    def get_event(self, event_id: int) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT {", ".join(EVENT_COLUMNS)} FROM events WHERE id = ?',
+                               (event_id,)).fetchone()
+        return self._row_to_event(row) if row else None
+
+    @traced('events.list_events')
+    def list_events(self, status: Optional[str] = 'pending', limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Events with the given status (None for all), soonest reminder first"""
+        query = f'SELECT {", ".join(EVENT_COLUMNS)} FROM events'
+        params = []
+        if status:
+            query += ' WHERE status = ?'
+            params.append(status)
+        query += ' ORDER BY remind_at LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [self._row_to_event(row) for row in rows]
+
+    def pending_between(self, after: Optional[str], until: str) -> List[Dict]:
+        """Pending events with `after` < remind_at <= `until` (ISO strings; `after` None = no lower bound)"""
+        with self._connect() as conn:
+            if after is None:
+                rows = conn.execute('''
+                    SELECT id, remind_at FROM events
+                    WHERE status = 'pending' AND remind_at <= ?
+                ''', (until,)).fetchall()
+            else:
+                rows = conn.execute('''
+                    SELECT id, remind_at FROM events
+                    WHERE status = 'pending' AND remind_at > ? AND remind_at <= ?
+                ''', (after, until)).fetchall()
+        return [{'id': row[0], 'remind_at': row[1]} for row in rows]
+
+    def updated_since(self, timestamp: float) -> List[Dict]:
+        """Events changed (added, snoozed, cancelled, fired) at or after an epoch timestamp"""
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT id, status, remind_at FROM events WHERE updated_at >= ?
+            ''', (timestamp,)).fetchall()
+        return [{'id': row[0], 'status': row[1], 'remind_at': row[2]} for row in rows]
+
+    def next_pending(self) -> Optional[Dict]:
+        """The pending event whose reminder is due first"""
+        events = self.list_events('pending', limit=1)
+        return events[0] if events else None
+
+    @traced('events.claim')
+    def claim(self, event_id: int) -> Optional[Dict]:
+        """
+        Mark a due reminder as fired and return it, or None if it was cancelled,
+        snoozed or already fired (e.g. by a scheduler in another process).
+        """
+        now = datetime.now()
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE events SET status = 'fired', fired_at = ?, updated_at = ?
+                WHERE id = ? AND status = 'pending' AND remind_at <= ?
+            ''', (now.isoformat(), time.time(), event_id, self._iso(now)))
+            claimed = cursor.rowcount == 1
+        return self.get_event(event_id) if claimed else None
+
+    @traced('events.snooze')
+    def snooze(self, event_id: int, remind_at: datetime) -> bool:
+        """Move a pending or fired reminder to `remind_at` (it becomes pending again)"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE events
+                SET status = 'pending', remind_at = ?, snooze_count = snooze_count + 1, updated_at = ?
+                WHERE id = ? AND status IN ('pending', 'fired')
+            ''', (self._iso(remind_at), time.time(), event_id))
+            return cursor.rowcount == 1
+
+    @traced('events.cancel')
+    def cancel(self, event_id: int) -> bool:
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE events SET status = 'cancelled', updated_at = ?
+                WHERE id = ? AND status != 'cancelled'
+            ''', (time.time(), event_id))
+            return cursor.rowcount == 1
+
+    def count_events(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM events GROUP BY status').fetchall()
+        counts = {'pending': 0, 'fired': 0, 'cancelled': 0, 'past': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def get_pattern(self, topic: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute(f'SELECT {", ".join(PATTERN_COLUMNS)} FROM event_patterns WHERE topic = ?',
+                               (topic,)).fetchone()
+        if not row:
+            return None
+        pattern = dict(zip(PATTERN_COLUMNS, row))
+        pattern['timestamps'] = json.loads(pattern['timestamps'] or '[]')
+        return pattern
+
+    def save_pattern(self, pattern: Dict):
+        values = dict(pattern, timestamps=json.dumps(pattern['timestamps']),
+                      updated_at=datetime.now().isoformat())
+        with self._connect() as conn:
+            conn.execute(f'''
+                INSERT OR REPLACE INTO event_patterns ({", ".join(PATTERN_COLUMNS)})
+                VALUES ({", ".join("?" for _ in PATTERN_COLUMNS)})
+            ''', [values.get(column) for column in PATTERN_COLUMNS])
+
+    def upcoming_patterns(self, after: str, min_confidence: float = 0.0, limit: int = 20) -> List[Dict]:
+        """Detected patterns whose next occurrence is after `after`, soonest first"""
+        with self._connect() as conn:
+            rows = conn.execute(f'''
+                SELECT {", ".join(PATTERN_COLUMNS)} FROM event_patterns
+                WHERE next_due > ? AND confidence >= ?
+                ORDER BY next_due LIMIT ?
+            ''', (after, min_confidence, limit)).fetchall()
+        patterns = []
+        for row in rows:
+            pattern = dict(zip(PATTERN_COLUMNS, row))
+            pattern['timestamps'] = json.loads(pattern['timestamps'] or '[]')
+            patterns.append(pattern)
+        return patterns
+
+    def reset_database(self) -> int:
+        """Delete all events and learned patterns; returns how many events were deleted"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM event_patterns')
+            return conn.execute('DELETE FROM events').rowcount
@@ -0,0 +1,257 @@
+# database/job_store.py
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+JOB_COLUMNS = ['id', 'kind', 'params', 'status', 'done', 'total', 'message', 'result', 'error',
+               'cancel_requested', 'worker', 'created_at', 'started_at', 'finished_at', 'updated_at',
+               'worker_host', 'worker_pid']
+ACTIVE_STATUSES = ('queued', 'running')
+FINAL_STATUSES = ('done', 'failed', 'cancelled')
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested"""
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process with this ID runs on this machine"""
+    if os.name == 'nt':
+        # os.kill would terminate the process on Windows
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # it exists, but belongs to another user
+    return True
+
+class JobStore:
+    """
+    SQLite-backed queue of background jobs (ingestion, export, re-embedding).
+    Jobs survive restarts and page reloads: UIs keep only job IDs and poll
+    `get`. Workers claim the oldest queued job in one write transaction, so
+    several workers (or processes) never run the same job. The claiming process
+    records its host and pid and touches its running jobs with `heartbeat`
+    (progress writes count too). `requeue_stale` queues a running job again only
+    once its heartbeat is older than the stale timeout and, for a job claimed on
+    this host, its process is gone, so a process starting up never takes over
+    a job another live process is still running. Times are epoch seconds.
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    params TEXT,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    done INTEGER DEFAULT 0,
+                    total INTEGER,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    cancel_requested INTEGER DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL,
+                    started_at REAL,
+                    finished_at REAL,
+                    updated_at REAL,
+                    worker_host TEXT,
+                    worker_pid INTEGER
+                )
+            ''')
+            # Worker host and pid columns (added to existing databases on upgrade)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+            if 'worker_host' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN worker_host TEXT')
+                conn.execute('ALTER TABLE jobs ADD COLUMN worker_pid INTEGER')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_jobs_status
+                ON jobs (status, id)
+            ''')
+
+    @staticmethod
+    def _row_to_job(row) -> Dict:
+        job = dict(zip(JOB_COLUMNS, row))
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['percent'] = round(100.0 * job['done'] / job['total'], 1) if job['total'] else None
+        return job
+
+    def submit(self, kind: str, params: Dict = None) -> int:
+        """Queue a job; returns its ID"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT INTO jobs (kind, params, status, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?)
+            ''', (kind, json.dumps(params or {}), now, now))
+            return cursor.lastrowid
+
+    def claim(self, worker: str = None, kinds: List[str] = None) -> Optional[Dict]:
+        """Mark the oldest queued job (of `kinds`, if given) running and return it, or None"""
+        worker = worker or f"pid-{os.getpid()}"
+        now = time.time()
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+        try:
+            # BEGIN IMMEDIATE takes the write lock before reading, so no two workers pick the same job
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                query = "SELECT id FROM jobs WHERE status = 'queued'"
+                args = []
+                if kinds:
+                    query += f" AND kind IN ({', '.join('?' * len(kinds))})"
+                    args.extend(kinds)
+                row = conn.execute(query + ' ORDER BY id LIMIT 1', args).fetchone()
+                if row is None:
+                    conn.execute('COMMIT')
+                    return None
+                conn.execute('''
+                    UPDATE jobs SET status = 'running', worker = ?, worker_host = ?, worker_pid = ?,
+                                    started_at = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (worker, socket.gethostname(), os.getpid(), now, now, row[0]))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        return self.get(row[0])
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(self, status: str = None, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Jobs with the given status (None for all, 'active' for queued and running), newest first"""
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        args = []
+        if status == 'active':
+            query += " WHERE status IN ('queued', 'running')"
+        elif status:
+            query += ' WHERE status = ?'
+            args.append(status)
+        query += ' ORDER BY id DESC LIMIT ? OFFSET ?'
+        with self._connect() as conn:
+            rows = conn.execute(query, args + [limit, offset]).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def update_progress(self, job_id: int, done: int, total: int = None, message: str = None) -> bool:
+        """Record progress (and the heartbeat); returns whether cancellation was requested"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE jobs SET done = ?, total = COALESCE(?, total), message = COALESCE(?, message),
+                                updated_at = ?
+                WHERE id = ?
+            ''', (done, total, message, time.time(), job_id))
+            row = conn.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def heartbeat(self, job_ids: List[int]) -> int:
+        """Mark running jobs as alive without touching their progress; returns how many"""
+        if not job_ids:
+            return 0
+        with self._connect() as conn:
+            cursor = conn.execute(f'''
+                UPDATE jobs SET updated_at = ?
+                WHERE status = 'running' AND id IN ({', '.join('?' * len(job_ids))})
+            ''', [time.time()] + list(job_ids))
+            return cursor.rowcount
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a job: a queued job is cancelled at once, a running one stops at its
+        next progress report. Returns False for unknown or finished jobs.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ?, updated_at = ?
+                WHERE id = ? AND status = 'queued'
+            ''', (now, now, job_id))
+            if cursor.rowcount:
+                return True
+            cursor = conn.execute('''
+                UPDATE jobs SET cancel_requested = 1, updated_at = ?
+                WHERE id = ? AND status = 'running'
+            ''', (now, job_id))
+            return cursor.rowcount > 0
+
+    def finish(self, job_id: int, status: str, result: Dict = None, error: str = None):
+        """Record the outcome of a running job ('done', 'failed' or 'cancelled')"""
+        if status not in FINAL_STATUSES:
+            raise ValueError(f"status must be one of {', '.join(FINAL_STATUSES)}")
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, json.dumps(result) if result is not None else None, error, now, now, job_id))
+
+    def requeue_stale(self, stale_seconds: float) -> int:
+        """
+        Queue again running jobs whose process died: no heartbeat for `stale_seconds` and, if
+        claimed on this host, no process with the recorded pid left. Returns how many.
+        """
+        now = time.time()
+        cutoff = now - stale_seconds
+        host = socket.gethostname()
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT id, cancel_requested, worker_host, worker_pid FROM jobs
+                WHERE status = 'running' AND updated_at < ?
+            ''', (cutoff,)).fetchall()
+            requeued = 0
+            for job_id, cancel_requested, worker_host, worker_pid in rows:
+                if worker_host == host and worker_pid and _process_alive(worker_pid):
+                    continue
+                # The heartbeat is checked again in case the worker reported since the read
+                if cancel_requested:
+                    # A job asked to cancel whose worker died is simply cancelled
+                    conn.execute('''
+                        UPDATE jobs SET status = 'cancelled', finished_at = ?, updated_at = ?
+                        WHERE id = ? AND status = 'running' AND updated_at < ?
+                    ''', (now, now, job_id, cutoff))
+                    continue
+                requeued += conn.execute('''
+                    UPDATE jobs SET status = 'queued', worker = NULL, worker_host = NULL, worker_pid = NULL,
+                                    done = 0, updated_at = ?
+                    WHERE id = ? AND status = 'running' AND updated_at < ?
+                ''', (now, job_id, cutoff)).rowcount
+        return requeued
+
+    def delete_finished(self, older_than_seconds: float = 0) -> int:
+        """Remove finished jobs older than the given age; returns how many"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                DELETE FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished_at < ?
+            ''', (time.time() - older_than_seconds,))
+            return cursor.rowcount
@@ -0,0 +1,62 @@
+# database/record_sequence.py
+import sqlite3
+from contextlib import contextmanager
+
+
+class RecordSequence:
+    """
+    SQLite counters numbering the records of a vector store, kept next to it.
+    Every record carries its number in its metadata; a scan reads one range of
+    numbers at a time, so each page is bounded however large the collection is,
+    and records deleted or added meanwhile neither shift nor repeat the others.
+    Counters are shared between processes using the same store directory.
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS record_sequences (
+                    name TEXT PRIMARY KEY,
+                    next_value INTEGER NOT NULL
+                )
+            ''')
+            # Collections whose records (stored before numbering existed) all carry a number
+            conn.execute('CREATE TABLE IF NOT EXISTS numbered_collections (name TEXT PRIMARY KEY)')
+
+    def reserve(self, name: str, count: int) -> int:
+        """First of `count` consecutive new numbers of counter `name`"""
+        with self._connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO record_sequences (name, next_value) VALUES (?, 0)', (name,))
+            conn.execute('UPDATE record_sequences SET next_value = next_value + ? WHERE name = ?', (count, name))
+            return conn.execute('SELECT next_value FROM record_sequences WHERE name = ?',
+                                (name,)).fetchone()[0] - count
+
+    def end(self, name: str) -> int:
+        """Numbers handed out so far by counter `name` (all below this value)"""
+        with self._connect() as conn:
+            row = conn.execute('SELECT next_value FROM record_sequences WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def is_numbered(self, collection_name: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute('SELECT 1 FROM numbered_collections WHERE name = ?',
+                                (collection_name,)).fetchone() is not None
+
+    def mark_numbered(self, collection_name: str):
+        with self._connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO numbered_collections (name) VALUES (?)', (collection_name,))
@@ -1,17 +1,38 @@
 # database/session_manager.py
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime
 from typing import List, Dict, Optional
 import json
+from helper.tracing import traced
 
 class SessionManager:
-    def __init__(self, db_path: str):
+    """
+    SQLite-backed session and message store.
+    Safe to share between threads: every call uses its own short-lived connection,
+    and the database runs in WAL mode so readers never block the writer.
+    """
+    
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
         self.init_db()
     
+    @contextmanager
+    def _connect(self):
+        """Open a connection that waits on locks instead of failing, and always closes"""
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
     def init_db(self):
         """Initialize session database"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            # WAL is persistent per database file: concurrent readers plus one writer
+            conn.execute('PRAGMA journal_mode=WAL')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS sessions (
                     session_id TEXT PRIMARY KEY,
@@ -31,11 +52,32 @@ class SessionManager:
                     FOREIGN KEY (session_id) REFERENCES sessions(session_id)
                 )
             ''')
+            
+            # Rolling summary columns (added to existing databases on upgrade)
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(sessions)')]
+            if 'summary' not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT DEFAULT ''")
+            if 'summary_message_id' not in columns:
+                conn.execute('ALTER TABLE sessions ADD COLUMN summary_message_id INTEGER DEFAULT 0')
+            
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_messages_session
+                ON messages (session_id, id)
+            ''')
+            
+            # Messages already embedded into the conversation memory collection
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS memory_index (
+                    message_id INTEGER PRIMARY KEY,
+                    indexed_at TEXT
+                )
+            ''')
             conn.commit()
     
+    @traced('session.create_session')
     def create_session(self, session_id: str, metadata: Dict = None):
         """Create a new session"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 INSERT INTO sessions (session_id, created_at, last_updated, metadata)
                 VALUES (?, ?, ?, ?)
@@ -47,9 +89,10 @@ class SessionManager:
             ))
             conn.commit()
     
+    @traced('session.add_message')
     def add_message(self, session_id: str, role: str, content: str):
         """Add a message to session"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute('''
                 INSERT INTO messages (session_id, role, content, timestamp)
                 VALUES (?, ?, ?, ?)
@@ -62,30 +105,187 @@ class SessionManager:
             
             conn.commit()
     
+    @traced('session.get_session_history')
     def get_session_history(self, session_id: str, limit: int = 50) -> List[Dict]:
         """Get session conversation history"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.execute('''
-                SELECT role, content, timestamp
+                SELECT id, role, content, timestamp
                 FROM messages
                 WHERE session_id = ?
-                ORDER BY timestamp DESC
+                ORDER BY id DESC
                 LIMIT ?
             ''', (session_id, limit))
             
             messages = []
             for row in cursor.fetchall():
                 messages.append({
-                    'role': row[0],
-                    'content': row[1],
-                    'timestamp': row[2]
+                    'id': row[0],
+                    'role': row[1],
+                    'content': row[2],
+                    'timestamp': row[3]
                 })
             
             return list(reversed(messages))
     
+    @traced('session.get_messages_since')
+    def get_messages_since(self, session_id: str, after_id: int = 0) -> List[Dict]:
+        """Get messages of a session with an id greater than `after_id`, oldest first"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT id, role, content, timestamp
+                FROM messages
+                WHERE session_id = ? AND id > ?
+                ORDER BY id ASC
+            ''', (session_id, after_id))
+            
+            return [
+                {'id': row[0], 'role': row[1], 'content': row[2], 'timestamp': row[3]}
+                for row in cursor.fetchall()
+            ]
+    
+    @traced('session.count_messages_since')
+    def count_messages_since(self, session_id: str, after_id: int = 0) -> Dict:
+        """Count messages (and their total characters) newer than `after_id`"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0)
+                FROM messages
+                WHERE session_id = ? AND id > ?
+            ''', (session_id, after_id))
+            count, chars = cursor.fetchone()
+            return {'messages': count, 'characters': chars}
+    
+    @traced('session.get_session_summary')
+    def get_session_summary(self, session_id: str) -> Dict:
+        """Get the rolling summary of a session and the last message id it covers"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT summary, summary_message_id FROM sessions WHERE session_id = ?
+            ''', (session_id,))
+            row = cursor.fetchone()
+            if not row:
+                return {'summary': '', 'summary_message_id': 0}
+            return {'summary': row[0] or '', 'summary_message_id': row[1] or 0}
+    
+    @traced('session.update_session_summary')
+    def update_session_summary(self, session_id: str, summary: str, summary_message_id: int):
+        """Store a new rolling summary covering messages up to `summary_message_id`"""
+        with self._connect() as conn:
+            # Never move the summary backwards if a newer one was stored meanwhile
+            conn.execute('''
+                UPDATE sessions SET summary = ?, summary_message_id = ?
+                WHERE session_id = ? AND COALESCE(summary_message_id, 0) < ?
+            ''', (summary, summary_message_id, session_id, summary_message_id))
+            conn.commit()
+    
+    @traced('session.get_unindexed_messages')
+    def get_unindexed_messages(self, limit: int = 64) -> List[Dict]:
+        """Get messages not yet embedded into conversation memory, oldest first"""
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                SELECT m.id, m.session_id, m.role, m.content, m.timestamp
+                FROM messages m
+                LEFT JOIN memory_index mi ON mi.message_id = m.id
+                WHERE mi.message_id IS NULL
+                ORDER BY m.id ASC
+                LIMIT ?
+            ''', (limit,))
+            
+            return [
+                {'id': row[0], 'session_id': row[1], 'role': row[2],
+                 'content': row[3], 'timestamp': row[4]}
+                for row in cursor.fetchall()
+            ]
+    
+    @traced('session.mark_messages_indexed')
+    def mark_messages_indexed(self, message_ids: List[int]):
+        """Record that messages have been embedded into conversation memory"""
+        if not message_ids:
+            return
+        now = datetime.now().isoformat()
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO memory_index (message_id, indexed_at)
+                VALUES (?, ?)
+            ''', [(message_id, now) for message_id in message_ids])
+            conn.commit()
+    
+    # Columns carried by snapshots, per table (the first one is the paging key)
+    SNAPSHOT_COLUMNS = {
+        'sessions': ['session_id', 'created_at', 'last_updated', 'metadata', 'summary', 'summary_message_id'],
+        'messages': ['id', 'session_id', 'role', 'content', 'timestamp'],
+        'memory_index': ['message_id', 'indexed_at'],
+    }
+    
+    def iter_table_rows(self, table: str, page_size: int = 500):
+        """Yield the rows of a snapshot table as lists of tuples, one page at a time"""
+        columns = self.SNAPSHOT_COLUMNS[table]
+        select = f"SELECT {', '.join(columns)} FROM {table}"
+        last = None
+        while True:
+            with self._connect() as conn:
+                if last is None:
+                    rows = conn.execute(f'{select} ORDER BY {columns[0]} LIMIT ?', (page_size,)).fetchall()
+                else:
+                    rows = conn.execute(f'{select} WHERE {columns[0]} > ? ORDER BY {columns[0]} LIMIT ?',
+                                        (last, page_size)).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+    
+    def import_sessions(self, rows: List[tuple]) -> List[str]:
+        """Insert snapshot session rows; returns the IDs of the sessions that did not exist yet"""
+        added = []
+        with self._connect() as conn:
+            for row in rows:
+                cursor = conn.execute('''
+                    INSERT OR IGNORE INTO sessions
+                    (session_id, created_at, last_updated, metadata, summary, summary_message_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', tuple(row))
+                if cursor.rowcount:
+                    added.append(row[0])
+        return added
+    
+    def import_messages(self, rows: List[tuple], session_ids, renumbered: set = None) -> Dict[int, int]:
+        """
+        Insert the snapshot message rows of `session_ids`. A session keeps its message
+        IDs unless one of them is already taken; then all its messages get fresh IDs in
+        snapshot order, so its history stays in order. `renumbered` carries those
+        sessions across pages of rows. Returns {snapshot message id: stored message id}.
+        Call `remap_summaries` once every page is in.
+        """
+        renumbered = set() if renumbered is None else renumbered
+        rows = [row for row in rows if row[1] in session_ids]
+        id_map = {}
+        with self._connect() as conn:
+            for message_id, session_id, *_ in rows:
+                if session_id not in renumbered and conn.execute(
+                        'SELECT 1 FROM messages WHERE id = ?', (message_id,)).fetchone():
+                    renumbered.add(session_id)
+            for message_id, session_id, role, content, timestamp in rows:
+                cursor = conn.execute('''
+                    INSERT INTO messages (id, session_id, role, content, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (None if session_id in renumbered else message_id, session_id, role, content, timestamp))
+                id_map[message_id] = cursor.lastrowid
+        return id_map
+    
+    def remap_summaries(self, session_ids, id_map: Dict[int, int]):
+        """Point the rolling summaries of imported sessions at their messages' stored IDs"""
+        with self._connect() as conn:
+            for session_id in session_ids:
+                row = conn.execute('SELECT summary_message_id FROM sessions WHERE session_id = ?',
+                                   (session_id,)).fetchone()
+                if row and row[0] in id_map:
+                    conn.execute('UPDATE sessions SET summary_message_id = ? WHERE session_id = ?',
+                                 (id_map[row[0]], session_id))
+    
     def reset_database(self):
         """Delete all sessions and messages from the database"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             # Get count before deletion
             cursor = conn.execute('SELECT COUNT(*) FROM messages')
             message_count = cursor.fetchone()[0]
@@ -96,6 +296,7 @@ class SessionManager:
             # Delete all messages and sessions
             conn.execute('DELETE FROM messages')
             conn.execute('DELETE FROM sessions')
+            conn.execute('DELETE FROM memory_index')
             conn.commit()
             
             print(f"Deleted {message_count} messages and {session_count} sessions from database.")
@@ -0,0 +1,248 @@
+# database/sharding.py
+"""
+A knowledge base split across several Chroma collections ("shards") by one
+metadata field, e.g. the source, a tenant, or the month of the timestamp.
+
+ShardedCollection offers the part of the Chroma collection API the stores use
+(add, upsert, get, update, delete, query, count), so VectorStore, snapshots and
+embedding migrations work on it unchanged. Writes go to the shard of each
+record's field value. Queries run on the shards a `where` filter or an explicit
+`shards` list selects (all shards otherwise), in parallel on a thread pool, and
+the per-shard results are merged into one global top k. Each shard has its own
+HNSW index, so a single-shard query only searches that slice.
+
+Records without the field (including everything stored before sharding was
+enabled) stay in the unsharded collection, shard '', which is searched with
+the others.
+"""
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+SHARD_SEPARATOR = '.shard.'  # versioned collection names (embedding_migration) use '__'
+UNSHARDED = ''
+
+
+def shard_slug(value) -> str:
+    """Collection-name-safe form of a shard value (a hash keeps distinct values apart)"""
+    text = str(value)
+    slug = re.sub(r'[^a-zA-Z0-9._-]+', '-', text).strip('-._')[:48]
+    if slug == text and slug:
+        return slug
+    return f"{slug or 'shard'}-{hashlib.blake2b(text.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+class ShardedCollection:
+    """Several collections named `{name}.shard.{shard}` (plus `name` itself) used as one"""
+
+    def __init__(self, client, name: str, shard_by: str, open_collection: Callable[[str], Any],
+                 time_format: str = None, workers: int = 4):
+        self.client = client
+        self.name = name
+        self.shard_by = shard_by
+        self.time_format = time_format  # shard by this strftime bucket of an ISO timestamp field
+        self.workers = workers
+        self._open = open_collection
+        self._lock = threading.Lock()
+        self._executor = None
+        self._shards = {UNSHARDED: open_collection(name)}
+        prefix = name + SHARD_SEPARATOR
+        for existing in client.list_collections():
+            collection_name = getattr(existing, 'name', existing)
+            if collection_name.startswith(prefix):
+                self._shards[collection_name[len(prefix):]] = open_collection(collection_name)
+
+    # ---------- Routing ----------
+
+    def shard_of(self, metadata: Optional[Dict]) -> str:
+        """Shard of a record with `metadata`"""
+        value = (metadata or {}).get(self.shard_by)
+        if value is None or value == '':
+            return UNSHARDED
+        if self.time_format:
+            try:
+                value = datetime.fromisoformat(str(value)).strftime(self.time_format)
+            except ValueError:
+                return UNSHARDED
+        return shard_slug(value)
+
+    def shards(self) -> List[str]:
+        with self._lock:
+            return sorted(self._shards)
+
+    def _collection(self, shard: str, create: bool = False):
+        with self._lock:
+            collection = self._shards.get(shard)
+            if collection is None and create:
+                collection = self._shards[shard] = self._open(f"{self.name}{SHARD_SEPARATOR}{shard}")
+            return collection
+
+    def _selected(self, where: Dict = None, shards: List[str] = None) -> List[str]:
+        """Shards a query needs: the given shard values, those `where` pins the field to, or all"""
+        values = shards if shards is not None else self._filtered_values(where)
+        if values is None:
+            return self.shards()
+        with self._lock:
+            return sorted({shard_slug(value) for value in values} & set(self._shards))
+
+    def _filtered_values(self, where: Optional[Dict]) -> Optional[List]:
+        """Field values a filter restricts records to ({field: v}, $eq, $in, inside $and), else None"""
+        if not where or self.time_format:
+            return None
+        for clause in where.get('$and', []):
+            values = self._filtered_values(clause)
+            if values is not None:
+                return values
+        condition = where.get(self.shard_by)
+        if condition is None:
+            return None
+        if not isinstance(condition, dict):
+            return [condition]
+        if '$eq' in condition:
+            return [condition['$eq']]
+        if '$in' in condition:
+            return list(condition['$in'])
+        return None
+
+    def _map(self, function, shards: List[str]) -> List:
+        """`function(collection)` for each shard, in parallel when there are several"""
+        collections = [self._collection(shard) for shard in shards]
+        if len(collections) <= 1:
+            return [function(collection) for collection in collections]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shard')
+        return list(self._executor.map(function, collections))
+
+    # ---------- Collection API ----------
+
+    def count(self) -> int:
+        return sum(self._map(lambda collection: collection.count(), self.shards()))
+
+    def counts(self) -> Dict[str, int]:
+        """Records per shard"""
+        shards = self.shards()
+        return dict(zip(shards, self._map(lambda collection: collection.count(), shards)))
+
+    def _write(self, method: str, ids: List[str], metadatas: List[Dict] = None, **columns):
+        groups = {}
+        for i, meta in enumerate(metadatas if metadatas is not None else [None] * len(ids)):
+            groups.setdefault(self.shard_of(meta), []).append(i)
+        for shard, rows in groups.items():
+            subset = {key: [values[i] for i in rows] for key, values in columns.items() if values is not None}
+            if metadatas is not None:
+                subset['metadatas'] = [metadatas[i] for i in rows]
+            shard_ids = [ids[i] for i in rows]
+            if method == 'upsert':
+                # A record whose field changed leaves its old shard
+                others = [other for other in self.shards() if other != shard]
+                self._map(lambda collection: collection.delete(ids=shard_ids), others)
+            getattr(self._collection(shard, create=True), method)(ids=shard_ids, **subset)
+
+    def add(self, ids: List[str], embeddings=None, documents: List[str] = None, metadatas: List[Dict] = None):
+        self._write('add', ids, metadatas, embeddings=embeddings, documents=documents)
+
+    def upsert(self, ids: List[str], embeddings=None, documents: List[str] = None, metadatas: List[Dict] = None):
+        """Insert or replace records in the shards of their (new) metadata"""
+        self._write('upsert', ids, metadatas, embeddings=embeddings, documents=documents)
+
+    def update(self, ids: List[str], embeddings=None, documents: List[str] = None, metadatas: List[Dict] = None):
+        """Update records where they are stored; the shard field is not re-evaluated"""
+        columns = {'embeddings': embeddings, 'documents': documents, 'metadatas': metadatas}
+        position = {doc_id: i for i, doc_id in enumerate(ids)}
+        shards = self.shards()
+        found = self._map(lambda collection: collection.get(ids=list(ids), include=[])['ids'], shards)
+        for shard, shard_ids in zip(shards, found):
+            if shard_ids:
+                subset = {key: [values[position[doc_id]] for doc_id in shard_ids]
+                          for key, values in columns.items() if values is not None}
+                self._collection(shard).update(ids=shard_ids, **subset)
+
+    def delete(self, ids: List[str] = None, where: Dict = None):
+        self._map(lambda collection: collection.delete(ids=ids, where=where), self._selected(where))
+
+    def get(self, ids: List[str] = None, where: Dict = None, limit: int = None, offset: int = None,
+            include: List[str] = None) -> Dict:
+        """Records by ID from every shard, or a page over the shards in name order"""
+        include = include if include is not None else ['documents', 'metadatas']
+        shards = self._selected(where)
+        if ids is not None:
+            pages = self._map(lambda collection: collection.get(ids=ids, where=where, include=include), shards)
+            return _concatenate(pages, include)
+        pages, skip, remaining = [], offset or 0, limit
+        for shard in shards:
+            if remaining is not None and remaining <= 0:
+                break
+            collection = self._collection(shard)
+            page = collection.get(where=where, limit=remaining, offset=skip, include=include)
+            if not page['ids']:
+                # The whole shard lies before the offset: carry what is left of it to the next shard
+                skip -= _matching(collection, where, skip)
+                continue
+            pages.append(page)
+            skip = 0
+            if remaining is not None:
+                remaining -= len(page['ids'])
+        return _concatenate(pages, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Dict = None, include: List[str] = None,
+              shards: List[str] = None) -> Dict:
+        """Top `n_results` per query embedding over the selected shards (see `_selected`)"""
+        include = list(include) if include is not None else ['documents', 'metadatas', 'distances']
+        fetch = include if 'distances' in include else include + ['distances']
+
+        def search(collection):
+            available = collection.count()
+            if not available:
+                return None
+            return collection.query(query_embeddings=query_embeddings, n_results=min(n_results, available),
+                                    where=where, include=fetch)
+
+        results = [result for result in self._map(search, self._selected(where, shards)) if result]
+        merged = {'ids': []}
+        merged.update({key: [] for key in include})
+        for row in range(len(query_embeddings)):
+            candidates = [(result['distances'][row][i], result, i) for result in results
+                          for i in range(len(result['ids'][row]))]
+            candidates.sort(key=lambda candidate: candidate[0])
+            top = candidates[:n_results]
+            merged['ids'].append([result['ids'][row][i] for _, result, i in top])
+            for key in include:
+                merged[key].append([result[key][row][i] for _, result, i in top])
+        return merged
+
+    def modify(self, **kwargs):
+        for shard in self.shards():
+            self._collection(shard).modify(**kwargs)
+
+    @property
+    def configuration(self):
+        return getattr(self._collection(UNSHARDED), 'configuration', None)
+
+    @property
+    def metadata(self):
+        return self._collection(UNSHARDED).metadata
+
+
+def _matching(collection, where: Optional[Dict], at_most: int, page_size: int = 1000) -> int:
+    """Records of `collection` matching `where` (counted up to `at_most`), read in bounded pages"""
+    if where is None:
+        return collection.count()
+    counted = 0
+    while counted < at_most:
+        size = min(page_size, at_most - counted)
+        found = len(collection.get(where=where, limit=size, offset=counted, include=[])['ids'])
+        counted += found
+        if found < size:
+            break
+    return counted
+
+
+def _concatenate(pages: List[Dict], include: List[str]) -> Dict:
+    merged = {'ids': [doc_id for page in pages for doc_id in page['ids']]}
+    for key in include:
+        merged[key] = [value for page in pages if page.get(key) is not None for value in page[key]]
+    return merged
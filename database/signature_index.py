@@ -0,0 +1,203 @@
+# database/signature_index.py
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from helper.tracing import traced
+
+SCHEMA_VERSION = 3  # 2: signatures carry the scope (shard) of their chunk; 3: and their sequence number
+
+
+class SignatureIndex:
+    """
+    SQLite index of chunk MinHash signatures, kept next to the vector store.
+    Each signature is stored once as a blob plus one row per LSH band; a lookup
+    is one indexed equality probe per band followed by an exact similarity check
+    of the few candidates, so it stays fast however many chunks there are.
+    Links record where skipped, linked or merged duplicates came from.
+    Every signature has a scope (the shard of a sharded knowledge base, '' otherwise),
+    and lookups given a scope only match chunks of that scope. Each `add` takes the
+    next sequence number, so a lookup can be limited to signatures added after an
+    earlier `sequence()` (e.g. by concurrent ingests since a first lookup).
+    """
+
+    def __init__(self, db_path: str, num_perm: int = 64, bands: int = 16, busy_timeout: float = 30.0):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.db_path = db_path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.busy_timeout = busy_timeout
+        self.init_db()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def init_db(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Signatures depend on the schema, num_perm and bands: start over if any changed
+            # (the vector store re-indexes its chunks when the index is empty)
+            layout = (SCHEMA_VERSION * 1000 + self.num_perm) * 1000 + self.bands
+            if conn.execute('PRAGMA user_version').fetchone()[0] != layout:
+                conn.execute('DROP TABLE IF EXISTS signature_bands')
+                conn.execute('DROP TABLE IF EXISTS chunk_signatures')
+                conn.execute('DROP TABLE IF EXISTS signature_sequence')
+                conn.execute(f'PRAGMA user_version = {int(layout)}')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunk_signatures (
+                    doc_id TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    scope TEXT NOT NULL DEFAULT '',
+                    seq INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE TABLE IF NOT EXISTS signature_sequence (value INTEGER NOT NULL)')
+            if conn.execute('SELECT COUNT(*) FROM signature_sequence').fetchone()[0] == 0:
+                conn.execute('INSERT INTO signature_sequence (value) VALUES (0)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS signature_bands (
+                    band INTEGER NOT NULL,
+                    key INTEGER NOT NULL,
+                    doc_id TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_signature_bands
+                ON signature_bands (band, key)
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_signature_bands_doc
+                ON signature_bands (doc_id)
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunk_links (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id TEXT NOT NULL,
+                    policy TEXT,
+                    source TEXT,
+                    metadata TEXT,
+                    created_at TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_chunk_links_doc
+                ON chunk_links (doc_id)
+            ''')
+
+    def sequence(self) -> int:
+        """Sequence number of the latest `add`"""
+        with self._connect() as conn:
+            return conn.execute('SELECT value FROM signature_sequence').fetchone()[0]
+
+    def find(self, signature, min_similarity: float, scope: str = None) -> Optional[Tuple[str, float]]:
+        """
+        Most similar indexed chunk with at least `min_similarity`, as (doc_id, similarity),
+        or None. With `scope`, only chunks of that scope are considered.
+        """
+        return self.find_many([signature], min_similarity, None if scope is None else [scope])[0]
+
+    @traced('signatures.find_many')
+    def find_many(self, signatures: List, min_similarity: float, scopes: List[str] = None,
+                  after: int = None) -> List[Optional[Tuple[str, float]]]:
+        """
+        `find` for a batch of signatures over one connection (`scopes`: one per signature).
+        With `after`, only signatures added after that `sequence()` are considered.
+        """
+        import numpy as np
+        from processing.near_duplicates import band_keys
+
+        where = ' OR '.join('(b.band = ? AND b.key = ?)' for _ in range(self.bands))
+        query = f'''
+            SELECT DISTINCT s.doc_id, s.signature FROM signature_bands b
+            JOIN chunk_signatures s ON s.doc_id = b.doc_id
+            WHERE ({where})
+        '''
+        if scopes is not None:
+            query += ' AND s.scope = ?'
+        if after is not None:
+            query += ' AND s.seq > ?'
+        matches = []
+        with self._connect() as conn:
+            for i, signature in enumerate(signatures):
+                probes = [value for probe in enumerate(band_keys(signature, self.bands)) for value in probe]
+                if scopes is not None:
+                    probes.append(scopes[i])
+                if after is not None:
+                    probes.append(after)
+                rows = conn.execute(query, probes).fetchall()
+                if not rows:
+                    matches.append(None)
+                    continue
+                candidates = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.uint64).reshape(len(rows), -1)
+                scores = (candidates == signature[None, :]).mean(axis=1)
+                best = int(np.argmax(scores))
+                matches.append((rows[best][0], float(scores[best])) if scores[best] >= min_similarity else None)
+        return matches
+
+    def add(self, signatures: Dict[str, object], scopes: Dict[str, str] = None):
+        """Insert or replace the signatures (uint64 arrays) of chunks by ID, with their scopes ('' if not given)"""
+        from processing.near_duplicates import band_keys
+
+        if not signatures:
+            return
+        scopes = scopes or {}
+        with self._connect() as conn:
+            conn.execute('UPDATE signature_sequence SET value = value + 1')
+            seq = conn.execute('SELECT value FROM signature_sequence').fetchone()[0]
+            self._delete(conn, list(signatures), links=False)
+            conn.executemany('INSERT INTO chunk_signatures (doc_id, signature, scope, seq) VALUES (?, ?, ?, ?)',
+                             [(doc_id, signature.tobytes(), scopes.get(doc_id, ''), seq)
+                              for doc_id, signature in signatures.items()])
+            conn.executemany('INSERT INTO signature_bands (band, key, doc_id) VALUES (?, ?, ?)',
+                             [(band, key, doc_id) for doc_id, signature in signatures.items()
+                              for band, key in enumerate(band_keys(signature, self.bands))])
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self._connect() as conn:
+            self._delete(conn, list(doc_ids))
+
+    @staticmethod
+    def _delete(conn, doc_ids: List[str], links: bool = True):
+        for start in range(0, len(doc_ids), 500):
+            page = doc_ids[start:start + 500]
+            marks = ', '.join('?' for _ in page)
+            conn.execute(f'DELETE FROM chunk_signatures WHERE doc_id IN ({marks})', page)
+            conn.execute(f'DELETE FROM signature_bands WHERE doc_id IN ({marks})', page)
+            if links:
+                conn.execute(f'DELETE FROM chunk_links WHERE doc_id IN ({marks})', page)
+
+    def link(self, doc_id: str, policy: str, source: str = None, metadata: Dict = None):
+        """Remember that a duplicate of `doc_id` arrived (and was skipped, linked or merged)"""
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO chunk_links (doc_id, policy, source, metadata, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (doc_id, policy, source, json.dumps(metadata or {}), datetime.now().isoformat()))
+
+    def links(self, doc_id: str) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT policy, source, metadata, created_at FROM chunk_links WHERE doc_id = ? ORDER BY id
+            ''', (doc_id,)).fetchall()
+        return [{'policy': row[0], 'source': row[1], 'metadata': json.loads(row[2] or '{}'),
+                 'created_at': row[3]} for row in rows]
+
+    def count(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            signatures = conn.execute('SELECT COUNT(*) FROM chunk_signatures').fetchone()[0]
+            links = conn.execute('SELECT COUNT(*) FROM chunk_links').fetchone()[0]
+        return {'signatures': signatures, 'links': links}
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM signature_bands')
+            conn.execute('DELETE FROM chunk_signatures')
+            conn.execute('DELETE FROM chunk_links')
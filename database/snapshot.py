@@ -0,0 +1,292 @@
+# database/snapshot.py
+"""
+Compact snapshots of the knowledge base, conversation memory and sessions.
+
+A snapshot is a directory:
+
+    manifest.json                   format, embedding model, counts and SHA-256 of every file
+    knowledge_base.vectors          embeddings, one row per record (little-endian float16 or float32)
+    knowledge_base.columns.jsonl.gz one gzipped JSON line per page: ids, documents, metadata by key
+    memory.vectors / memory.columns.jsonl.gz
+    sessions.jsonl.gz               sessions, messages and memory_index rows, one table page per line
+
+Export pages through the collections (Config.STORE_PAGE_SIZE records at a time),
+so memory stays flat however large the store is. Import checks every checksum
+first, then bulk-loads the stored embeddings page by page: nothing is re-embedded,
+so no Ollama call is made and restore time depends on disk throughput.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List
+
+from config import Config
+
+FORMAT = 'personal-agent-snapshot'
+VERSION = 1
+DTYPES = {'float16': '<f2', 'float32': '<f4'}
+COLLECTIONS = ('knowledge_base', 'memory')
+SESSIONS_FILE = 'sessions.jsonl.gz'
+# Sessions before messages before memory_index, so imports can remap message IDs
+SESSION_TABLES = ('sessions', 'messages', 'memory_index')
+
+
+class SnapshotError(Exception):
+    """The snapshot is missing, damaged or does not fit the target store"""
+
+
+class _HashingWriter:
+    """File wrapper computing the SHA-256 of everything written through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def _columns(metadatas: List[Dict]) -> Dict[str, List]:
+    """Metadata dicts as one list per key (None where a record lacks the key)"""
+    keys = sorted({key for meta in metadatas for key in (meta or {})})
+    return {key: [(meta or {}).get(key) for meta in metadatas] for key in keys}
+
+
+def _rows(columns: Dict[str, List], count: int) -> List[Dict]:
+    return [{key: values[i] for key, values in columns.items() if values[i] is not None} for i in range(count)]
+
+
+def _export_collection(vector_store, collection, directory: str, name: str, dtype: str,
+                       page_size: int, on_page: Callable[[int], None] = None) -> Dict:
+    import numpy as np
+
+    vectors_file, columns_file = f'{name}.vectors', f'{name}.columns.jsonl.gz'
+    records, dimension = 0, 0
+    with open(os.path.join(directory, vectors_file), 'wb') as raw_vectors, \
+            open(os.path.join(directory, columns_file), 'wb') as raw_columns:
+        vectors, columns = _HashingWriter(raw_vectors), _HashingWriter(raw_columns)
+        with gzip.GzipFile(fileobj=columns, mode='wb') as compressed:
+            for page in vector_store.iter_pages(collection, page_size=page_size,
+                                                include=['documents', 'metadatas', 'embeddings']):
+                embeddings = np.asarray(page['embeddings'], dtype=DTYPES[dtype])
+                dimension = dimension or embeddings.shape[1]
+                if embeddings.shape[1] != dimension:
+                    raise SnapshotError(f"{name} mixes embedding sizes {dimension} and {embeddings.shape[1]}")
+                vectors.write(embeddings.tobytes())
+                line = {
+                    'ids': page['ids'],
+                    'documents': page.get('documents') or [None] * len(page['ids']),
+                    'metadata': _columns(page.get('metadatas') or [])
+                }
+                compressed.write((json.dumps(line) + "\n").encode('utf-8'))
+                records += len(page['ids'])
+                if on_page is not None:
+                    on_page(len(page['ids']))
+    return {
+        'records': records,
+        'dimension': int(dimension),
+        'vectors': vectors_file,
+        'columns': columns_file,
+        'checksums': {vectors_file: vectors.sha256.hexdigest(), columns_file: columns.sha256.hexdigest()}
+    }
+
+
+def _export_sessions(session_manager, directory: str, page_size: int) -> Dict:
+    counts = {table: 0 for table in SESSION_TABLES}
+    with open(os.path.join(directory, SESSIONS_FILE), 'wb') as raw:
+        hashing = _HashingWriter(raw)
+        with gzip.GzipFile(fileobj=hashing, mode='wb') as compressed:
+            for table in SESSION_TABLES:
+                names = session_manager.SNAPSHOT_COLUMNS[table]
+                for rows in session_manager.iter_table_rows(table, page_size=page_size):
+                    line = {'table': table, 'columns': {name: [row[i] for row in rows] for i, name in enumerate(names)}}
+                    compressed.write((json.dumps(line) + "\n").encode('utf-8'))
+                    counts[table] += len(rows)
+    return dict(counts, checksums={SESSIONS_FILE: hashing.sha256.hexdigest()})
+
+
+def export_snapshot(vector_store, session_manager, path: str, dtype: str = None, page_size: int = None,
+                    progress: Callable[[int, int], None] = None) -> Dict:
+    """
+    Write a snapshot of `vector_store` (and `session_manager`, if given) to the new
+    directory `path`. It is built in `path + '.partial'` and renamed when complete,
+    so an interrupted export never leaves something that looks like a snapshot.
+    `progress(done, total)` is called with record counts after every page; an
+    exception it raises aborts the export. Returns the manifest.
+    """
+    dtype = dtype or Config.SNAPSHOT_DTYPE
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype must be one of {', '.join(DTYPES)}")
+    page_size = page_size or Config.STORE_PAGE_SIZE
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists")
+
+    partial = path.rstrip(os.sep) + '.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    try:
+        manifest = {
+            'format': FORMAT,
+            'version': VERSION,
+            'created_at': datetime.now().isoformat(),
+            'embedding_model': vector_store.embedding_model,
+            'dtype': dtype,
+            'collections': {},
+            'checksums': {}
+        }
+        sources = {'knowledge_base': vector_store.collection, 'memory': vector_store.memory_collection}
+        on_page = None
+        if progress is not None:
+            counts = {'done': 0, 'total': sum(sources[name].count() for name in COLLECTIONS)}
+            progress(0, counts['total'])
+
+            def on_page(records):
+                counts['done'] += records
+                progress(counts['done'], max(counts['total'], counts['done']))
+        for name in COLLECTIONS:
+            exported = _export_collection(vector_store, sources[name], partial, name, dtype, page_size, on_page)
+            manifest['checksums'].update(exported.pop('checksums'))
+            manifest['collections'][name] = exported
+        if session_manager is not None:
+            exported = _export_sessions(session_manager, partial, page_size)
+            manifest['checksums'].update(exported.pop('checksums'))
+            manifest['sessions'] = dict(exported, file=SESSIONS_FILE)
+
+        with open(os.path.join(partial, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return manifest
+
+
+def read_manifest(path: str) -> Dict:
+    try:
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"No readable snapshot manifest in {path}: {e}")
+    if manifest.get('format') != FORMAT or manifest.get('version') != VERSION:
+        raise SnapshotError(f"{path} is not a version {VERSION} snapshot")
+    return manifest
+
+
+def verify_snapshot(path: str, manifest: Dict = None) -> Dict:
+    """Check every file of a snapshot against its manifest checksum; returns the manifest"""
+    manifest = manifest or read_manifest(path)
+    for name, expected in manifest['checksums'].items():
+        digest = hashlib.sha256()
+        try:
+            with open(os.path.join(path, name), 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        except OSError as e:
+            raise SnapshotError(f"Snapshot file {name} is unreadable: {e}")
+        if digest.hexdigest() != expected:
+            raise SnapshotError(f"Snapshot file {name} is damaged (checksum mismatch)")
+    return manifest
+
+
+def _iter_collection(path: str, info: Dict, dtype: str) -> Iterator:
+    """Yield (ids, documents, metadatas, float32 embeddings) per exported page"""
+    import numpy as np
+
+    row_bytes = info['dimension'] * np.dtype(DTYPES[dtype]).itemsize
+    with open(os.path.join(path, info['vectors']), 'rb') as vectors, \
+            gzip.open(os.path.join(path, info['columns']), 'rt', encoding='utf-8') as columns:
+        for line in columns:
+            page = json.loads(line)
+            count = len(page['ids'])
+            data = vectors.read(count * row_bytes)
+            if len(data) != count * row_bytes:
+                raise SnapshotError(f"{info['vectors']} ends early")
+            embeddings = np.frombuffer(data, dtype=DTYPES[dtype]).reshape(count, info['dimension'])
+            yield page['ids'], page['documents'], _rows(page['metadata'], count), embeddings.astype(np.float32)
+
+
+def _stored_dimension(collection):
+    page = collection.get(limit=1, include=['embeddings'])
+    embeddings = page.get('embeddings')
+    return len(embeddings[0]) if embeddings is not None and len(embeddings) else None
+
+
+def _import_sessions(session_manager, path: str) -> Dict:
+    """Load sessions new to the target; returns counts and the message ID map"""
+    added_sessions, id_map, indexed, renumbered = set(), {}, 0, set()
+    with gzip.open(os.path.join(path, SESSIONS_FILE), 'rt', encoding='utf-8') as f:
+        for line in f:
+            page = json.loads(line)
+            names = session_manager.SNAPSHOT_COLUMNS[page['table']]
+            rows = list(zip(*(page['columns'][name] for name in names)))
+            if page['table'] == 'sessions':
+                added_sessions.update(session_manager.import_sessions(rows))
+            elif page['table'] == 'messages':
+                id_map.update(session_manager.import_messages(rows, added_sessions, renumbered))
+            else:
+                message_ids = [id_map[row[0]] for row in rows if row[0] in id_map]
+                session_manager.mark_messages_indexed(message_ids)
+                indexed += len(message_ids)
+    session_manager.remap_summaries(added_sessions, id_map)
+    return {'sessions': len(added_sessions), 'messages': len(id_map), 'memory_index': indexed,
+            'id_map': id_map}
+
+
+def _remap_memory(ids, documents, metadatas, embeddings, id_map):
+    """Point memory records at the message IDs they were imported under; drop the rest"""
+    keep = []
+    for i, meta in enumerate(metadatas):
+        message_id = meta.get('message_id')
+        if message_id in id_map:
+            meta['message_id'] = id_map[message_id]
+            ids[i] = f"msg-{id_map[message_id]}"
+            keep.append(i)
+    return ([ids[i] for i in keep], [documents[i] for i in keep], [metadatas[i] for i in keep],
+            embeddings[keep])
+
+
+def import_snapshot(vector_store, session_manager, path: str, verify: bool = True) -> Dict:
+    """
+    Bulk-load a snapshot into `vector_store` (upserting by ID) and, given a
+    `session_manager`, add its sessions that do not exist yet. Conversation memory
+    is only loaded together with its sessions, since its IDs follow message IDs.
+    Returns the number of records, sessions and messages loaded.
+    """
+    manifest = verify_snapshot(path) if verify else read_manifest(path)
+    if manifest['embedding_model'] != vector_store.embedding_model:
+        raise SnapshotError(f"Snapshot embeddings come from {manifest['embedding_model']}, "
+                            f"but this store uses {vector_store.embedding_model}")
+    sources = {'knowledge_base': vector_store.collection, 'memory': vector_store.memory_collection}
+    for name in COLLECTIONS:
+        info = manifest['collections'][name]
+        stored = _stored_dimension(sources[name])
+        if info['records'] and stored and stored != info['dimension']:
+            raise SnapshotError(f"Snapshot {name} embeddings have {info['dimension']} dimensions, "
+                                f"the store has {stored}")
+
+    loaded = {'knowledge_base': 0, 'memory': 0, 'sessions': 0, 'messages': 0}
+    id_map = None
+    if session_manager is not None and 'sessions' in manifest:
+        sessions = _import_sessions(session_manager, path)
+        id_map = sessions.pop('id_map')
+        loaded.update(sessions)
+
+    for name in COLLECTIONS:
+        if name == 'memory' and id_map is None:
+            continue
+        print(f"Loading {manifest['collections'][name]['records']} {name} records...")
+        for ids, documents, metadatas, embeddings in _iter_collection(path, manifest['collections'][name],
+                                                                      manifest['dtype']):
+            if name == 'memory':
+                ids, documents, metadatas, embeddings = _remap_memory(ids, documents, metadatas,
+                                                                      embeddings, id_map)
+            vector_store.load_records(ids, documents, metadatas, embeddings, memory=name == 'memory')
+            loaded[name] += len(ids)
+    return loaded
@@ -2,46 +2,151 @@
 import chromadb
 from chromadb.config import Settings
 from typing import List, Dict, Any
+import os
+import threading
 import uuid
 from datetime import datetime
 from ollama_runner import OllamaClient
 from config import Config
+from helper.tracing import traced, tracer
+from database.sharding import ShardedCollection, UNSHARDED, shard_slug
+
+# Metadata field numbering each record, so scans can read bounded ranges (see RecordSequence)
+SEQ_FIELD = '_seq'
+
+
+def hnsw_metadata(m: int = None, construction_ef: int = None, search_ef: int = None) -> Dict[str, Any]:
+    """Collection metadata creating a cosine HNSW index (Config.HNSW_* for parameters not given)"""
+    return {
+        "hnsw:space": "cosine",
+        "hnsw:M": m or Config.HNSW_M,
+        "hnsw:construction_ef": construction_ef or Config.HNSW_CONSTRUCTION_EF,
+        "hnsw:search_ef": search_ef or Config.HNSW_SEARCH_EF
+    }
+
+def set_search_ef(collection, search_ef: int) -> bool:
+    """
+    Change the query-time candidate list size of an existing collection (M and
+    construction_ef cannot change once built). Chroma applies it when the index is
+    loaded, i.e. from the first query of the process on. False if nothing changed.
+    """
+    configuration = getattr(collection, 'configuration', None) or {}
+    hnsw = configuration.get('hnsw') or {}
+    if not hnsw or hnsw.get('ef_search') == search_ef:
+        return False
+    try:
+        collection.modify(configuration={'hnsw': {'ef_search': search_ef}})
+    except Exception as e:
+        print(f"Could not set search_ef of {collection.name}: {e}")
+        return False
+    return True
 
 class VectorStore:
+    """
+    Chroma-backed knowledge base and conversation memory.
+    One instance can be shared between threads: reads run concurrently, while
+    writes are serialized so multi-step updates are never observed half done.
+    Collections are versioned by embedding model (see database/embedding_migration.py):
+    queries use the active model's collections until a migration switches them.
+    With Config.SHARD_BY, the knowledge base is split into shards by that metadata
+    field (see database/sharding.py); conversation memory is never sharded.
+    """
+    
     def __init__(self, persist_directory: str, collection_name: str = "knowledge_base",
-                 embedding_model: str = None):
+                 embedding_model: str = None, memory_collection_name: str = None):
+        from database.embedding_migration import CollectionRegistry
+        
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(anonymized_telemetry=False)
         )
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.collection_name = collection_name
+        self.memory_collection_name = memory_collection_name or Config.MEMORY_COLLECTION
+        # The configured model; the active one differs until a migration to it completes
+        self.target_embedding_model = embedding_model or Config.EMBEDDING_MODEL
+        self.registry = CollectionRegistry(os.path.join(persist_directory, 'collections.json'))
+        entry = self.registry.resolve(collection_name, self.memory_collection_name, self.target_embedding_model)
+        self.embedding_model = entry['active']
+        version = entry['versions'][self.embedding_model]
+        self.collection = self._open_collection(version['collection'], sharded=True)
+        # Past conversation messages, kept apart from the knowledge base
+        self.memory_collection = self._open_collection(version['memory_collection'])
+        if self.needs_migration:
+            print(f"Embedding model changed from {self.embedding_model} to {self.target_embedding_model}: "
+                  f"searches use {self.embedding_model} until the migration completes (--mode migrate).")
         # Use Ollama for embeddings
         self.ollama_client = OllamaClient(base_url=Config.OLLAMA_BASE_URL)
-        self.embedding_model = embedding_model or Config.EMBEDDING_MODEL
-    
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Get embeddings for a list of texts using Ollama"""
-        embeddings = []
-        for text in texts:
-            embedding = self.ollama_client.get_embeddings(
-                model=self.embedding_model,
-                prompt=text
-            )
-            embeddings.append(embedding)
-        return embeddings
+        self._write_lock = threading.RLock()
+        # Optional replacement for per-text Ollama calls, e.g. a cross-request batcher
+        self.embedder = None
+        self.model_embedders = {}  # embedding model -> embedder, for models other than the active one
+        # Background re-embedding into another model's collections, and the IDs written meanwhile
+        self.migration = None
+        self._migration_ids = None
+        self.on_switch = []  # callbacks(model) run when a migration switches the active model
+        # Bumped on every write so cached search results can tell they are stale
+        self.generation = 0
+        # MinHash signatures of stored chunks, for near-duplicate detection at ingest
+        from database.signature_index import SignatureIndex
+        self.signatures = SignatureIndex(os.path.join(persist_directory, 'signatures.db'),
+                                         num_perm=Config.DEDUP_NUM_PERM, bands=Config.DEDUP_BANDS)
+        self.duplicate_counts = {'skipped': 0, 'linked': 0, 'merged': 0}
+        self._signatures_checked = False
+        # Scan numbers of the records of this store's collections
+        from database.record_sequence import RecordSequence
+        self.sequence = RecordSequence(os.path.join(persist_directory, 'sequence.db'))
+        self._numbered_collections = set()
+    
+    def _open_collection(self, name: str, sharded: bool = False):
+        if sharded and Config.SHARD_BY:
+            time_format = Config.SHARD_TIME_FORMAT if Config.SHARD_BY == 'timestamp' else None
+            return ShardedCollection(self.client, name, Config.SHARD_BY, self._open_collection,
+                                     time_format=time_format, workers=Config.SHARD_SEARCH_WORKERS)
+        collection = self.client.get_or_create_collection(name=name, metadata=hnsw_metadata())
+        set_search_ef(collection, Config.HNSW_SEARCH_EF)
+        return collection
+    
+    def _dedup_scope(self, metadata: Dict = None) -> str:
+        """Shard a record is stored in; near-duplicates are only matched within it"""
+        if isinstance(self.collection, ShardedCollection):
+            return self.collection.shard_of(metadata)
+        return UNSHARDED
+    
+    def set_embedder(self, embedder, model: str = None):
+        """
+        Route embedding calls through `embedder(texts) -> embeddings` (None restores Ollama).
+        With `model`, only embeddings for that model, e.g. the target of a migration.
+        """
+        if model is None or model == self.embedding_model:
+            self.embedder = embedder
+        else:
+            self.model_embedders[model] = embedder
+    
+    @traced('vector_store.get_embeddings')
+    def get_embeddings(self, texts: List[str], model: str = None) -> List[List[float]]:
+        """Get embeddings for a list of texts using Ollama (with the active model unless `model` is given)"""
+        if model is not None and model != self.embedding_model:
+            if self.model_embedders.get(model) is not None:
+                return self.model_embedders[model](texts)
+            return self.ollama_client.embed_batch(model, texts)
+        if self.embedder is not None:
+            return self.embedder(texts)
+        
+        # One /api/embed request for the whole list (older servers: one request per text)
+        return self.ollama_client.embed_batch(self.embedding_model, texts)
     
-    def add_documents(self, texts: List[str], metadata: List[Dict[str, Any]] = None):
-        """Add documents to vector store"""
+    @traced('vector_store.add_documents')
+    def add_documents(self, texts: List[str], metadata: List[Dict[str, Any]] = None,
+                      inserted: List[str] = None):
+        """
+        Add documents to vector store. Near-duplicates of stored chunks (or of each
+        other) are handled by Config.DEDUP_POLICY instead of being stored again.
+        Returns one ID per text: a duplicate gets the ID of the chunk it matched.
+        The IDs of the chunks actually stored are appended to `inserted`, if given.
+        """
         if not texts:
             return
         
-        print(f"Generating embeddings for {len(texts)} documents...")
-        # Generate embeddings using Ollama
-        embeddings = self.get_embeddings(texts)
-        
         # Generate IDs
         ids = [str(uuid.uuid4()) for _ in texts]
         
@@ -56,40 +161,468 @@ class VectorStore:
             cleaned_meta['timestamp'] = datetime.now().isoformat()
             cleaned_metadata.append(cleaned_meta)
         
+        texts = list(texts)
+        result_ids = list(ids)
+        keep = list(range(len(texts)))  # batch indices to store
+        stored_duplicates = []  # (batch index, ID of the stored chunk it repeats)
+        batch_duplicates = 0
+        dedup = Config.DEDUP_POLICY != 'off'
+        if dedup:
+            from processing.near_duplicates import minhash
+            
+            self._ensure_signature_index()
+            # Signatures added after this point are checked again under the write lock
+            mark = self.signatures.sequence()
+            batch_signatures = [minhash(text, Config.DEDUP_NUM_PERM) for text in texts]
+            scopes = [self._dedup_scope(meta) for meta in cleaned_metadata]
+            matches = self._find_duplicates(batch_signatures, scopes)
+            keep = [i for i, match in enumerate(matches) if match is None]
+            for i, match in enumerate(matches):
+                if match is None:
+                    continue
+                kind, target = match
+                if kind == 'stored':
+                    result_ids[i] = target
+                    stored_duplicates.append((i, target))
+                    continue
+                result_ids[i] = ids[target]
+                batch_duplicates += 1
+                if Config.DEDUP_POLICY == 'merge':
+                    # The newer text of the batch is the one stored
+                    texts[target], cleaned_metadata[target] = texts[i], cleaned_metadata[i]
+                    batch_signatures[target] = batch_signatures[i]
+        
+        # Texts replacing stored chunks under 'merge' are embedded in the same call
+        merge_sources = {}
+        if Config.DEDUP_POLICY == 'merge':
+            merge_sources = {doc_id: i for i, doc_id in stored_duplicates}
+        embed = keep + sorted(set(merge_sources.values()))
+        model = self.embedding_model
+        embeddings = {}
+        if embed:
+            print(f"Generating embeddings for {len(embed)} documents...")
+            # Generate embeddings using Ollama
+            embeddings = dict(zip(embed, self.get_embeddings([texts[i] for i in embed])))
+        
         # Add to collection
-        self.collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=cleaned_metadata,
-            ids=ids
-        )
+        with self._write_lock:
+            if dedup and keep:
+                # A concurrent ingest may have stored the same text since the lookup above; only
+                # signatures added since then are looked at. The lock also covers the insert below.
+                late = self._find_duplicates([batch_signatures[i] for i in keep], [scopes[i] for i in keep],
+                                             after=mark, within_batch=False)
+                stored_as = {}
+                for i, match in zip(list(keep), late):
+                    if match is not None:
+                        keep.remove(i)
+                        stored_as[ids[i]] = match[1]
+                        stored_duplicates.append((i, match[1]))
+                result_ids = [stored_as.get(doc_id, doc_id) for doc_id in result_ids]
+            kept_ids = [ids[i] for i in keep]
+            if keep:
+                kept_texts = [texts[i] for i in keep]
+                self.collection.add(
+                    embeddings=self._current_embeddings(kept_texts, [embeddings[i] for i in keep], model),
+                    documents=kept_texts,
+                    metadatas=self._number(self.collection, kept_ids, [cleaned_metadata[i] for i in keep],
+                                           new=True),
+                    ids=kept_ids
+                )
+                self.generation += 1
+                self._track(kept_ids)
+                if dedup:
+                    self.signatures.add({ids[i]: batch_signatures[i] for i in keep},
+                                        {ids[i]: scopes[i] for i in keep})
         
-        print(f"Successfully added {len(texts)} documents to vector store.")
-        return ids
+        # Links, counts and merged text are recorded once, outside the lock
+        if dedup:
+            self._apply_duplicates(sorted(stored_duplicates), batch_duplicates, texts, cleaned_metadata,
+                                   embeddings, model)
+        if inserted is not None:
+            inserted.extend(kept_ids)
+        
+        if keep:
+            print(f"Successfully added {len(keep)} documents to vector store.")
+        return result_ids
     
-    def search(self, query: str, n_results: int = 5, filter_dict: Dict = None):
-        """Search for similar documents"""
+    @traced('vector_store.find_duplicates')
+    def _find_duplicates(self, batch_signatures: List, scopes: List[str], after: int = None,
+                         within_batch: bool = True) -> List:
+        """
+        Look up, without changing anything, what each text of a batch duplicates: None
+        for a new text, ('batch', j) for an earlier new text j of the batch, or ('stored',
+        doc_id) for a stored chunk. Matches stay within a text's scope (its shard).
+        `after` limits stored chunks to those indexed after that signature sequence number.
+        """
+        import numpy as np
+        
+        threshold = Config.DEDUP_MIN_SIMILARITY
+        stored_matches = self.signatures.find_many(batch_signatures, threshold, scopes, after=after)
+        matches = []
+        kept = []  # batch indices of new texts
+        kept_matrix = np.empty((len(batch_signatures), Config.DEDUP_NUM_PERM), dtype=np.uint64)
+        for i, (signature, match) in enumerate(zip(batch_signatures, stored_matches)):
+            if within_batch and kept:
+                scores = (kept_matrix[:len(kept)] == signature[None, :]).mean(axis=1)
+                scores[np.array([scopes[k] != scopes[i] for k in kept], dtype=bool)] = 0
+                best = int(np.argmax(scores))
+                if scores[best] >= threshold:
+                    matches.append(('batch', kept[best]))
+                    continue
+            if match is not None:
+                matches.append(('stored', match[0]))
+                continue
+            kept_matrix[len(kept)] = signature
+            kept.append(i)
+            matches.append(None)
+        return matches
+    
+    def _apply_duplicates(self, stored_duplicates: List, batch_duplicates: int, texts: List[str],
+                          metadata: List[Dict], embeddings: Dict, model: str):
+        """
+        Record the duplicates found by an ingest according to Config.DEDUP_POLICY:
+        count them, link them to the chunks they repeat, or merge their text into
+        those chunks (the newest duplicate wins, with the embedding already made).
+        """
+        policy = Config.DEDUP_POLICY
+        for _ in range(batch_duplicates):
+            self._count_duplicate(policy)
+        links = {}  # existing doc_id -> number of duplicates linked in this batch
+        merges = {}  # existing doc_id -> batch index of its newest duplicate
+        for i, doc_id in stored_duplicates:
+            self._count_duplicate(policy)
+            if policy == 'merge':
+                merges[doc_id] = i
+            else:
+                self.signatures.link(doc_id, policy, source=metadata[i].get('source'), metadata=metadata[i])
+                if policy == 'link':
+                    links[doc_id] = links.get(doc_id, 0) + 1
+        
+        if links:
+            self._record_links(links)
+        if merges:
+            merge_ids = list(merges)
+            self._replace_documents(merge_ids, [texts[merges[d]] for d in merge_ids],
+                                    [dict(metadata[merges[d]], merged_duplicate=True) for d in merge_ids],
+                                    [embeddings[merges[d]] for d in merge_ids], model)
+            for doc_id in merge_ids:
+                self.signatures.link(doc_id, 'merge', source=metadata[merges[doc_id]].get('source'))
+    
+    def _count_duplicate(self, policy: str):
+        key = {'skip': 'skipped', 'link': 'linked', 'merge': 'merged'}.get(policy)
+        if key:
+            self.duplicate_counts[key] += 1
+    
+    def _record_links(self, links: Dict[str, int]):
+        """Count linked duplicates on the chunks they matched (metadata only, no re-embedding)"""
+        doc_ids = list(links)
+        with self._write_lock:
+            existing = self.collection.get(ids=doc_ids, include=['metadatas'])
+            if not existing['ids']:
+                return
+            now = datetime.now().isoformat()
+            metadatas = []
+            for doc_id, meta in zip(existing['ids'], existing['metadatas']):
+                meta = dict(meta or {})
+                meta['duplicate_count'] = meta.get('duplicate_count', 0) + links[doc_id]
+                meta['last_duplicate_at'] = now
+                metadatas.append(meta)
+            self.collection.update(ids=existing['ids'], metadatas=metadatas)
+            self.generation += 1
+            self._track(existing['ids'])
+    
+    def _ensure_signature_index(self):
+        """Index chunks stored before duplicate detection existed (once, if the index is empty)"""
+        from processing.near_duplicates import minhash
+        
+        if self._signatures_checked:
+            return
+        self._signatures_checked = True
+        if self.signatures.count()['signatures'] or not self.collection.count():
+            return
+        print("Building near-duplicate signature index...")
+        page, scopes = {}, {}
+        for doc_id, document, meta in self.iter_documents(include=['documents', 'metadatas']):
+            page[doc_id] = minhash(document or '', Config.DEDUP_NUM_PERM)
+            scopes[doc_id] = self._dedup_scope(meta)
+            if len(page) >= Config.STORE_PAGE_SIZE:
+                self.signatures.add(page, scopes)
+                page, scopes = {}, {}
+        self.signatures.add(page, scopes)
+    
+    def find_duplicate(self, text: str, metadata: Dict = None):
+        """
+        (ID, similarity) of the stored chunk most similar to `text` above Config.DEDUP_MIN_SIMILARITY,
+        or None. Only the shard a record with `metadata` would be stored in is searched.
+        """
+        from processing.near_duplicates import minhash
+        
+        self._ensure_signature_index()
+        return self.signatures.find(minhash(text, Config.DEDUP_NUM_PERM), Config.DEDUP_MIN_SIMILARITY,
+                                    scope=self._dedup_scope(metadata))
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Get the embedding for a single search query"""
+        return self.get_embeddings([query])[0]
+    
+    @traced('vector_store.search')
+    def search(self, query: str, n_results: int = 5, filter_dict: Dict = None,
+               query_embedding: List[float] = None, mmr: bool = False, mmr_lambda: float = None,
+               fetch_multiplier: int = None, shards: List[str] = None):
+        """
+        Search for similar documents (`query_embedding` skips embedding `query` again).
+        With `mmr`, `n_results * fetch_multiplier` candidates are fetched and a diverse
+        `n_results` of them returned, in selection order (see `_diversify`).
+        `shards` (values of Config.SHARD_BY) limits a sharded knowledge base to those shards.
+        """
         print(f"Searching for: {query}")
         
         # Generate query embedding using Ollama
-        query_embedding = self.ollama_client.get_embeddings(
-            model=self.embedding_model,
-            prompt=query
-        )
-        
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results,
-            where=filter_dict
-        )
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
+        return self._query_knowledge_base(query_embedding, n_results, filter_dict, mmr, mmr_lambda,
+                                          fetch_multiplier, shards)
+    
+    def _query_knowledge_base(self, query_embedding: List[float], n_results: int, filter_dict: Dict,
+                              mmr: bool, mmr_lambda: float, fetch_multiplier: int, shards: List[str] = None):
+        fetch = n_results
+        if mmr:
+            fetch = n_results * (fetch_multiplier or Config.MMR_FETCH_MULTIPLIER)
+        collection = self.collection
+        # Shard selection only exists on a sharded knowledge base
+        routing = {'shards': shards} if shards is not None and isinstance(collection, ShardedCollection) else {}
+        with tracer.span('vector_store.collection_query'):
+            results = collection.query(
+                query_embeddings=[query_embedding],
+                n_results=fetch,
+                where=filter_dict,
+                include=['documents', 'metadatas', 'distances', 'embeddings'] if mmr
+                else ['documents', 'metadatas', 'distances'],
+                **routing
+            )
+        if mmr:
+            with tracer.span('vector_store.mmr'):
+                results = self._diversify(results, query_embedding, n_results,
+                                          Config.MMR_LAMBDA if mmr_lambda is None else mmr_lambda)
         return results
     
+    @staticmethod
+    def _diversify(results: Dict, query_embedding: List[float], n_results: int, mmr_lambda: float) -> Dict:
+        """Keep the maximal-marginal-relevance `n_results` of over-fetched results (embeddings dropped)"""
+        from processing.mmr import mmr_select
+        
+        embeddings = results.get('embeddings')
+        if embeddings is None or not len(embeddings) or not len(embeddings[0]):
+            return results
+        order = mmr_select(query_embedding, embeddings[0], n_results, mmr_lambda)
+        diversified = {'ids': [[results['ids'][0][i] for i in order]]}
+        for key in ('documents', 'metadatas', 'distances'):
+            if results.get(key) is not None:
+                diversified[key] = [[results[key][0][i] for i in order]]
+        return diversified
+    
+    @traced('vector_store.search_with_memory')
+    def search_with_memory(self, query: str, n_results: int = 5, n_memory: int = 3,
+                           filter_dict: Dict = None, memory_filter: Dict = None,
+                           query_embedding: List[float] = None, mmr: bool = False,
+                           mmr_lambda: float = None, fetch_multiplier: int = None, shards: List[str] = None):
+        """
+        Search the knowledge base and conversation memory with a single query embedding.
+        Returns (knowledge_base_results, memory_results); `mmr` applies to the knowledge base.
+        """
+        print(f"Searching for: {query}")
+        
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        
+        results = self._query_knowledge_base(query_embedding, n_results, filter_dict, mmr, mmr_lambda,
+                                             fetch_multiplier, shards)
+        return results, self._query_memory(query_embedding, n_memory, memory_filter)
+    
+    @traced('vector_store.search_memory')
+    def search_memory(self, query: str, n_memory: int = 3, memory_filter: Dict = None,
+                      query_embedding: List[float] = None):
+        """Search conversation memory only (`query_embedding` skips embedding `query` again)"""
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
+        return self._query_memory(query_embedding, n_memory, memory_filter)
+    
+    def _query_memory(self, query_embedding: List[float], n_memory: int, memory_filter: Dict = None):
+        memory_results = {'ids': [[]], 'documents': [[]], 'metadatas': [[]], 'distances': [[]]}
+        memory_count = self.memory_collection.count()
+        if n_memory > 0 and memory_count > 0:
+            with tracer.span('vector_store.memory_query'):
+                memory_results = self.memory_collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=min(n_memory, memory_count),
+                    where=memory_filter
+                )
+        return memory_results
+    
+    @traced('vector_store.add_memories')
+    def add_memories(self, ids: List[str], texts: List[str], metadata: List[Dict[str, Any]]):
+        """Embed conversation messages into the memory collection (idempotent by ID)"""
+        if not ids:
+            return []
+        
+        model = self.embedding_model
+        embeddings = self.get_embeddings(texts)
+        cleaned_metadata = [{k: v for k, v in meta.items() if v is not None} for meta in metadata]
+        with self._write_lock:
+            embeddings = self._current_embeddings(texts, embeddings, model)
+            self.memory_collection.upsert(
+                embeddings=embeddings,
+                documents=texts,
+                metadatas=self._number(self.memory_collection, ids, cleaned_metadata),
+                ids=ids
+            )
+            self._track(ids, memory=True)
+        return ids
+    
+    def reset_memory(self):
+        """Delete all conversation messages from the memory collection"""
+        deleted = self._delete_all(self.memory_collection)
+        if deleted:
+            print(f"Deleted {deleted} messages from conversation memory.")
+        return deleted
+    
+    def _delete_all(self, collection) -> int:
+        """Delete every record of a collection one page of IDs at a time"""
+        deleted = 0
+        with self._write_lock:
+            while True:
+                page = collection.get(include=[], limit=Config.STORE_PAGE_SIZE)
+                if not page or not page['ids']:
+                    return deleted
+                collection.delete(ids=page['ids'])
+                self._track(page['ids'], memory=collection is self.memory_collection)
+                deleted += len(page['ids'])
+    
+    def _number(self, collection, ids: List[str], metadatas: List[Dict], new: bool = False) -> List[Dict]:
+        """
+        `metadatas` with the scan number of each record: the one it is stored with, or a
+        new one for records not stored yet (all of them when `new`). Call under the write lock.
+        """
+        numbers = {}
+        if not new:
+            stored = collection.get(ids=list(ids), include=['metadatas'])
+            numbers = {doc_id: (meta or {}).get(SEQ_FIELD) for doc_id, meta in zip(stored['ids'], stored['metadatas'])}
+        missing = [doc_id for doc_id in dict.fromkeys(ids) if numbers.get(doc_id) is None]
+        if missing:
+            first = self.sequence.reserve(self.collection_name, len(missing))
+            numbers.update({doc_id: first + i for i, doc_id in enumerate(missing)})
+        return [dict(meta or {}, **{SEQ_FIELD: numbers[doc_id]}) for doc_id, meta in zip(ids, metadatas)]
+    
+    def _ensure_numbered(self, collection):
+        """Give a scan number to the records stored before numbering existed (once per collection)"""
+        name = collection.name
+        if name in self._numbered_collections:
+            return
+        if not self.sequence.is_numbered(name):
+            # Offset pages shift when others delete meanwhile: passes repeat until one numbers nothing
+            total = 0
+            while True:
+                numbered, offset = 0, 0
+                while True:
+                    with self._write_lock:
+                        page = collection.get(limit=Config.STORE_PAGE_SIZE, offset=offset, include=['metadatas'])
+                        missing = [doc_id for doc_id, meta in zip(page['ids'], page['metadatas'])
+                                   if (meta or {}).get(SEQ_FIELD) is None]
+                        if missing:
+                            first = self.sequence.reserve(self.collection_name, len(missing))
+                            collection.update(ids=missing,
+                                              metadatas=[{SEQ_FIELD: first + i} for i in range(len(missing))])
+                            self._track(missing, memory=collection is self.memory_collection)
+                    if not page['ids']:
+                        break
+                    numbered += len(missing)
+                    offset += len(page['ids'])
+                total += numbered
+                if not numbered:
+                    break
+            self.sequence.mark_numbered(name)
+            if total:
+                print(f"Numbered {total} records of {name} for paged scans.")
+        self._numbered_collections.add(name)
+    
+    def iter_pages(self, collection=None, page_size: int = None, include: List[str] = None):
+        """
+        Yield raw `get` pages of a collection (the knowledge base by default) until it is exhausted.
+        Each page is one range of `page_size` scan numbers, so a page never holds more records
+        than that however large the collection is. Unlike offset paging, records written
+        meanwhile shift nothing: the scan covers the records that existed when it started,
+        those deleted since drop out of their page, and those added are left out.
+        """
+        collection = collection if collection is not None else self.collection
+        page_size = page_size or Config.STORE_PAGE_SIZE
+        include = include if include is not None else ['documents', 'metadatas']
+        self._ensure_numbered(collection)
+        end = self.sequence.end(self.collection_name)
+        for start in range(0, end, page_size):
+            where = {'$and': [{SEQ_FIELD: {'$gte': start}}, {SEQ_FIELD: {'$lt': min(start + page_size, end)}}]}
+            page = collection.get(where=where, include=include)
+            if page and page.get('ids'):
+                yield page
+    
+    def iter_documents(self, page_size: int = None, include: List[str] = None):
+        """
+        Yield knowledge base records as (id, document, metadata), fetching one page at a
+        time so scanning or exporting the collection does not load it whole.
+        """
+        for page in self.iter_pages(page_size=page_size, include=include):
+            ids = page['ids']
+            documents = page.get('documents') or [None] * len(ids)
+            metadatas = page.get('metadatas') or [None] * len(ids)
+            yield from zip(ids, documents, metadatas)
+    
+    @traced('vector_store.load_records')
+    def load_records(self, ids: List[str], texts: List[str], metadata: List[Dict[str, Any]],
+                     embeddings, memory: bool = False):
+        """
+        Upsert records with their precomputed embeddings, e.g. from a snapshot.
+        Nothing is embedded, and duplicate detection does not run: the records are
+        taken as they are (their signatures are indexed for later ingests).
+        """
+        if not ids:
+            return []
+        
+        # Scan numbers come from this store, not from wherever the records were exported
+        cleaned_metadata = [{k: v for k, v in (meta or {}).items() if v is not None and k != SEQ_FIELD}
+                            for meta in metadata]
+        collection = self.memory_collection if memory else self.collection
+        if not memory and Config.DEDUP_POLICY != 'off':
+            # Chunks stored before signatures existed are indexed first, not skipped
+            self._ensure_signature_index()
+        with self._write_lock:
+            cleaned_metadata = self._number(collection, ids, cleaned_metadata)
+            collection.upsert(
+                embeddings=embeddings,
+                documents=texts,
+                metadatas=cleaned_metadata,
+                ids=ids
+            )
+            if not memory:
+                self.generation += 1
+            self._track(ids, memory=memory)
+        if not memory and Config.DEDUP_POLICY != 'off':
+            from processing.near_duplicates import minhash
+            self.signatures.add({doc_id: minhash(text or '', Config.DEDUP_NUM_PERM)
+                                 for doc_id, text in zip(ids, texts)},
+                                {doc_id: self._dedup_scope(meta) for doc_id, meta in zip(ids, cleaned_metadata)})
+        return ids
+    
+    @traced('vector_store.delete_by_ids')
     def delete_by_ids(self, ids: List[str]):
         """Delete documents by IDs"""
-        self.collection.delete(ids=ids)
+        with self._write_lock:
+            self.collection.delete(ids=ids)
+            self.generation += 1
+            self._track(ids)
+        self.signatures.remove(ids)
         print(f"Deleted {len(ids)} documents.")
     
+    @traced('vector_store.update_documents')
     def update_documents(self, ids: List[str], texts: List[str], metadata: List[Dict[str, Any]] = None):
         """Update existing documents in the collection"""
         if not ids or not texts:
@@ -101,8 +634,16 @@ class VectorStore:
         print(f"Updating {len(ids)} documents...")
         
         # Generate new embeddings
+        model = self.embedding_model
         embeddings = self.get_embeddings(texts)
+        self._replace_documents(ids, texts, metadata, embeddings, model)
         
+        print(f"Successfully updated {len(ids)} documents.")
+        return ids
+    
+    def _replace_documents(self, ids: List[str], texts: List[str], metadata: List[Dict[str, Any]],
+                           embeddings, model: str):
+        """Store new texts, metadata and embeddings (made with `model`) under existing IDs"""
         # Prepare metadata
         if metadata is None:
             metadata = [{} for _ in texts]
@@ -116,16 +657,23 @@ class VectorStore:
             cleaned_metadata.append(cleaned_meta)
         
         # Delete old documents and add new ones with same IDs
-        self.collection.delete(ids=ids)
-        self.collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=cleaned_metadata,
-            ids=ids
-        )
-        
-        print(f"Successfully updated {len(ids)} documents.")
-        return ids
+        with self._write_lock:
+            embeddings = self._current_embeddings(texts, embeddings, model)
+            # Replaced records keep their scan numbers, so a running scan still meets them once
+            cleaned_metadata = self._number(self.collection, ids, cleaned_metadata)
+            self.collection.delete(ids=ids)
+            self.collection.add(
+                embeddings=embeddings,
+                documents=texts,
+                metadatas=cleaned_metadata,
+                ids=ids
+            )
+            self.generation += 1
+            self._track(ids)
+        if Config.DEDUP_POLICY != 'off':
+            from processing.near_duplicates import minhash
+            self.signatures.add({doc_id: minhash(text, Config.DEDUP_NUM_PERM) for doc_id, text in zip(ids, texts)},
+                                {doc_id: self._dedup_scope(meta) for doc_id, meta in zip(ids, cleaned_metadata)})
     
     def get_documents_by_ids(self, ids: List[str]) -> Dict:
         """Get documents by their IDs"""
@@ -135,23 +683,121 @@ class VectorStore:
         results = self.collection.get(ids=ids)
         return results
     
+    @property
+    def needs_migration(self) -> bool:
+        return self.embedding_model != self.target_embedding_model
+    
+    def start_migration(self, model: str = None, background: bool = True, batch_size: int = None,
+                        pause_seconds: float = None):
+        """
+        Re-embed the collections with `model` (default: the configured model) and switch
+        to them when done. Returns the migration (the running one if already started),
+        or None when `model` is already active.
+        """
+        from database.embedding_migration import EmbeddingMigration, COLLECTIONS
+        
+        model = model or self.target_embedding_model
+        with self._write_lock:
+            if self.migration is not None and self.migration.state in ('pending', 'running'):
+                return self.migration
+            if model == self.embedding_model:
+                return None
+            self.migration = EmbeddingMigration(self, model, batch_size=batch_size, pause_seconds=pause_seconds)
+            # Track writes from now on; the migration lists the records to copy after this
+            self._migration_ids = {name: set() for name in COLLECTIONS}
+        if background:
+            return self.migration.start()
+        self.migration.run()
+        return self.migration
+    
+    def open_version(self, model: str) -> Dict:
+        """The knowledge base and memory collections of `model` (created if new)"""
+        version = self.registry.version(self.collection_name, self.memory_collection_name, model)
+        return {'knowledge_base': self._open_collection(version['collection'], sharded=True),
+                'memory': self._open_collection(version['memory_collection'])}
+    
+    def _current_embeddings(self, texts: List[str], embeddings, model: str):
+        """`embeddings` if `model` is still active, else texts re-embedded (a migration switched meanwhile)"""
+        if model == self.embedding_model:
+            return embeddings
+        return self.get_embeddings(texts)
+    
+    def _track(self, ids: List[str], memory: bool = False):
+        """Remember IDs written while a migration runs (called under the write lock)"""
+        if self._migration_ids is not None:
+            self._migration_ids['memory' if memory else 'knowledge_base'].update(ids)
+    
+    def pending_migration_ids(self) -> Dict[str, int]:
+        with self._write_lock:
+            return {name: len(ids) for name, ids in (self._migration_ids or {}).items()}
+    
+    def take_migration_ids(self, name: str) -> List[str]:
+        """IDs written to a collection since the last call, for the migration to sync"""
+        with self._write_lock:
+            if self._migration_ids is None:
+                return []
+            ids, self._migration_ids[name] = self._migration_ids[name], set()
+            return list(ids)
+    
+    def switch_version(self, model: str, collection, memory_collection):
+        """Make `model` and its collections active for all later reads and writes"""
+        with self._write_lock:
+            self.collection, self.memory_collection = collection, memory_collection
+            self.embedding_model = model
+            if self.model_embedders.get(model) is not None:
+                self.embedder = self.model_embedders.pop(model)
+            self.registry.activate(self.collection_name, model)
+            self._migration_ids = None
+            # Results cached against the old collections are stale now
+            self.generation += 1
+            for callback in self.on_switch:
+                callback(model)
+    
+    def migration_finished(self, migration):
+        with self._write_lock:
+            if migration is self.migration:
+                self._migration_ids = None
+    
+    def migration_status(self):
+        """Progress of the current or last migration, {'state': 'needed', ...} if one is due, else None"""
+        if self.migration is not None:
+            return self.migration.status()
+        if self.needs_migration:
+            return {'state': 'needed', 'from': self.embedding_model, 'to': self.target_embedding_model}
+        return None
+    
+    def unknown_shards(self, shards: List[str]) -> List[str]:
+        """Values of `shards` the knowledge base has no shard for (all of them if it is not sharded)"""
+        if not isinstance(self.collection, ShardedCollection):
+            return list(shards)
+        existing = set(self.collection.shards())
+        return [value for value in shards if shard_slug(value) not in existing]
+    
     def get_collection_stats(self):
         """Get statistics about the collection"""
         count = self.collection.count()
-        return {
+        stats = {
             'total_documents': count,
+            'memory_messages': self.memory_collection.count(),
+            'near_duplicates': dict(self.duplicate_counts, **self.signatures.count()),
             'embedding_model': self.embedding_model,
             'llm_model': Config.LLM_MODEL
         }
+        if isinstance(self.collection, ShardedCollection):
+            stats['shards'] = {shard or '(unsharded)': n for shard, n in self.collection.counts().items()}
+        migration = self.migration_status()
+        if migration is not None:
+            stats['embedding_migration'] = migration
+        return stats
     
     def reset_collection(self):
         """Delete all documents from the collection"""
-        # Get all document IDs
-        all_documents = self.collection.get()
-        if all_documents and all_documents['ids']:
-            self.collection.delete(ids=all_documents['ids'])
-            print(f"Deleted {len(all_documents['ids'])} documents from vector store.")
-            return len(all_documents['ids'])
+        deleted = self._delete_all(self.collection)
+        with self._write_lock:
+            self.generation += 1
+        self.signatures.clear()
+        if deleted:
+            print(f"Deleted {deleted} documents from vector store.")
         else:
             print("No documents to delete in vector store.")
-            return 0
\ No newline at end of file
+        return deleted
\ No newline at end of file
@@ -1,5 +1,18 @@
 # helper package
-from .knowledge_base import append_to_kb
-from .speechtotext import voice_search
+# Submodules are imported on first use so that, for example, importing
+# append_to_kb does not load speech_recognition/PyAudio.
+import importlib
 
-__all__ = ['append_to_kb', 'voice_search']
+_LAZY_ATTRIBUTES = {
+    'append_to_kb': '.knowledge_base',
+    'voice_search': '.speechtotext',
+    'VoicePipeline': '.voice_pipeline',
+}
+
+__all__ = ['append_to_kb', 'voice_search', 'VoicePipeline']
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name], __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
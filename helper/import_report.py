@@ -0,0 +1,94 @@
+# helper/import_report.py
+"""Measure what importing an entry point costs, in a fresh interpreter"""
+import json
+import subprocess
+import sys
+from typing import Dict, List
+
+from config import Config
+
+# Runs in the child interpreter: time the import and list what got loaded
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+# Entry points and packages reported by `python main.py --mode imports`
+DEFAULT_TARGETS = [
+    'import main',
+    'import agent_daemon',
+    'import api_server',
+    'from database import SessionManager',
+    'from helper import append_to_kb',
+    'from agent import PersonalAgent',
+    'from database import VectorStore',
+    'from helper import voice_search',
+]
+
+
+def _parse_importtime(stderr: str, top: int) -> List[Dict]:
+    """Slowest modules by cumulative import time from `-X importtime` output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # Header line
+            continue
+        entries.append({
+            'module': fields[2].strip(),
+            'self_ms': self_us / 1000.0,
+            'cumulative_ms': cumulative_us / 1000.0
+        })
+    entries.sort(key=lambda entry: entry['cumulative_ms'], reverse=True)
+    return entries[:top]
+
+
+def measure_import(statement: str, top: int = 10) -> Dict:
+    """
+    Run `statement` in a fresh interpreter and report its import time,
+    which heavy dependencies it loaded and the slowest modules it imported.
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _PROBE.format(statement=statement)],
+        cwd=str(Config.BASE_DIR),
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'unknown error'
+        return {'statement': statement, 'error': error}
+
+    probe = json.loads(completed.stdout.strip().splitlines()[-1])
+    loaded = set(probe['modules'])
+    return {
+        'statement': statement,
+        'seconds': probe['seconds'],
+        'heavy_modules_loaded': [name for name in Config.HEAVY_MODULES if name in loaded],
+        'slowest': _parse_importtime(completed.stderr, top)
+    }
+
+
+def print_import_report(targets: List[str] = None, top: int = 5):
+    """Print import cost per entry point against the startup budget"""
+    budget = Config.STARTUP_IMPORT_BUDGET_SECONDS
+    print(f"=== Import Time Report (budget: {budget:.2f}s) ===")
+    for statement in targets or DEFAULT_TARGETS:
+        report = measure_import(statement, top=top)
+        print(f"\n{statement}")
+        if 'error' in report:
+            print(f"  ❌ failed: {report['error']}")
+            continue
+        status = 'OK' if report['seconds'] <= budget else 'OVER BUDGET'
+        print(f"  time: {report['seconds'] * 1000:.1f} ms [{status}]")
+        print(f"  heavy modules: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+        for entry in report['slowest']:
+            print(f"    {entry['cumulative_ms']:8.1f} ms  {entry['module']}")
@@ -1,28 +1,19 @@
 # helper/speechtotext.py
-import speech_recognition as sr
+# Microphone input through the voice pipeline: the ambient noise level is cached
+# between calls, and capture is cut at the first pause instead of a fixed window.
+from helper.voice_pipeline import listen
 
 def voice_search():
-    """Convert speech to text using Google Speech Recognition"""
-    r = sr.Recognizer()
-
-    with sr.Microphone() as source:
-        print('🎤 Listening...')
-        # Adjust for ambient noise
-        r.adjust_for_ambient_noise(source, duration=0.5)
-        # Listen for minimum 10 seconds (timeout=10) and allow up to 30 seconds of speech
-        audio = r.listen(source, timeout=10, phrase_time_limit=30)
-        print('✓ Processing...')
-
+    """Convert the next spoken phrase to text (Config.VOICE_RECOGNIZER, Google by default)"""
+    print('🎤 Listening...')
     try:
-        text = r.recognize_google(audio)
-        print(f'✓ Recognized: {text}')
-        return text
-    except sr.UnknownValueError:
-        print('❌ Could not understand audio')
-        return None
-    except sr.RequestError as e:
-        print(f'❌ Error with speech recognition service: {e}')
-        return None
+        # Wait up to VOICE_LISTEN_TIMEOUT seconds for speech, allow up to 30 seconds of it
+        text = listen(phrase_seconds=30)
     except Exception as e:
-        print(f'❌ Error: {e}')
+        print(f'❌ Error with speech recognition: {e}')
+        return None
+    if not text:
+        print('❌ Could not understand audio')
         return None
+    print(f'✓ Recognized: {text}')
+    return text
@@ -0,0 +1,283 @@
+# helper/tracing.py
+"""
+Lightweight latency tracing.
+
+Code wraps each stage in `tracer.span(name)` (or decorates it with `@traced(name)`);
+the tracer keeps per-span counts, totals and a bounded sample window for
+percentiles, plus the server-side metrics Ollama returns with each response.
+With memory profiling on, each span also records its tracemalloc peak.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict
+
+from config import Config
+
+# Duration fields Ollama reports (in nanoseconds) with generate/embed responses
+OLLAMA_DURATION_FIELDS = ['total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration']
+OLLAMA_COUNT_FIELDS = ['prompt_eval_count', 'eval_count']
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Tracer:
+    """Thread-safe aggregate of span timings and Ollama server metrics"""
+
+    def __init__(self, max_samples: int = 1024, enabled: bool = True):
+        self.max_samples = max_samples
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans: Dict[str, Dict] = {}
+        self._ollama: Dict[str, Dict] = {}
+        self._memory: Dict[str, Dict] = {}
+        self.memory_profiling = False
+        self._local = threading.local()
+
+    def enable_memory_profiling(self):
+        """
+        Record the peak Python allocation of every span (via tracemalloc).
+        tracemalloc is process-wide, so spans running concurrently in other
+        threads inflate each other's peaks; profile one operation at a time.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+        self.memory_profiling = True
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the enclosed block under `name`"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        frame = self._enter_memory_frame() if self.memory_profiling else None
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+            if frame is not None:
+                self._exit_memory_frame(name, frame)
+
+    def _enter_memory_frame(self) -> Dict:
+        stack = getattr(self._local, 'memory_stack', None)
+        if stack is None:
+            stack = self._local.memory_stack = []
+        current, peak = tracemalloc.get_traced_memory()
+        # reset_peak() below would lose the enclosing span's peak so far; keep it on its frame
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame = {'start': current, 'peak': current}
+        stack.append(frame)
+        return frame
+
+    def _exit_memory_frame(self, name: str, frame: Dict):
+        current, peak = tracemalloc.get_traced_memory()
+        stack = self._local.memory_stack
+        stack.pop()
+        peak = max(peak, frame['peak'])
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        self.record_memory(name, peak - frame['start'], current - frame['start'])
+
+    def record_memory(self, name: str, peak_bytes: int, retained_bytes: int):
+        with self._lock:
+            memory = self._memory.get(name)
+            if memory is None:
+                memory = self._memory[name] = {'count': 0, 'peak': 0, 'total_peak': 0, 'retained': 0}
+            memory['count'] += 1
+            memory['peak'] = max(memory['peak'], peak_bytes)
+            memory['total_peak'] += peak_bytes
+            memory['retained'] = max(memory['retained'], retained_bytes)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            span = self._spans.get(name)
+            if span is None:
+                span = self._spans[name] = {
+                    'count': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'samples': deque(maxlen=self.max_samples)
+                }
+            span['count'] += 1
+            span['total'] += seconds
+            span['max'] = max(span['max'], seconds)
+            span['samples'].append(seconds)
+
+    def record_ollama(self, operation: str, model: str, response: Dict):
+        """Accumulate the timing and token counts from an Ollama response body"""
+        if not self.enabled or not isinstance(response, dict):
+            return
+        key = f"{operation}:{model}"
+        with self._lock:
+            metrics = self._ollama.get(key)
+            if metrics is None:
+                metrics = self._ollama[key] = {'operation': operation, 'model': model, 'calls': 0}
+                metrics.update({field: 0 for field in OLLAMA_DURATION_FIELDS + OLLAMA_COUNT_FIELDS})
+            metrics['calls'] += 1
+            for field in OLLAMA_DURATION_FIELDS + OLLAMA_COUNT_FIELDS:
+                value = response.get(field)
+                if isinstance(value, (int, float)):
+                    metrics[field] += value
+
+    def snapshot(self) -> Dict:
+        """Summaries of all spans (milliseconds) and Ollama metrics"""
+        with self._lock:
+            spans = {name: dict(span, samples=sorted(span['samples']))
+                     for name, span in self._spans.items()}
+            ollama = {key: dict(metrics) for key, metrics in self._ollama.items()}
+            memory = {name: dict(values) for name, values in self._memory.items()}
+
+        span_summary = {}
+        for name, span in sorted(spans.items()):
+            samples = span['samples']
+            span_summary[name] = {
+                'count': span['count'],
+                'total_ms': round(span['total'] * 1000, 2),
+                'mean_ms': round(span['total'] / span['count'] * 1000, 2),
+                'p50_ms': round(_percentile(samples, 0.50) * 1000, 2),
+                'p95_ms': round(_percentile(samples, 0.95) * 1000, 2),
+                'p99_ms': round(_percentile(samples, 0.99) * 1000, 2),
+                'max_ms': round(span['max'] * 1000, 2)
+            }
+
+        ollama_summary = {}
+        for key, metrics in sorted(ollama.items()):
+            eval_seconds = metrics['eval_duration'] / 1e9
+            ollama_summary[key] = {
+                'calls': metrics['calls'],
+                'prompt_tokens': metrics['prompt_eval_count'],
+                'completion_tokens': metrics['eval_count'],
+                'total_ms': round(metrics['total_duration'] / 1e6, 2),
+                'load_ms': round(metrics['load_duration'] / 1e6, 2),
+                'prompt_eval_ms': round(metrics['prompt_eval_duration'] / 1e6, 2),
+                'eval_ms': round(metrics['eval_duration'] / 1e6, 2),
+                'tokens_per_second': round(metrics['eval_count'] / eval_seconds, 2) if eval_seconds else 0.0
+            }
+
+        memory_summary = {}
+        for name, values in sorted(memory.items()):
+            memory_summary[name] = {
+                'count': values['count'],
+                'peak_kb': round(values['peak'] / 1024, 1),
+                'mean_peak_kb': round(values['total_peak'] / values['count'] / 1024, 1),
+                'retained_kb': round(values['retained'] / 1024, 1)
+            }
+
+        return {'spans': span_summary, 'ollama': ollama_summary, 'memory': memory_summary}
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._ollama.clear()
+            self._memory.clear()
+
+    def to_prometheus(self, prefix: str = 'personal_agent') -> str:
+        """Render current metrics in the Prometheus text exposition format"""
+        with self._lock:
+            spans = {name: (span['count'], span['total'], sorted(span['samples']))
+                     for name, span in self._spans.items()}
+            ollama = {key: dict(metrics) for key, metrics in self._ollama.items()}
+            memory = {name: values['peak'] for name, values in self._memory.items()}
+
+        lines = [
+            f"# HELP {prefix}_span_seconds Latency of traced stages.",
+            f"# TYPE {prefix}_span_seconds summary"
+        ]
+        for name, (count, total, samples) in sorted(spans.items()):
+            for quantile in (0.5, 0.95, 0.99):
+                lines.append(f'{prefix}_span_seconds{{span="{name}",quantile="{quantile}"}} '
+                             f'{_percentile(samples, quantile):.6f}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {count}')
+
+        lines.append(f"# HELP {prefix}_ollama_calls_total Ollama API calls.")
+        lines.append(f"# TYPE {prefix}_ollama_calls_total counter")
+        for metrics in ollama.values():
+            lines.append(f'{prefix}_ollama_calls_total{{operation="{metrics["operation"]}",'
+                         f'model="{metrics["model"]}"}} {metrics["calls"]}')
+
+        lines.append(f"# HELP {prefix}_ollama_tokens_total Tokens processed by Ollama.")
+        lines.append(f"# TYPE {prefix}_ollama_tokens_total counter")
+        for metrics in ollama.values():
+            labels = f'operation="{metrics["operation"]}",model="{metrics["model"]}"'
+            lines.append(f'{prefix}_ollama_tokens_total{{{labels},kind="prompt"}} {metrics["prompt_eval_count"]}')
+            lines.append(f'{prefix}_ollama_tokens_total{{{labels},kind="completion"}} {metrics["eval_count"]}')
+
+        lines.append(f"# HELP {prefix}_ollama_duration_seconds_total Server-side Ollama time by phase.")
+        lines.append(f"# TYPE {prefix}_ollama_duration_seconds_total counter")
+        for metrics in ollama.values():
+            labels = f'operation="{metrics["operation"]}",model="{metrics["model"]}"'
+            for field in OLLAMA_DURATION_FIELDS:
+                phase = field[:-len('_duration')]
+                lines.append(f'{prefix}_ollama_duration_seconds_total{{{labels},phase="{phase}"}} '
+                             f'{metrics[field] / 1e9:.6f}')
+
+        if memory:
+            lines.append(f"# HELP {prefix}_span_peak_memory_bytes Peak Python allocation of traced stages.")
+            lines.append(f"# TYPE {prefix}_span_peak_memory_bytes gauge")
+            for name, peak in sorted(memory.items()):
+                lines.append(f'{prefix}_span_peak_memory_bytes{{span="{name}"}} {peak}')
+
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path: str):
+        """Atomically write the Prometheus text file (for node_exporter's textfile collector)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+class PrometheusFileExporter:
+    """Background thread that rewrites the Prometheus text file every `interval` seconds"""
+
+    def __init__(self, path: str, interval: float = 15.0, source: Tracer = None):
+        self.path = str(path)
+        self.interval = interval
+        self.source = source or tracer
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval)
+        self.source.export_prometheus(self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.source.export_prometheus(self.path)
+            except OSError as e:
+                print(f"Error writing metrics file {self.path}: {e}")
+
+
+def traced(name: str):
+    """Decorator form of `tracer.span(name)`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Process-wide tracer shared by the agent, storage and Ollama client
+tracer = Tracer(enabled=Config.TRACING_ENABLED)
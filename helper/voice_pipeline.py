@@ -0,0 +1,412 @@
+# helper/voice_pipeline.py
+"""
+Voice input pipeline: audio source -> energy VAD -> background transcription.
+
+Sources yield 16-bit mono PCM frames of Config.VOICE_FRAME_MS from a WAV file
+(path, bytes or file object), a raw PCM byte stream, or the microphone. The
+voice activity detector compares frame RMS energy with the ambient noise level
+(measured over the first Config.VOICE_CALIBRATION_MS, then tracked during
+silence) and cuts the audio into speech segments at pauses. A capture thread
+runs the source and the VAD while a second thread transcribes finished
+segments, so recognition of one phrase overlaps capture of the next.
+
+Recognizers are pluggable: any object with `transcribe(audio, sample_rate)`
+returning text (or None for no speech) works, so tests run offline. The noise
+level of the microphone is cached for Config.VOICE_CALIBRATION_TTL_SECONDS,
+so repeated voice inputs start listening at once instead of recalibrating.
+"""
+import io
+import os
+import queue
+import threading
+import time
+import wave
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from config import Config
+
+SAMPLE_WIDTH = 2  # bytes per sample of the PCM passed around (16-bit little-endian)
+_DONE = object()
+
+
+def to_mono16(data: bytes, sample_width: int, channels: int) -> bytes:
+    """PCM of any WAV sample width and channel count as 16-bit mono"""
+    import numpy as np
+
+    if sample_width == 2 and channels == 1:
+        return data
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype='<i2')
+    elif sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((raw[:, 2] << 24 | raw[:, 1] << 16 | raw[:, 0] << 8) >> 16).astype(np.int16)
+    elif sample_width == 4:
+        samples = (np.frombuffer(data, dtype='<i4') >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported sample width {sample_width}")
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples.astype('<i2').tobytes()
+
+
+def frame_energy(frame: bytes) -> float:
+    """RMS amplitude of a 16-bit PCM frame"""
+    import numpy as np
+
+    samples = np.frombuffer(frame, dtype='<i2').astype(np.float32)
+    return float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+
+# ---------- Sources ----------
+
+class WavSource:
+    """A WAV file given as a path, bytes or a binary file object"""
+
+    def __init__(self, wav, frame_ms: int = None):
+        if isinstance(wav, (bytes, bytearray)):
+            wav = io.BytesIO(wav)
+        self.name = str(wav) if isinstance(wav, (str, os.PathLike)) else getattr(wav, 'name', 'stream')
+        self.wav = wave.open(wav if not isinstance(wav, os.PathLike) else str(wav), 'rb')
+        self.sample_rate = self.wav.getframerate()
+        self.frame_ms = frame_ms or Config.VOICE_FRAME_MS
+        self.calibration_key = None  # every recording has its own noise level
+
+    def frames(self, stop: threading.Event = None) -> Iterator[bytes]:
+        samples = max(1, self.sample_rate * self.frame_ms // 1000)
+        try:
+            while stop is None or not stop.is_set():
+                data = self.wav.readframes(samples)
+                if not data:
+                    return
+                yield to_mono16(data, self.wav.getsampwidth(), self.wav.getnchannels())
+        finally:
+            self.wav.close()
+
+
+class PCMStreamSource:
+    """Raw 16-bit mono little-endian PCM read from a binary stream (pipe, socket file)"""
+
+    def __init__(self, stream, sample_rate: int, frame_ms: int = None, calibration_key: str = None):
+        self.stream = stream
+        self.name = getattr(stream, 'name', 'stream')
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms or Config.VOICE_FRAME_MS
+        self.calibration_key = calibration_key
+
+    def frames(self, stop: threading.Event = None) -> Iterator[bytes]:
+        size = max(1, self.sample_rate * self.frame_ms // 1000) * SAMPLE_WIDTH
+        pending = b''
+        while stop is None or not stop.is_set():
+            data = self.stream.read(size - len(pending))
+            if not data:
+                break
+            pending += data
+            if len(pending) >= size:
+                yield pending
+                pending = b''
+        if len(pending) >= SAMPLE_WIDTH:
+            yield pending[:len(pending) - len(pending) % SAMPLE_WIDTH]
+
+
+class MicrophoneSource:
+    """The default (or `device_index`) microphone, through speech_recognition/PyAudio"""
+
+    def __init__(self, device_index: int = None, sample_rate: int = None, frame_ms: int = None):
+        self.device_index = device_index
+        self.frame_ms = frame_ms or Config.VOICE_FRAME_MS
+        self.sample_rate = sample_rate or Config.VOICE_SAMPLE_RATE
+        self.name = f"microphone {device_index if device_index is not None else 'default'}"
+        self.calibration_key = f"mic:{device_index}"
+
+    def frames(self, stop: threading.Event = None) -> Iterator[bytes]:
+        import speech_recognition as sr
+
+        samples = max(1, self.sample_rate * self.frame_ms // 1000)
+        with sr.Microphone(device_index=self.device_index, sample_rate=self.sample_rate,
+                           chunk_size=samples) as microphone:
+            while stop is None or not stop.is_set():
+                yield to_mono16(microphone.stream.read(microphone.CHUNK), microphone.SAMPLE_WIDTH, 1)
+
+
+def open_source(audio, frame_ms: int = None):
+    """A source for a path, bytes, a binary WAV file object, or an existing source"""
+    if hasattr(audio, 'frames'):
+        return audio
+    return WavSource(audio, frame_ms=frame_ms)
+
+
+# ---------- Noise calibration ----------
+
+class NoiseCalibration:
+    """Ambient noise level per source (e.g. microphone), reused for `ttl_seconds`"""
+
+    def __init__(self, ttl_seconds: float = None):
+        self.ttl_seconds = Config.VOICE_CALIBRATION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._levels: Dict[str, tuple] = {}  # key -> (noise level, measured at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Optional[str]) -> Optional[float]:
+        if key is None:
+            return None
+        with self._lock:
+            level, measured_at = self._levels.get(key, (None, 0.0))
+            if level is not None and time.time() - measured_at <= self.ttl_seconds:
+                self.hits += 1
+                return level
+            self.misses += 1
+            return None
+
+    def put(self, key: Optional[str], level: float):
+        if key is not None and level is not None:
+            with self._lock:
+                self._levels[key] = (level, time.time())
+
+
+calibration_cache = NoiseCalibration()
+
+
+# ---------- Voice activity detection ----------
+
+class EnergyVAD:
+    """
+    Splits 16-bit PCM frames into speech segments. A frame is voiced when its RMS
+    energy exceeds max(VOICE_MIN_ENERGY, noise level * VOICE_ENERGY_RATIO). A
+    segment starts at a voiced frame (with VOICE_PADDING_MS of lead-in) and ends
+    after VOICE_SILENCE_MS of unvoiced frames or at `max_segment_seconds`
+    (default VOICE_MAX_SEGMENT_SECONDS).
+    Segments with less than VOICE_MIN_SPEECH_MS of voiced audio are dropped.
+    """
+
+    def __init__(self, sample_rate: int, frame_ms: int = None, noise_level: float = None,
+                 max_segment_seconds: float = None):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms or Config.VOICE_FRAME_MS
+        self.noise_level = noise_level
+        self.calibration_frames = max(1, Config.VOICE_CALIBRATION_MS // self.frame_ms)
+        self.silence_frames = max(1, Config.VOICE_SILENCE_MS // self.frame_ms)
+        self.padding_frames = Config.VOICE_PADDING_MS // self.frame_ms
+        self.min_speech_frames = max(1, Config.VOICE_MIN_SPEECH_MS // self.frame_ms)
+        max_segment_seconds = max_segment_seconds or Config.VOICE_MAX_SEGMENT_SECONDS
+        self.max_segment_frames = max(1, int(max_segment_seconds * 1000) // self.frame_ms)
+
+    @property
+    def threshold(self) -> float:
+        return max(Config.VOICE_MIN_ENERGY, (self.noise_level or 0.0) * Config.VOICE_ENERGY_RATIO)
+
+    def _calibrate(self, energies: List[float]):
+        # The quieter frames of the window: speech right at the start does not count as noise
+        ordered = sorted(energies)
+        self.noise_level = ordered[len(ordered) // 5]
+
+    def segments(self, frames: Iterable[bytes], timeout: float = None) -> Iterator[Dict]:
+        """
+        Yield {'audio', 'sample_rate', 'start', 'end'} (times in seconds) per segment.
+        With `timeout`, stop if no speech has started after that many seconds.
+        """
+        frames = iter(frames)
+        if self.noise_level is None:
+            # Measure on the first frames, then run them through detection like the rest
+            head = []
+            for frame in frames:
+                head.append(frame)
+                if len(head) >= self.calibration_frames:
+                    break
+            self._calibrate([frame_energy(frame) for frame in head])
+            frames = _chain(head, frames)
+
+        lead_in = deque(maxlen=self.padding_frames or None)
+        segment, voiced, silence, start, spoken = [], 0, 0, 0, False
+        timeout_frames = None if timeout is None else int(timeout * 1000) // self.frame_ms
+        for index, frame in enumerate(frames):
+            energy = frame_energy(frame)
+            is_voiced = energy > self.threshold
+            if not segment:
+                if not is_voiced:
+                    # Track slow changes of the ambient level between phrases
+                    self.noise_level = 0.95 * self.noise_level + 0.05 * energy
+                    if self.padding_frames:
+                        lead_in.append(frame)
+                    if timeout_frames is not None and not spoken and index >= timeout_frames:
+                        return
+                    continue
+                segment, voiced, silence = list(lead_in) + [frame], 1, 0
+                start = index - len(lead_in)
+                lead_in.clear()
+                spoken = True
+                continue
+            segment.append(frame)
+            if is_voiced:
+                voiced, silence = voiced + 1, 0
+            else:
+                silence += 1
+            if silence >= self.silence_frames or len(segment) >= self.max_segment_frames:
+                # Keep VOICE_PADDING_MS of the trailing silence
+                keep = len(segment) - max(0, silence - self.padding_frames)
+                if voiced >= self.min_speech_frames:
+                    yield self._segment(segment[:keep], start)
+                segment = []
+        if segment and voiced >= self.min_speech_frames:
+            yield self._segment(segment, start)
+
+    def _segment(self, frames: List[bytes], start: int) -> Dict:
+        audio = b''.join(frames)
+        seconds = self.frame_ms / 1000.0
+        return {
+            'audio': audio,
+            'sample_rate': self.sample_rate,
+            'start': round(start * seconds, 3),
+            'end': round(start * seconds + len(audio) / SAMPLE_WIDTH / self.sample_rate, 3),
+        }
+
+
+def _chain(head: List[bytes], rest: Iterator[bytes]) -> Iterator[bytes]:
+    yield from head
+    yield from rest
+
+
+# ---------- Recognizers ----------
+
+class GoogleRecognizer:
+    """Google Web Speech through speech_recognition (needs network; the previous default)"""
+
+    def __init__(self, language: str = None):
+        self.language = language or Config.VOICE_LANGUAGE
+        self._recognizer = None
+
+    def transcribe(self, audio: bytes, sample_rate: int) -> Optional[str]:
+        import speech_recognition as sr
+
+        if self._recognizer is None:
+            self._recognizer = sr.Recognizer()
+        try:
+            return self._recognizer.recognize_google(sr.AudioData(audio, sample_rate, SAMPLE_WIDTH),
+                                                     language=self.language)
+        except sr.UnknownValueError:
+            return None
+
+
+RECOGNIZERS = {
+    'google': GoogleRecognizer,
+}
+
+
+def get_recognizer(name: str = None):
+    name = name or Config.VOICE_RECOGNIZER
+    if name not in RECOGNIZERS:
+        raise ValueError(f"Unknown recognizer '{name}' (expected one of {', '.join(RECOGNIZERS)})")
+    return RECOGNIZERS[name]()
+
+
+# ---------- Pipeline ----------
+
+class VoicePipeline:
+    """Capture and VAD on one thread, transcription of finished segments on another"""
+
+    def __init__(self, recognizer=None, calibration: NoiseCalibration = None):
+        self.recognizer = recognizer or get_recognizer()
+        self.calibration = calibration or calibration_cache
+
+    def stream(self, audio, max_segments: int = None, timeout: float = None,
+               max_segment_seconds: float = None, stop: threading.Event = None) -> Iterator[Dict]:
+        """
+        Transcripts {'text', 'start', 'end', 'index'} of the speech segments of
+        `audio` (see `open_source`), in order, as soon as each is recognized.
+        Segments without recognizable speech are skipped. Capture stops after
+        `max_segments` segments, when no speech started within `timeout` seconds,
+        when `stop` is set, or when the generator is closed.
+        """
+        source = open_source(audio)
+        stop = stop or threading.Event()
+        segments = queue.Queue(maxsize=Config.VOICE_QUEUE_SEGMENTS)
+        results = queue.Queue()
+
+        def put(target, item):
+            # Bounded queue: give up when the consumer has gone away
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def capture():
+            try:
+                vad = EnergyVAD(source.sample_rate, source.frame_ms, self.calibration.get(source.calibration_key),
+                                max_segment_seconds=max_segment_seconds)
+                for count, segment in enumerate(vad.segments(source.frames(stop), timeout=timeout), 1):
+                    if not put(segments, segment) or (max_segments and count >= max_segments):
+                        break
+                self.calibration.put(source.calibration_key, vad.noise_level)
+            except Exception as e:
+                put(segments, e)
+            finally:
+                put(segments, _DONE)
+
+        def transcribe():
+            index = 0
+            while not stop.is_set():
+                try:
+                    segment = segments.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if segment is _DONE or isinstance(segment, Exception):
+                    results.put(segment)
+                    return
+                try:
+                    text = self.recognizer.transcribe(segment['audio'], segment['sample_rate'])
+                except Exception as e:
+                    print(f"❌ Error transcribing {source.name} at {segment['start']:.1f}s: {e}")
+                    text = None
+                if text:
+                    results.put({'text': text.strip(), 'start': segment['start'], 'end': segment['end'],
+                                 'index': index})
+                    index += 1
+
+        threads = [threading.Thread(target=capture, daemon=True, name='voice-capture'),
+                   threading.Thread(target=transcribe, daemon=True, name='voice-transcribe')]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+
+    def transcribe(self, audio, **kwargs) -> str:
+        """All recognized text of `audio`, joined"""
+        return ' '.join(result['text'] for result in self.stream(audio, **kwargs))
+
+
+def iter_audio_files(path: str) -> List[str]:
+    """`path` itself, or the audio files in the folder `path` (recursively, sorted)"""
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for directory, _, names in os.walk(path):
+        found.extend(os.path.join(directory, name) for name in names
+                     if name.lower().endswith(Config.VOICE_FILE_EXTENSIONS))
+    return sorted(found)
+
+
+def duration_seconds(path: str) -> float:
+    with wave.open(path, 'rb') as wav:
+        return wav.getnframes() / float(wav.getframerate() or 1)
+
+
+def listen(recognizer=None, timeout: float = None, phrase_seconds: float = None,
+           device_index: int = None) -> Optional[str]:
+    """Text of the next phrase spoken into the microphone, or None"""
+    timeout = Config.VOICE_LISTEN_TIMEOUT if timeout is None else timeout
+    return VoicePipeline(recognizer).transcribe(MicrophoneSource(device_index), max_segments=1, timeout=timeout,
+                                                max_segment_seconds=phrase_seconds) or None
@@ -1,10 +1,165 @@
 # main.py
 from config import Config
-from database.vector_store import VectorStore
-from database.session_manager import SessionManager
-from agent.personal_agent import PersonalAgent
-from helper.speechtotext import voice_search
 import argparse
+import os
+
+# Heavy modules (chromadb, speech recognition) are imported only when a command
+# actually runs in-process, so commands forwarded to the daemon start instantly.
+
+def voice_search():
+    from helper.speechtotext import voice_search as _voice_search
+    return _voice_search()
+
+def build_agent(model: str):
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from database.event_store import EventStore
+    from agent.personal_agent import PersonalAgent
+    
+    print("Initializing Personal AI Agent...")
+    vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
+    session_manager = SessionManager(str(Config.METADATA_DB_PATH))
+    event_store = EventStore(str(Config.METADATA_DB_PATH))
+    return PersonalAgent(vector_store, session_manager, llm_model=model, event_store=event_store)
+
+def open_job_store():
+    # Queuing and listing jobs only touch sqlite; a daemon, API server or UI runs them
+    from database.job_store import JobStore
+    return JobStore(str(Config.METADATA_DB_PATH))
+
+def print_jobs(jobs):
+    if not jobs:
+        print("No background jobs.")
+        return
+    print(f"\n{'id':>6}  {'kind':<10}{'status':<11}{'progress':>16}  detail")
+    for job in jobs:
+        progress = f"{job['done']}/{job['total']}" if job['total'] else str(job['done'])
+        if job['percent'] is not None:
+            progress += f" {job['percent']:.0f}%"
+        detail = job['error'] or (job['result'] if job['result'] is not None else job['message'] or '')
+        print(f"{job['id']:>6}  {job['kind']:<10}{job['status']:<11}{progress:>16}  {detail}")
+
+def queue_job(kind, params):
+    job_id = open_job_store().submit(kind, params)
+    print(f"✓ Queued job #{job_id}. It runs in the daemon, API server or a UI; "
+          f"follow it with --mode jobs, stop it with --mode cancel-job --job-id {job_id}.")
+
+def open_event_store():
+    # Reminder commands only touch sqlite, so they skip loading the vector store
+    from database.event_store import EventStore
+    return EventStore(str(Config.METADATA_DB_PATH))
+
+def print_reminders(events):
+    if not events:
+        print("No reminders.")
+        return
+    print(f"\n{'id':>6}  {'remind at':<20}{'due':<20}{'status':<11}title")
+    for event in events:
+        print(f"{event['id']:>6}  {event['remind_at'].replace('T', ' '):<20}"
+              f"{event['due_at'].replace('T', ' '):<20}{event['status']:<11}{event['title']}")
+
+def print_predictions(predictions):
+    if not predictions:
+        print("No recurring events detected yet.")
+        return
+    print(f"\n{'next due':<20}{'period':<16}{'confidence':>10}{'seen':>6}  topic")
+    for prediction in predictions:
+        print(f"{prediction['next_due'].replace('T', ' '):<20}{prediction['period']:<16}"
+              f"{prediction['confidence']:>10.2f}{prediction['occurrences']:>6}  {prediction['topic']}")
+
+def print_stats(stats):
+    print("\n=== Knowledge Base Statistics ===")
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+def print_migration(status):
+    if status is None:
+        print(f"✓ Embeddings already use {Config.EMBEDDING_MODEL}; nothing to migrate.")
+        return
+    counts = status.get('collections', {})
+    done = ', '.join(f"{name} {c['done']}/{c['total']}" for name, c in counts.items())
+    print(f"Migration {status['from']} → {status['to']}: {status['state']}"
+          + (f" ({status['percent']:.1f}%: {done})" if counts else '')
+          + (f" - {status['error']}" if status.get('error') else ''))
+
+def print_add_result(doc_ids):
+    print(f"✓ Successfully added {len(doc_ids)} chunks to knowledge base.")
+
+def print_query_result(result):
+    print(f"\n❓ Question: {result['question']}")
+    print(f"\n📚 Found {len(result['context'])} relevant chunks:\n")
+    
+    for i, (chunk, distance) in enumerate(zip(result['context'], result['distances']), 1):
+        print(f"\n[{i}] (similarity: {1 - distance:.3f})")
+        print(f"{chunk[:300]}{'...' if len(chunk) > 300 else ''}")
+        print("-" * 80)
+
+def print_profile(snapshot):
+    print("\n=== Stage Latency (ms) ===")
+    print(f"{'stage':<40}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}")
+    for name, span in snapshot['spans'].items():
+        print(f"{name:<40}{span['count']:>7}{span['mean_ms']:>10.1f}"
+              f"{span['p50_ms']:>10.1f}{span['p95_ms']:>10.1f}{span['max_ms']:>10.1f}")
+    
+    if snapshot['memory']:
+        print_memory_profile(snapshot)
+    
+    if snapshot['ollama']:
+        print("\n=== Ollama Server Metrics ===")
+        for key, metrics in snapshot['ollama'].items():
+            print(f"{key}:")
+            for metric, value in metrics.items():
+                print(f"  {metric}: {value}")
+
+def print_memory_profile(snapshot):
+    print("\n=== Peak Memory (KiB, tracemalloc) ===")
+    print(f"{'operation':<40}{'count':>7}{'peak':>12}{'mean peak':>12}{'retained':>12}")
+    for name, memory in snapshot['memory'].items():
+        print(f"{name:<40}{memory['count']:>7}{memory['peak_kb']:>12.1f}"
+              f"{memory['mean_peak_kb']:>12.1f}{memory['retained_kb']:>12.1f}")
+
+def parse_shards(value):
+    return [shard.strip() for shard in value.split(',') if shard.strip()] if value else None
+
+def forward_to_daemon(args, text=None):
+    """Run the command on a warm daemon; returns False when it must run in-process"""
+    from agent_daemon import FORWARDED_MODES, send_command
+    
+    # Memory profiles must measure this process, not the daemon
+    if args.no_daemon or args.profile_memory or args.mode not in FORWARDED_MODES:
+        return False
+    
+    command = {'mode': args.mode, 'model': args.model}
+    if args.mode == 'add':
+        command.update({
+            'text': text,
+            'source': args.source,
+            'metadata': {'input_type': args.input_type, 'file': args.file}
+        })
+        if args.file:
+            # The daemon streams the file itself rather than receiving its contents
+            command['file'] = os.path.abspath(args.file)
+    elif args.mode == 'query':
+        command.update({'text': text, 'mmr': args.mmr or None, 'mmr_lambda': args.mmr_lambda,
+                        'shards': parse_shards(args.shard)})
+    
+    response = send_command(command)
+    if response is None or (not response['ok'] and response.get('fallback')):
+        return False
+    if not response['ok']:
+        print(f"❌ Daemon error: {response['error']}")
+        return True
+    
+    if args.mode == 'stats':
+        print_stats(response['result'])
+    elif args.mode == 'migrate':
+        print_migration(response['result'])
+        print("The daemon migrates in the background; follow it with --mode stats.")
+    elif args.mode == 'add':
+        print_add_result(response['result'] or [])
+    else:
+        print_query_result(response['result'])
+    return True
 
 def main():
     # Initialize config
@@ -12,32 +167,241 @@ def main():
     
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Personal AI Knowledge Base Agent')
-    parser.add_argument('--mode', choices=['add', 'query', 'chat', 'stats'], 
+    parser.add_argument('--mode', choices=['add', 'query', 'chat', 'stats', 'daemon', 'daemon-stop',
+                                           'imports', 'profile', 'reminders', 'snooze', 'cancel-reminder',
+                                           'watch', 'predictions', 'accept-prediction', 'export', 'import',
+                                           'migrate', 'jobs', 'cancel-job', 'transcribe'], 
                        required=True, help='Operation mode')
     parser.add_argument('--input-type', choices=['text', 'voice'], 
                        default='text', help='Input type')
     parser.add_argument('--text', type=str, help='Text input')
     parser.add_argument('--source', type=str, default='manual', 
                        help='Source of the knowledge')
-    parser.add_argument('--file', type=str, help='File path to add to knowledge base')
+    parser.add_argument('--file', type=str,
+                       help='File path to add to knowledge base (snapshot directory for export/import, '
+                            'WAV file or folder for transcribe)')
+    parser.add_argument('--dtype', choices=['float16', 'float32'], default=Config.SNAPSHOT_DTYPE,
+                       help='Embedding precision written by --mode export')
     parser.add_argument('--temperature', type=float, default=0.7,
                        help='LLM temperature (0.0-1.0)')
     parser.add_argument('--model', type=str, default=Config.LLM_MODEL,
                        help='Ollama model to use')
+    parser.add_argument('--mmr', action='store_true',
+                       help='Diversify query results with maximal marginal relevance')
+    parser.add_argument('--mmr-lambda', type=float, default=None,
+                       help='MMR relevance/diversity trade-off (1.0 = relevance only)')
+    parser.add_argument('--shard', type=str, default=None,
+                       help='Comma-separated shards (values of Config.SHARD_BY) a query searches')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='Run in-process even if a daemon is running')
+    parser.add_argument('--profile-op', choices=['chat', 'query'], default='chat',
+                       help='Operation timed by --mode profile')
+    parser.add_argument('--repeat', type=int, default=1,
+                       help='Number of profiled runs')
+    parser.add_argument('--metrics-file', type=str, default=Config.METRICS_EXPORT_PATH,
+                       help='Write Prometheus text-format metrics here on exit')
+    parser.add_argument('--event-id', type=int, help='Reminder to snooze or cancel')
+    parser.add_argument('--minutes', type=float, default=Config.REMINDER_SNOOZE_MINUTES,
+                       help='Snooze length in minutes')
+    parser.add_argument('--status', choices=['pending', 'fired', 'cancelled', 'past', 'all'], default='pending',
+                       help='Reminders listed by --mode reminders')
+    parser.add_argument('--limit', type=int, default=20, help='Reminders or jobs listed by --mode reminders/jobs')
+    parser.add_argument('--topic', type=str, help='Recurring topic for --mode accept-prediction')
+    parser.add_argument('--background', action='store_true',
+                       help='Queue add/transcribe/export as a background job instead of waiting for it')
+    parser.add_argument('--job-id', type=int, help='Background job to cancel')
+    parser.add_argument('--profile-memory', action='store_true',
+                       help='Record the tracemalloc peak of each operation and print it on exit')
     args = parser.parse_args()
     
-    # Initialize components
-    print("Initializing Personal AI Agent...")
-    vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
-    session_manager = SessionManager(str(Config.METADATA_DB_PATH))
-    agent = PersonalAgent(vector_store, session_manager, llm_model=args.model)
+    if args.profile_memory:
+        from helper.tracing import tracer
+        tracer.enable_memory_profiling()
+    
+    try:
+        run(args)
+    finally:
+        if args.profile_memory and args.mode != 'profile':
+            from helper.tracing import tracer
+            print_memory_profile(tracer.snapshot())
+        if args.metrics_file:
+            from helper.tracing import tracer
+            tracer.export_prometheus(str(args.metrics_file))
+
+def run(args):
+    if args.mode == 'imports':
+        # Import cost of each entry point, measured in fresh interpreters
+        from helper.import_report import print_import_report
+        print_import_report()
+        return
+    
+    if args.mode == 'profile':
+        # Time each stage of a chat turn or query, excluding startup
+        from helper.tracing import tracer
+        agent = build_agent(args.model)
+        question = args.text or input("Enter a question to profile: ")
+        session_id = agent.create_session({'mode': 'profile'}) if args.profile_op == 'chat' else None
+        tracer.reset()
+        for _ in range(max(args.repeat, 1)):
+            if args.profile_op == 'chat':
+                agent.chat(question, session_id=session_id)
+            else:
+                agent.query(question)
+        print_profile(tracer.snapshot())
+        return
+    
+    if args.mode == 'reminders':
+        status = None if args.status == 'all' else args.status
+        print_reminders(open_event_store().list_events(status, limit=args.limit))
+        return
+    
+    if args.mode in ('snooze', 'cancel-reminder'):
+        if args.event_id is None:
+            print("❌ --event-id is required.")
+            return
+        from datetime import datetime, timedelta
+        event_store = open_event_store()
+        if args.mode == 'snooze':
+            remind_at = datetime.now() + timedelta(minutes=args.minutes)
+            if event_store.snooze(args.event_id, remind_at):
+                print(f"✓ Reminder {args.event_id} snoozed until {remind_at:%Y-%m-%d %H:%M}.")
+            else:
+                print(f"❌ No active reminder {args.event_id}.")
+        elif event_store.cancel(args.event_id):
+            print(f"✓ Reminder {args.event_id} cancelled.")
+        else:
+            print(f"❌ No active reminder {args.event_id}.")
+        return
+    
+    if args.mode in ('predictions', 'accept-prediction'):
+        from agent.event_predictor import RecurrencePredictor
+        predictor = RecurrencePredictor(open_event_store())
+        if args.mode == 'predictions':
+            print_predictions(predictor.predictions(limit=args.limit))
+            return
+        prediction = predictor.prediction(args.topic) if args.topic else None
+        if prediction is None:
+            print("❌ No upcoming prediction for that --topic (see --mode predictions).")
+            return
+        stored = predictor.event_store.add_events([predictor.reminder_for(prediction)], source='prediction')
+        if stored:
+            print(f"✓ Reminder {stored[0]['id']} added for {stored[0]['due_at'].replace('T', ' ')}.")
+        else:
+            print("Reminder already added.")
+        return
+    
+    if args.mode == 'jobs':
+        print_jobs(open_job_store().list_jobs(limit=args.limit))
+        return
+    
+    if args.mode == 'cancel-job':
+        if args.job_id is None:
+            print("❌ --job-id is required.")
+        elif open_job_store().cancel(args.job_id):
+            print(f"✓ Job {args.job_id} cancelled (a running job stops after its current batch).")
+        else:
+            print(f"❌ No queued or running job {args.job_id}.")
+        return
+    
+    if args.mode in ('export', 'import'):
+        if not args.file:
+            print("❌ --file is required (the snapshot directory).")
+            return
+        if args.mode == 'export' and args.background:
+            queue_job('export', {'path': os.path.abspath(args.file), 'dtype': args.dtype})
+            return
+        from database.vector_store import VectorStore
+        from database.session_manager import SessionManager
+        from database.snapshot import SnapshotError, export_snapshot, import_snapshot
+        vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
+        session_manager = SessionManager(str(Config.METADATA_DB_PATH))
+        try:
+            if args.mode == 'export':
+                manifest = export_snapshot(vector_store, session_manager, args.file, dtype=args.dtype)
+                collections = manifest['collections']
+                print(f"✓ Exported {collections['knowledge_base']['records']} chunks, "
+                      f"{collections['memory']['records']} memory messages and "
+                      f"{manifest['sessions']['sessions']} sessions to {args.file}.")
+            else:
+                loaded = import_snapshot(vector_store, session_manager, args.file)
+                print(f"✓ Imported {loaded['knowledge_base']} chunks, {loaded['memory']} memory messages, "
+                      f"{loaded['sessions']} sessions and {loaded['messages']} messages.")
+        except (SnapshotError, FileExistsError, ValueError) as e:
+            print(f"❌ {e}")
+        return
+    
+    if args.mode == 'transcribe':
+        # Recordings (a WAV file or a folder of them) become knowledge base documents
+        if not args.file or not os.path.exists(args.file):
+            print("❌ --file must name a WAV file or a folder of recordings.")
+            return
+        source = args.source if args.source != 'manual' else 'voice'
+        if args.background:
+            queue_job('transcribe', {'path': os.path.abspath(args.file), 'source': source})
+            return
+        agent = build_agent(args.model)
+        counts = agent.add_audio_to_knowledge_base(args.file, source=source)
+        print(f"✓ Transcribed {counts['transcribed']} of {counts['files']} recordings "
+              f"into {counts['chunks']} chunks.")
+        return
+    
+    if args.mode == 'watch':
+        # Fire reminders in the foreground until interrupted
+        import time
+        from agent.reminder_scheduler import ReminderScheduler
+        scheduler = ReminderScheduler(open_event_store()).start()
+        upcoming = scheduler.event_store.next_pending()
+        print("⏰ Watching reminders (Ctrl+C to stop)")
+        if upcoming:
+            print(f"Next: {upcoming['title']} at {upcoming['remind_at'].replace('T', ' ')}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return
+    
+    if args.mode == 'daemon':
+        from agent_daemon import run_daemon
+        run_daemon(args.model)
+        return
+    
+    if args.mode == 'daemon-stop':
+        from agent_daemon import send_command
+        response = send_command({'mode': 'shutdown'})
+        if response is None:
+            print("No daemon is running.")
+        elif not response['ok']:
+            print(f"❌ Daemon error: {response['error']}")
+        else:
+            print("✓ Daemon stopped.")
+        return
+    
+    if args.mode == 'migrate':
+        # Re-embed into Config.EMBEDDING_MODEL's collections; a running daemon keeps serving meanwhile
+        if forward_to_daemon(args):
+            return
+        from database.vector_store import VectorStore
+        vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
+        migration = vector_store.start_migration()
+        if migration is None:
+            print_migration(None)
+            return
+        try:
+            while not migration.wait(timeout=5):
+                print_migration(migration.status())
+        except KeyboardInterrupt:
+            migration.cancel()
+            migration.wait()
+        print_migration(migration.status())
+        return
     
     if args.mode == 'stats':
+        if forward_to_daemon(args):
+            return
         # Show statistics
-        stats = agent.get_stats()
-        print("\n=== Knowledge Base Statistics ===")
-        for key, value in stats.items():
-            print(f"{key}: {value}")
+        agent = build_agent(args.model)
+        print_stats(agent.get_stats())
         return
     
     if args.mode == 'add':
@@ -45,10 +409,25 @@ def main():
         text = None
         
         if args.file:
-            # Read from file
-            with open(args.file, 'r', encoding='utf-8') as f:
-                text = f.read()
-            print(f"Read {len(text)} characters from {args.file}")
+            # Stream the file in blocks instead of reading it into one string
+            print(f"\n📝 Adding {args.file} to knowledge base...")
+            if args.background:
+                queue_job('add_file', {'path': os.path.abspath(args.file), 'source': args.source,
+                                       'metadata': {'input_type': args.input_type, 'file': args.file}})
+                return
+            if forward_to_daemon(args):
+                return
+            agent = build_agent(args.model)
+            doc_ids = agent.add_file_to_knowledge_base(
+                args.file,
+                source=args.source,
+                metadata={
+                    'input_type': args.input_type,
+                    'file': args.file
+                }
+            )
+            print_add_result(doc_ids)
+            return
         elif args.input_type == 'voice':
             print("🎤 Listening for speech...")
             text = voice_search()
@@ -61,15 +440,22 @@ def main():
         
         if text:
             print(f"\n📝 Adding to knowledge base...")
+            if args.background:
+                queue_job('add_text', {'text': text, 'source': args.source,
+                                       'metadata': {'input_type': args.input_type, 'file': None}})
+                return
+            if forward_to_daemon(args, text):
+                return
+            agent = build_agent(args.model)
             doc_ids = agent.add_to_knowledge_base(
-                text, 
+                text,
                 source=args.source,
                 metadata={
                     'input_type': args.input_type,
                     'file': args.file if args.file else None
                 }
             )
-            print(f"✓ Successfully added {len(doc_ids)} chunks to knowledge base.")
+            print_add_result(doc_ids)
     
     elif args.mode == 'query':
         # Query knowledge base
@@ -83,17 +469,16 @@ def main():
         else:
             question = args.text or input("Enter your question: ")
         
-        result = agent.query(question)
-        print(f"\n❓ Question: {result['question']}")
-        print(f"\n📚 Found {len(result['context'])} relevant chunks:\n")
-        
-        for i, (chunk, distance) in enumerate(zip(result['context'], result['distances']), 1):
-            print(f"\n[{i}] (similarity: {1 - distance:.3f})")
-            print(f"{chunk[:300]}{'...' if len(chunk) > 300 else ''}")
-            print("-" * 80)
+        if forward_to_daemon(args, question):
+            return
+        agent = build_agent(args.model)
+        print_query_result(agent.query(question, mmr=args.mmr or None, mmr_lambda=args.mmr_lambda,
+                                       shards=parse_shards(args.shard)))
     
     elif args.mode == 'chat':
         # Interactive chat mode
+        agent = build_agent(args.model)
+        agent.start_reminders()
         session_id = agent.start_session({'mode': 'chat', 'input_type': args.input_type})
         print(f"\n💬 Chat Mode Started")
         print(f"Session ID: {session_id}")
@@ -132,4 +517,4 @@ def main():
             print("-" * 80)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
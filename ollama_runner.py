@@ -1,6 +1,24 @@
 # ollama_runner.py
-import requests
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
+from helper.tracing import traced, tracer
+# `requests` is imported inside each call so importing the agent stays cheap
+
+class ModelNotFoundError(Exception):
+    """The requested model is not installed on the Ollama server (HTTP 404)"""
+    
+    def __init__(self, model: str, detail: str = ''):
+        super().__init__(f"Model {model} not found on the Ollama server{f': {detail}' if detail else ''}")
+        self.model = model
+
+def _raise_for_missing_model(response, model: str):
+    """Turn Ollama's 404 for an unknown model into ModelNotFoundError"""
+    if response.status_code != 404:
+        return
+    try:
+        detail = response.json().get('error', '')
+    except ValueError:
+        detail = ''
+    raise ModelNotFoundError(model, detail)
 
 class OllamaClient:
     """Client for interacting with Ollama API"""
@@ -8,28 +26,78 @@ class OllamaClient:
     def __init__(self, base_url: str = "http://localhost:11434"):
         self.base_url = base_url.rstrip('/')
     
-    def generate(self, model: str, prompt: str, temperature: float = 0.7) -> str:
-        """Generate text using Ollama's generate endpoint"""
+    @traced('ollama.generate')
+    def generate(self, model: str, prompt: str, temperature: float = 0.7, options: Dict = None,
+                 timeout: float = 120) -> str:
+        """
+        Generate text using Ollama's generate endpoint. `options` are passed through
+        as Ollama model options (e.g. num_predict, num_ctx); None values are left out.
+        """
+        import requests
         url = f"{self.base_url}/api/generate"
         payload = {
             "model": model,
             "prompt": prompt,
             "stream": False,
             "options": {
-                "temperature": temperature
+                "temperature": temperature,
+                **{key: value for key, value in (options or {}).items() if value is not None}
             }
         }
         
         try:
-            response = requests.post(url, json=payload, timeout=120)
+            response = requests.post(url, json=payload, timeout=timeout)
+            _raise_for_missing_model(response, model)
             response.raise_for_status()
             result = response.json()
+            tracer.record_ollama('generate', model, result)
             return result.get("response", "")
         except requests.exceptions.RequestException as e:
             raise Exception(f"Error calling Ollama API: {e}")
     
+    def generate_stream(self, model: str, prompt: str, temperature: float = 0.7, options: Dict = None,
+                        timeout: float = 120) -> Iterator[str]:
+        """
+        Like `generate`, but yield the response in pieces as Ollama produces them.
+        Closing the generator early (e.g. a cancelled chat) closes the connection,
+        which stops the generation on the server.
+        """
+        import json
+        import requests
+        url = f"{self.base_url}/api/generate"
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": temperature,
+                **{key: value for key, value in (options or {}).items() if value is not None}
+            }
+        }
+        
+        with tracer.span('ollama.generate_stream'):
+            try:
+                with requests.post(url, json=payload, timeout=timeout, stream=True) as response:
+                    _raise_for_missing_model(response, model)
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        part = json.loads(line)
+                        if part.get('error'):
+                            raise Exception(f"Error calling Ollama API: {part['error']}")
+                        if part.get('response'):
+                            yield part['response']
+                        if part.get('done'):
+                            tracer.record_ollama('generate', model, part)
+                            return
+            except requests.exceptions.RequestException as e:
+                raise Exception(f"Error calling Ollama API: {e}")
+    
+    @traced('ollama.embeddings')
     def get_embeddings(self, model: str, prompt: str) -> List[float]:
         """Get embeddings for a text using Ollama's embeddings endpoint"""
+        import requests
         url = f"{self.base_url}/api/embeddings"
         payload = {
             "model": model,
@@ -38,8 +106,35 @@ class OllamaClient:
         
         try:
             response = requests.post(url, json=payload, timeout=120)
+            _raise_for_missing_model(response, model)
             response.raise_for_status()
             result = response.json()
+            tracer.record_ollama('embeddings', model, result)
             return result.get("embedding", [])
         except requests.exceptions.RequestException as e:
             raise Exception(f"Error getting embeddings from Ollama: {e}")
+    
+    @traced('ollama.embed_batch')
+    def embed_batch(self, model: str, inputs: List[str]) -> List[List[float]]:
+        """Get embeddings for several texts in one request using Ollama's embed endpoint"""
+        if not inputs:
+            return []
+        import requests
+        url = f"{self.base_url}/api/embed"
+        payload = {
+            "model": model,
+            "input": inputs
+        }
+        
+        try:
+            response = requests.post(url, json=payload, timeout=120)
+            if response.status_code == 404:
+                # Older Ollama servers only offer the single-prompt endpoint (which
+                # raises ModelNotFoundError if the 404 was for the model instead)
+                return [self.get_embeddings(model, text) for text in inputs]
+            response.raise_for_status()
+            result = response.json()
+            tracer.record_ollama('embed', model, result)
+            return result.get("embeddings", [])
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Error getting embeddings from Ollama: {e}")
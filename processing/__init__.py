@@ -1,4 +1,5 @@
 # processing package
 from .text_processor import TextProcessor
+from .event_extractor import EventExtractor
 
-__all__ = ['TextProcessor']
+__all__ = ['TextProcessor', 'EventExtractor']
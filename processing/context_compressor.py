@@ -0,0 +1,128 @@
+# processing/context_compressor.py
+"""
+Sentence-level compression of retrieved chunks before they reach the prompt.
+
+Chunks are split into sentences (long unpunctuated runs into word windows) and
+every sentence is scored by cosine similarity to the query. The query and all
+sentences not yet cached go to the embedder in one batch, and the scores are one
+matrix-vector product. The best sentences are kept, best first, until
+`budget_tokens` is used; each chunk is then rendered as its kept sentences in
+their original order, with gaps marked by " … ". Chunks left with no sentence
+are dropped.
+
+Sentence embeddings are cached per chunk text (and embedding model), so chunks
+that keep coming back for related questions are split and embedded once.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from config import Config
+from processing.text_processor import TextProcessor
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def split_sentences(text: str, max_words: int = None) -> List[str]:
+    """Sentences of `text`; runs longer than `max_words` words are cut into windows"""
+    max_words = max_words or Config.COMPRESSION_MAX_SENTENCE_WORDS
+    sentences = []
+    for part in _SENTENCE_END.split(text):
+        words = part.split()
+        for start in range(0, len(words), max_words):
+            sentences.append(' '.join(words[start:start + max_words]))
+    return sentences
+
+
+class ContextCompressor:
+    """Keeps the query-relevant sentences of retrieved chunks within a token budget"""
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]], budget_tokens: int = None,
+                 cache_chunks: int = None, version: Callable[[], str] = None):
+        self.embed = embed
+        self.budget_tokens = budget_tokens or Config.COMPRESSION_TOKEN_BUDGET
+        self.cache_chunks = cache_chunks or Config.COMPRESSION_CACHE_CHUNKS
+        # Names the embedding model behind `embed`, so cached embeddings never mix models
+        self.version = version
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (sentences, unit vectors)
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'chunks': 0, 'cache_hits': 0, 'sentences': 0, 'sentences_kept': 0,
+                         'tokens_in': 0, 'tokens_out': 0}
+
+    def compress(self, query: str, chunks: List[str]) -> List[str]:
+        """The chunks cut down to their most query-relevant sentences (empty chunks dropped)"""
+        import numpy as np
+
+        if not chunks:
+            return []
+        version = self.version() if self.version else None
+        keys = [(version, hashlib.blake2b(chunk.encode('utf-8'), digest_size=16).digest()) for chunk in chunks]
+        entries, missing = {}, {}
+        with self._lock:
+            for key, chunk in zip(keys, chunks):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    entries[key] = self._cache[key]
+                elif key not in missing:
+                    missing[key] = split_sentences(chunk)
+        hits = sum(1 for key in keys if key in entries)
+
+        # One `embed` call for the query and every sentence not cached yet (a single
+        # /api/embed request with VectorStore.get_embeddings)
+        texts = [query] + [sentence for sentences in missing.values() for sentence in sentences]
+        vectors = np.asarray(self.embed(texts), dtype=np.float32)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query_vector, offset = vectors[0], 1
+        with self._lock:
+            for key, sentences in missing.items():
+                entries[key] = (sentences, vectors[offset:offset + len(sentences)])
+                offset += len(sentences)
+                self._cache[key] = entries[key]
+            while len(self._cache) > self.cache_chunks:
+                self._cache.popitem(last=False)
+
+        # Score every sentence of every chunk in one product, then fill the budget best first
+        owners = np.concatenate([np.full(len(entries[key][0]), i) for i, key in enumerate(keys)])
+        positions = np.concatenate([np.arange(len(entries[key][0])) for key in keys])
+        scores = np.concatenate([entries[key][1] for key in keys]) @ query_vector
+        if not len(scores):
+            return []
+        costs = np.array([TextProcessor.estimate_tokens(sentence) for key in keys for sentence in entries[key][0]])
+        order = np.argsort(-scores, kind='stable')
+        within = np.cumsum(costs[order]) <= self.budget_tokens
+        within[0] = True  # always keep the best sentence
+        kept = order[within]
+
+        compressed = []
+        for i, key in enumerate(keys):
+            indices = np.sort(positions[kept[owners[kept] == i]])
+            if not len(indices):
+                continue
+            sentences = entries[key][0]
+            spans, span = [], [sentences[indices[0]]]
+            for previous, index in zip(indices, indices[1:]):
+                if index != previous + 1:
+                    spans.append(' '.join(span))
+                    span = []
+                span.append(sentences[index])
+            spans.append(' '.join(span))
+            compressed.append(' … '.join(spans))
+
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['chunks'] += len(chunks)
+            self.counters['cache_hits'] += hits
+            self.counters['sentences'] += len(scores)
+            self.counters['sentences_kept'] += len(kept)
+            self.counters['tokens_in'] += sum(TextProcessor.estimate_tokens(chunk) for chunk in chunks)
+            self.counters['tokens_out'] += sum(TextProcessor.estimate_tokens(chunk) for chunk in compressed)
+        return compressed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.counters, cached_chunks=len(self._cache))
+        if stats['tokens_in']:
+            stats['token_ratio'] = round(stats['tokens_out'] / stats['tokens_in'], 3)
+        return stats
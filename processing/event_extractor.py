@@ -0,0 +1,297 @@
+# processing/event_extractor.py
+"""
+Find dated events ("dentist appointment on 12 March at 4pm", "rent due tomorrow")
+in free text.
+
+A rule-based parser handles absolute dates (ISO, numeric, month names), relative
+dates (today, tomorrow, next friday, in 3 days) and times of day. Sentences that
+look like events but defeat the rules are optionally sent to an LLM in a single
+batched call.
+"""
+import json
+import re
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from config import Config
+from processing.text_processor import TextProcessor
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12
+}
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'twelve': 12, 'fifteen': 15,
+    'twenty': 20, 'thirty': 30
+}
+PARTS_OF_DAY = {'morning': (9, 0), 'noon': (12, 0), 'afternoon': (15, 0), 'evening': (18, 0),
+                'tonight': (20, 0), 'night': (20, 0), 'midnight': (0, 0)}
+
+_MONTH = (r'(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?'
+          r'|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)\b\.?')
+_MERIDIEM = r'(am|pm|a\.m\.|p\.m\.)(?![a-z])'
+_ORDINAL = r'(?:st|nd|rd|th)?'
+
+ISO_DATE = re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})(?:[ t](\d{1,2}):(\d{2}))?\b', re.I)
+NUMERIC_DATE = re.compile(r'\b(\d{1,2})[/.](\d{1,2})[/.](\d{4}|\d{2})\b')
+DAY_MONTH = re.compile(rf'\b(\d{{1,2}}){_ORDINAL}\s+(?:of\s+)?{_MONTH}(?:,?\s+(\d{{4}}))?', re.I)
+MONTH_DAY = re.compile(rf'\b{_MONTH}\s+(\d{{1,2}}){_ORDINAL}\b(?:,?\s+(\d{{4}}))?', re.I)
+RELATIVE_DAY = re.compile(r'\b(day after tomorrow|tomorrow|today|tonight|this weekend|next week)\b', re.I)
+WEEKDAY = re.compile(r'\b(?:(next|this|coming|on)\s+)?(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b',
+                     re.I)
+IN_DURATION = re.compile(r'\bin\s+(\d+|an?|one|two|three|four|five|six|seven|eight|nine|ten|twelve|fifteen'
+                         r'|twenty|thirty)\s+(minute|min|hour|hr|day|week)s?\b', re.I)
+CLOCK_TIME = re.compile(rf'\b(?:at\s+)?(\d{{1,2}}):(\d{{2}})\s*{_MERIDIEM}?', re.I)
+HOUR_TIME = re.compile(rf'\b(?:at\s+)?(\d{{1,2}})\s*{_MERIDIEM}', re.I)
+AT_HOUR = re.compile(r'\bat\s+(\d{1,2})\b(?!\s*[/.:\d])', re.I)
+PART_OF_DAY = re.compile(r'\b(morning|noon|afternoon|evening|tonight|night|midnight)\b', re.I)
+
+# Cheap pre-filter: sentences without any of these cannot carry a date
+DATE_HINT = re.compile(
+    r'\d|today|tonight|tomorrow|week|monday|tuesday|wednesday|thursday|friday|saturday|sunday'
+    r'|jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|month|year|fortnight|noon|morning|evening',
+    re.I)
+# Sentences worth an LLM call when the rules find no date
+EVENT_HINT = re.compile(
+    r'\b(deadline|due|remind|appointment|meeting|exam|birthday|anniversary|renew\w*|expir\w*|pay\w*'
+    r'|bill|flight|interview|call|submit\w*|party|wedding|visit|schedul\w*|book\w*)\b', re.I)
+# Past tense: a date without a year is the latest occurrence, not the next one
+PAST_HINT = re.compile(r'\b(paid|was|were|had|did|went|attended|happened|held|renewed|received|last)\b', re.I)
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def _year(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    year = int(value)
+    return year + 2000 if year < 100 else year
+
+
+def _safe_date(year: int, month: int, day: int) -> Optional[datetime]:
+    try:
+        return datetime(year, month, day)
+    except ValueError:
+        return None
+
+
+def _upcoming(month: int, day: int, now: datetime, past: bool = False) -> Optional[datetime]:
+    """Next occurrence of month/day (this year unless it has already passed), or the latest if `past`"""
+    date = _safe_date(now.year, month, day)
+    if date is not None and not past and date.date() < now.date():
+        date = _safe_date(now.year + 1, month, day)
+    elif date is not None and past and date.date() > now.date():
+        date = _safe_date(now.year - 1, month, day)
+    return date
+
+
+def parse_time(sentence: str) -> Optional[Tuple[int, int]]:
+    """(hour, minute) of the first time of day mentioned in the sentence"""
+    for pattern in (CLOCK_TIME, HOUR_TIME):
+        match = pattern.search(sentence)
+        if match:
+            hour = int(match.group(1))
+            minute = int(match.group(2)) if pattern is CLOCK_TIME else 0
+            meridiem = (match.group(3) if pattern is CLOCK_TIME else match.group(2)) or ''
+            meridiem = meridiem.lower().replace('.', '')
+            if meridiem == 'pm' and hour < 12:
+                hour += 12
+            elif meridiem == 'am' and hour == 12:
+                hour = 0
+            if hour < 24 and minute < 60:
+                return hour, minute
+
+    match = AT_HOUR.search(sentence)
+    if match and int(match.group(1)) <= 23:
+        hour = int(match.group(1))
+        # "at 5" in everyday text almost always means the afternoon
+        return (hour + 12, 0) if 1 <= hour <= 7 else (hour, 0)
+
+    match = PART_OF_DAY.search(sentence)
+    if match:
+        return PARTS_OF_DAY[match.group(1).lower()]
+    return None
+
+
+def parse_date(sentence: str, now: datetime) -> Optional[Tuple[datetime, bool]]:
+    """
+    Date (or date and time) mentioned in the sentence, relative to `now`.
+    Returns (datetime, has_time) or None when no rule matches.
+    """
+    match = ISO_DATE.search(sentence)
+    if match:
+        date = _safe_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+        if date is not None:
+            if match.group(4):
+                return date.replace(hour=int(match.group(4)) % 24, minute=int(match.group(5)) % 60), True
+            return date, False
+
+    match = NUMERIC_DATE.search(sentence)
+    if match:
+        first, second = int(match.group(1)), int(match.group(2))
+        day, month = (first, second) if Config.DATE_ORDER == 'DMY' else (second, first)
+        date = _safe_date(_year(match.group(3)), month, day)
+        if date is not None:
+            return date, False
+
+    for pattern, day_group, month_group in ((DAY_MONTH, 1, 2), (MONTH_DAY, 2, 1)):
+        match = pattern.search(sentence)
+        if match:
+            day, month = int(match.group(day_group)), MONTHS[match.group(month_group).lower()[:3]]
+            year = _year(match.group(3))
+            date = (_safe_date(year, month, day) if year
+                    else _upcoming(month, day, now, past=bool(PAST_HINT.search(sentence))))
+            if date is not None:
+                return date, False
+
+    match = IN_DURATION.search(sentence)
+    if match:
+        amount = match.group(1).lower()
+        amount = int(amount) if amount.isdigit() else NUMBER_WORDS[amount]
+        unit = match.group(2).lower()
+        if unit in ('minute', 'min'):
+            return now + timedelta(minutes=amount), True
+        if unit in ('hour', 'hr'):
+            return now + timedelta(hours=amount), True
+        days = amount * 7 if unit == 'week' else amount
+        return datetime(now.year, now.month, now.day) + timedelta(days=days), False
+
+    today = datetime(now.year, now.month, now.day)
+    match = RELATIVE_DAY.search(sentence)
+    if match:
+        phrase = match.group(1).lower()
+        if phrase in ('today', 'tonight'):
+            return today, False
+        if phrase == 'tomorrow':
+            return today + timedelta(days=1), False
+        if phrase == 'day after tomorrow':
+            return today + timedelta(days=2), False
+        if phrase == 'this weekend':
+            return today + timedelta(days=(5 - today.weekday()) % 7), False
+        return today + timedelta(days=7 - today.weekday()), False  # next week: coming Monday
+
+    match = WEEKDAY.search(sentence)
+    if match:
+        qualifier = (match.group(1) or '').lower()
+        ahead = (WEEKDAYS.index(match.group(2).lower()) - today.weekday()) % 7
+        if ahead == 0 and qualifier != 'this':
+            ahead = 7
+        return today + timedelta(days=ahead), False
+
+    return None
+
+
+def iter_sentences(source: Union[str, Iterable[str]], max_chars: int = 2000) -> Iterator[str]:
+    """Yield sentences from a string, file object or block iterable without joining the input"""
+    pending = ''
+    for block in TextProcessor.iter_blocks(source):
+        pending += block
+        parts = SENTENCE_END.split(pending)
+        pending = parts.pop()
+        # A "sentence" that never ends (e.g. a log dump) is cut to stay bounded
+        while len(pending) > max_chars:
+            parts.append(pending[:max_chars])
+            pending = pending[max_chars:]
+        for part in parts:
+            part = part.strip()
+            if part:
+                yield part
+    if pending.strip():
+        yield pending.strip()
+
+
+class EventExtractor:
+    """Extract dated events from text with rules first and an optional LLM fallback"""
+
+    def __init__(self, llm: Optional[Callable[[str], str]] = None, lead_minutes: int = None,
+                 llm_max_sentences: int = None):
+        self.llm = llm
+        self.lead = timedelta(minutes=Config.REMINDER_LEAD_MINUTES if lead_minutes is None else lead_minutes)
+        self.llm_max_sentences = (Config.EVENT_LLM_MAX_SENTENCES if llm_max_sentences is None
+                                  else llm_max_sentences)
+        hour, minute = Config.REMINDER_DEFAULT_TIME.split(':')
+        self.default_time = (int(hour), int(minute))
+
+    def extract(self, source: Union[str, Iterable[str]], now: datetime = None,
+                include_past: bool = False) -> List[Dict]:
+        """
+        Events in the text as dicts with title, description, due_at, remind_at and
+        method ('rule' or 'llm'). Events already in the past are dropped unless
+        `include_past` is set.
+        """
+        now = now or datetime.now()
+        events, unresolved = [], []
+
+        for sentence in iter_sentences(source):
+            if not DATE_HINT.search(sentence):
+                continue
+            event = self.parse_sentence(sentence, now)
+            if event is not None:
+                events.append(event)
+            elif EVENT_HINT.search(sentence) and len(unresolved) < self.llm_max_sentences:
+                unresolved.append(sentence)
+
+        if unresolved and self.llm is not None:
+            events.extend(self._resolve_with_llm(unresolved, now))
+
+        if not include_past:
+            events = [event for event in events if event['due_at'] >= now]
+        return events
+
+    def parse_sentence(self, sentence: str, now: datetime) -> Optional[Dict]:
+        parsed = parse_date(sentence, now)
+        if parsed is None:
+            return None
+        due_at, has_time = parsed
+        if not has_time:
+            hour, minute = parse_time(sentence) or self.default_time
+            due_at = due_at.replace(hour=hour, minute=minute)
+        return self._event(sentence, sentence, due_at.replace(second=0, microsecond=0), 'rule')
+
+    def _event(self, title: str, description: str, due_at: datetime, method: str) -> Dict:
+        title = ' '.join(title.split())
+        if len(title) > Config.EVENT_TITLE_MAX_CHARS:
+            title = title[:Config.EVENT_TITLE_MAX_CHARS - 3].rstrip() + '...'
+        return {
+            'title': title,
+            'description': description,
+            'due_at': due_at,
+            'remind_at': due_at - self.lead,
+            'method': method
+        }
+
+    def _resolve_with_llm(self, sentences: List[str], now: datetime) -> List[Dict]:
+        numbered = "\n".join(f"{i}. {sentence}" for i, sentence in enumerate(sentences, 1))
+        prompt = f"""You are a date extraction assistant. Today is {now.strftime('%A %Y-%m-%d %H:%M')}.
+For each numbered sentence, work out the date and time of the event it describes.
+
+Sentences:
+{numbered}
+
+Respond ONLY with a JSON array, one object per sentence that has a date:
+[{{"index": 1, "due": "YYYY-MM-DD HH:MM", "title": "short event title"}}]
+Use {Config.REMINDER_DEFAULT_TIME} when no time is given. Respond with [] if no sentence has a date.
+
+Response:"""
+
+        try:
+            response = self.llm(prompt)
+            match = re.search(r'\[.*\]', response, re.DOTALL)
+            items = json.loads(match.group()) if match else []
+        except Exception as e:
+            print(f"Error resolving event dates with the LLM: {e}")
+            return []
+
+        events = []
+        for item in items:
+            try:
+                index = int(item['index'])
+                if not 1 <= index <= len(sentences):
+                    continue
+                sentence = sentences[index - 1]
+                due_at = datetime.strptime(str(item['due']).strip(), '%Y-%m-%d %H:%M')
+            except (KeyError, ValueError, IndexError, TypeError):
+                continue
+            events.append(self._event(item.get('title') or sentence, sentence, due_at, 'llm'))
+        return events
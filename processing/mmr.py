@@ -0,0 +1,45 @@
+# processing/mmr.py
+"""
+Maximal marginal relevance: pick search results that are relevant but not
+redundant with each other.
+
+Each step selects the candidate maximizing
+
+    lambda * sim(query, c) - (1 - lambda) * max(sim(c, s) for s already selected)
+
+All similarities come from two matrix products computed once. The running
+"closest selected" vector is updated with one `np.maximum` per pick, so k picks
+from n candidates cost O(n^2 d) for the products plus O(k n) vector work, with
+no pairwise Python loops.
+"""
+from typing import List
+
+
+def mmr_select(query_embedding, embeddings, k: int, lambda_mult: float = 0.7) -> List[int]:
+    """
+    Indices of `k` of the candidate `embeddings` (n x d) in selection order.
+    `lambda_mult` 1.0 ranks by relevance alone, 0.0 by diversity alone.
+    """
+    import numpy as np
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim != 2 or not len(vectors) or k <= 0:
+        return []
+    k = min(k, len(vectors))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    closest = np.full(len(vectors), -np.inf, dtype=np.float32)  # max similarity to a selected candidate
+    available = np.ones(len(vectors), dtype=bool)
+    selected = []
+    for _ in range(k):
+        redundancy = np.where(np.isfinite(closest), closest, 0.0)
+        scores = np.where(available, lambda_mult * relevance - (1.0 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        closest = np.maximum(closest, similarity[best])
+    return selected
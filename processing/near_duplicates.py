@@ -0,0 +1,69 @@
+# processing/near_duplicates.py
+"""
+MinHash signatures for spotting near-duplicate chunks.
+
+A chunk's signature holds, for each of `num_perm` hash functions, the minimum
+hash over its word 3-shingles. The fraction of positions where two signatures
+agree estimates the Jaccard similarity of their shingle sets, so one changed
+word in a 500-character chunk still scores about 0.9 while unrelated text
+scores near 0.
+
+For lookups the signature is cut into `bands` bands of `num_perm / bands` rows
+and each band is hashed to one integer: two chunks become candidates when any
+band matches exactly (probability 1 - (1 - s^rows)^bands for similarity s), so
+the index answers with a few indexed equality probes instead of a scan.
+"""
+import hashlib
+import re
+from typing import List
+
+SHINGLE_WORDS = 3
+_WORD = re.compile(r'\w+')
+_MASK_SEED = 0x5EED
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> List[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def _mix(values):
+    """splitmix64 finalizer on a uint64 array (wrapping arithmetic)"""
+    import numpy as np
+
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def minhash(text: str, num_perm: int = 64):
+    """uint64 array of `num_perm` minimum hashes (all max values for text without words)"""
+    import numpy as np
+
+    features = shingles(text)
+    if not features:
+        return np.full(num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+    hashes = np.array([int.from_bytes(hashlib.blake2b(f.encode('utf-8'), digest_size=8).digest(), 'little')
+                       for f in features], dtype=np.uint64)
+    masks = _mix(np.arange(_MASK_SEED, _MASK_SEED + num_perm, dtype=np.uint64))
+    # num_perm x features: each row is one hash function applied to every shingle
+    return _mix(hashes[None, :] ^ masks[:, None]).min(axis=1)
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float((a == b).mean())
+
+
+def band_keys(signature, bands: int) -> List[int]:
+    """One signed 64-bit key per band (SQLite integers are signed)"""
+    rows = len(signature) // bands
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
@@ -1,6 +1,7 @@
 # processing/text_processor.py
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Union
 import re
+from config import Config
 
 class TextProcessor:
     def __init__(self, chunk_size: int = 500, chunk_overlap: int = 50):
@@ -15,15 +16,71 @@ class TextProcessor:
         text = text.strip()
         return text
     
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Rough token estimate (about 4 characters per token)"""
+        return (len(text) + 3) // 4
+    
     def chunk_text(self, text: str) -> List[str]:
         """Split text into overlapping chunks"""
-        text = self.clean_text(text)
-        words = text.split()
+        chunks = list(self.iter_chunks(text))
+        return chunks if chunks else [self.clean_text(text)]
+    
+    @staticmethod
+    def iter_blocks(source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Yield a string or text file object in blocks of Config.STREAM_READ_CHARS (iterables as they come)"""
+        if isinstance(source, str):
+            for start in range(0, len(source), Config.STREAM_READ_CHARS):
+                yield source[start:start + Config.STREAM_READ_CHARS]
+        elif hasattr(source, 'read'):
+            # Fixed-size reads: iterating a file by lines breaks on newline-free input
+            yield from iter(lambda: source.read(Config.STREAM_READ_CHARS), '')
+        else:
+            yield from source
+    
+    @staticmethod
+    def iter_word_blocks(source: Union[str, Iterable[str]]) -> Iterator[List[str]]:
+        """
+        Yield the whitespace-separated words of the input one block at a time,
+        without ever joining the input into one string or one word list.
+        """
+        partial = ''
+        for block in TextProcessor.iter_blocks(source):
+            words = (partial + block).split()
+            # A word may continue in the next block
+            partial = words.pop() if words and not block[-1:].isspace() else ''
+            if words:
+                yield words
+        if partial:
+            yield [partial]
+    
+    def iter_chunks(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        """
+        Lazily split text into the same overlapping chunks as `chunk_text`.
+        Only one chunk worth of words plus one input block is held at a time.
+        """
+        step = self.chunk_size - self.chunk_overlap
+        window = []
+        for words in self.iter_word_blocks(source):
+            window.extend(words)
+            while len(window) >= self.chunk_size:
+                yield ' '.join(window[:self.chunk_size])
+                del window[:step]
+        
+        while window:
+            yield ' '.join(window[:self.chunk_size])
+            del window[:step]
+    
+    def measure(self, source: Union[str, Iterable[str]]) -> Dict[str, int]:
+        """Characters, words and chunk count of the input, in one streaming pass"""
+        characters = 0
         
-        chunks = []
-        for i in range(0, len(words), self.chunk_size - self.chunk_overlap):
-            chunk = ' '.join(words[i:i + self.chunk_size])
-            if chunk:
-                chunks.append(chunk)
+        def counted_blocks():
+            nonlocal characters
+            for block in self.iter_blocks(source):
+                characters += len(block)
+                yield block
         
-        return chunks if chunks else [text]
\ No newline at end of file
+        words = sum(len(block) for block in self.iter_word_blocks(counted_blocks()))
+        step = self.chunk_size - self.chunk_overlap
+        return {'characters': characters, 'words': words, 'chunks': (words + step - 1) // step}
\ No newline at end of file
@@ -0,0 +1,276 @@
+# test_api_server.py
+"""Embedding micro-batching and admission control of the HTTP API (uses the fake Ollama server, no models needed)"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from config import Config
+from conftest import config_override
+from api_server import APIServer, EmbeddingBatcher
+from benchmarks.fake_ollama import FakeOllamaServer, fake_embedding
+from ollama_runner import OllamaClient
+
+@contextmanager
+def _batcher(window_ms, max_batch_size):
+    server = FakeOllamaServer()
+    server.start()
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield EmbeddingBatcher(OllamaClient(server.base_url), 'fake', loop,
+                               window_ms=window_ms, max_batch_size=max_batch_size), server
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        server.stop()
+
+def _embed_concurrently(batcher, texts):
+    """Each text embedded by its own thread, all released at once; results in text order"""
+    results = [None] * len(texts)
+    barrier = threading.Barrier(len(texts))
+
+    def embed(i):
+        barrier.wait()
+        results[i] = batcher.embed([texts[i]])[0]
+
+    threads = [threading.Thread(target=embed, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+class _BlockingAgent:
+    """Agent stand-in whose chat holds its worker thread until `release` is set"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.chatting = 0
+
+    def chat(self, message, session_id=None):
+        self.chatting += 1
+        self.release.wait(timeout=10)
+        return f"echo {message}"
+
+    def create_session(self, metadata=None):
+        return 'session'
+
+    def query(self, question, **kwargs):
+        self.queries = getattr(self, 'queries', []) + [kwargs]
+        return {'context': [], 'question': question}
+
+    def unknown_shards(self, shards):
+        return [shard for shard in shards if shard not in ('notes', 'mail')]
+
+    def submit_job(self, kind, params=None):
+        self.jobs = getattr(self, 'jobs', []) + [(kind, params)]
+        return len(self.jobs)
+
+    def job_status(self, job_id):
+        return {'id': job_id} if job_id == 1 else None
+
+    def list_jobs(self, status=None, limit=20):
+        return [{'id': i, 'status': status} for i in range(1, limit + 1)]
+
+    def cancel_job(self, job_id):
+        return job_id == 1
+
+async def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        await asyncio.sleep(0.01)
+
+def test_requests_within_window_share_one_call():
+    texts = [f"note number {i}" for i in range(8)]
+    with _batcher(window_ms=200, max_batch_size=64) as (batcher, server):
+        results = _embed_concurrently(batcher, texts)
+        assert results == [fake_embedding(text) for text in texts]
+        assert server.request_counts == {'/api/embed': 1}
+        stats = batcher.get_stats()
+        assert (stats['batches_sent'], stats['requests_batched'], stats['texts_embedded']) == (1, 8, 8)
+
+def test_max_batch_flushes_early_and_splits():
+    with _batcher(window_ms=10000, max_batch_size=4) as (batcher, server):
+        # A full batch goes out at once instead of waiting out the window
+        started = time.time()
+        texts = [f"note {i}" for i in range(4)]
+        assert _embed_concurrently(batcher, texts) == [fake_embedding(text) for text in texts]
+        assert time.time() - started < 5
+        # One large request is sent in max_batch_size parts
+        texts = [f"chunk {i}" for i in range(10)]
+        assert batcher.embed(texts) == [fake_embedding(text) for text in texts]
+        assert server.request_counts['/api/embed'] == 1 + 3
+
+def test_overload_returns_503():
+    agent = _BlockingAgent()
+    api = APIServer(agent, max_pending=2, queue_timeout=5)
+
+    async def scenario():
+        admitted = [asyncio.ensure_future(api.dispatch('POST', '/chat', {'message': str(i)})) for i in range(2)]
+        await _wait_until(lambda: agent.chatting == 2)
+        status, payload, headers = await api.dispatch('POST', '/chat', {'message': 'one too many'})
+        assert status == 503 and headers == {'Retry-After': '1'}
+        # /health bypasses admission control
+        assert (await api.dispatch('GET', '/health', {}))[0] == 200
+        agent.release.set()
+        return [await request for request in admitted]
+
+    try:
+        finished = asyncio.run(scenario())
+    finally:
+        agent.release.set()
+        api.executor.shutdown(wait=True)
+    assert [(status, payload['response']) for status, payload, _ in finished] == [(200, 'echo 0'), (200, 'echo 1')]
+    assert api.counters['chat'] == {'requests': 3, 'rejected': 1, 'errors': 0}
+    assert api.in_flight == 0
+
+def test_endpoint_concurrency_is_limited_per_endpoint():
+    agent = _BlockingAgent()
+    api = APIServer(agent, max_pending=10, endpoint_limits=dict(Config.API_ENDPOINT_CONCURRENCY, chat=1),
+                    queue_timeout=0.2)
+
+    async def scenario():
+        first = asyncio.ensure_future(api.dispatch('POST', '/chat', {'message': 'first'}))
+        await _wait_until(lambda: agent.chatting == 1)
+        # A second chat waits for the only slot, then gives up; other endpoints are unaffected
+        status, payload, _ = await api.dispatch('POST', '/chat', {'message': 'second'})
+        assert status == 503 and "'chat'" in payload['error']
+        status, payload, _ = await api.dispatch('POST', '/query', {'question': 'rent?'})
+        assert status == 200 and payload['question'] == 'rent?'
+        agent.release.set()
+        return await first
+
+    try:
+        status, payload, _ = asyncio.run(scenario())
+    finally:
+        agent.release.set()
+        api.executor.shutdown(wait=True)
+    assert status == 200 and payload['response'] == 'echo first'
+    assert api.counters['chat']['rejected'] == 1 and api.counters['query']['rejected'] == 0
+
+def test_malformed_requests_get_400():
+    api = APIServer(_BlockingAgent())
+
+    async def send(raw):
+        server = await asyncio.start_server(api.handle_connection, '127.0.0.1', 0)
+        try:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(raw)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), timeout=5)
+            writer.close()
+            return response
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    async def scenario():
+        return [await send(raw) for raw in (
+            b"POST /query HTTP/1.1\r\nContent-Length: lots\r\n\r\n",
+            b"POST /query HTTP/1.1\r\nContent-Length: -5\r\n\r\n",
+            b"GET /health HTTP/1.1\r\nX-Padding: " + b"x" * 100000 + b"\r\n\r\n",
+            b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n",
+        )]
+
+    try:
+        *malformed, healthy = asyncio.run(scenario())
+    finally:
+        api.executor.shutdown(wait=True)
+    for response in malformed:
+        assert response.startswith(b"HTTP/1.1 400 "), response[:80]
+    assert b"Invalid Content-Length" in malformed[0] and b"too long" in malformed[2]
+    assert healthy.startswith(b"HTTP/1.1 200 ")
+
+def test_api_jobs_cannot_touch_files_outside_uploads():
+    agent = _BlockingAgent()
+    api = APIServer(agent)
+    with tempfile.TemporaryDirectory() as tmp, config_override(JOB_UPLOAD_DIR=os.path.join(tmp, 'uploads')):
+        os.makedirs(Config.JOB_UPLOAD_DIR)
+        outside = os.path.join(tmp, 'precious.txt')
+        upload = os.path.join(Config.JOB_UPLOAD_DIR, 'notes.txt')
+        for path in (outside, upload):
+            with open(path, 'w') as f:
+                f.write('keep me')
+
+        async def scenario():
+            return [await api.dispatch('POST', '/jobs', body) for body in (
+                {'kind': 'add_file', 'params': {'path': outside, 'delete_after': True}},
+                {'kind': 'add_file', 'params': {'path': os.path.join(Config.JOB_UPLOAD_DIR, '..', 'precious.txt')}},
+                {'kind': 'export', 'params': {'path': outside}},
+                {'kind': 'add_file', 'params': {'path': upload, 'delete_after': True}},
+            )]
+
+        try:
+            *rejected, (status, payload, _) = asyncio.run(scenario())
+        finally:
+            api.executor.shutdown(wait=True)
+        assert [response[0] for response in rejected] == [400, 400, 400]
+        assert "cannot be submitted" in rejected[2][1]['error']
+        # Only the file inside the upload directory is queued, and never for deletion
+        assert status == 200 and agent.jobs == [('add_file', {'path': upload})]
+        assert os.path.exists(outside) and os.path.exists(upload)
+
+def test_job_ids_and_limits_must_be_integers():
+    api = APIServer(_BlockingAgent())
+
+    async def scenario():
+        return [await api.dispatch(method, path, body) for method, path, body in (
+            ('GET', '/jobs', {'limit': 'abc'}),
+            ('GET', '/jobs', {'job_id': '1x'}),
+            ('POST', '/jobs/cancel', {'job_id': True}),
+            ('POST', '/jobs/cancel', {}),
+            ('GET', '/jobs', {'limit': '2', 'status': 'queued'}),
+            ('GET', '/jobs', {'job_id': '1'}),
+            ('GET', '/jobs', {'job_id': '7'}),
+            ('POST', '/jobs/cancel', {'job_id': 1}),
+        )]
+
+    try:
+        responses = asyncio.run(scenario())
+    finally:
+        api.executor.shutdown(wait=True)
+    assert [status for status, _, _ in responses] == [400, 400, 400, 400, 200, 200, 404, 200]
+    assert responses[0][1]['error'] == "'limit' must be an integer"
+    assert responses[4][1] == {'jobs': [{'id': 1, 'status': 'queued'}, {'id': 2, 'status': 'queued'}]}
+    assert responses[5][1] == {'id': 1} and responses[7][1] == {'cancelled': True}
+
+def test_query_options_are_validated():
+    agent = _BlockingAgent()
+    api = APIServer(agent)
+
+    async def scenario():
+        return [await api.dispatch('POST', '/query', dict(body, question='rent?')) for body in (
+            {'n_results': 'ten'},
+            {'n_results': 0},
+            {'n_results': Config.API_MAX_RESULTS + 1},
+            {'mmr_lambda': 1.5},
+            {'mmr_lambda': 'high'},
+            {'mmr': 'yes'},
+            {'shards': 'notes'},
+            {'shards': ['notes', 'diary']},
+            {'n_results': 5, 'mmr': True, 'mmr_lambda': 0, 'shards': ['mail']},
+        )]
+
+    try:
+        responses = asyncio.run(scenario())
+    finally:
+        api.executor.shutdown(wait=True)
+    assert [status for status, _, _ in responses] == [400] * 8 + [200]
+    assert responses[2][1]['error'] == f"'n_results' must be from 1 to {Config.API_MAX_RESULTS}"
+    assert responses[3][1]['error'] == "'mmr_lambda' must be a number from 0 to 1"
+    assert responses[7][1]['error'] == "Unknown shards: diary"
+    # Only the valid request reached the agent
+    assert agent.queries == [{'n_results': 5, 'session_id': None, 'mmr': True, 'mmr_lambda': 0.0,
+                              'shards': ['mail']}]
+
+if __name__ == '__main__':
+    for test in [test_requests_within_window_share_one_call, test_max_batch_flushes_early_and_splits,
+                 test_overload_returns_503, test_endpoint_concurrency_is_limited_per_endpoint,
+                 test_malformed_requests_get_400, test_api_jobs_cannot_touch_files_outside_uploads,
+                 test_job_ids_and_limits_must_be_integers, test_query_options_are_validated]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,82 @@
+# test_benchmarks.py
+"""Fake Ollama server contract and a tiny run of the offline benchmark harness"""
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from config import Config
+from conftest import config_override
+from benchmarks.fake_ollama import FakeOllamaServer, fake_embedding
+
+@contextmanager
+def _server(**kwargs):
+    server = FakeOllamaServer(dimensions=16, **kwargs)
+    try:
+        yield server, server.start()
+    finally:
+        server.stop()
+
+def test_fake_server_answers_like_ollama():
+    import requests
+
+    with _server() as (server, url):
+        reply = requests.post(f"{url}/api/embed", json={'model': 'fake', 'input': ["rent is due", "gym"]}).json()
+        assert reply['embeddings'] == [fake_embedding("rent is due", 16), fake_embedding("gym", 16)]
+        assert reply['prompt_eval_count'] == 4
+        reply = requests.post(f"{url}/api/embed", json={'model': 'fake', 'input': "rent is due"}).json()
+        assert reply['embeddings'] == [fake_embedding("rent is due", 16)]
+        reply = requests.post(f"{url}/api/embeddings", json={'model': 'fake', 'prompt': "rent is due"}).json()
+        assert reply['embedding'] == fake_embedding("rent is due", 16)
+
+        prompt = "You are a summarization assistant. Summarize the chat."
+        reply = requests.post(f"{url}/api/generate", json={'model': 'fake', 'prompt': prompt}).json()
+        assert reply['done'] and reply['response'] == 'The user and the assistant discussed several topics.'
+        assert reply['eval_count'] == len(reply['response'].split())
+
+        with requests.post(f"{url}/api/generate", json={'model': 'fake', 'prompt': prompt, 'stream': True},
+                           stream=True) as response:
+            assert response.headers['Content-Type'] == 'application/x-ndjson'
+            lines = [json.loads(line) for line in response.iter_lines() if line]
+        assert len(lines) > 2 and not any(line['done'] for line in lines[:-1])
+        assert ''.join(line['response'] for line in lines) == reply['response']
+        assert lines[-1]['done'] and lines[-1]['eval_count'] == reply['eval_count']
+
+        server.missing_models.add('llama-missing')
+        response = requests.post(f"{url}/api/generate", json={'model': 'llama-missing', 'prompt': prompt})
+        assert response.status_code == 404 and 'not found' in response.json()['error']
+        assert requests.post(f"{url}/api/unknown", json={}).status_code == 404
+        assert requests.get(f"{url}/api/tags").json()['models'] == [{'name': 'fake'}]
+        assert server.request_counts == {'/api/embed': 2, '/api/embeddings': 1, '/api/generate': 3,
+                                         '/api/unknown': 1}
+
+def test_harness_runs_end_to_end():
+    from benchmarks import run_benchmarks
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'bench.json')
+        argv = ['run_benchmarks', '--sizes', '20', '--chunks-per-doc', '10', '--queries', '5',
+                '--session-ops', '5', '--chat-turns', '2']
+        # main() points Config at the fake server and disables background work; restore it afterwards
+        changed = ('OLLAMA_BASE_URL', 'MEMORY_ENABLED', 'SUMMARY_TRIGGER_MESSAGES', 'SUMMARY_TRIGGER_TOKENS',
+                   'ROUTER_LOG_PATH')
+        with config_override(**{name: getattr(Config, name) for name in changed}):
+            previous_argv = sys.argv
+            try:
+                sys.argv = argv + ['--output', output]
+                run_benchmarks.main()
+                sys.argv = argv + ['--output', os.path.join(tmp, 'again.json'), '--compare', output]
+                run_benchmarks.main()
+            finally:
+                sys.argv = previous_argv
+        with open(output, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    assert results['ingest']['20']['chunks'] == 20
+    assert results['search']['20']['count'] == 5
+    assert results['sessions']['write']['count'] == 5 and results['chat']['total']['count'] == 2
+    assert results['meta']['fake_server_requests']['/api/generate'] >= 2
+
+if __name__ == '__main__':
+    for test in [test_fake_server_answers_like_ollama, test_harness_runs_end_to_end]:
+        test()
+        print(f"✓ {test.__name__}")
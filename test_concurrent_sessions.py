@@ -0,0 +1,121 @@
+# test_concurrent_sessions.py
+"""Concurrent sessions on one shared agent stay apart, and sqlite survives parallel writers (no Ollama needed)"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from conftest import config_override
+from benchmarks.fake_ollama import fake_embedding
+
+SESSIONS = 6
+TURNS = 8
+TAG = re.compile(r'session(\d+)-fact')
+
+def _run_threads(target, count):
+    """`target(i)` on `count` threads released together; returns the exceptions they raised"""
+    errors = []
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        try:
+            barrier.wait()
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    return errors
+
+def _wait_for_background(agent, timeout=10.0):
+    deadline = time.time() + timeout
+    while agent._summaries_in_progress or agent._memory_indexing:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def _sessions_in(text):
+    return {int(number) for number in TAG.findall(text)}
+
+def test_shared_agent_keeps_sessions_apart():
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from agent.personal_agent import PersonalAgent
+
+    settings = dict(SUMMARY_KEEP_RECENT=2, SUMMARY_TRIGGER_MESSAGES=2, SUMMARY_TRIGGER_TOKENS=10**6,
+                    HISTORY_TOKEN_BUDGET=10**6, MEMORY_ENABLED=True, MEMORY_MIN_CHARS=1)
+    with config_override(**settings), tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='concurrency_test',
+                            memory_collection_name='concurrency_test_memory')
+        store.set_embedder(lambda texts: [fake_embedding(text) for text in texts])
+        agent = PersonalAgent(store, SessionManager(os.path.join(tmp, 'metadata.db')), llm_model='fake')
+        prompts = []
+
+        def generate(prompt, temperature=None, task='chat'):
+            prompts.append(prompt)
+            # Echo the tag of the current message, so replies are attributable too
+            return f"noted session{TAG.findall(prompt)[-1]}-fact"
+
+        def summarize(messages, previous_summary='', **kwargs):
+            return ' '.join([previous_summary] + [message['content'] for message in messages]).strip()
+
+        agent._call_ollama_llm = generate
+        agent.summarize_conversation = summarize
+        sessions = [agent.create_session({'user': n}) for n in range(SESSIONS)]
+
+        def converse(n):
+            for turn in range(TURNS):
+                agent.chat(f"session{n}-fact-{turn}", use_context=False, session_id=sessions[n])
+
+        assert _run_threads(converse, SESSIONS) == []
+        _wait_for_background(agent)
+        agent.index_conversation_memory()
+
+        # Every prompt mixes history of exactly one session
+        assert len(prompts) == SESSIONS * TURNS
+        assert all(len(_sessions_in(prompt)) == 1 for prompt in prompts)
+        for n, session_id in enumerate(sessions):
+            history = agent.session_manager.get_session_history(session_id, limit=100)
+            assert [message['content'] for message in history if message['role'] == 'user'] == \
+                [f"session{n}-fact-{turn}" for turn in range(TURNS)]
+            assert _sessions_in(' '.join(message['content'] for message in history)) == {n}
+            summary = agent.session_manager.get_session_summary(session_id)['summary']
+            assert summary and _sessions_in(summary) == {n}
+
+        # Conversation memory records carry the session they came from
+        memories = store.memory_collection.get(include=['documents', 'metadatas'])
+        assert len(memories['ids']) == SESSIONS * TURNS * 2
+        for document, meta in zip(memories['documents'], memories['metadatas']):
+            assert _sessions_in(document) == {sessions.index(meta['session_id'])}
+
+def test_parallel_writes_survive_on_wal():
+    from database.session_manager import SessionManager
+
+    writers, messages = 8, 40
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SessionManager(os.path.join(tmp, 'metadata.db'), busy_timeout=30.0)
+        for n in range(writers):
+            manager.create_session(f"writer-{n}")
+
+        def write(n):
+            for i in range(messages):
+                manager.add_message(f"writer-{n}", 'user', f"message {i}")
+                manager.get_session_history(f"writer-{n}", limit=5)
+
+        assert _run_threads(write, writers) == []
+        for n in range(writers):
+            assert manager.count_messages_since(f"writer-{n}")['messages'] == messages
+        conn = sqlite3.connect(manager.db_path)
+        try:
+            assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        finally:
+            conn.close()
+
+if __name__ == '__main__':
+    for test in [test_shared_agent_keeps_sessions_apart, test_parallel_writes_survive_on_wal]:
+        test()
+        print(f"✓ {test.__name__}")
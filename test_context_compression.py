@@ -0,0 +1,92 @@
+# test_context_compression.py
+"""Sentence-level compression of retrieved context (no Ollama needed)"""
+import os
+import random
+import tempfile
+import zlib
+from config import Config
+from conftest import config_override
+from processing.context_compressor import ContextCompressor, split_sentences
+from processing.text_processor import TextProcessor
+
+FILLER = "The weather was mild and the garden needed watering again. "
+RENT = "The rent of 1200 euros is due on the fifth of every month. "
+
+def _embed(texts):
+    """Hashed bag of words, so sentences sharing words with the query score high"""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 128
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip('?.,!').encode()) % 128] += 1.0
+        vectors.append(vector)
+    return vectors
+
+def test_split_sentences():
+    assert split_sentences("One. Two? Three!\nFour") == ["One.", "Two?", "Three!", "Four"]
+    words = ' '.join(f"w{i}" for i in range(100))
+    assert [len(s.split()) for s in split_sentences(words, max_words=40)] == [40, 40, 20]
+
+def test_keeps_relevant_sentences_within_budget():
+    calls = []
+    compressor = ContextCompressor(lambda texts: calls.append(len(texts)) or _embed(texts), budget_tokens=20)
+    chunks = [FILLER * 4 + RENT + FILLER * 4, FILLER * 8]
+    compressed = compressor.compress("When is the rent due?", chunks)
+
+    assert compressed == [RENT.strip()]
+    assert sum(TextProcessor.estimate_tokens(chunk) for chunk in compressed) <= 20
+    # One embedding call for the query and all sentences; cached chunks only need the query
+    assert calls == [1 + sum(len(split_sentences(chunk)) for chunk in chunks)]
+    compressor.compress("How much is the rent?", chunks)
+    assert calls[1] == 1 and compressor.stats()['cache_hits'] == 2
+
+def test_chat_prompt_shrinks():
+    from database.vector_store import VectorStore
+    from agent.personal_agent import PersonalAgent
+
+    rng = random.Random(0)
+    words = "garden weather project meeting train music holiday kitchen".split()
+    notes = [' '.join(rng.choice(words) for _ in range(12)) + '.' for _ in range(40)]
+    with config_override(DEDUP_POLICY='off', ROUTER_ENABLED=False, QUERY_CACHE_ENABLED=False), \
+            tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='compression_test',
+                            memory_collection_name='compression_test_memory')
+        store.set_embedder(_embed)
+        processor = TextProcessor(Config.CHUNK_SIZE, Config.CHUNK_OVERLAP)
+        store.add_documents(processor.chunk_text(' '.join(notes[:20]) + ' ' + RENT + ' '.join(notes[20:])))
+
+        prompts = {}
+        for enabled in (False, True):
+            with config_override(COMPRESSION_ENABLED=enabled, COMPRESSION_TOKEN_BUDGET=60):
+                agent = PersonalAgent(store, session_manager=None, llm_model='fake')
+            agent.reframe_query = lambda question, *args, **kwargs: question
+            agent._call_ollama_llm = lambda prompt, *args, **kwargs: prompts.setdefault(enabled, prompt)
+            agent.chat("When is the rent due?", session_id=None)
+        assert RENT.strip() in prompts[True]
+        assert len(prompts[True]) < len(prompts[False]) / 2
+        assert agent.get_stats()['context_compression']['token_ratio'] < 0.5
+
+def test_sentences_embedded_in_one_request():
+    from benchmarks.fake_ollama import FakeOllamaServer
+    from database.vector_store import VectorStore
+
+    server = FakeOllamaServer()
+    server.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='compression_batch_test',
+                                memory_collection_name='compression_batch_test_memory')
+            store.ollama_client.base_url = server.base_url
+            compressor = ContextCompressor(store.get_embeddings, budget_tokens=20)
+            compressed = compressor.compress("When is the rent due?", [FILLER * 4 + RENT, FILLER * 6])
+    finally:
+        server.stop()
+    assert compressed
+    # The query and all 12 sentences go out as one batch, not one request each
+    assert server.request_counts.get('/api/embed') == 1 and '/api/embeddings' not in server.request_counts
+
+if __name__ == '__main__':
+    for test in [test_split_sentences, test_keeps_relevant_sentences_within_budget, test_chat_prompt_shrinks,
+                 test_sentences_embedded_in_one_request]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,94 @@
+# test_conversation_memory.py
+"""Cross-session conversation memory: recall from other sessions, idempotent indexing (no Ollama needed)"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from conftest import config_override
+from benchmarks.fake_ollama import fake_embedding
+
+FACT = "My sister Anna moves to Lisbon in November for her new job."
+
+@contextmanager
+def _agent(**settings):
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from agent.personal_agent import PersonalAgent
+
+    settings = dict(dict(MEMORY_ENABLED=True, MEMORY_MIN_CHARS=20, ROUTER_ENABLED=False,
+                         COMPRESSION_ENABLED=False, QUERY_CACHE_ENABLED=False, REMINDERS_ENABLED=False),
+                    **settings)
+    with config_override(**settings), tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='memory_recall_test',
+                            memory_collection_name='memory_recall_test_memory')
+        store.set_embedder(lambda texts: [fake_embedding(text) for text in texts])
+        agent = PersonalAgent(store, SessionManager(os.path.join(tmp, 'metadata.db')), llm_model='fake')
+        agent.reframe_query = lambda question: question
+        prompts = []
+        agent._call_ollama_llm = lambda prompt, temperature=None, task='chat': prompts.append(prompt) or "Noted."
+        agent.summarize_conversation = lambda messages, previous_summary='', **kwargs: previous_summary
+        yield agent, prompts
+
+def _wait_for_indexing(agent, timeout=10.0):
+    deadline = time.time() + timeout
+    while agent._memory_indexing:
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+def test_message_from_one_session_is_recalled_in_another():
+    with _agent() as (agent, prompts):
+        first = agent.create_session({'user': 'me'})
+        agent.chat(FACT, session_id=first)
+        _wait_for_indexing(agent)
+
+        second = agent.create_session({'user': 'me'})
+        result = agent.query("Where does Anna move to in November?", include_memory=True, session_id=second)
+        assert FACT in [memory['content'] for memory in result['memory']]
+        assert all(memory['session_id'] == first for memory in result['memory'])
+        agent.chat("When does my sister Anna move to Lisbon?", session_id=second)
+        assert FACT in prompts[-1]
+
+        # The session itself reaches the prompt through its history, not through memory
+        result = agent.query("Where does Anna move to in November?", include_memory=True, session_id=first)
+        assert all(memory['session_id'] != first for memory in result['memory'])
+
+def test_indexing_is_idempotent():
+    with _agent() as (agent, _):
+        manager, store = agent.session_manager, agent.vector_store
+        session = agent.create_session()
+        manager.add_message(session, 'user', FACT)
+        manager.add_message(session, 'assistant', "ok")  # too short to embed, still marked as seen
+        assert agent.index_conversation_memory() == 1
+        assert agent.index_conversation_memory() == 0
+        assert store.memory_collection.count() == 1
+        assert manager.get_unindexed_messages(limit=10) == []
+
+        manager.add_message(session, 'user', "The flat in Lisbon has two bedrooms and a balcony.")
+        assert agent.index_conversation_memory() == 1
+        assert store.memory_collection.count() == 2
+
+        # Indexing the same messages again (e.g. after memory_index was lost) replaces, never duplicates
+        history = [m for m in manager.get_session_history(session) if len(m['content']) >= 20]
+        store.add_memories([f"msg-{m['id']}" for m in history], [m['content'] for m in history],
+                           [{'session_id': session, 'role': m['role'], 'message_id': m['id']} for m in history])
+        assert store.memory_collection.count() == 2
+
+def test_disabled_memory_is_neither_indexed_nor_retrieved():
+    with _agent(MEMORY_ENABLED=False) as (agent, prompts):
+        # A message indexed while memory was still on
+        agent.session_manager.add_message(agent.create_session(), 'user', FACT)
+        agent.index_conversation_memory()
+        assert agent.vector_store.memory_collection.count() == 1
+
+        agent.chat("When does my sister Anna move to Lisbon?", session_id=agent.create_session())
+        assert FACT not in prompts[-1]
+        # New turns are not scheduled for indexing
+        assert not agent._memory_indexing
+        assert len(agent.session_manager.get_unindexed_messages(limit=10)) == 2
+        assert agent.vector_store.memory_collection.count() == 1
+
+if __name__ == '__main__':
+    for test in [test_message_from_one_session_is_recalled_in_another, test_indexing_is_idempotent,
+                 test_disabled_memory_is_neither_indexed_nor_retrieved]:
+        test()
+        print(f"✓ {test.__name__}")
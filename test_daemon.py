@@ -0,0 +1,138 @@
+# test_daemon.py
+"""CLI daemon: owner-only socket, command forwarding and in-process fallback (no Ollama needed)"""
+import argparse
+import os
+import socket
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from conftest import config_override
+from agent_daemon import AgentDaemon, send_command
+
+class _Agent:
+    """Agent stand-in answering the forwarded modes"""
+
+    def __init__(self):
+        self.added = []
+
+    def query(self, text, **kwargs):
+        return {'question': text, 'context': ["Rent is due on the fifth."], 'distances': [0.25]}
+
+    def add_to_knowledge_base(self, text, source='manual', metadata=None):
+        self.added.append((text, source))
+        return ['doc-1']
+
+    def get_stats(self):
+        return {'total_documents': 1}
+
+@contextmanager
+def _daemon():
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, 'agent.sock')
+        agent = _Agent()
+        server = AgentDaemon(agent, 'fake', socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with config_override(DAEMON_SOCKET_PATH=socket_path):
+                yield agent, socket_path
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join(timeout=5)
+
+def _args(mode, **values):
+    defaults = dict(mode=mode, model='fake', no_daemon=False, profile_memory=False, source='manual',
+                    input_type='text', file=None, mmr=False, mmr_lambda=None, shard=None)
+    defaults.update(values)
+    return argparse.Namespace(**defaults)
+
+def test_socket_is_owner_only_from_creation():
+    previous = os.umask(0o022)
+    try:
+        with _daemon() as (_, socket_path):
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        # The process umask is restored after binding
+        assert os.umask(0o022) == 0o022
+    finally:
+        os.umask(previous)
+
+def test_commands_forwarded_to_daemon():
+    from main import forward_to_daemon
+
+    with _daemon() as (agent, socket_path):
+        assert send_command({'mode': 'ping'}, socket_path)['result']['model'] == 'fake'
+        response = send_command({'mode': 'query', 'model': 'fake', 'text': 'When is rent due?'}, socket_path)
+        assert response == {'ok': True, 'result': {'question': 'When is rent due?',
+                                                   'context': ["Rent is due on the fifth."], 'distances': [0.25]}}
+        assert forward_to_daemon(_args('add', source='notes'), "Water bill is due on the 15th.")
+        assert agent.added == [("Water bill is due on the 15th.", 'notes')]
+        assert forward_to_daemon(_args('stats'))
+        # Another model, --no-daemon or a mode the daemon does not serve run in-process
+        assert not forward_to_daemon(_args('query', model='other'), 'When is rent due?')
+        assert not forward_to_daemon(_args('query', no_daemon=True), 'When is rent due?')
+        assert not forward_to_daemon(_args('chat'), 'hello')
+        assert send_command({'mode': 'chat'}, socket_path)['fallback'] is True
+
+def test_falls_back_when_no_daemon_runs():
+    from main import forward_to_daemon
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, 'agent.sock')
+        assert send_command({'mode': 'ping'}, socket_path) is None
+        # A socket file left behind by a daemon that died
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        assert os.path.exists(socket_path)
+        assert send_command({'mode': 'ping'}, socket_path) is None
+        with config_override(DAEMON_SOCKET_PATH=socket_path):
+            assert not forward_to_daemon(_args('stats'))
+
+@contextmanager
+def _broken_daemon(reply: bytes):
+    """A listener that reads the command, writes `reply` and hangs up"""
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, 'agent.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen()
+
+        def serve():
+            while True:
+                try:
+                    conn, _ = listener.accept()
+                except OSError:
+                    return
+                with conn, conn.makefile('rb') as stream:
+                    stream.readline()
+                    conn.sendall(reply)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        try:
+            with config_override(DAEMON_SOCKET_PATH=socket_path):
+                yield socket_path
+        finally:
+            # shutdown wakes the blocked accept (close alone does not)
+            listener.shutdown(socket.SHUT_RDWR)
+            listener.close()
+            thread.join(timeout=5)
+
+def test_daemon_dying_mid_reply_is_an_error():
+    from main import forward_to_daemon
+
+    for reply in (b'{"ok": true, "res', b'', b'not json\n', b'[1, 2]\n'):
+        with _broken_daemon(reply) as socket_path:
+            response = send_command({'mode': 'ping'}, socket_path)
+            # The command reached the daemon, so the caller must not run it again in-process
+            assert response['ok'] is False and response['fallback'] is False
+            assert "No valid reply" in response['error']
+            assert forward_to_daemon(_args('add'), "Water bill is due on the 15th.")
+
+if __name__ == '__main__':
+    for test in [test_socket_is_owner_only_from_creation, test_commands_forwarded_to_daemon,
+                 test_falls_back_when_no_daemon_runs, test_daemon_dying_mid_reply_is_an_error]:
+        test()
+        print(f"✓ {test.__name__}")
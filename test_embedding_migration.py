@@ -0,0 +1,128 @@
+# test_embedding_migration.py
+"""Versioned collections and online embedding model migration (no Ollama needed)"""
+import tempfile
+import threading
+from conftest import config_override
+from database.vector_store import VectorStore
+
+OLD, NEW = 'old-embedder', 'new-embedder'
+
+def _old(texts):
+    return [[float(len(text)), 1.0] for text in texts]
+
+def _new(texts):
+    return [[float(len(text)), 1.0, 2.0] for text in texts]
+
+def _store(tmp, model):
+    store = VectorStore(tmp, collection_name='migration_test', embedding_model=model,
+                        memory_collection_name='migration_test_memory')
+    store.set_embedder(_old if store.embedding_model == OLD else _new)
+    if store.embedding_model != model:
+        store.set_embedder(_new, model=model)
+    return store
+
+def _records(collection):
+    records = collection.get(include=['documents', 'embeddings'])
+    return {doc_id: (doc, len(vector)) for doc_id, doc, vector in
+            zip(records['ids'], records['documents'], records['embeddings'])}
+
+def test_model_change_keeps_serving_old_collection():
+    with config_override(DEDUP_POLICY='off'), tempfile.TemporaryDirectory() as tmp:
+        [doc_id] = _store(tmp, OLD).add_documents(["Rent is due on the first."])
+
+        store = _store(tmp, NEW)
+        assert store.collection.name == 'migration_test' and store.embedding_model == OLD
+        assert store.needs_migration
+        assert store.get_collection_stats()['embedding_migration']['state'] == 'needed'
+        assert store.search("rent", n_results=1)['ids'] == [[doc_id]]
+
+def test_migration_copies_concurrent_writes_and_switches():
+    with config_override(DEDUP_POLICY='off'), tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp, OLD)
+        ids = store.add_documents([f"note number {i} about the project" for i in range(200)])
+        store.add_memories(['msg-1'], ["When is rent due?"], [{'message_id': 1}])
+
+        store = _store(tmp, NEW)
+        switched = []
+        store.on_switch.append(switched.append)
+        generation = store.generation
+        # Pause between batches so the writes below land while the copy runs
+        in_batch = threading.Event()
+        embed = store.model_embedders[NEW]
+        locked = []
+        def embed_new(texts):
+            in_batch.set()
+            locked.append(store._write_lock._is_owned())
+            return embed(texts)
+        store.model_embedders[NEW] = embed_new
+        migration = store.start_migration(batch_size=16, pause_seconds=0.02)
+        assert in_batch.wait(10)
+        added = store.add_documents(["written during the migration"])
+        store.update_documents([ids[-1]], ["the last note, rewritten"])
+        store.delete_by_ids(ids[:5])
+        assert migration.wait(timeout=60) and migration.state == 'switched', migration.status()
+
+        assert switched == [NEW] and store.embedding_model == NEW and not store.needs_migration
+        assert store.generation > generation
+        records = _records(store.collection)
+        assert set(records) == set(ids[5:]) | set(added)
+        assert records[ids[-1]][0] == "the last note, rewritten"
+        assert {dimensions for _, dimensions in records.values()} == {3}
+        assert list(_records(store.memory_collection)) == ['msg-1']
+        assert migration.status()['percent'] == 100.0
+        # Writers were never held off while the new model embedded
+        assert locked and not any(locked)
+
+        # The switch is persisted, and later writes go to the new collections
+        reopened = _store(tmp, NEW)
+        assert reopened.embedding_model == NEW and reopened.collection.name == store.collection.name
+        reopened.add_documents(["after the switch"])
+        assert reopened.collection.count() == len(records) + 1
+
+def test_interrupted_migration_resumes():
+    with config_override(DEDUP_POLICY='off'), tempfile.TemporaryDirectory() as tmp:
+        _store(tmp, OLD).add_documents([f"document {i}" for i in range(64)])
+
+        store = _store(tmp, NEW)
+        embedded = []
+        store.model_embedders[NEW] = lambda texts: embedded.extend(texts) or _new(texts)
+        migration = store.start_migration(batch_size=8, pause_seconds=0)
+        original = migration._sync
+        def sync_then_cancel(*args):
+            original(*args)
+            if len(embedded) >= 24:
+                migration.cancel()
+        migration._sync = sync_then_cancel
+        migration.wait(timeout=30)
+        assert migration.state == 'cancelled' and store.embedding_model == OLD
+
+        copied = len(embedded)
+        migration = store.start_migration(background=False, batch_size=8, pause_seconds=0)
+        assert migration.state == 'switched'
+        # Records copied before the interruption are not embedded again
+        assert len(embedded) == 64 and copied < 64
+
+def test_steady_writes_do_not_hold_off_the_switch():
+    with config_override(DEDUP_POLICY='off', MIGRATION_CATCHUP_ROUNDS=5), tempfile.TemporaryDirectory() as tmp:
+        _store(tmp, OLD).add_documents([f"document {i}" for i in range(40)])
+        store = _store(tmp, NEW)
+        migration = store.start_migration(batch_size=8, pause_seconds=0.01)
+        written = []
+
+        def write_until_switched():
+            while not migration.wait(timeout=0):
+                written.extend(store.add_documents([f"steady write {len(written)}"]))
+
+        writer = threading.Thread(target=write_until_switched)
+        writer.start()
+        writer.join(timeout=60)
+        assert migration.state == 'switched', migration.status()
+        # Every write, including those racing the switch, is in the new collections
+        assert set(written) <= set(store.collection.get(include=[])['ids'])
+        assert store.collection.count() == 40 + len(written)
+
+if __name__ == '__main__':
+    for test in [test_model_change_keeps_serving_old_collection, test_migration_copies_concurrent_writes_and_switches,
+                 test_interrupted_migration_resumes, test_steady_writes_do_not_hold_off_the_switch]:
+        test()
+        print(f"✓ {test.__name__}")
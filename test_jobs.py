@@ -0,0 +1,188 @@
+# test_jobs.py
+"""Persistent background job queue and its worker pool (no Ollama needed)"""
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from conftest import config_override
+from config import Config
+from database.job_store import JobStore
+
+def _agent(tmp, embed):
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from agent.personal_agent import PersonalAgent
+
+    store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='jobs_test',
+                        memory_collection_name='jobs_test_memory')
+    store.set_embedder(embed)
+    db_path = os.path.join(tmp, 'metadata.db')
+    return PersonalAgent(store, SessionManager(db_path), llm_model='fake', job_store=JobStore(db_path))
+
+def _wait(agent, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = agent.job_status(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+def _set_worker(store, host, pid):
+    """Pretend the running jobs were claimed by process `pid` on `host`"""
+    with sqlite3.connect(store.db_path) as conn:
+        conn.execute("UPDATE jobs SET worker_host = ?, worker_pid = ? WHERE status = 'running'", (host, pid))
+    conn.close()
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    return process.pid
+
+def test_store_claims_each_job_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = JobStore(os.path.join(tmp, 'jobs.db'))
+        ids = [store.submit('add_text', {'text': f"note {i}"}) for i in range(40)]
+        claimed = []
+
+        def claim_all():
+            while True:
+                job = store.claim()
+                if job is None:
+                    return
+                claimed.append(job['id'])
+
+        threads = [threading.Thread(target=claim_all) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(claimed) == ids
+        assert store.get(ids[0])['params'] == {'text': 'note 0'}
+
+        queued = store.submit('export')
+        assert store.cancel(queued) and store.get(queued)['status'] == 'cancelled'
+        assert not store.cancel(queued)
+        # Running jobs of a live process stay put however long they are silent
+        assert store.requeue_stale(0) == 0
+        # Once that process is gone, they are queued again
+        _set_worker(store, socket.gethostname(), _dead_pid())
+        assert store.requeue_stale(0) == len(ids)
+        assert store.claim()['id'] == ids[0]
+
+def test_ingest_job_reports_progress():
+    with config_override(DEDUP_POLICY='off', REMINDERS_ENABLED=False, INGEST_BATCH_SIZE=1, JOB_PROGRESS_INTERVAL=0), \
+            tempfile.TemporaryDirectory() as tmp:
+        agent = _agent(tmp, lambda texts: [[float(len(text)), 1.0] for text in texts])
+        path = os.path.join(tmp, 'notes.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(' '.join(f"Note {i} is about the garden project." for i in range(300)))
+        seen = []
+        agent.job_store.update_progress = lambda job_id, done, total=None, message=None: \
+            seen.append((done, total)) or JobStore.update_progress(agent.job_store, job_id, done, total, message)
+
+        agent.start_jobs(workers=2)
+        try:
+            job = _wait(agent, agent.submit_file_job(path, metadata={'file': 'notes.txt'}))
+        finally:
+            agent.stop_jobs()
+        assert job['status'] == 'done', job
+        total = job['total']
+        assert total > 2 and job['done'] == total and job['percent'] == 100.0
+        assert job['result'] == {'chunks': total} == {'chunks': agent.vector_store.collection.count()}
+        assert seen == [(done, total) for done in range(1, total + 1)]
+
+def test_cancel_stops_running_job():
+    with config_override(DEDUP_POLICY='off', REMINDERS_ENABLED=False, INGEST_BATCH_SIZE=2, JOB_PROGRESS_INTERVAL=0), \
+            tempfile.TemporaryDirectory() as tmp:
+        started, release = threading.Event(), threading.Event()
+
+        def slow_embed(texts):
+            started.set()
+            release.wait(10)
+            return [[1.0, float(len(text))] for text in texts]
+
+        agent = _agent(tmp, slow_embed)
+        agent.start_jobs(workers=1)
+        try:
+            text = ' '.join(f"Sentence number {i} of a long upload." for i in range(200))
+            job_id = agent.submit_job('add_text', {'text': text})
+            assert started.wait(10)
+            assert agent.cancel_job(job_id)
+            release.set()
+            job = _wait(agent, job_id)
+            # The page keeps working: other jobs still run after a cancellation
+            export = _wait(agent, agent.submit_job('export', {'path': os.path.join(tmp, 'snapshot')}))
+        finally:
+            agent.stop_jobs()
+        assert job['status'] == 'cancelled' and job['done'] < job['total']
+        assert agent.vector_store.collection.count() == job['done']
+        assert export['status'] == 'done' and export['result']['records']['knowledge_base'] == job['done']
+        assert export['done'] == export['total']
+
+def test_only_upload_copies_are_deleted():
+    from agent.job_runner import JobRunner
+
+    class _Agent:
+        def add_file_to_knowledge_base(self, path, **kwargs):
+            return ['chunk']
+
+    with tempfile.TemporaryDirectory() as tmp, config_override(JOB_UPLOAD_DIR=os.path.join(tmp, 'uploads')):
+        os.makedirs(Config.JOB_UPLOAD_DIR)
+        outside = os.path.join(tmp, 'precious.txt')
+        upload = os.path.join(Config.JOB_UPLOAD_DIR, 'copy.txt')
+        for path in (outside, upload):
+            with open(path, 'w') as f:
+                f.write('text')
+        store = JobStore(os.path.join(tmp, 'jobs.db'))
+        runner = JobRunner(_Agent(), store, workers=1)
+        # A job queued by any process with delete_after on a foreign file leaves the file alone
+        for path in (outside, upload):
+            store.submit('add_file', {'path': path, 'delete_after': True})
+            assert runner.execute(store.claim())['status'] == 'done'
+        assert os.path.exists(outside) and not os.path.exists(upload)
+
+def test_heartbeat_keeps_silent_jobs_from_being_requeued():
+    from agent.job_runner import JobRunner
+
+    with tempfile.TemporaryDirectory() as tmp, config_override(JOB_HEARTBEAT_SECONDS=0.05):
+        store = JobStore(os.path.join(tmp, 'jobs.db'))
+        running, release = threading.Event(), threading.Event()
+
+        def silent(job, report):
+            # Like measuring a file or transcribing one long recording: no progress for a while
+            running.set()
+            release.wait(10)
+            return {}
+
+        runner = JobRunner(None, store, workers=1, poll_seconds=0.05)
+        runner.register('silent', silent)
+        runner.start()
+        try:
+            job_id = runner.submit('silent')
+            assert running.wait(10)
+            # Seen from another machine, only the heartbeat tells the job is alive
+            _set_worker(store, 'another-host', 1)
+            time.sleep(0.5)
+            assert store.requeue_stale(0.3) == 0 and store.get(job_id)['status'] == 'running'
+            release.set()
+        finally:
+            runner.stop()
+        assert store.get(job_id)['status'] == 'done'
+
+        # Without heartbeats, a job from another host counts as orphaned after the stale timeout
+        store.submit('silent')
+        store.claim()
+        _set_worker(store, 'another-host', 1)
+        time.sleep(0.05)
+        assert store.requeue_stale(0.01) == 1
+
+if __name__ == '__main__':
+    for test in [test_store_claims_each_job_once, test_ingest_job_reports_progress, test_cancel_stops_running_job,
+                 test_only_upload_copies_are_deleted, test_heartbeat_keeps_silent_jobs_from_being_requeued]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,93 @@
+# test_load_test.py
+"""Load test bookkeeping: latency percentiles, per-operation report and error accounting (no Ollama needed)"""
+import io
+import random
+import threading
+import time
+from contextlib import redirect_stderr
+from benchmarks.common import latency_summary
+from benchmarks.load_test import DEFAULT_SCRIPT, Recorder, build_report, print_report, run_closed_loop, run_session
+
+class _Client:
+    """Client stand-in whose chats fail every `fail_every`-th call"""
+
+    def __init__(self, fail_every=0):
+        self.fail_every = fail_every
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def new_session(self):
+        return 'session'
+
+    def query(self, session_id, text):
+        return {'context': []}
+
+    def chat(self, session_id, text):
+        with self._lock:
+            self.calls += 1
+            failing = self.fail_every and self.calls % self.fail_every == 0
+        if failing:
+            raise RuntimeError("503 Server busy")
+        return 'ok'
+
+def test_latency_percentiles():
+    samples = [ms / 1000 for ms in range(100, 0, -1)]  # unordered on purpose
+    assert latency_summary(samples) == {'count': 100, 'mean_ms': 50.5, 'p50_ms': 51.0, 'p90_ms': 90.0,
+                                        'p99_ms': 99.0, 'max_ms': 100.0}
+    assert latency_summary([0.25]) == {'count': 1, 'mean_ms': 250.0, 'p50_ms': 250.0, 'p90_ms': 250.0,
+                                       'p99_ms': 250.0, 'max_ms': 250.0}
+    assert latency_summary([]) == {'count': 0}
+
+def test_report_counts_throughput_and_errors():
+    recorder = Recorder()
+    for ms in (100, 200, 300):
+        recorder.record('chat', ms / 1000)
+    recorder.record('chat', 0.05, RuntimeError("timed out"))
+    recorder.record('query', 0.01, RuntimeError("503 Server busy"))
+    recorder.record_queue_delay(0.002)
+    stages = {'spans': {'agent.generate': {'count': 3, 'mean_ms': 180.0, 'p95_ms': 290.0, 'total_ms': 540.0}},
+              'ollama': {}}
+
+    report = build_report(recorder, elapsed=2.0, stage_snapshot=stages)
+    assert (report['completed'], report['errors'], report['error_rate']) == (3, 2, 0.4)
+    assert report['throughput_per_second'] == 1.5
+    chat = report['operations']['chat']
+    assert (chat['count'], chat['p50_ms'], chat['max_ms'], chat['errors'], chat['error_rate']) == (3, 200.0, 300.0, 1, 0.25)
+    assert chat['throughput_per_second'] == 1.5
+    # An operation that only failed still gets a row
+    assert report['operations']['query'] == {'count': 0, 'errors': 1, 'error_rate': 1.0, 'throughput_per_second': 0.0}
+    assert report['queue_delay']['p50_ms'] == 2.0
+    assert report['stages'] == stages['spans']
+    assert report['error_samples'] == ["chat: timed out", "query: 503 Server busy"]
+
+    output = io.StringIO()
+    with redirect_stderr(output):
+        print_report(report)
+    assert "chat" in output.getvalue() and "error: query: 503 Server busy" in output.getvalue()
+
+    assert build_report(Recorder(), elapsed=0.0) == {
+        'elapsed_seconds': 0.0, 'completed': 0, 'errors': 0, 'error_rate': 0.0,
+        'throughput_per_second': 0.0, 'operations': {}, 'error_samples': []}
+
+def test_sessions_record_every_step():
+    recorder = Recorder()
+    run_session(_Client(fail_every=2), DEFAULT_SCRIPT, random.Random(0), recorder,
+                deadline=time.perf_counter() + 60, think_scale=0)
+    chats = sum(1 for operation, _, _ in DEFAULT_SCRIPT if operation == 'chat')
+    queries = len(DEFAULT_SCRIPT) - chats
+    assert len(recorder.latencies['session']) == 1
+    assert len(recorder.latencies['query']) == queries
+    assert len(recorder.latencies['chat']) + recorder.errors['chat'] == chats
+    assert recorder.errors['chat'] == chats // 2
+
+    # Concurrent users share one recorder without losing samples
+    client = _Client()
+    recorder = Recorder()
+    run_closed_loop(client, DEFAULT_SCRIPT, users=4, duration=0.2, seed=1, recorder=recorder, think_scale=0)
+    assert len(recorder.latencies['chat']) == client.calls and not recorder.errors
+
+if __name__ == '__main__':
+    for test in [test_latency_percentiles, test_report_counts_throughput_and_errors,
+                 test_sessions_record_every_step]:
+        test()
+        print(f"✓ {test.__name__}")
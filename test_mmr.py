@@ -0,0 +1,69 @@
+# test_mmr.py
+"""Maximal marginal relevance selection and its use in search/query (no Ollama needed)"""
+import os
+import tempfile
+import time
+from conftest import config_override
+from processing.mmr import mmr_select
+
+# Three near-copies of the most relevant chunk (overlapping windows) and two other relevant chunks
+VECTORS = {
+    "rent due first of month": [1.0, 0.0, 0.0],
+    "rent due first of month, paid by transfer": [0.99, 0.05, 0.0],
+    "the rent due first of month": [0.98, 0.0, 0.05],
+    "landlord phone number": [0.6, 0.8, 0.0],
+    "deposit returned at move out": [0.6, 0.0, 0.8],
+}
+QUERY = [1.0, 0.3, 0.3]
+
+def test_selection_prefers_diverse_candidates():
+    texts = list(VECTORS)
+    embeddings = [VECTORS[text] for text in texts]
+    relevance_only = [texts[i] for i in mmr_select(QUERY, embeddings, 3, lambda_mult=1.0)]
+    assert all("rent" in text for text in relevance_only)
+
+    diverse = [texts[i] for i in mmr_select(QUERY, embeddings, 3, lambda_mult=0.5)]
+    assert diverse[0] == relevance_only[0]
+    assert set(diverse[1:]) == {"landlord phone number", "deposit returned at move out"}
+    assert len(mmr_select(QUERY, embeddings, 10)) == len(texts)
+    assert mmr_select(QUERY, [], 3) == []
+
+def test_selection_is_fast_for_many_candidates():
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(400, 384)).astype(np.float32)
+    start = time.perf_counter()
+    selected = mmr_select(rng.normal(size=384), embeddings, 10)
+    assert len(set(selected)) == 10
+    assert time.perf_counter() - start < 0.5
+
+def test_search_and_query_diversify_results():
+    from database.vector_store import VectorStore
+    from agent.personal_agent import PersonalAgent
+
+    with config_override(DEDUP_POLICY='off'), tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='mmr_test',
+                            memory_collection_name='mmr_test_memory')
+        store.set_embedder(lambda texts: [VECTORS.get(text, QUERY) for text in texts])
+        store.add_documents(list(VECTORS), [{'position': i} for i in range(len(VECTORS))])
+
+        plain = store.search("rent", n_results=3)
+        assert all("rent" in doc for doc in plain['documents'][0])
+        diverse = store.search("rent", n_results=3, mmr=True, mmr_lambda=0.5)
+        assert len(diverse['ids'][0]) == 3 and 'embeddings' not in diverse
+        assert sum("rent" in doc for doc in diverse['documents'][0]) == 1
+        for doc, meta in zip(diverse['documents'][0], diverse['metadatas'][0]):
+            assert list(VECTORS)[meta['position']] == doc
+
+        agent = PersonalAgent(store, session_manager=None, llm_model='fake')
+        result = agent.query("rent", n_results=3, reframe=False, mmr=True, mmr_lambda=0.5)
+        assert result['context'] == diverse['documents'][0]
+        # Diversified and plain results are cached separately
+        assert agent.query("rent", n_results=3, reframe=False)['context'] == plain['documents'][0]
+
+if __name__ == '__main__':
+    for test in [test_selection_prefers_diverse_candidates, test_selection_is_fast_for_many_candidates,
+                 test_search_and_query_diversify_results]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,92 @@
+# test_model_profiles.py
+"""Per-task model routing and generation budgets (no Ollama needed)"""
+from config import Config
+from agent.personal_agent import PersonalAgent
+from ollama_runner import ModelNotFoundError, OllamaClient
+from benchmarks.fake_ollama import FakeOllamaServer
+
+class _RecordingClient:
+    """Stands in for OllamaClient; `missing` models fail like an Ollama 404, `failing` ones with other errors"""
+    def __init__(self, missing=(), failing=()):
+        self.calls = []
+        self.missing = set(missing)
+        self.failing = set(failing)
+    
+    def generate(self, model, prompt, temperature=0.7, options=None, timeout=120):
+        self.calls.append({'model': model, 'temperature': temperature, 'options': options, 'timeout': timeout})
+        if model in self.missing:
+            raise ModelNotFoundError(model, f"model '{model}' not found")
+        if model in self.failing:
+            raise Exception("Error calling Ollama API: read timed out (file not found in cache)")
+        return ' reply '
+
+def _agent(client):
+    agent = PersonalAgent(vector_store=None, session_manager=None, llm_model='big-model')
+    agent.ollama_client = client
+    return agent
+
+def test_tasks_use_their_profiles():
+    client = _RecordingClient()
+    agent = _agent(client)
+    reframe = Config.MODEL_PROFILES['reframe']
+    
+    assert agent.reframe_query("what is due today?") == 'reply'
+    agent.detect_update_intent("My rent is now 1200")
+    agent._call_ollama_llm("chat prompt", 0.9)
+    
+    reframe_call, intent_call, chat_call = client.calls
+    assert reframe_call['model'] == Config.AUX_LLM_MODEL
+    assert reframe_call['options']['num_predict'] == reframe['num_predict']
+    assert reframe_call['timeout'] == reframe['timeout']
+    assert reframe_call['temperature'] == reframe['temperature']
+    assert intent_call['options']['num_ctx'] == Config.MODEL_PROFILES['intent']['num_ctx']
+    # Chat runs on the agent's own model with the caller's temperature
+    assert (chat_call['model'], chat_call['temperature']) == ('big-model', 0.9)
+
+def test_missing_task_model_falls_back_to_agent_model():
+    client = _RecordingClient(missing={Config.AUX_LLM_MODEL})
+    agent = _agent(client)
+    
+    assert agent.reframe_query("what is due today?") == 'reply'
+    assert [call['model'] for call in client.calls] == [Config.AUX_LLM_MODEL, 'big-model']
+    # Later calls skip the missing model
+    agent.reframe_query("and tomorrow?")
+    assert client.calls[-1]['model'] == 'big-model' and len(client.calls) == 3
+
+def test_other_errors_do_not_fall_back():
+    client = _RecordingClient(failing={Config.AUX_LLM_MODEL})
+    agent = _agent(client)
+    
+    # An error that merely mentions "not found" is not a missing model: no fallback
+    error = None
+    try:
+        agent._generate("what is due today?", task='reframe')
+    except Exception as e:
+        error = e
+    assert error is not None and not isinstance(error, ModelNotFoundError)
+    assert [call['model'] for call in client.calls] == [Config.AUX_LLM_MODEL]
+    assert agent.model_profile('reframe')['model'] == Config.AUX_LLM_MODEL
+
+def test_client_raises_model_not_found_on_404():
+    server = FakeOllamaServer()
+    server.missing_models = {'absent'}
+    server.start()
+    try:
+        client = OllamaClient(server.base_url)
+        for call in (lambda: client.generate('absent', 'hi'),
+                     lambda: list(client.generate_stream('absent', 'hi')),
+                     lambda: client.embed_batch('absent', ['hi'])):
+            try:
+                call()
+                assert False, "expected ModelNotFoundError"
+            except ModelNotFoundError as e:
+                assert e.model == 'absent' and "not found" in str(e)
+        assert client.generate('fake', 'hi')
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    for test in [test_tasks_use_their_profiles, test_missing_task_model_falls_back_to_agent_model,
+                 test_other_errors_do_not_fall_back, test_client_raises_model_not_found_on_404]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,154 @@
+# test_near_duplicates.py
+"""Near-duplicate detection at ingest: MinHash signatures, LSH index and policies (no Ollama needed)"""
+import random
+import tempfile
+import time
+from config import Config
+from conftest import config_override
+from database.signature_index import SignatureIndex
+from processing.near_duplicates import minhash, similarity
+
+WORDS = "rent payment bill electricity water meeting project deadline doctor appointment".split()
+NOTE = ("The landlord confirmed that the rent for the flat on Baker Street goes up to 1200 euros "
+        "from the first of next month, payable by bank transfer before the fifth.")
+
+def _text(rng, words=80):
+    return ' '.join(rng.choice(WORDS) + str(rng.randrange(1000)) for _ in range(words))
+
+def _store(tmp):
+    from database.vector_store import VectorStore
+
+    store = VectorStore(tmp)
+    store.set_embedder(lambda texts: [[float(len(text)), 1.0] for text in texts])
+    return store
+
+def test_signatures_estimate_similarity():
+    edited = NOTE.replace("1200", "1250")
+    assert similarity(minhash(NOTE), minhash(NOTE.upper() + " !")) == 1.0
+    assert similarity(minhash(NOTE), minhash(edited)) >= Config.DEDUP_MIN_SIMILARITY
+    assert similarity(minhash(NOTE), minhash("Doctor appointment moved to Tuesday at 4pm.")) < 0.2
+
+def test_index_finds_near_duplicates_among_many():
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SignatureIndex(f"{tmp}/signatures.db")
+        texts = {f"doc-{i}": _text(rng) for i in range(5000)}
+        index.add({doc_id: minhash(text) for doc_id, text in texts.items()})
+
+        words = texts['doc-1234'].split()
+        words[40] = 'changed'
+        start = time.perf_counter()
+        match = index.find(minhash(' '.join(words)), Config.DEDUP_MIN_SIMILARITY)
+        elapsed = time.perf_counter() - start
+        assert match[0] == 'doc-1234' and match[1] >= Config.DEDUP_MIN_SIMILARITY
+        assert index.find(minhash(_text(rng)), Config.DEDUP_MIN_SIMILARITY) is None
+        assert elapsed < 0.5
+
+def test_policies():
+    edited = NOTE.replace("1200", "1250")
+    for policy in ('skip', 'link', 'merge'):
+        with config_override(DEDUP_POLICY=policy), tempfile.TemporaryDirectory() as tmp:
+            store = _store(tmp)
+            [first] = store.add_documents([NOTE], [{'source': 'note'}])
+            # A duplicate of a stored chunk and one inside the same batch
+            ids = store.add_documents([edited, "Something else entirely about the car insurance renewal."],
+                                      [{'source': 'voice'}, {'source': 'voice'}])
+            assert ids[0] == first and store.collection.count() == 2
+
+            stored = store.collection.get(ids=[first])
+            if policy == 'merge':
+                assert stored['documents'] == [edited]
+            else:
+                assert stored['documents'] == [NOTE]
+            if policy == 'link':
+                assert stored['metadatas'][0]['duplicate_count'] == 1
+                assert store.signatures.links(first)[0]['source'] == 'voice'
+
+            store.delete_by_ids([first])
+            assert store.find_duplicate(NOTE) is None
+
+def test_existing_chunks_are_indexed_on_first_add():
+    with tempfile.TemporaryDirectory() as tmp:
+        with config_override(DEDUP_POLICY='off'):
+            [first] = _store(tmp).add_documents([NOTE])
+        with config_override(DEDUP_POLICY='skip'):
+            store = _store(tmp)
+            assert store.add_documents([NOTE]) == [first]
+            assert store.get_collection_stats()['near_duplicates']['skipped'] == 1
+
+def test_concurrent_ingests_store_a_text_once():
+    import threading
+
+    for policy in ('skip', 'link'):
+        with config_override(DEDUP_POLICY=policy), tempfile.TemporaryDirectory() as tmp:
+            store = _store(tmp)
+            barrier = threading.Barrier(4)
+
+            def slow_embed(texts):
+                # Every ingest has passed its first duplicate lookup before any of them stores
+                barrier.wait(timeout=10)
+                return [[float(len(text)), 1.0] for text in texts]
+
+            store.set_embedder(slow_embed)
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(store.add_documents([NOTE])))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=30)
+            assert store.collection.count() == 1
+            assert len(results) == 4 and len({doc_id for [doc_id] in results}) == 1
+            # Each repeat is recorded exactly once, whichever lookup caught it
+            key = {'skip': 'skipped', 'link': 'linked'}[policy]
+            assert store.duplicate_counts[key] == 3 and store.signatures.count()['links'] == 3
+            if policy == 'link':
+                assert store.collection.get(ids=results[0])['metadatas'][0]['duplicate_count'] == 3
+
+def test_merge_embeds_once_outside_the_write_lock():
+    edited = NOTE.replace("1200", "1250")
+    with config_override(DEDUP_POLICY='merge'), tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        [first] = store.add_documents([NOTE])
+        calls = []
+
+        def embed(texts):
+            calls.append((list(texts), store._write_lock._is_owned()))
+            return [[float(len(text)), 1.0] for text in texts]
+
+        store.set_embedder(embed)
+        other = "Something else entirely about the car insurance renewal."
+        ids = store.add_documents([edited, other])
+        # The new chunk and the merged text share one embedding call, made before taking the lock
+        assert calls == [([other, edited], False)]
+        assert ids[0] == first and store.collection.get(ids=[first])['documents'] == [edited]
+        assert store.duplicate_counts['merged'] == 1
+
+def test_events_point_at_inserted_chunks():
+    from agent.personal_agent import PersonalAgent
+
+    other = "Something else entirely about the car insurance renewal."
+    with config_override(DEDUP_POLICY='link'), tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        inserted = []
+        ids = store.add_documents([NOTE, other, NOTE], inserted=inserted)
+        assert inserted == ids[:2] and ids[2] == ids[0]
+        inserted = []
+        ids = store.add_documents([NOTE, "A third note about the dentist on Friday."], inserted=inserted)
+        assert ids[0] != inserted[0] and inserted == ids[1:]
+
+        agent = PersonalAgent(store, session_manager=None, llm_model='fake')
+        events = []
+        agent.extract_events = lambda text, source='manual', doc_id=None, topic=None: events.append(doc_id)
+        [new_id] = agent.add_to_knowledge_base("The boiler service is booked for the third of March.")
+        # A text that only repeats a stored chunk is linked to it; its events belong to no chunk
+        assert agent.add_to_knowledge_base(NOTE) == [ids[0]]
+        assert events == [new_id, None]
+
+if __name__ == '__main__':
+    for test in [test_signatures_estimate_similarity, test_index_finds_near_duplicates_among_many,
+                 test_policies, test_existing_chunks_are_indexed_on_first_add,
+                 test_concurrent_ingests_store_a_text_once, test_merge_embeds_once_outside_the_write_lock,
+                 test_events_point_at_inserted_chunks]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,121 @@
+# test_query_cache.py
+"""Query result cache: exact and near-duplicate hits, invalidation on writes (no Ollama needed)"""
+import tempfile
+import time
+from agent.query_cache import QueryCache, normalize_question
+
+def _embed(text):
+    """Bag-of-letters embedding: questions differing in a word or two stay very similar"""
+    vector = [0.0] * 26
+    for char in text.lower():
+        if 'a' <= char <= 'z':
+            vector[ord(char) - ord('a')] += 1.0
+    return vector
+
+def _agent(tmp):
+    from database.vector_store import VectorStore
+    from agent.personal_agent import PersonalAgent
+
+    store = VectorStore(tmp)
+    store.set_embedder(lambda texts: [_embed(text) for text in texts])
+    agent = PersonalAgent(store, session_manager=None, llm_model='fake')
+    agent.reframe_query = lambda question: question
+    searches = []
+    search = store.search
+    store.search = lambda *args, **kwargs: searches.append(args[0]) or search(*args, **kwargs)
+    return agent, store, searches
+
+def test_exact_and_near_duplicate_hits():
+    cache = QueryCache(max_entries=4, ttl_seconds=60, similarity=0.95)
+    question = "When is my rent due?"
+    assert cache.get(question, 'scope', 0, embed=_embed)[0] is None
+    cache.put(question, 'scope', 0, {'context': ['rent']}, embedding=_embed(question))
+
+    assert normalize_question("  when is my RENT due ") == normalize_question(question)
+    assert cache.get("when is my rent due", 'scope', 0)[0] == {'context': ['rent']}
+    assert cache.get("When is my rent due now?", 'scope', 0, embed=_embed)[0] == {'context': ['rent']}
+    assert cache.get("Who won the football match?", 'scope', 0, embed=_embed)[0] is None
+    # Other scopes (e.g. n_results) and newer generations never share results
+    assert cache.get(question, 'other scope', 0)[0] is None
+    assert cache.get(question, 'scope', 1)[0] is None
+    assert cache.get(question, 'scope', 0)[0] is None
+    stats = cache.stats()
+    assert (stats['exact_hits'], stats['similar_hits'], stats['stale']) == (1, 1, 1)
+
+def test_lru_and_ttl_eviction():
+    cache = QueryCache(max_entries=2, ttl_seconds=0.2, similarity=1.0)
+    for question in ("a one", "b two", "c three"):
+        cache.put(question, None, 0, {'q': question})
+    assert cache.get("a one", None, 0)[0] is None
+    assert cache.get("c three", None, 0)[0] == {'q': 'c three'}
+    time.sleep(0.3)
+    assert cache.get("c three", None, 0)[0] is None
+    assert cache.stats()['evictions'] == 1
+
+def test_agent_query_is_invalidated_by_writes():
+    with tempfile.TemporaryDirectory() as tmp:
+        agent, store, searches = _agent(tmp)
+        store.add_documents(["Rent is due on the first of the month."])
+
+        first = agent.query("When is rent due?", n_results=1)
+        assert agent.query("when is rent due", n_results=1)['context'] == first['context']
+        assert len(searches) == 1
+
+        for write in (lambda: store.add_documents(["Water bill is due on the 15th."]),
+                      lambda: store.update_documents(store.collection.get()['ids'][:1], ["Rent is due on the second."]),
+                      lambda: store.delete_by_ids(store.collection.get()['ids'][-1:]),
+                      store.reset_collection):
+            write()
+            agent.query("When is rent due?", n_results=1)
+        assert len(searches) == 5
+        assert agent.get_stats()['query_cache']['exact_hits'] == 1
+
+def test_cache_probe_embedding_is_reused_for_search():
+    with tempfile.TemporaryDirectory() as tmp:
+        agent, store, _ = _agent(tmp)
+        store.add_documents(["Rent is due on the first of the month."])
+        embedded = []
+        store.set_embedder(lambda texts: embedded.extend(texts) or [_embed(text) for text in texts])
+
+        # Reframing kept the text: the near-duplicate probe's embedding serves the search
+        agent.query("When is rent due?", n_results=1)
+        assert embedded == ["When is rent due?"]
+        # A reframed question is embedded on its own
+        embedded.clear()
+        agent.reframe_query = lambda question: question + " (rent payment date)"
+        agent.query("Which bills are due?", n_results=1)
+        assert embedded == ["Which bills are due?", "Which bills are due? (rent payment date)"]
+
+def test_repeated_chat_question_hits_and_still_sees_new_memory():
+    import os
+    from database.session_manager import SessionManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        agent, store, _ = _agent(os.path.join(tmp, 'vectors'))
+        agent.session_manager = SessionManager(os.path.join(tmp, 'metadata.db'))
+        agent.retrieval_router = None
+        prompts = []
+        agent._call_ollama_llm = lambda prompt, *args, **kwargs: prompts.append(prompt) or "reply"
+        agent._schedule_memory_indexing = lambda: None  # no background thread outliving the temp dir
+        searches = []
+        search = store.search_with_memory
+        store.search_with_memory = lambda *args, **kwargs: searches.append(args[0]) or search(*args, **kwargs)
+        store.add_documents(["Rent is due on the first of the month."])
+
+        session_id = agent.start_session()
+        agent.chat("When is rent due?", session_id=session_id)
+        # Another session's turn lands in memory between the two questions
+        store.add_memories(['other-1'], ["My rent is due on the fifth now."],
+                           [{'session_id': 'other', 'role': 'user'}])
+        agent.chat("When is rent due?", session_id=session_id)
+
+        assert len(searches) == 1
+        assert agent.get_stats()['query_cache']['exact_hits'] == 1
+        assert "fifth" not in prompts[0] and "fifth" in prompts[1]
+
+if __name__ == '__main__':
+    for test in [test_exact_and_near_duplicate_hits, test_lru_and_ttl_eviction,
+                 test_agent_query_is_invalidated_by_writes, test_cache_probe_embedding_is_reused_for_search,
+                 test_repeated_chat_question_hits_and_still_sees_new_memory]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,158 @@
+# test_reminders.py
+"""Event extraction and reminder scheduling (no Ollama needed)"""
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from database.event_store import EventStore
+from agent.reminder_scheduler import ReminderScheduler
+from agent.event_predictor import RecurrencePredictor, analyze, topic_key
+from processing.event_extractor import EventExtractor, parse_date, parse_time
+
+NOW = datetime(2026, 10, 19, 10, 0)  # a Monday
+
+def _event(title, remind_at, due_at=None):
+    return {'title': title, 'description': title, 'due_at': due_at or remind_at,
+            'remind_at': remind_at, 'method': 'rule'}
+
+def _store(tmp):
+    return EventStore(os.path.join(tmp, 'events.db'))
+
+def test_rule_parser():
+    assert parse_date("Dentist appointment on 12 March", NOW) == (datetime(2027, 3, 12), False)
+    assert parse_date("Rent is due tomorrow", NOW) == (datetime(2026, 10, 20), False)
+    assert parse_date("Team meeting next friday", NOW) == (datetime(2026, 10, 23), False)
+    assert parse_date("Submit report 2026-11-02 14:00", NOW) == (datetime(2026, 11, 2, 14, 0), True)
+    assert parse_date("Call mom in 2 hours", NOW) == (datetime(2026, 10, 19, 12, 0), True)
+    assert parse_date("The market 5 was busy", NOW) is None
+    assert parse_time("at 4pm") == (16, 0)
+    assert parse_time("at 10:30 am") == (10, 30)
+    assert parse_time("I am amazing") is None
+
+def test_extractor_uses_llm_only_for_unresolved_sentences():
+    prompts = []
+
+    def llm(prompt):
+        prompts.append(prompt)
+        return '[{"index": 1, "due": "2026-11-01 09:00", "title": "Pay insurance"}]'
+
+    text = ("Dentist appointment on 21 October at 4pm. The weather was nice. "
+            "Pay the insurance bill next month. Old exam on 1 January 2020.")
+    events = EventExtractor(llm=llm, lead_minutes=30).extract(text, now=NOW)
+
+    assert [(e['method'], e['due_at']) for e in events] == [
+        ('rule', datetime(2026, 10, 21, 16, 0)),
+        ('llm', datetime(2026, 11, 1, 9, 0)),
+    ]
+    assert events[0]['remind_at'] == datetime(2026, 10, 21, 15, 30)
+    assert len(prompts) == 1 and 'Pay the insurance bill next month' in prompts[0]
+    assert 'Dentist' not in prompts[0]
+
+def test_store_deduplicates_and_snoozes():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        remind_at = datetime.now() + timedelta(days=1)
+        assert len(store.add_events([_event('Pay rent', remind_at)])) == 1
+        assert store.add_events([_event('Pay rent', remind_at)]) == []
+        event_id = store.list_events()[0]['id']
+
+        assert store.snooze(event_id, remind_at + timedelta(hours=1))
+        assert store.get_event(event_id)['snooze_count'] == 1
+        assert store.cancel(event_id)
+        assert not store.snooze(event_id, remind_at)
+        assert store.count_events() == {'pending': 0, 'fired': 0, 'cancelled': 1, 'past': 0}
+
+def test_past_events_cannot_be_snoozed():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        held = datetime.now() - timedelta(days=30)
+        [event] = store.add_events([dict(_event('Dentist visit', held), status='past')])
+
+        # A past event only feeds recurrence patterns; snoozing must not turn it into a reminder
+        assert not store.snooze(event['id'], datetime.now() + timedelta(hours=1))
+        assert store.get_event(event['id'])['status'] == 'past'
+        assert store.count_events() == {'pending': 0, 'fired': 0, 'cancelled': 0, 'past': 1}
+
+def test_scheduler_fires_at_due_time_and_skips_cancelled():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        fired = []
+        done = threading.Event()
+        scheduler = ReminderScheduler(store, on_fire=lambda e: (fired.append(e['title']), done.set())).start()
+        try:
+            soon = datetime.now() + timedelta(seconds=1)
+            keep, drop = store.add_events([_event('keep', soon), _event('drop', soon)])
+            scheduler.schedule(keep['id'], keep['remind_at'])
+            scheduler.schedule(drop['id'], drop['remind_at'])
+            scheduler.cancel(drop['id'])
+            assert done.wait(5)
+            time.sleep(0.2)
+        finally:
+            scheduler.stop()
+        assert fired == ['keep']
+        assert store.get_event(keep['id'])['status'] == 'fired'
+        assert store.get_event(drop['id'])['status'] == 'cancelled'
+
+def test_missed_reminders_fire_after_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        _store(tmp).add_events([_event('missed', datetime.now() - timedelta(hours=2))])
+        done = threading.Event()
+        scheduler = ReminderScheduler(_store(tmp), on_fire=lambda e: done.set()).start()
+        try:
+            assert done.wait(5)
+        finally:
+            scheduler.stop()
+        assert _store(tmp).count_events()['fired'] == 1
+
+def test_scheduler_keeps_only_the_horizon_in_memory():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        start = datetime.now() + timedelta(hours=1)
+        # 20,000 pending reminders, one a minute: only the first day is loaded
+        store.add_events([_event(f'event {i}', start + timedelta(minutes=i)) for i in range(20000)])
+        scheduler = ReminderScheduler(store, horizon_seconds=24 * 3600)
+        scheduler.refresh()
+        assert 1300 <= scheduler.pending_in_memory <= 1440
+
+        # Later events are scheduled as the horizon moves forward
+        scheduler.horizon_seconds = 48 * 3600
+        scheduler.refresh()
+        assert 2700 <= scheduler.pending_in_memory <= 2880
+
+def test_recurrence_fit():
+    monthly = [datetime(2026, month, 1, 9).timestamp() for month in range(3, 11)]
+    fit = analyze(monthly, now=NOW)
+    assert fit['period'] == 'monthly' and fit['next_due'] == datetime(2026, 11, 1, 9)
+
+    weekly = [(NOW - timedelta(weeks=w)).timestamp() for w in (8, 7, 6, 4, 3, 2, 1)]
+    assert analyze(weekly, now=NOW)['period'] == 'weekly'
+
+    irregular = [(NOW - timedelta(days=d)).timestamp() for d in (40, 31, 29, 12, 3)]
+    assert analyze(irregular, now=NOW) is None
+    assert topic_key("Paid the rent on 1 October") == topic_key("Rent payment due 1 November") == 'rent'
+
+def test_predictor_is_incremental_and_accepts_predictions():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _store(tmp)
+        predictor = RecurrencePredictor(store, window=4)
+        start = datetime.now() - timedelta(weeks=10)
+        for week in range(10):
+            prediction = predictor.observe('team sync', start + timedelta(weeks=week), title='Team sync')
+        # Only the last `window` occurrences are kept, however many were observed
+        assert len(store.get_pattern('team sync')['timestamps']) == 4
+        assert prediction['period'] == 'weekly' and prediction['occurrences'] == 10
+        assert predictor.predictions(min_confidence=0.5)[0]['topic'] == 'team sync'
+
+        reminder = predictor.reminder_for(predictor.prediction('team sync'))
+        assert len(store.add_events([reminder])) == 1
+        assert store.list_events()[0]['method'] == 'predicted'
+
+if __name__ == '__main__':
+    for test in [test_rule_parser, test_extractor_uses_llm_only_for_unresolved_sentences,
+                 test_store_deduplicates_and_snoozes, test_past_events_cannot_be_snoozed,
+                 test_scheduler_fires_at_due_time_and_skips_cancelled,
+                 test_missed_reminders_fire_after_restart, test_scheduler_keeps_only_the_horizon_in_memory,
+                 test_recurrence_fit, test_predictor_is_incremental_and_accepts_predictions]:
+        test()
+        print(f"✓ {test.__name__}")
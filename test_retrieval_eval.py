@@ -0,0 +1,83 @@
+# test_retrieval_eval.py
+"""Retrieval evaluation harness and configurable HNSW settings (offline, fake embeddings)"""
+import json
+import os
+import random
+import tempfile
+from config import Config
+from conftest import config_override
+from benchmarks.fake_ollama import fake_embedding
+from benchmarks.retrieval_eval import evaluate, exact_top_k, load_dataset, quality, recommend, synthetic_dataset
+
+def _embed(texts):
+    return [fake_embedding(text) for text in texts]
+
+def test_metrics_against_exact_search():
+    import numpy as np
+
+    chunks = np.eye(4, dtype=np.float32)
+    queries = np.array([[0.1, 0.9, 0.3, 0.0], [0.0, 0.0, 0.2, 1.0]], dtype=np.float32)
+    assert exact_top_k(chunks, queries, 2) == [[1, 2], [3, 2]]
+    # Chunks 0-1 belong to document a, chunks 2-3 to b; each document counts once, at its best chunk
+    labels = [{'query': 'q1', 'relevant': ['b']}, {'query': 'q2', 'relevant': ['a']}]
+    assert quality([[1, 2], [3, 2]], ['a', 'a', 'b', 'b'], labels) == {'recall_at_k': 0.5, 'mrr': 0.25}
+
+def test_sweep_reports_quality_and_latency():
+    dataset = synthetic_dataset(60, 30, random.Random(3), words=300)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'labeled.json')
+        with open(os.path.join(tmp, 'doc-0.txt'), 'w', encoding='utf-8') as f:
+            f.write(dataset['documents'][0].pop('text'))
+        dataset['documents'][0]['path'] = 'doc-0.txt'
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(dataset, f)
+        dataset = load_dataset(path)
+        report = evaluate(dataset, _embed, os.path.join(tmp, 'indexes'), chunkings=[(100, 10), (200, 20)],
+                          m_values=[16], construction_efs=[100], search_efs=[5, 400], k=5)
+    assert [(row['chunk_size'], row['chunk_overlap']) for row in report['exact']] == [(100, 10), (200, 20)]
+    assert len(report['results']) == 4
+    for row in report['results']:
+        assert 0 <= row['recall_at_k'] <= 1 and 0 <= row['mrr'] <= row['recall_at_k']
+        assert row['latency']['count'] == 30 and row['build_seconds'] > 0
+    # A search_ef covering the whole corpus makes the index agree with exact search
+    for small, large in zip(report['results'][::2], report['results'][1::2]):
+        assert large['ann_recall'] >= 0.95 and large['ann_recall'] >= small['ann_recall']
+    assert report['exact'][0]['recall_at_k'] > 0.2
+
+def test_recommendation_prefers_fast_settings_with_enough_recall():
+    def row(search_ef, recall, ann, p50, chunk_size=500):
+        return {'chunk_size': chunk_size, 'chunk_overlap': 50, 'm': 16, 'construction_ef': 100,
+                'search_ef': search_ef, 'recall_at_k': recall, 'mrr': recall / 2, 'ann_recall': ann,
+                'latency': {'p50_ms': p50}}
+
+    report = {'exact': [{'chunk_size': 500, 'chunk_overlap': 50, 'recall_at_k': 0.9},
+                        {'chunk_size': 200, 'chunk_overlap': 50, 'recall_at_k': 0.8}],
+              'results': [row(10, 0.70, 0.80, 0.3), row(50, 0.895, 0.97, 0.5), row(200, 0.9, 1.0, 0.9),
+                          row(50, 0.8, 0.99, 0.4, chunk_size=200)]}
+    recommendation = recommend(report, min_ann_recall=0.95, tolerance=0.01)
+    assert recommendation['settings'] == {'CHUNK_SIZE': 500, 'CHUNK_OVERLAP': 50, 'HNSW_M': 16,
+                                          'HNSW_CONSTRUCTION_EF': 100, 'HNSW_SEARCH_EF': 50}
+    assert recommendation['recall_lost_to_index'] == 0.005
+    assert recommend(report, min_ann_recall=1.01) is None
+
+def test_vector_store_uses_configured_hnsw():
+    from database.vector_store import VectorStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with config_override(HNSW_M=8, HNSW_CONSTRUCTION_EF=64, HNSW_SEARCH_EF=32):
+            store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='hnsw_test',
+                                memory_collection_name='hnsw_test_memory')
+            hnsw = store.collection.configuration['hnsw']
+            assert (hnsw['max_neighbors'], hnsw['ef_construction'], hnsw['ef_search']) == (8, 64, 32)
+            assert store.memory_collection.configuration['hnsw']['ef_search'] == 32
+        # Reopened with other settings: only search_ef can change on an existing index
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='hnsw_test',
+                            memory_collection_name='hnsw_test_memory')
+        hnsw = store.collection.configuration['hnsw']
+        assert (hnsw['max_neighbors'], hnsw['ef_construction'], hnsw['ef_search']) == (8, 64, Config.HNSW_SEARCH_EF)
+
+if __name__ == '__main__':
+    for test in [test_metrics_against_exact_search, test_sweep_reports_quality_and_latency,
+                 test_recommendation_prefers_fast_settings_with_enough_recall, test_vector_store_uses_configured_hnsw]:
+        test()
+        print(f"✓ {test.__name__}")
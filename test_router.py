@@ -0,0 +1,71 @@
+# test_router.py
+"""Retrieval router: rules, centroid classifier and chat integration (no Ollama needed)"""
+import json
+import os
+import tempfile
+import zlib
+from agent.retrieval_router import RetrievalRouter
+
+def _embed(texts):
+    """Hashed bag of words, so texts sharing words are similar"""
+    vectors = []
+    for text in texts:
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[zlib.crc32(word.strip('?.,!').encode()) % 64] += 1.0
+        vectors.append(vector)
+    return vectors
+
+def test_rules_and_classifier():
+    router = RetrievalRouter(_embed, log_path='')
+    assert router.route("Thanks!", has_history=True)['route'] == 'chitchat'
+    assert router.route("why?", has_history=True)['route'] == 'followup'
+    # Without a previous turn there is nothing to follow up on
+    assert router.route("why?", has_history=False)['route'] == 'knowledge'
+    assert router.route("explain the lease terms", has_history=True)['retrieve']
+
+    personal = router.route("When is my rent due next month?")
+    assert personal['retrieve'] and personal['reframe'] and personal['embedding'] is None
+    classified = router.route("hello how are you")
+    assert classified['route'] == 'chitchat' and classified['embedding'] is not None
+    typed = router.route("what is the WIFI password")
+    assert typed['retrieve'] and typed['reframe']
+    assert router.stats()['classified'] == 4
+
+def test_chat_skips_retrieval_for_chitchat_and_logs_decisions():
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from agent.personal_agent import PersonalAgent
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'))
+        store.set_embedder(_embed)
+        agent = PersonalAgent(store, SessionManager(os.path.join(tmp, 'metadata.db')), llm_model='fake')
+        log_path = os.path.join(tmp, 'router.jsonl')
+        agent.retrieval_router = RetrievalRouter(_embed, log_path=log_path)
+        calls = []
+        agent._call_ollama_llm = lambda prompt, *args, **kwargs: calls.append(prompt) or "reply"
+        agent._schedule_memory_indexing = lambda: None  # no background thread outliving the temp dir
+        searches = []
+        search = store.search_with_memory
+        store.search_with_memory = lambda *args, **kwargs: searches.append(args[0]) or search(*args, **kwargs)
+        store.add_documents(["Rent is due on the first of the month."])
+
+        session_id = agent.start_session()
+        agent.chat("When is my rent due?", session_id=session_id)
+        agent.chat("thanks", session_id=session_id)
+        agent.chat("why is that?", session_id=session_id)
+
+        # One search and no reframe call for the knowledge question; nothing else for the rest
+        assert len(searches) == 1 and len(calls) == 3
+        history = agent.session_manager.get_session_history(session_id, limit=10)
+        assert [m['content'] for m in history if m['role'] == 'user'] == [
+            "When is my rent due?", "thanks", "why is that?"]
+        with open(log_path, encoding='utf-8') as f:
+            routes = [json.loads(line)['route'] for line in f]
+        assert routes == ['knowledge', 'chitchat', 'followup']
+
+if __name__ == '__main__':
+    for test in [test_rules_and_classifier, test_chat_skips_retrieval_for_chitchat_and_logs_decisions]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,66 @@
+# test_session_summary.py
+"""Rolling session summary: every message is either summarized or in the prompt verbatim (no Ollama needed)"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from conftest import config_override
+
+@contextmanager
+def _agent():
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from agent.personal_agent import PersonalAgent
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='summary_test',
+                            memory_collection_name='summary_test_memory')
+        agent = PersonalAgent(store, SessionManager(os.path.join(tmp, 'metadata.db')), llm_model='fake')
+        prompts = []
+        agent._call_ollama_llm = lambda prompt, temperature=None, task='chat': prompts.append(prompt) or 'noted'
+        yield agent, prompts
+
+def _wait_for_summaries(agent, timeout=5.0):
+    deadline = time.time() + timeout
+    while agent._summaries_in_progress and time.time() < deadline:
+        time.sleep(0.01)
+    assert not agent._summaries_in_progress
+
+def test_summary_rollover_drops_no_message():
+    with config_override(SUMMARY_KEEP_RECENT=2, SUMMARY_TRIGGER_MESSAGES=2, SUMMARY_TRIGGER_TOKENS=10**6,
+                         HISTORY_TOKEN_BUDGET=10**6, MEMORY_ENABLED=False), _agent() as (agent, prompts):
+        calls = []
+
+        def summarize(messages, previous_summary='', **kwargs):
+            # Every other refresh fails, so the summary lags behind the verbatim window
+            calls.append(len(messages))
+            if len(calls) % 2:
+                return ''
+            return ' '.join([previous_summary] + [message['content'] for message in messages]).strip()
+
+        agent.summarize_conversation = summarize
+        session_id = agent.create_session()
+        for turn in range(12):
+            agent.chat(f"fact-{turn:02d}", use_context=False, session_id=session_id)
+            _wait_for_summaries(agent)
+            for earlier in range(turn + 1):
+                assert f"fact-{earlier:02d}" in prompts[-1], (turn, earlier)
+
+        state = agent.session_manager.get_session_summary(session_id)
+        assert len(calls) >= 2 and state['summary_message_id'] > 0
+        assert 'fact-00' in state['summary']
+
+def test_history_is_capped_by_tokens():
+    from agent.personal_agent import PersonalAgent
+
+    messages = [{'role': 'user', 'content': 'x' * 400} for _ in range(5)]  # 100 tokens each
+    with config_override(HISTORY_TOKEN_BUDGET=250):
+        assert len(PersonalAgent._recent_history(messages)) == 2
+    with config_override(HISTORY_TOKEN_BUDGET=10):
+        # The newest message is always kept
+        assert PersonalAgent._recent_history(messages) == messages[-1:]
+
+if __name__ == '__main__':
+    for test in [test_summary_rollover_drops_no_message, test_history_is_capped_by_tokens]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,155 @@
+# test_sharding.py
+"""Sharded knowledge base: routed writes, parallel fan-out search, single-shard queries (offline)"""
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from conftest import config_override
+from benchmarks.fake_ollama import fake_embedding
+
+NOTES = [
+    ("Rent of 1200 is due on the fifth of every month", 'bills'),
+    ("The electricity bill arrives in the first week", 'bills'),
+    ("Doctor appointment on Monday morning at nine", 'health'),
+    ("Gym membership renewal is due in March", 'health'),
+    ("Project deadline for the server backup report is Friday", 'work'),
+    ("Weekly meeting with the network team on Tuesday", 'work'),
+    ("Birthday party for Sam on Saturday evening", None),
+]
+
+@contextmanager
+def _store(shard_by='source', name='shard_test', dedup='off'):
+    from database.vector_store import VectorStore
+
+    with config_override(SHARD_BY=shard_by, DEDUP_POLICY=dedup), tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name=name,
+                            memory_collection_name=f'{name}_memory')
+        store.set_embedder(lambda texts: [fake_embedding(text) for text in texts])
+        yield store, tmp
+
+class _Spy:
+    """Collection wrapper recording the threads that queried it"""
+
+    def __init__(self, collection, calls):
+        self.collection, self.calls = collection, calls
+
+    def query(self, **kwargs):
+        self.calls.append((self.collection.name, threading.current_thread().name))
+        return self.collection.query(**kwargs)
+
+    def get(self, **kwargs):
+        self.calls.append((self.collection.name, kwargs))
+        return self.collection.get(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+def _spy(store):
+    calls = []
+    store.collection._shards = {shard: _Spy(collection, calls) for shard, collection in store.collection._shards.items()}
+    return calls
+
+def test_writes_routed_and_search_merged_globally():
+    texts = [text for text, _ in NOTES]
+    metadata = [{'source': source} for _, source in NOTES]
+    with _store(shard_by=None, name='flat_test') as (flat, _):
+        flat.add_documents(texts, metadata)
+        expected = flat.search("when is the rent and the bill due", n_results=4)
+    with _store() as (store, _):
+        store.add_documents(texts, metadata)
+        assert store.collection.counts() == {'': 1, 'bills': 2, 'health': 2, 'work': 2}
+        assert store.get_collection_stats()['shards']['(unsharded)'] == 1
+        results = store.search("when is the rent and the bill due", n_results=4)
+        # The merged top k of all shards is the top k of one big collection
+        assert results['documents'] == expected['documents']
+        assert [round(d, 5) for d in results['distances'][0]] == [round(d, 5) for d in expected['distances'][0]]
+        assert sorted(doc for _, doc, _ in store.iter_documents(page_size=3)) == sorted(texts)
+
+def test_single_shard_queries_touch_only_their_slice():
+    with _store() as (store, _):
+        store.add_documents([text for text, _ in NOTES], [{'source': source} for _, source in NOTES])
+        calls = _spy(store)
+        results = store.search("doctor appointment", n_results=3)
+        # Every shard was queried, on the shard pool
+        assert sorted(name for name, _ in calls) == ['shard_test', 'shard_test.shard.bills',
+                                                     'shard_test.shard.health', 'shard_test.shard.work']
+        assert all(thread.startswith('shard') for _, thread in calls)
+        assert results['documents'][0][0].startswith("Doctor appointment")
+
+        calls.clear()
+        results = store.search("doctor appointment", n_results=3, shards=['health'])
+        assert [name for name, _ in calls] == ['shard_test.shard.health'] and len(results['ids'][0]) == 2
+        calls.clear()
+        store.search("meeting", n_results=3, filter_dict={'source': {'$in': ['work', 'bills']}})
+        assert sorted(name for name, _ in calls) == ['shard_test.shard.bills', 'shard_test.shard.work']
+        calls.clear()
+        assert store.search("meeting", n_results=3, shards=['unknown'])['ids'] == [[]] and calls == []
+        assert store.unknown_shards(['health', 'unknown']) == ['unknown']
+
+def test_updates_move_records_between_shards():
+    with _store() as (store, _):
+        ids = store.add_documents([text for text, _ in NOTES], [{'source': source} for _, source in NOTES])
+        store.update_documents([ids[0]], ["Rent of 1250 is due on the fifth"], [{'source': 'health'}])
+        assert store.collection.counts() == {'': 1, 'bills': 1, 'health': 3, 'work': 2}
+        store._record_links({ids[0]: 2})
+        assert store.get_documents_by_ids([ids[0]])['metadatas'][0]['duplicate_count'] == 2
+        store.delete_by_ids(ids[:2])
+        assert store.collection.count() == 5
+
+def test_filtered_pages_step_through_shards():
+    metadata = [{'source': source, 'kind': 'note' if i % 3 else 'task'} for i, (_, source) in enumerate(NOTES)]
+    with _store() as (store, _):
+        store.add_documents([text for text, _ in NOTES], metadata)
+        where = {'kind': 'note'}
+        matching = [doc_id for shard in store.collection.shards()
+                    for doc_id in store.collection._collection(shard).get(where=where, include=[])['ids']]
+        calls = _spy(store)
+        for offset in range(len(matching) + 2):
+            for limit in (1, 2, 3, None):
+                page = store.collection.get(where=where, limit=limit, offset=offset, include=['metadatas'])
+                expected = matching[offset:offset + limit if limit else None]
+                assert page['ids'] == expected, (offset, limit)
+                assert all(meta['kind'] == 'note' for meta in page['metadatas'])
+        # Shards skipped by the offset are counted in bounded pages, never by listing all their IDs
+        assert all(kwargs['limit'] is not None for _, kwargs in calls if kwargs.get('include') == [])
+
+def test_time_buckets_and_snapshot_round_trip():
+    from database.snapshot import export_snapshot, import_snapshot
+
+    texts = [text for text, _ in NOTES]
+    months = ['2026-08-03T10:00:00', '2026-09-14T10:00:00', '2026-09-20T10:00:00', '2026-10-01T10:00:00']
+    metadata = [{'source': source, 'timestamp': months[i % len(months)]} for i, (_, source) in enumerate(NOTES)]
+    embeddings = [fake_embedding(text) for text in texts]
+    with _store(shard_by='timestamp') as (store, tmp):
+        store.load_records([f"note-{i}" for i in range(len(texts))], texts, metadata, embeddings)
+        assert store.collection.counts() == {'': 0, '2026-08': 2, '2026-09': 4, '2026-10': 1}
+        results = store.search("doctor appointment", n_results=5, shards=['2026-09'])
+        assert all(meta['timestamp'].startswith('2026-09') for meta in results['metadatas'][0])
+
+        export_snapshot(store, None, os.path.join(tmp, 'snapshot'))
+        with _store(shard_by='source', name='restored') as (restored, _):
+            loaded = import_snapshot(restored, None, os.path.join(tmp, 'snapshot'))
+            assert loaded['knowledge_base'] == len(texts)
+            assert restored.collection.counts() == {'': 1, 'bills': 2, 'health': 2, 'work': 2}
+
+def test_near_duplicates_stay_within_their_shard():
+    note = NOTES[0][0]
+    with _store(dedup='link') as (store, _):
+        [alice] = store.add_documents([note], [{'source': 'alice'}])
+        # The same text from another tenant, twice in one batch: stored once, in bob's shard
+        bob, linked = store.add_documents([note, note], [{'source': 'bob'}, {'source': 'bob'}])
+        assert bob != alice and linked == bob
+        assert store.collection.counts() == {'': 0, 'alice': 1, 'bob': 1}
+        assert store.search(note, n_results=3, shards=['bob'])['ids'] == [[bob]]
+        # A later copy for bob links to bob's chunk, never to alice's
+        assert store.add_documents([note], [{'source': 'bob'}]) == [bob]
+        assert store.collection.counts() == {'': 0, 'alice': 1, 'bob': 1}
+        assert store.find_duplicate(note, {'source': 'alice'})[0] == alice
+        assert store.find_duplicate(note, {'source': 'carol'}) is None
+
+if __name__ == '__main__':
+    for test in [test_writes_routed_and_search_merged_globally, test_single_shard_queries_touch_only_their_slice,
+                 test_updates_move_records_between_shards, test_filtered_pages_step_through_shards,
+                 test_time_buckets_and_snapshot_round_trip, test_near_duplicates_stay_within_their_shard]:
+        test()
+        print(f"✓ {test.__name__}")
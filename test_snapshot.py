@@ -0,0 +1,146 @@
+# test_snapshot.py
+"""Snapshot export/import: embeddings, metadata and sessions round-trip without re-embedding (no Ollama needed)"""
+import os
+import tempfile
+from database.session_manager import SessionManager
+from database.snapshot import SnapshotError, export_snapshot, import_snapshot
+from database.vector_store import VectorStore
+
+TEXTS = ["Rent is due on the first of the month.", "The wifi password is on the fridge.",
+         "Dentist appointment every six months."]
+
+def _embed(texts):
+    return [[len(text) / 10.0, 1.0 / (1 + i), 0.333] for i, text in enumerate(texts)]
+
+def _refuse(texts):
+    raise AssertionError("import must not compute embeddings")
+
+def _source(tmp):
+    store = VectorStore(os.path.join(tmp, 'source'))
+    store.set_embedder(_embed)
+    sessions = SessionManager(os.path.join(tmp, 'source.db'))
+    store.add_documents(TEXTS, [{'source': 'note', 'page': i} for i in range(len(TEXTS))])
+    sessions.create_session('chat-1', {'mode': 'chat'})
+    sessions.add_message('chat-1', 'user', 'When is the rent due?')
+    sessions.add_message('chat-1', 'assistant', 'On the first of the month.')
+    sessions.update_session_summary('chat-1', 'Asked about rent.', 2)
+    store.add_memories(['msg-1', 'msg-2'], ['When is the rent due?', 'On the first of the month.'],
+                       [{'session_id': 'chat-1', 'role': role, 'message_id': i}
+                        for i, role in ((1, 'user'), (2, 'assistant'))])
+    sessions.mark_messages_indexed([1, 2])
+    return store, sessions
+
+def _target(tmp, name='target'):
+    store = VectorStore(os.path.join(tmp, name))
+    store.set_embedder(_refuse)
+    return store, SessionManager(os.path.join(tmp, f'{name}.db'))
+
+def _by_id(store):
+    records = store.collection.get(include=['documents', 'metadatas', 'embeddings'])
+    return {doc_id: (doc, meta, list(vector)) for doc_id, doc, meta, vector in
+            zip(records['ids'], records['documents'], records['metadatas'], records['embeddings'])}
+
+def test_round_trip_without_embedding():
+    with tempfile.TemporaryDirectory() as tmp:
+        source, source_sessions = _source(tmp)
+        for dtype, tolerance in (('float32', 1e-7), ('float16', 1e-3)):
+            path = os.path.join(tmp, f'snapshot-{dtype}')
+            manifest = export_snapshot(source, source_sessions, path, dtype=dtype)
+            assert manifest['collections']['knowledge_base']['records'] == len(TEXTS)
+            assert manifest['sessions']['messages'] == 2
+
+            target, target_sessions = _target(tmp, dtype)
+            loaded = import_snapshot(target, target_sessions, path)
+            assert loaded['knowledge_base'] == len(TEXTS) and loaded['memory'] == 2
+
+            expected, actual = _by_id(source), _by_id(target)
+            assert expected.keys() == actual.keys()
+            for doc_id, (doc, meta, vector) in expected.items():
+                assert actual[doc_id][:2] == (doc, meta)
+                assert all(abs(a - b) <= tolerance * max(1.0, abs(b)) for a, b in zip(actual[doc_id][2], vector))
+            assert target_sessions.get_session_summary('chat-1')['summary'] == 'Asked about rent.'
+            # Imported messages keep their memory, so nothing is queued for re-embedding
+            assert target_sessions.get_unindexed_messages() == []
+            assert target.find_duplicate(TEXTS[0]) is not None
+
+def test_message_ids_are_remapped_when_taken():
+    with tempfile.TemporaryDirectory() as tmp:
+        source, source_sessions = _source(tmp)
+        path = os.path.join(tmp, 'snapshot')
+        export_snapshot(source, source_sessions, path)
+
+        target, target_sessions = _target(tmp)
+        target_sessions.create_session('local')
+        target_sessions.add_message('local', 'user', 'A message already using ID 1')
+        import_snapshot(target, target_sessions, path)
+
+        history = target_sessions.get_session_history('chat-1')
+        assert [m['content'] for m in history] == ['When is the rent due?', 'On the first of the month.']
+        memory = target.memory_collection.get(include=['metadatas'])
+        assert sorted(memory['ids']) == sorted(f"msg-{m['id']}" for m in history)
+        assert target_sessions.get_session_summary('chat-1')['summary_message_id'] == history[-1]['id']
+        # Importing again adds nothing twice
+        assert import_snapshot(target, target_sessions, path)['messages'] == 0
+        assert target.collection.count() == len(TEXTS)
+
+def test_import_into_target_with_id_gap_keeps_order():
+    import sqlite3
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, source_sessions = _source(tmp)
+        path = os.path.join(tmp, 'snapshot')
+        export_snapshot(source, source_sessions, path)
+
+        # Target messages 1 and 100: snapshot message 1 collides, message 2 would not
+        target, target_sessions = _target(tmp)
+        target_sessions.create_session('local')
+        target_sessions.add_message('local', 'user', 'A message already using ID 1')
+        conn = sqlite3.connect(target_sessions.db_path)
+        with conn:
+            conn.execute("INSERT INTO messages (id, session_id, role, content, timestamp) "
+                         "VALUES (100, 'local', 'assistant', 'A message using ID 100', '')")
+        conn.close()
+        import_snapshot(target, target_sessions, path)
+
+        history = target_sessions.get_session_history('chat-1')
+        assert [m['content'] for m in history] == ['When is the rent due?', 'On the first of the month.']
+        assert [m['id'] for m in history] == [101, 102]
+        # The summary still covers exactly the messages it covered in the source
+        summary_id = target_sessions.get_session_summary('chat-1')['summary_message_id']
+        assert summary_id == 102 and target_sessions.get_messages_since('chat-1', summary_id) == []
+
+def test_damaged_or_mismatched_snapshots_are_refused():
+    with tempfile.TemporaryDirectory() as tmp:
+        source, source_sessions = _source(tmp)
+        path = os.path.join(tmp, 'snapshot')
+        export_snapshot(source, source_sessions, path)
+        try:
+            export_snapshot(source, source_sessions, path)
+            assert False, "existing snapshot overwritten"
+        except FileExistsError:
+            pass
+
+        target, target_sessions = _target(tmp)
+        target.embedding_model = 'another-model'
+        try:
+            import_snapshot(target, target_sessions, path)
+            assert False, "embedding model mismatch accepted"
+        except SnapshotError:
+            pass
+
+        with open(os.path.join(path, 'knowledge_base.vectors'), 'r+b') as f:
+            f.write(b'\x00\x01')
+        target.embedding_model = source.embedding_model
+        try:
+            import_snapshot(target, target_sessions, path)
+            assert False, "damaged snapshot accepted"
+        except SnapshotError:
+            pass
+        assert target.collection.count() == 0
+
+if __name__ == '__main__':
+    for test in [test_round_trip_without_embedding, test_message_ids_are_remapped_when_taken,
+                 test_import_into_target_with_id_gap_keeps_order,
+                 test_damaged_or_mismatched_snapshots_are_refused]:
+        test()
+        print(f"✓ {test.__name__}")
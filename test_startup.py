@@ -0,0 +1,37 @@
+# test_startup.py
+"""Startup regression tests: entry points must stay cheap to import"""
+from config import Config
+from helper.import_report import measure_import
+
+def _assert_light(statement, allowed=()):
+    report = measure_import(statement)
+    assert 'error' not in report, report
+    heavy = [name for name in report['heavy_modules_loaded'] if name not in allowed]
+    assert not heavy, f"{statement} loaded heavy modules: {heavy}"
+    assert report['seconds'] <= Config.STARTUP_IMPORT_BUDGET_SECONDS, (
+        f"{statement} took {report['seconds']:.3f}s "
+        f"(budget {Config.STARTUP_IMPORT_BUDGET_SECONDS:.3f}s)"
+    )
+
+def test_main_startup_budget():
+    """The CLI must not load chromadb, speech recognition or requests before a command runs"""
+    _assert_light('import main')
+
+def test_daemon_client_startup_budget():
+    _assert_light('import agent_daemon')
+
+def test_sessions_only_import_skips_chromadb():
+    _assert_light('from database import SessionManager')
+
+def test_helper_import_skips_speech_recognition():
+    _assert_light('from helper import append_to_kb')
+
+def test_agent_import_is_light():
+    _assert_light('from agent import PersonalAgent')
+
+if __name__ == '__main__':
+    for test in [test_main_startup_budget, test_daemon_client_startup_budget,
+                 test_sessions_only_import_skips_chromadb,
+                 test_helper_import_skips_speech_recognition, test_agent_import_is_light]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,80 @@
+# test_streaming.py
+"""Streamed chat generation and cancellation (uses the fake Ollama server, no models needed)"""
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from conftest import config_override
+from benchmarks.fake_ollama import FakeOllamaServer, fake_embedding
+from ollama_runner import OllamaClient
+
+ANSWER = ' '.join(f"word{i}" for i in range(40))
+
+@contextmanager
+def _fake_agent(generate_latency_ms=0.0):
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from agent.personal_agent import PersonalAgent
+
+    server = FakeOllamaServer(generate_latency_ms=generate_latency_ms)
+    server.default_response = ANSWER
+    server.start()
+    try:
+        with config_override(DEDUP_POLICY='off'), tempfile.TemporaryDirectory() as tmp:
+            store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='streaming_test',
+                                memory_collection_name='streaming_test_memory')
+            store.set_embedder(lambda texts: [fake_embedding(text) for text in texts])
+            store.add_documents(["The rent is due on the fifth of every month."])
+            agent = PersonalAgent(store, SessionManager(os.path.join(tmp, 'metadata.db')), llm_model='fake')
+            agent.ollama_client = OllamaClient(server.base_url)
+            agent._schedule_memory_indexing = lambda: None
+            yield agent, server
+    finally:
+        server.stop()
+
+def test_client_streams_pieces():
+    server = FakeOllamaServer()
+    server.default_response = ANSWER
+    server.start()
+    try:
+        pieces = list(OllamaClient(server.base_url).generate_stream('fake', 'Say something'))
+    finally:
+        server.stop()
+    assert len(pieces) == 40 and ''.join(pieces) == ANSWER
+
+def test_chat_streams_tokens_and_keeps_session():
+    with _fake_agent() as (agent, _):
+        session_id = agent.create_session()
+        pieces = []
+        response = agent.chat("When is the rent due?", session_id=session_id, on_token=pieces.append)
+        assert response == ANSWER and len(pieces) == 40 and ''.join(pieces) == ANSWER
+        # Without on_token the same turn is generated in one piece
+        assert agent.chat("And the deposit?", session_id=session_id) == ANSWER
+        roles = [message['role'] for message in agent.session_manager.get_session_history(session_id, limit=10)]
+        assert roles == ['user', 'assistant', 'user', 'assistant']
+
+def test_cancel_stops_generation_early():
+    # The full answer takes 2 s to stream; cancelling after 3 pieces returns at once
+    with _fake_agent(generate_latency_ms=2000) as (agent, _):
+        session_id = agent.create_session()
+        cancel = threading.Event()
+        pieces = []
+
+        def on_token(piece):
+            pieces.append(piece)
+            if len(pieces) == 3:
+                cancel.set()
+
+        start = time.perf_counter()
+        response = agent.chat("When is the rent due?", session_id=session_id, on_token=on_token, cancel=cancel)
+        assert time.perf_counter() - start < 1.0
+        assert response == ''.join(pieces).strip() and len(pieces) == 3
+        history = agent.session_manager.get_session_history(session_id, limit=10)
+        assert history[-1]['content'] == response
+
+if __name__ == '__main__':
+    for test in [test_client_streams_pieces, test_chat_streams_tokens_and_keeps_session,
+                 test_cancel_stops_generation_early]:
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,122 @@
+# test_tracing.py
+"""Span tracing: nesting, timing aggregation and the Prometheus text format (no Ollama needed)"""
+import os
+import re
+import tempfile
+import time
+from helper.tracing import Tracer, traced, tracer
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (-?[0-9.e+-]+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="([^"]*)"')
+
+def _samples(text):
+    """{(metric, ((label, value), ...)): value} of a Prometheus exposition, checking every line's syntax"""
+    samples, typed = {}, set()
+    assert text.endswith("\n")
+    for line in text.splitlines():
+        if line.startswith('# HELP ') or line.startswith('# TYPE '):
+            parts = line.split(' ', 3)
+            if parts[1] == 'TYPE':
+                assert parts[3] in ('counter', 'gauge', 'summary', 'histogram', 'untyped')
+                typed.add(parts[2])
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        # Every sample belongs to a family declared before it
+        assert name in typed or re.sub(r'_(sum|count)$', '', name) in typed, line
+        samples[(name, tuple(LABEL.findall(labels or '')))] = float(value)
+    return samples
+
+def test_nested_spans_record_both_levels():
+    local = Tracer()
+    with local.span('outer'):
+        time.sleep(0.02)
+        for _ in range(3):
+            with local.span('inner'):
+                time.sleep(0.01)
+    try:
+        with local.span('failing'):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    spans = local.snapshot()['spans']
+    assert (spans['outer']['count'], spans['inner']['count'], spans['failing']['count']) == (1, 3, 1)
+    # The outer span includes the time of the spans nested in it
+    assert spans['outer']['total_ms'] >= spans['inner']['total_ms'] + 20
+    assert spans['inner']['total_ms'] >= 30
+
+    disabled = Tracer(enabled=False)
+    with disabled.span('ignored'):
+        pass
+    assert disabled.snapshot()['spans'] == {}
+
+def test_traced_decorator_uses_shared_tracer():
+    enabled = tracer.enabled
+    tracer.enabled = True
+    try:
+        @traced('test_tracing.decorated')
+        def decorated(value):
+            return value * 2
+
+        assert decorated(21) == 42 and decorated.__name__ == 'decorated'
+        assert tracer.snapshot()['spans']['test_tracing.decorated']['count'] == 1
+    finally:
+        tracer.enabled = enabled
+
+def test_timings_aggregate_into_percentiles():
+    local = Tracer()
+    for ms in range(1, 101):
+        local.record('stage', ms / 1000)
+    stage = local.snapshot()['spans']['stage']
+    assert stage == {'count': 100, 'total_ms': 5050.0, 'mean_ms': 50.5, 'p50_ms': 51.0,
+                     'p95_ms': 95.0, 'p99_ms': 99.0, 'max_ms': 100.0}
+
+    # Percentiles come from the bounded sample window; count, total and max from every call
+    windowed = Tracer(max_samples=10)
+    for ms in range(1, 101):
+        windowed.record('stage', ms / 1000)
+    stage = windowed.snapshot()['spans']['stage']
+    assert (stage['count'], stage['max_ms'], stage['p50_ms'], stage['p99_ms']) == (100, 100.0, 95.0, 100.0)
+
+    for response in ({'total_duration': 3e9, 'eval_duration': 2e9, 'eval_count': 40, 'prompt_eval_count': 10},
+                     {'total_duration': 1e9, 'eval_duration': 0.5e9, 'eval_count': 10, 'prompt_eval_count': 5}):
+        local.record_ollama('generate', 'fake', response)
+    local.record_ollama('generate', 'fake', "not a response body")
+    ollama = local.snapshot()['ollama']['generate:fake']
+    assert (ollama['calls'], ollama['prompt_tokens'], ollama['completion_tokens']) == (2, 15, 50)
+    assert (ollama['total_ms'], ollama['eval_ms'], ollama['tokens_per_second']) == (4000.0, 2500.0, 20.0)
+
+    local.reset()
+    assert local.snapshot() == {'spans': {}, 'ollama': {}, 'memory': {}}
+
+def test_prometheus_text_format():
+    local = Tracer()
+    for ms in (10, 20, 30):
+        local.record('agent.query', ms / 1000)
+    local.record_ollama('embed', 'nomic', {'total_duration': 2e9, 'load_duration': 0.5e9, 'prompt_eval_count': 7})
+    local.record_memory('agent.query', 4096, 1024)
+
+    samples = _samples(local.to_prometheus(prefix='test'))
+    assert samples[('test_span_seconds', (('span', 'agent.query'), ('quantile', '0.5')))] == 0.02
+    assert samples[('test_span_seconds', (('span', 'agent.query'), ('quantile', '0.99')))] == 0.03
+    assert samples[('test_span_seconds_sum', (('span', 'agent.query'),))] == 0.06
+    assert samples[('test_span_seconds_count', (('span', 'agent.query'),))] == 3
+    labels = (('operation', 'embed'), ('model', 'nomic'))
+    assert samples[('test_ollama_calls_total', labels)] == 1
+    assert samples[('test_ollama_tokens_total', labels + (('kind', 'prompt'),))] == 7
+    assert samples[('test_ollama_duration_seconds_total', labels + (('phase', 'load'),))] == 0.5
+    assert samples[('test_span_peak_memory_bytes', (('span', 'agent.query'),))] == 4096
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'agent.prom')
+        local.export_prometheus(path)
+        assert os.listdir(tmp) == ['agent.prom']
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == local.to_prometheus()
+
+if __name__ == '__main__':
+    for test in [test_nested_spans_record_both_levels, test_traced_decorator_uses_shared_tracer,
+                 test_timings_aggregate_into_percentiles, test_prometheus_text_format]:
+        test()
+        print(f"✓ {test.__name__}")
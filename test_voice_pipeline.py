@@ -0,0 +1,144 @@
+# test_voice_pipeline.py
+"""Voice pipeline: WAV/stream sources, energy VAD, background transcription (offline)"""
+import io
+import os
+import tempfile
+import time
+import wave
+from conftest import config_override
+from helper.voice_pipeline import (EnergyVAD, NoiseCalibration, PCMStreamSource, VoicePipeline, WavSource)
+
+RATE = 16000
+# Each "word" is a tone; the fake recognizer names the dominant frequency of a segment
+WORDS = {440: 'rent', 660: 'due', 880: 'friday'}
+
+def _pcm(parts, seed=0):
+    """16-bit PCM of (frequency or None for background noise, seconds) parts"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for frequency, seconds in parts:
+        t = np.arange(int(RATE * seconds)) / RATE
+        signal = rng.normal(0, 30, len(t))
+        if frequency:
+            signal += 8000 * np.sin(2 * np.pi * frequency * t)
+        chunks.append(signal)
+    return np.concatenate(chunks).astype('<i2').tobytes()
+
+def _wav(pcm, channels=1):
+    import numpy as np
+
+    if channels > 1:
+        pcm = np.repeat(np.frombuffer(pcm, dtype='<i2'), channels).tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+class ToneRecognizer:
+    """Offline recognizer backend: the word of the segment's dominant frequency"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    def transcribe(self, audio, sample_rate):
+        import numpy as np
+
+        self.calls.append(time.perf_counter())
+        time.sleep(self.delay)
+        samples = np.frombuffer(audio, dtype='<i2').astype(np.float32)
+        spectrum = np.abs(np.fft.rfft(samples))
+        frequency = np.fft.rfftfreq(len(samples), 1 / sample_rate)[int(np.argmax(spectrum))]
+        nearest = min(WORDS, key=lambda f: abs(f - frequency))
+        return WORDS[nearest] if abs(nearest - frequency) < 20 else None
+
+SPEECH = [(None, 0.6), (440, 0.5), (None, 0.8), (660, 0.4), (None, 0.9), (880, 0.6), (None, 0.5)]
+
+def test_vad_finds_segments():
+    segments = list(EnergyVAD(RATE).segments(WavSource(_wav(_pcm(SPEECH))).frames()))
+    assert len(segments) == 3
+    # Starts at the tone onsets (within padding and one frame), in order
+    for segment, onset in zip(segments, [0.6, 1.9, 3.2]):
+        assert onset - 0.2 <= segment['start'] <= onset + 0.03, segment['start']
+    assert all(a['end'] < b['start'] for a, b in zip(segments, segments[1:]))
+    # A click shorter than VOICE_MIN_SPEECH_MS is not speech
+    assert list(EnergyVAD(RATE).segments(WavSource(_wav(_pcm([(None, 0.6), (440, 0.06), (None, 1.0)]))).frames())) == []
+
+def test_sources_transcribe_the_same():
+    pcm = _pcm(SPEECH)
+    pipeline = VoicePipeline(ToneRecognizer())
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'note.wav')
+        with open(path, 'wb') as f:
+            f.write(_wav(pcm))
+        assert pipeline.transcribe(path) == 'rent due friday'
+    assert pipeline.transcribe(_wav(pcm, channels=2)) == 'rent due friday'
+    assert pipeline.transcribe(io.BytesIO(_wav(pcm))) == 'rent due friday'
+    assert pipeline.transcribe(PCMStreamSource(io.BytesIO(pcm), RATE)) == 'rent due friday'
+    assert [r['text'] for r in pipeline.stream(_wav(pcm), max_segments=2)] == ['rent', 'due']
+
+def test_transcription_overlaps_capture():
+    class SlowStream(io.BytesIO):
+        """PCM arriving in real time, like a microphone"""
+        def read(self, size=-1):
+            time.sleep(size / 2 / RATE / 4)
+            return super().read(size)
+
+    recognizer = ToneRecognizer(delay=0.2)
+    stream = SlowStream(_pcm(SPEECH))
+    results = []
+    for result in VoicePipeline(recognizer).stream(PCMStreamSource(stream, RATE)):
+        results.append((result['text'], time.perf_counter(), stream.tell() < len(stream.getvalue())))
+    assert [text for text, _, _ in results] == ['rent', 'due', 'friday']
+    # The first phrase was recognized while later audio was still being captured
+    assert results[0][2]
+
+def test_microphone_calibration_is_cached():
+    calibration = NoiseCalibration(ttl_seconds=60)
+    pipeline = VoicePipeline(ToneRecognizer(), calibration=calibration)
+    pcm = _pcm(SPEECH)
+    assert pipeline.transcribe(PCMStreamSource(io.BytesIO(pcm), RATE, calibration_key='mic:None')) == 'rent due friday'
+    assert calibration.misses == 1 and calibration.get('mic:None') is not None
+    # The next capture starts with speech right away and still uses the stored noise level
+    assert pipeline.transcribe(PCMStreamSource(io.BytesIO(pcm[int(0.6 * RATE) * 2:]), RATE,
+                                               calibration_key='mic:None')) == 'rent due friday'
+    assert calibration.hits >= 2
+
+def test_folder_of_recordings_into_knowledge_base():
+    from database.vector_store import VectorStore
+    from agent.personal_agent import PersonalAgent
+
+    with config_override(DEDUP_POLICY='off', REMINDERS_ENABLED=False), tempfile.TemporaryDirectory() as tmp:
+        recordings = os.path.join(tmp, 'recordings')
+        os.makedirs(os.path.join(recordings, 'week2'))
+        for name, parts in [('a.wav', SPEECH), ('week2/b.wav', [(None, 0.6), (880, 0.5), (None, 0.6)]),
+                            ('silence.wav', [(None, 1.0)])]:
+            with open(os.path.join(recordings, name), 'wb') as f:
+                f.write(_wav(_pcm(parts)))
+        with open(os.path.join(recordings, 'notes.txt'), 'w') as f:
+            f.write('not audio')
+
+        store = VectorStore(os.path.join(tmp, 'vectors'), collection_name='voice_test',
+                            memory_collection_name='voice_test_memory')
+        store.set_embedder(lambda texts: [[float(len(text)), 1.0] for text in texts])
+        agent = PersonalAgent(store, session_manager=None, llm_model='fake')
+        progress = []
+        counts = agent.add_audio_to_knowledge_base(recordings, progress=lambda done, total: progress.append(done),
+                                                   recognizer=ToneRecognizer())
+        assert counts == {'files': 3, 'transcribed': 2, 'chunks': 2} and progress == [1, 2, 3]
+        stored = store.collection.get(include=['documents', 'metadatas'])
+        by_file = {meta['file']: (doc, meta) for doc, meta in zip(stored['documents'], stored['metadatas'])}
+        assert by_file['a.wav'][0] == 'rent due friday'
+        assert by_file[os.path.join('week2', 'b.wav')][0] == 'friday'
+        assert by_file['a.wav'][1]['source'] == 'voice' and by_file['a.wav'][1]['duration_seconds'] == 4.3
+
+if __name__ == '__main__':
+    for test in [test_vad_finds_segments, test_sources_transcribe_the_same, test_transcription_overlaps_capture,
+                 test_microphone_calibration_is_cached, test_folder_of_recordings_into_knowledge_base]:
+        test()
+        print(f"✓ {test.__name__}")
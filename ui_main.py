@@ -1,23 +1,58 @@
 # ui_main.py
+import queue
+import threading
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import filedialog, scrolledtext, messagebox
 from config import Config
-from database.vector_store import VectorStore
-from database.session_manager import SessionManager
-from agent.personal_agent import PersonalAgent
-from helper.speechtotext import voice_search
+
+FRAME_MS = 16  # ~60 fps: how often results from workers are applied to the widgets
+FRAME_BUDGET_SECONDS = 0.008  # Time per frame spent on queued callbacks, leaving the rest for redraws
+
+def voice_search():
+    # speech_recognition (and PyAudio) load only when voice input is actually used
+    from helper.speechtotext import voice_search as _voice_search
+    return _voice_search()
+
+def build_agent():
+    from database.vector_store import VectorStore
+    from database.session_manager import SessionManager
+    from database.event_store import EventStore
+    from database.job_store import JobStore
+    from agent.personal_agent import PersonalAgent
+
+    Config.create_dirs()
+    vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
+    session_manager = SessionManager(str(Config.METADATA_DB_PATH))
+    event_store = EventStore(str(Config.METADATA_DB_PATH))
+    job_store = JobStore(str(Config.METADATA_DB_PATH))
+    agent = PersonalAgent(vector_store, session_manager, event_store=event_store, job_store=job_store)
+    # Adding runs as a background job; the window polls its progress
+    agent.start_jobs()
+    return agent
 
 class PersonalAIGUI:
+    """
+    Tk front end. Slow work (loading the agent, voice capture, Chroma and Ollama
+    calls) runs on a worker executor. Workers never touch widgets: they queue
+    callbacks that the Tk thread applies once per frame, so the window keeps
+    redrawing during long operations. Chat answers stream into the output as
+    they are generated, and one chat session lasts until "New Chat".
+    """
+
     def __init__(self, root):
         self.root = root
         self.root.title("Personal AI Knowledge Agent")
-        self.root.geometry("700x500")
+        self.root.geometry("700x560")
 
-        # Initialize agent
-        Config.create_dirs()
-        self.vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
-        self.session_manager = SessionManager(str(Config.METADATA_DB_PATH))
-        self.agent = PersonalAgent(self.vector_store, self.session_manager)
+        self.agent = None
+        self.session_id = None
+        self.job_id = None
+        self.cancel_event = None  # set by Cancel to stop the running operation
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='gui-worker')
+        self.ui_queue = queue.SimpleQueue()  # (callback, args) from workers, run on the Tk thread
+        self.pending_text = []  # streamed pieces waiting for the next frame
 
         # Mode selection
         self.mode_var = tk.StringVar(value="add")
@@ -44,77 +79,223 @@ class PersonalAIGUI:
         self.output_area = scrolledtext.ScrolledText(root, height=15)
         self.output_area.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-        # Action button
-        tk.Button(root, text="Run", command=self.run_mode, bg="lightblue").pack(pady=10)
+        # Actions
+        buttons = tk.Frame(root)
+        buttons.pack(pady=10)
+        self.run_button = tk.Button(buttons, text="Run", command=self.run_mode, bg="lightblue", state=tk.DISABLED)
+        self.run_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(buttons, text="Cancel", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="New Chat", command=self.new_chat).pack(side=tk.LEFT, padx=5)
+
+        # Status line (agent loading, operations, background job progress)
+        self.status = tk.StringVar(value="Loading knowledge base...")
+        tk.Label(root, textvariable=self.status).pack()
+
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(FRAME_MS, self.drain)
+        self.submit(build_agent, self.agent_ready)
+
+    # ---------- Worker plumbing ----------
+
+    def call_soon(self, callback, *args):
+        """Run `callback(*args)` on the Tk thread at the next frame (safe from any thread)"""
+        self.ui_queue.put((callback, args))
+
+    def submit(self, work, on_done=None):
+        """Run `work()` on a worker; `on_done(result)` (or an error dialog) follows on the Tk thread"""
+        def run():
+            try:
+                result = work()
+            except Exception as e:
+                self.call_soon(self.failed, e)
+                return
+            if on_done is not None:
+                self.call_soon(on_done, result)
+        return self.executor.submit(run)
+
+    def drain(self):
+        """Apply queued callbacks for at most one frame budget, then the streamed text in one insert"""
+        deadline = time.perf_counter() + FRAME_BUDGET_SECONDS
+        while time.perf_counter() < deadline:
+            try:
+                callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        if self.pending_text:
+            self.output_area.insert(tk.END, ''.join(self.pending_text))
+            self.output_area.see(tk.END)
+            self.pending_text.clear()
+        self.root.after(FRAME_MS, self.drain)
+
+    def agent_ready(self, agent):
+        self.agent = agent
+        self.run_button.config(state=tk.NORMAL)
+        self.status.set("Ready.")
+
+    def start_operation(self, label):
+        self.cancel_event = threading.Event()
+        self.run_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        self.status.set(label)
+        return self.cancel_event
+
+    def end_operation(self, label="Ready."):
+        self.cancel_event = None
+        self.run_button.config(state=tk.NORMAL if self.agent else tk.DISABLED)
+        if self.job_id is None:
+            self.cancel_button.config(state=tk.DISABLED)
+        self.status.set(label)
+
+    def failed(self, error):
+        self.end_operation()
+        messagebox.showerror("Error", str(error))
+
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+            self.status.set("Cancelling...")
+        if self.job_id is not None:
+            self.agent.cancel_job(self.job_id)
+
+    def close(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.agent is not None:
+            self.agent.stop_jobs()
+        self.root.destroy()
+
+    # ---------- Background jobs ----------
+
+    def watch_job(self, job_id):
+        self.job_id = job_id
+        self.cancel_button.config(state=tk.NORMAL)
+        self.poll_job()
+
+    def poll_job(self):
+        job = self.agent.job_status(self.job_id)
+        if job is None:
+            return
+        progress = f"{job['done']}/{job['total']} chunks" if job['total'] else "starting"
+        self.status.set(f"Job #{job['id']} ({job['kind']}): {job['status']}, {progress}")
+        if job['status'] in ("queued", "running"):
+            self.root.after(int(Config.JOB_PROGRESS_INTERVAL * 1000), self.poll_job)
+            return
+        self.job_id = None
+        if self.cancel_event is None:
+            self.cancel_button.config(state=tk.DISABLED)
+        if job['status'] == "done":
+            self.output_area.insert(tk.END, f"Added {job['result']['chunks']} chunks to knowledge base.\n")
+        elif job['status'] == "failed":
+            self.output_area.insert(tk.END, f"Job #{job['id']} failed: {job['error']}\n")
+        else:
+            self.output_area.insert(tk.END, f"Job #{job['id']} cancelled after {job['done']} chunks.\n")
+
+    # ---------- Modes ----------
 
     def select_file(self):
         file = filedialog.askopenfilename()
         if file:
             self.file_path.set(file)
 
+    def new_chat(self):
+        self.session_id = None
+        self.output_area.delete("1.0", tk.END)
+
+    def capture(self, text, input_type, cancel):
+        """The typed text, or speech recognized on the worker thread"""
+        if input_type != "voice":
+            return text
+        self.call_soon(self.status.set, "🎤 Listening...")
+        text = voice_search()
+        if not text and not cancel.is_set():
+            raise ValueError("No speech recognized.")
+        return text
+
     def run_mode(self):
+        if self.agent is None:
+            return
         mode = self.mode_var.get()
         input_type = self.input_var.get()
         text = self.text_input.get("1.0", tk.END).strip()
         file = self.file_path.get() or None
 
-        self.output_area.delete("1.0", tk.END)
+        if mode != "chat":
+            self.output_area.delete("1.0", tk.END)
+        if mode in ("add", "query") and input_type != "voice" and not text and not (mode == "add" and file):
+            messagebox.showerror("Error", "No input provided." if mode == "add" else "No question provided.")
+            return
+
+        if mode == "stats":
+            self.start_operation("Collecting statistics...")
+            self.submit(self.agent.get_stats, self.show_stats)
+
+        elif mode == "add":
+            cancel = self.start_operation("Adding...")
+
+            def add():
+                metadata = {"input_type": input_type, "file": file}
+                if input_type != "voice" and file:
+                    # The job streams the file instead of reading it into one string
+                    return self.agent.submit_file_job(file, source="manual", metadata=metadata)
+                captured = self.capture(text, input_type, cancel)
+                if cancel.is_set():
+                    return None
+                return self.agent.submit_job("add_text", {"text": captured, "source": "manual", "metadata": metadata})
+            self.submit(add, self.job_queued)
+
+        elif mode == "query":
+            cancel = self.start_operation("Searching...")
+
+            def query():
+                question = self.capture(text, input_type, cancel)
+                return None if cancel.is_set() else self.agent.query(question)
+            self.submit(query, lambda result: self.show_query(result, cancel))
+
+        elif mode == "chat":
+            cancel = self.start_operation("Thinking...")
+            self.submit(lambda: self.chat(text, input_type, cancel), lambda response: self.chat_done(cancel))
+
+    def job_queued(self, job_id):
+        self.end_operation()
+        if job_id is None:
+            self.output_area.insert(tk.END, "Cancelled.\n")
+        else:
+            self.watch_job(job_id)
+
+    def show_stats(self, stats):
+        self.end_operation()
+        for k, v in stats.items():
+            self.output_area.insert(tk.END, f"{k}: {v}\n")
+
+    def show_query(self, result, cancel):
+        self.end_operation()
+        if result is None or cancel.is_set():
+            self.output_area.insert(tk.END, "Cancelled.\n")
+            return
+        self.output_area.insert(tk.END, f"Question: {result['question']}\n\n")
+        for i, (chunk, distance) in enumerate(zip(result['context'], result['distances']), 1):
+            self.output_area.insert(tk.END, f"[{i}] (similarity: {1 - distance:.3f})\n{chunk[:300]}...\n\n")
+
+    def chat(self, text, input_type, cancel):
+        """Worker side of a chat turn: the answer streams into the output as it is generated"""
+        if self.session_id is None:
+            self.session_id = self.agent.create_session({"mode": "chat", "input_type": input_type, "ui": "tk"})
+        user_input = self.capture(text, input_type, cancel)
+        if cancel.is_set():
+            return None
+        self.call_soon(self.pending_text.append, f"You: {user_input}\nAssistant: ")
+        self.call_soon(self.status.set, "Thinking...")
+        return self.agent.chat(user_input, session_id=self.session_id,
+                               on_token=lambda piece: self.call_soon(self.pending_text.append, piece),
+                               cancel=cancel)
 
-        try:
-            if mode == "stats":
-                stats = self.agent.get_stats()
-                for k, v in stats.items():
-                    self.output_area.insert(tk.END, f"{k}: {v}\n")
-
-            elif mode == "add":
-                if input_type == "voice":
-                    text = voice_search()
-                    if not text:
-                        messagebox.showerror("Error", "No speech recognized.")
-                        return
-                elif file:
-                    with open(file, "r", encoding="utf-8") as f:
-                        text = f.read()
-
-                if not text:
-                    messagebox.showerror("Error", "No input provided.")
-                    return
-
-                doc_ids = self.agent.add_to_knowledge_base(
-                    text, source="manual", metadata={"input_type": input_type, "file": file}
-                )
-                self.output_area.insert(tk.END, f"Added {len(doc_ids)} chunks to knowledge base.\n")
-
-            elif mode == "query":
-                if input_type == "voice":
-                    text = voice_search()
-                    if not text:
-                        messagebox.showerror("Error", "No speech recognized.")
-                        return
-
-                if not text:
-                    messagebox.showerror("Error", "No question provided.")
-                    return
-
-                result = self.agent.query(text)
-                self.output_area.insert(tk.END, f"Question: {result['question']}\n\n")
-                for i, (chunk, distance) in enumerate(zip(result['context'], result['distances']), 1):
-                    self.output_area.insert(tk.END, f"[{i}] (similarity: {1 - distance:.3f})\n{chunk[:300]}...\n\n")
-
-            elif mode == "chat":
-                session_id = self.agent.start_session({"mode": "chat", "input_type": input_type})
-                user_input = text
-                if input_type == "voice":
-                    user_input = voice_search()
-                    if not user_input:
-                        messagebox.showerror("Error", "No speech recognized.")
-                        return
-                response = self.agent.chat(user_input)
-                self.output_area.insert(tk.END, f"You: {user_input}\n")
-                self.output_area.insert(tk.END, f"Assistant: {response}\n")
-
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+    def chat_done(self, cancel):
+        self.pending_text.append(" [cancelled]\n\n" if cancel.is_set() else "\n\n")
+        self.text_input.delete("1.0", tk.END)
+        self.end_operation()
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,9 +1,26 @@
 # view_knowledge_base.py
 """View all documents stored in the knowledge base"""
+import argparse
+import json
 from config import Config
 from database.vector_store import VectorStore
 
+def export_documents(vector_store, path):
+    """Write the knowledge base as JSON Lines, one page of documents in memory at a time"""
+    exported = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for doc_id, doc, meta in vector_store.iter_documents():
+            f.write(json.dumps({'id': doc_id, 'document': doc, 'metadata': meta}) + "\n")
+            exported += 1
+    return exported
+
 def main():
+    parser = argparse.ArgumentParser(description='View or export the knowledge base')
+    parser.add_argument('--export', type=str, help='Write all documents to this JSON Lines file')
+    parser.add_argument('--page-size', type=int, default=Config.STORE_PAGE_SIZE,
+                       help='Documents fetched from the vector store per page')
+    args = parser.parse_args()
+    
     Config.create_dirs()
     vector_store = VectorStore(str(Config.VECTOR_DB_PATH))
     
@@ -13,21 +30,19 @@ def main():
     
     print(f"Total documents in knowledge base: {count}\n")
     
+    if args.export:
+        exported = export_documents(vector_store, args.export)
+        print(f"Exported {exported} documents to {args.export}")
+        return
+    
     if count > 0:
-        # Get all documents
-        # ChromaDB's get() method can retrieve all documents
+        # Documents are fetched page by page so large collections don't exhaust memory
         try:
-            results = collection.get()
-            
-            documents = results.get('documents', [])
-            metadatas = results.get('metadatas', [])
-            ids = results.get('ids', [])
-            
             print("=" * 80)
             print("KNOWLEDGE BASE CONTENTS")
             print("=" * 80)
             
-            for i, (doc_id, doc, meta) in enumerate(zip(ids, documents, metadatas), 1):
+            for i, (doc_id, doc, meta) in enumerate(vector_store.iter_documents(args.page_size), 1):
                 print(f"\n[{i}] ID: {doc_id}")
                 if meta:
                     print(f"Timestamp: {meta.get('timestamp', 'N/A')}")
@@ -39,24 +54,6 @@ def main():
                 print("-" * 80)
         except Exception as e:
             print(f"Error retrieving documents: {e}")
-            print("\nTrying alternative method...")
-            # Alternative: query with a very general query to get all documents
-            try:
-                # Get a sample query to retrieve documents
-                results = collection.get(limit=count)
-                documents = results.get('documents', [])
-                metadatas = results.get('metadatas', [])
-                ids = results.get('ids', [])
-                
-                for i, (doc_id, doc, meta) in enumerate(zip(ids, documents, metadatas), 1):
-                    print(f"\n[{i}] ID: {doc_id}")
-                    if meta:
-                        print(f"Timestamp: {meta.get('timestamp', 'N/A')}")
-                        print(f"Source: {meta.get('source', 'N/A')}")
-                    print(f"\nText: {doc[:500]}{'...' if len(doc) > 500 else ''}")
-                    print("-" * 80)
-            except Exception as e2:
-                print(f"Alternative method also failed: {e2}")
     else:
         print("No documents found in knowledge base.")
         print("Add some text using: python main.py --mode add --text 'Your text here'")